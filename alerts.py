@@ -0,0 +1,526 @@
+"""
+Alertas de estoque baixo e de prazos (SLA), avaliados a cada alteração
+Cada evento reavalia só as regras da entidade que mudou: uma alteração de
+estoque confere o limite da categoria do anúncio; um produto do CD ou uma
+pergunta recalcula o próprio vencimento. Os vencimentos da próxima janela
+(ALERT_HORIZON) ficam em um heap e uma thread acorda no primeiro deles; os
+mais distantes ficam no banco e entram no heap pelos índices quando a janela
+avança, então a memória não cresce com o catálogo. Os alertas são gravados
+um por regra e entidade, e os avisos do dashboard contam só os ativos.
+
+O relógio roda só no worker líder; os produtos do CD alterados em outros
+workers chegam a ele pela revisão gravada na linha do produto.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import case, func, select
+import meli_store
+from models import db, Alert, CDProduct, CDState, MeliItem, MeliQuestion
+
+# Título e prioridade do aviso de cada regra, e o texto quando há vários alertas
+RULES = {
+    'low_stock': {'title': 'Estoque baixo', 'priority': 'medium',
+                  'summary': '{count} produtos com estoque abaixo do limite da categoria'},
+    'question_sla': {'title': 'Pergunta sem resposta', 'priority': 'high',
+                     'summary': '{count} perguntas sem resposta além do prazo'},
+    'cd_dwell': {'title': 'Permanência no CD', 'priority': 'medium',
+                 'summary': '{count} produtos no CD além do prazo de permanência'},
+}
+STATUSES = ('active', 'resolved')
+
+# Produtos do CD com este status já saíram e não contam permanência
+CD_SHIPPED = 'enviado'
+
+# Ids por instrução nas consultas e atualizações em lote
+CHUNK_SIZE = 500
+
+_EPOCH = datetime(1970, 1, 1)
+
+def _epoch(value):
+    """Segundos desde 1970 de uma data em UTC sem fuso (como as do banco)"""
+    return (value - _EPOCH).total_seconds()
+
+def _datetime(seconds):
+    return _EPOCH + timedelta(seconds=seconds)
+
+def _chunks(values):
+    for start in range(0, len(values), CHUNK_SIZE):
+        yield values[start:start + CHUNK_SIZE]
+
+def parse_limits(value, default):
+    """Limites por categoria de um dict ou de 'Eletrônicos=72,MLB1055=5'; '*' vale para as demais"""
+    if isinstance(value, dict):
+        limits = {str(key): float(number) for key, number in value.items()}
+    else:
+        limits = {}
+        for part in (value or '').split(','):
+            if part.strip():
+                key, _, number = part.rpartition('=')
+                limits[key.strip() or '*'] = float(number)
+    limits.setdefault('*', float(default))
+    return limits
+
+class AlertEngine:
+    """Avalia as regras por evento, acompanha os vencimentos e grava os alertas"""
+
+    def __init__(self, app=None):
+        self.stock_thresholds = {'*': 10.0}
+        self.dwell_sla_hours = {'*': 96.0}
+        self.question_sla_hours = 24.0
+        # Vencimentos além disso (segundos) esperam no banco até a janela chegar neles
+        self.horizon = 3600.0
+        # Intervalo da procura por produtos do CD alterados em outros processos
+        self.poll_interval = 5.0
+        # Chamados (sem argumentos) depois que o relógio grava alertas novos
+        self.listeners = []
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        # (vencimento, sequência, regra, entidade, alerta)
+        self._heap = []
+        self._sequence = itertools.count()
+        # Vencimento vigente de cada (regra, entidade); entradas do heap que não
+        # batem com ele foram substituídas por um evento mais novo
+        self._deadlines = {}
+        # Até onde a janela de cada regra com prazo já está no heap (epoch)
+        self._windows = {}
+        # Versão do CD acompanhada (com track_cd) e o instante da carga, de onde conta
+        # a permanência dos produtos do arquivo; os alterados pela API contam de
+        # permanencia_desde. Revisões até _cd_revision já foram reagendadas
+        self._cd_dataset = None
+        self._cd_revision = 0
+        self._tracking_cd = False
+        self._thread = None
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Lê ALERT_STOCK_THRESHOLDS, ALERT_DWELL_SLA_HOURS, ALERT_QUESTION_SLA_HOURS, ALERT_HORIZON
+        e ALERT_POLL_INTERVAL"""
+        self.app = app
+        self.stock_thresholds = parse_limits(app.config.get('ALERT_STOCK_THRESHOLDS'), self.stock_thresholds['*'])
+        self.dwell_sla_hours = parse_limits(app.config.get('ALERT_DWELL_SLA_HOURS'), self.dwell_sla_hours['*'])
+        self.question_sla_hours = float(app.config.get('ALERT_QUESTION_SLA_HOURS', self.question_sla_hours))
+        self.horizon = float(app.config.get('ALERT_HORIZON', self.horizon))
+        self.poll_interval = float(app.config.get('ALERT_POLL_INTERVAL', self.poll_interval))
+
+    def on_change(self, listener):
+        """Registra `listener()` para quando o relógio grava alertas (decorador)"""
+        self.listeners.append(listener)
+        return listener
+
+    @staticmethod
+    def _limit(limits, category):
+        return limits.get(category or '', limits['*'])
+
+    # Gravação (sem commit: vai junto com a alteração que gerou o alerta)
+
+    def _raise(self, rule, alerts):
+        """Ativa os alertas; um que já estava ativo só é atualizado"""
+        if not alerts:
+            return
+        now = datetime.utcnow()
+        table = Alert.__table__
+        statement = meli_store.dialect_insert(table)
+        excluded = statement.excluded
+        statement = statement.on_conflict_do_update(index_elements=['rule', 'entity_id'], set_={
+            'category': excluded.category, 'severity': excluded.severity, 'message': excluded.message,
+            'value': excluded.value, 'threshold': excluded.threshold, 'updated_at': excluded.updated_at,
+            'status': 'active', 'resolved_at': None,
+            # Mantém a data em que o alerta surgiu enquanto ele continua ativo
+            'raised_at': case((table.c.status == 'active', table.c.raised_at), else_=excluded.raised_at)
+        })
+        db.session.execute(statement, [
+            {'rule': rule, 'status': 'active', 'raised_at': now, 'updated_at': now, **alert} for alert in alerts
+        ])
+
+    def _resolve(self, rule, entity_ids):
+        if not entity_ids:
+            return
+        now = datetime.utcnow()
+        table = Alert.__table__
+        for chunk in _chunks(entity_ids):
+            db.session.execute(table.update().where(
+                table.c.rule == rule, table.c.entity_id.in_(chunk), table.c.status == 'active'
+            ).values(status='resolved', resolved_at=now, updated_at=now))
+
+    def _reconcile(self, rule, alerts):
+        """Deixa ativos exatamente estes alertas da regra: grava os novos e resolve os demais"""
+        active = set(db.session.execute(
+            select(Alert.entity_id).where(Alert.status == 'active', Alert.rule == rule)).scalars())
+        self._raise(rule, [alert for alert in alerts if alert['entity_id'] not in active])
+        self._resolve(rule, list(active - {alert['entity_id'] for alert in alerts}))
+
+    # Estoque
+
+    def items_changed(self, rows):
+        """Confere o limite da categoria dos anúncios gravados (linhas de meli_item)"""
+        low, ok = [], []
+        for row in rows:
+            threshold = self._limit(self.stock_thresholds, row.get('category_id'))
+            quantity = row.get('available_quantity') or 0
+            if row.get('status') != 'active' or quantity >= threshold:
+                ok.append(row['id'])
+                continue
+            low.append({
+                'entity_id': row['id'], 'category': row.get('category_id'),
+                'severity': 'high' if quantity <= 0 else 'medium',
+                'message': f"{row.get('title') or row['id']}: {quantity} unidades (limite {threshold:g})"[:255],
+                'value': quantity, 'threshold': threshold
+            })
+        self._raise('low_stock', low)
+        self._resolve('low_stock', ok)
+
+    def stock_changed(self, quantities):
+        """Confere os anúncios com estoque alterado ({id: quantidade}); categoria e status vêm do banco"""
+        rows = []
+        for chunk in _chunks(list(quantities)):
+            rows.extend(
+                {'id': row.id, 'title': row.title, 'category_id': row.category_id, 'status': row.status,
+                 'available_quantity': quantities[row.id]}
+                for row in db.session.execute(
+                    select(MeliItem.id, MeliItem.title, MeliItem.category_id, MeliItem.status)
+                    .where(MeliItem.id.in_(chunk)))
+            )
+        self.items_changed(rows)
+
+    # Perguntas
+
+    def _question_alert(self, question_id, item_id):
+        hours = self.question_sla_hours
+        return {
+            'entity_id': str(question_id), 'category': None, 'severity': 'high',
+            'message': f'Pergunta {question_id} do anúncio {item_id} sem resposta há mais de {hours:g} h',
+            'value': hours, 'threshold': hours
+        }
+
+    def _question_window(self, start, end):
+        """Perguntas sem resposta que vencem em (start, end]; sem start, todas até end"""
+        sla = self.question_sla_hours * 3600
+        query = select(MeliQuestion.id, MeliQuestion.item_id, MeliQuestion.date_created).where(
+            MeliQuestion.status == 'UNANSWERED', MeliQuestion.date_created <= _datetime(end - sla))
+        if start is not None:
+            query = query.where(MeliQuestion.date_created > _datetime(start - sla))
+        return [(str(row.id), _epoch(row.date_created) + sla, self._question_alert(row.id, row.item_id))
+                for row in db.session.execute(query)]
+
+    def questions_changed(self, rows):
+        """Recalcula o prazo das perguntas gravadas (linhas de meli_question)"""
+        now = time.time()
+        breached, answered = [], []
+        with self._lock:
+            window = self._windows.get('question_sla')
+            for row in rows:
+                entity_id = str(row['id'])
+                self._deadlines.pop(('question_sla', entity_id), None)
+                if row['status'] != 'UNANSWERED':
+                    answered.append(entity_id)
+                    continue
+                deadline = _epoch(row['date_created']) + self.question_sla_hours * 3600
+                alert = self._question_alert(row['id'], row.get('item_id'))
+                if deadline <= now:
+                    breached.append(alert)
+                elif window is not None and deadline <= window:
+                    # Além da janela, a pergunta entra no heap quando a janela chegar nela
+                    self._schedule('question_sla', entity_id, deadline, alert)
+        self._raise('question_sla', breached)
+        self._resolve('question_sla', answered)
+
+    # Produtos do CD
+
+    def _dwell_alert(self, product, sla):
+        return {
+            'entity_id': str(product['id']), 'category': product['categoria'], 'severity': 'medium',
+            'message': f"{product['nome']} ({product['sku']}) no CD há mais de {sla:g} h"[:255],
+            'value': sla, 'threshold': sla
+        }
+
+    def _dwell_entry(self, row, base):
+        """(entidade, vencimento, alerta) de um produto; `base` é o instante da carga"""
+        sla = self._limit(self.dwell_sla_hours, row['categoria'])
+        deadline = (row['permanencia_desde'] or base) + (sla - row['tempo_permanencia']) * 3600
+        return str(row['id']), deadline, self._dwell_alert(row, sla)
+
+    _CD_COLUMNS = (CDProduct.id, CDProduct.nome, CDProduct.sku, CDProduct.categoria, CDProduct.status,
+                   CDProduct.tempo_permanencia, CDProduct.permanencia_desde)
+
+    def _cd_window(self, start, end, dataset=None):
+        """Produtos pendentes que vencem em (start, end]; sem start, todos até end
+
+        Os que vieram do arquivo vencem em carga + (prazo - permanência) horas,
+        então a janela é uma faixa de tempo_permanencia no índice de cada
+        categoria; os alterados pela API (poucos) vêm pelo índice da revisão.
+        """
+        dataset = dataset or self._cd_dataset
+        if dataset is None:
+            return []
+        version, base = dataset
+        configured = [categoria for categoria in self.dwell_sla_hours if categoria != '*']
+        entries = []
+        for categoria, sla in self.dwell_sla_hours.items():
+            query = select(*self._CD_COLUMNS).where(
+                CDProduct.snapshot == version,
+                CDProduct.categoria.notin_(configured) if categoria == '*' else CDProduct.categoria == categoria,
+                CDProduct.tempo_permanencia >= sla - (end - base) / 3600,
+                CDProduct.status != CD_SHIPPED,
+                CDProduct.revision.is_(None))
+            if start is not None:
+                query = query.where(CDProduct.tempo_permanencia < sla - (start - base) / 3600)
+            entries.extend(self._dwell_entry(row, base) for row in db.session.execute(query).mappings())
+        changed = select(*self._CD_COLUMNS).where(
+            CDProduct.snapshot == version, CDProduct.revision.isnot(None), CDProduct.status != CD_SHIPPED)
+        for row in db.session.execute(changed).mappings():
+            entry = self._dwell_entry(row, base)
+            if (start is None or entry[1] > start) and entry[1] <= end:
+                entries.append(entry)
+        return entries
+
+    def cd_loaded(self, dataset):
+        """Nova versão do CD: refaz os alertas de permanência
+
+        O relógio (no processo com track_cd) recomeça a janela na versão nova
+        quando nota a troca na linha de cd_state.
+        """
+        now = time.time()
+        entries = self._cd_window(None, now, (dataset.version, dataset.loaded_at))
+        self._reconcile('cd_dwell', [alert for _, _, alert in entries])
+        with self._lock:
+            self._wake.notify()
+
+    def cd_product_changed(self, row, since):
+        """Confere na hora o prazo de um produto incluído ou alterado
+
+        `since` é o instante de onde a permanência conta; um vencimento futuro
+        fica com o relógio, que encontra o produto pela revisão gravada.
+        """
+        sla = self._limit(self.dwell_sla_hours, row['categoria'])
+        deadline = since + (sla - row['tempo_permanencia']) * 3600
+        if row['status'] != CD_SHIPPED and deadline <= time.time():
+            self._raise('cd_dwell', [self._dwell_alert(row, sla)])
+        else:
+            self._resolve('cd_dwell', [str(row['id'])])
+
+    def cd_product_removed(self, product_id):
+        self._resolve('cd_dwell', [str(product_id)])
+
+    # Relógio dos prazos
+
+    def _schedule(self, rule, entity_id, deadline, alert):
+        """Põe um vencimento no heap (com o lock)"""
+        self._deadlines[(rule, entity_id)] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._sequence), rule, entity_id, alert))
+        if len(self._heap) > 2 * len(self._deadlines) + 1024:
+            # Muitas entradas substituídas: reconstrói só com as vigentes
+            self._heap = [entry for entry in self._heap if self._deadlines.get(entry[2:4]) == entry[0]]
+            heapq.heapify(self._heap)
+        self._wake.notify()
+
+    def track_questions(self):
+        """Acompanha os prazos das perguntas neste processo (um só: a tabela é compartilhada)"""
+        with self.app.app_context():
+            now = time.time()
+            self._reconcile('question_sla', [alert for _, _, alert in self._question_window(None, now)])
+            db.session.commit()
+        with self._lock:
+            self._windows['question_sla'] = now
+            self._wake.notify()
+
+    def track_cd(self):
+        """Acompanha os prazos de permanência do CD neste processo (um só: os produtos são compartilhados)"""
+        with self._lock:
+            self._tracking_cd = True
+            self._wake.notify()
+
+    def _poll_cd(self):
+        """Segue a versão vigente do CD e reagenda os produtos alterados desde a última consulta"""
+        state = db.session.execute(
+            select(CDState.version, CDState.revision, CDState.loaded_at).where(CDState.id == 1)).first()
+        if state is None:
+            return
+        with self._lock:
+            if self._cd_dataset is None or self._cd_dataset[0] != state.version:
+                # Carga nova (em qualquer worker), que já gravou os vencidos até ela:
+                # a janela recomeça no instante da carga e traz também os alterados
+                for key in [key for key in self._deadlines if key[0] == 'cd_dwell']:
+                    del self._deadlines[key]
+                self._cd_dataset = (state.version, state.loaded_at)
+                self._cd_revision = state.revision
+                self._windows['cd_dwell'] = state.loaded_at
+                return
+            seen = self._cd_revision
+        if state.revision <= seen:
+            return
+        rows = db.session.execute(select(*self._CD_COLUMNS).where(
+            CDProduct.snapshot == state.version, CDProduct.revision > seen)).mappings().all()
+        with self._lock:
+            if self._cd_dataset[0] != state.version:
+                return
+            base, window = self._cd_dataset[1], self._windows['cd_dwell']
+            for row in rows:
+                entity_id, deadline, alert = self._dwell_entry(row, base)
+                self._deadlines.pop(('cd_dwell', entity_id), None)
+                # Além da janela, o produto entra no heap quando a janela chegar nele
+                if row['status'] != CD_SHIPPED and deadline <= window:
+                    self._schedule('cd_dwell', entity_id, deadline, alert)
+            self._cd_revision = state.revision
+
+    def _advance(self, now):
+        """Carrega no heap os vencimentos que entraram na janela até agora + horizonte"""
+        with self._lock:
+            windows = dict(self._windows)
+        for rule, loaded in windows.items():
+            if loaded - now > self.horizon / 2:
+                continue
+            end = now + self.horizon
+            window = self._question_window if rule == 'question_sla' else self._cd_window
+            entries = window(loaded, end)
+            with self._lock:
+                # Uma carga nova do CD no meio da consulta recomeça a janela
+                if self._windows.get(rule) != loaded:
+                    continue
+                for entity_id, deadline, alert in entries:
+                    # Um evento durante a consulta já trouxe o vencimento certo
+                    if (rule, entity_id) not in self._deadlines:
+                        self._schedule(rule, entity_id, deadline, alert)
+                self._windows[rule] = end
+
+    def _pop_due(self, now):
+        due = {}
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, _, rule, entity_id, alert = heapq.heappop(self._heap)
+                if self._deadlines.get((rule, entity_id)) != deadline:
+                    continue
+                del self._deadlines[(rule, entity_id)]
+                due.setdefault(rule, []).append(alert)
+        return due
+
+    def _still_due(self, rule, alerts, now):
+        """Confere no banco os vencidos, que podem ter mudado em outro processo
+
+        Perguntas respondidas e produtos enviados ou removidos são descartados;
+        o prazo de um produto é recalculado da linha atual, e o que ainda não
+        venceu volta para o heap (ou para o banco, se além da janela).
+        """
+        ids = [int(alert['entity_id']) for alert in alerts]
+        if rule == 'question_sla':
+            valid = set()
+            for chunk in _chunks(ids):
+                valid.update(str(entity_id) for entity_id in db.session.execute(select(MeliQuestion.id).where(
+                    MeliQuestion.id.in_(chunk), MeliQuestion.status == 'UNANSWERED')).scalars())
+            return [alert for alert in alerts if alert['entity_id'] in valid]
+        version, base = self._cd_dataset
+        due = []
+        for chunk in _chunks(ids):
+            rows = db.session.execute(select(*self._CD_COLUMNS).where(
+                CDProduct.snapshot == version, CDProduct.id.in_(chunk), CDProduct.status != CD_SHIPPED)).mappings()
+            for row in rows:
+                entity_id, deadline, alert = self._dwell_entry(row, base)
+                if deadline <= now:
+                    due.append(alert)
+                    continue
+                with self._lock:
+                    if (rule, entity_id) not in self._deadlines and deadline <= self._windows.get(rule, 0):
+                        self._schedule(rule, entity_id, deadline, alert)
+        return due
+
+    def run_due(self, now=None):
+        """Avança as janelas e grava os alertas dos prazos vencidos; retorna quantos"""
+        now = now or time.time()
+        with self.app.app_context():
+            if self._tracking_cd:
+                self._poll_cd()
+            self._advance(now)
+            raised = 0
+            for rule, alerts in self._pop_due(now).items():
+                alerts = self._still_due(rule, alerts, now)
+                self._raise(rule, alerts)
+                raised += len(alerts)
+            db.session.commit()
+            if raised:
+                for listener in self.listeners:
+                    listener()
+            return raised
+
+    def _delay(self, now):
+        """Segundos até o próximo vencimento ou avanço de janela (com o lock)"""
+        delay = self.poll_interval if self._tracking_cd else self.horizon / 2
+        if self._heap:
+            delay = min(delay, self._heap[0][0] - now)
+        for loaded in self._windows.values():
+            delay = min(delay, loaded - self.horizon / 2 - now)
+        return max(delay, 0)
+
+    def _run(self):
+        while True:
+            try:
+                self.run_due()
+            except Exception:
+                self.app.logger.exception('Erro inesperado no relógio de alertas')
+                time.sleep(5)
+            with self._wake:
+                self._wake.wait(self._delay(time.time()))
+
+    def start(self):
+        """Inicia o relógio dos prazos acompanhados por este processo"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='alerts', daemon=True)
+            self._thread.start()
+
+    # Consulta
+
+    def stats(self):
+        with self._lock:
+            return {
+                'scheduled': len(self._deadlines),
+                'heap': len(self._heap),
+                'cd_version': self._cd_dataset[0] if self._cd_dataset else None,
+                'windows': {rule: _datetime(end).isoformat() for rule, end in self._windows.items()}
+            }
+
+    def notifications(self):
+        """Avisos do dashboard: um por regra com alertas ativos (consulta só os ativos)"""
+        counts = dict(db.session.execute(
+            select(Alert.rule, func.count()).where(Alert.status == 'active').group_by(Alert.rule)).all())
+        notifications = []
+        for rule, spec in RULES.items():
+            count = counts.get(rule)
+            if not count:
+                continue
+            latest = (Alert.query.filter_by(status='active', rule=rule)
+                      .order_by(Alert.raised_at.desc(), Alert.id.desc()).first())
+            notifications.append({
+                'id': rule,
+                'type': rule,
+                'title': spec['title'],
+                'message': latest.message if count == 1 else spec['summary'].format(count=count),
+                'priority': spec['priority'],
+                'count': count,
+                'created_at': latest.raised_at.isoformat()
+            })
+        return notifications
+
+    def search(self, rule=None, status='active', limit=50, offset=0):
+        """Página de alertas, dos mais recentes para os mais antigos"""
+        if rule and rule not in RULES:
+            raise ValueError(f"rule deve ser uma de: {', '.join(RULES)}")
+        if status and status not in STATUSES:
+            raise ValueError(f"status deve ser um de: {', '.join(STATUSES)}")
+        query = Alert.query
+        if rule:
+            query = query.filter(Alert.rule == rule)
+        if status:
+            query = query.filter(Alert.status == status)
+        rows = query.order_by(Alert.raised_at.desc(), Alert.id.desc()).offset(offset).limit(limit + 1).all()
+        return {
+            'alerts': [row.to_dict() for row in rows[:limit]],
+            'paging': {'offset': offset, 'limit': limit,
+                       'next_offset': offset + limit if len(rows) > limit else None}
+        }
+
+# Uma instância por processo: os armazenamentos avisam das alterações por ela
+alert_engine = AlertEngine()
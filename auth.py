@@ -1,10 +1,53 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask import Blueprint, current_app, request, jsonify
+import click
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt, get_jwt_identity
 from models import db, User
+from password_hashing import passwords, HashingBusy
+from ttl_cache import TTLCache
+from token_auth import token_auth
+from instrumentation import metrics
 import re
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
+# Dados usados no login, por worker, para não consultar o banco a cada tentativa
+_login_users = TTLCache(max_bytes=4 * 1024 * 1024)
+metrics.cache('login_users', _login_users.stats)
+
+def _login_record(email):
+    user = User.query.filter_by(email=email).first()
+    if user is None:
+        return None
+    return {
+        'id': user.id,
+        'password_hash': user.password_hash,
+        'is_active': user.is_active,
+        'user': user.to_dict()
+    }
+
+def get_login_record(email):
+    """Usuário do login pelo email, do cache do worker quando possível
+
+    Emails inexistentes não ficam no cache: o cadastro pode acontecer em outro
+    worker, que não tem como invalidar o cache deste.
+    """
+    ttl = current_app.config.get('LOGIN_USER_CACHE_TTL', 30)
+    return _login_users.get_or_load(('login', email), lambda: _login_record(email), ttl=ttl,
+                                    cache_none=False)
+
+def invalidate_login_cache(email):
+    _login_users.invalidate('login', email)
+
+def _rehash_password(record, email, password):
+    """Refaz o hash com a política atual; se o pool estiver cheio fica para o próximo login"""
+    try:
+        new_hash = passwords.run(passwords.hash, password)
+    except HashingBusy:
+        return
+    User.query.filter_by(id=record['id']).update({'password_hash': new_hash})
+    db.session.commit()
+    invalidate_login_cache(email)
+
 def validate_email(email):
     """Valida formato do email"""
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -56,9 +99,10 @@ def register():
         new_user = User(nome=nome, email=email, password=password)
         db.session.add(new_user)
         db.session.commit()
+        invalidate_login_cache(email)
         
         # Gerar token de acesso
-        access_token = create_access_token(identity=new_user.id)
+        access_token = create_access_token(identity=str(new_user.id))
         
         return jsonify({
             'message': 'Conta criada com sucesso',
@@ -85,22 +129,35 @@ def login():
         if not email or not password:
             return jsonify({'error': 'Email e senha são obrigatórios'}), 400
         
-        # Buscar usuário
-        user = User.query.filter_by(email=email).first()
+        # Buscar usuário; emails inexistentes conferem um hash de referência
+        # para que o tempo de resposta não revele quais contas existem
+        record = get_login_record(email)
+        password_hash = record['password_hash'] if record else passwords.dummy_hash
+        
+        try:
+            valid = passwords.run(passwords.verify, password_hash, password)
+        except HashingBusy:
+            response = jsonify({'error': 'Muitos logins simultâneos. Tente novamente em instantes.'})
+            response.headers['Retry-After'] = '1'
+            return response, 503
         
-        if not user or not user.check_password(password):
+        if not record or not valid:
             return jsonify({'error': 'Email ou senha incorretos'}), 401
         
-        if not user.is_active:
+        if not record['is_active']:
             return jsonify({'error': 'Conta desativada. Entre em contato com o suporte.'}), 403
         
+        # Hash gerado com outro esquema ou custo: refaz com a política atual
+        if passwords.needs_rehash(password_hash):
+            _rehash_password(record, email, password)
+        
         # Gerar token de acesso
-        access_token = create_access_token(identity=user.id)
+        access_token = create_access_token(identity=str(record['id']))
         
         return jsonify({
             'message': 'Login realizado com sucesso',
             'access_token': access_token,
-            'user': user.to_dict()
+            'user': record['user']
         }), 200
         
     except Exception as e:
@@ -111,14 +168,13 @@ def login():
 def get_current_user():
     """Endpoint para obter informações do usuário atual"""
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = token_auth.get_user(get_jwt_identity())
         
         if not user:
             return jsonify({'error': 'Usuário não encontrado'}), 404
         
         return jsonify({
-            'user': user.to_dict()
+            'user': user
         }), 200
         
     except Exception as e:
@@ -127,6 +183,18 @@ def get_current_user():
 @auth_bp.route('/logout', methods=['POST'])
 @jwt_required()
 def logout():
-    """Endpoint para logout (opcional - pode ser gerenciado pelo frontend)"""
+    """Endpoint para logout: o token deixa de valer imediatamente"""
+    token_auth.revoke_token(get_jwt())
     return jsonify({'message': 'Logout realizado com sucesso'}), 200
 
+@auth_bp.cli.command('deactivate-user')
+@click.argument('email')
+def deactivate_user_command(email):
+    """Desativa a conta e derruba as sessões abertas (flask auth deactivate-user EMAIL)"""
+    user = User.query.filter_by(email=email.strip().lower()).first()
+    if user is None:
+        raise click.ClickException('Usuário não encontrado')
+    token_auth.deactivate_user(user)
+    invalidate_login_cache(user.email)
+    click.echo(f'Conta {user.email} desativada')
+
@@ -0,0 +1,90 @@
+"""
+Benchmark dos alertas: avaliação por evento x recontagem do catálogo
+Grava anúncios e produtos do CD sintéticos (medindo o custo dos alertas na
+gravação), mede uma alteração de estoque isolada e compara os avisos a partir
+dos alertas ativos com a contagem antiga, que varria os anúncios
+
+Uso: python benchmarks/bench_alerts.py --items 1000000 --products 1000000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask
+from sqlalchemy import func
+from models import db, MeliItem
+from synthetic_data import SyntheticMarketplace
+from bench_products import synthetic_products
+from alerts import alert_engine
+import cd_store
+import meli_store
+import migrations
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+def old_low_stock_count(threshold=10):
+    """A contagem antiga: anúncios ativos abaixo de um limite fixo, a cada aviso"""
+    return db.session.query(func.count(MeliItem.id)).filter(
+        MeliItem.status == 'active', MeliItem.available_quantity < threshold).scalar()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=1000000)
+    parser.add_argument('--products', type=int, default=1000000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(tempfile.mkdtemp(), "bench.db")}'
+    app.config['ALERT_STOCK_THRESHOLDS'] = 'MLB1055=3,MLB1276=20,*=10'
+    app.config['ALERT_DWELL_SLA_HOURS'] = 'Eletrônicos=72,Informática=120,*=200'
+    db.init_app(app)
+    alert_engine.init_app(app)
+    data = SyntheticMarketplace(items=args.items, orders=0, questions=0)
+    with app.app_context():
+        migrations.upgrade()
+        start = time.perf_counter()
+        for batch in data.batches('items', args.batch_size):
+            meli_store.upsert_items(batch)
+            db.session.commit()
+        elapsed = time.perf_counter() - start
+        print(f'Anúncios: {args.items} gravados e conferidos em {elapsed:.1f} s ({args.items / elapsed:,.0f}/s)')
+
+        start = time.perf_counter()
+        cd_store.load_products(synthetic_products(args.products))
+        elapsed = time.perf_counter() - start
+        alert_engine.track_cd()
+        alert_engine.run_due()
+        stats = alert_engine.stats()
+        print(f'CD: {args.products} produtos carregados em {elapsed:.1f} s; '
+              f'{stats["scheduled"]} vencimentos na próxima hora no heap')
+
+        ids = [row.id for row in MeliItem.query.filter(MeliItem.status == 'active').limit(args.repeat)]
+        quantities = iter(range(10 ** 9))
+        stock_ms = timed(lambda: meli_store.update_item_stock(ids[next(quantities) % len(ids)],
+                                                              next(quantities) % 15), args.repeat)
+        print(f'Alteração de estoque com reavaliação: {stock_ms:.2f} ms')
+
+        print(f"{'avisos':<40} {'tempo':>10}")
+        print(f"{'contagem antiga (varre os anúncios)':<40} {timed(old_low_stock_count, args.repeat):>8.2f}ms")
+        print(f"{'alertas ativos':<40} {timed(alert_engine.notifications, args.repeat):>8.2f}ms")
+        print('Alertas ativos:', {n['id']: n['count'] for n in alert_engine.notifications()})
+        # Os produtos sintéticos têm ids de 1 em diante
+        cd_ms = timed(lambda: cd_store.upsert_product({'id': 1, 'quantidade': next(quantities) % 100}), args.repeat)
+        print(f'Alteração de produto do CD com reavaliação: {cd_ms:.2f} ms')
+
+if __name__ == '__main__':
+    main()
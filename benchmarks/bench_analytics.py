@@ -0,0 +1,149 @@
+"""
+Benchmark das análises de vendas do Mercado Livre (/api/mercadolivre/metrics e /analytics)
+Compara as consultas sobre os totais diários com a mesma agregação feita
+direto nas linhas de pedido, e mede o recálculo completo e a gravação incremental
+
+Uso: python benchmarks/bench_analytics.py --sizes 1000000 10000000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask, json
+from sqlalchemy import func
+from models import db, MeliOrder, MeliOrderItem
+import meli_analytics
+import meli_store
+import migrations
+from bench_products import percentile, measure
+
+CATEGORIES = ['MLB1051', 'MLB1648', 'MLB1039', 'MLB1000', 'MLB1574', 'MLB1276', 'MLB1132']
+STATUSES = ['paid', 'confirmed', 'ready_to_ship', 'shipped', 'delivered', 'cancelled']
+CHUNK = 20000
+
+def synthetic_orders(lines, items=5000, days=365, seed=42):
+    """Gera pedidos sintéticos (com 1 a 3 linhas cada) até somar `lines` linhas"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    catalog = [(f'MLB{1000000000 + i}', rng.choice(CATEGORIES), round(rng.uniform(50, 2000), 2))
+               for i in range(items)]
+    order_id, produced = 2000000000, 0
+    while produced < lines:
+        order_id += 1
+        created = now - timedelta(days=rng.randint(0, days - 1), minutes=rng.randint(0, 1439))
+        order = {'id': order_id, 'status': rng.choice(STATUSES), 'date_created': created,
+                 'last_updated': created, 'total_amount': 0, 'currency_id': 'BRL',
+                 'buyer_id': None, 'buyer_nickname': None, 'shipment_id': None}
+        order_lines = []
+        for item_id, category, price in rng.sample(catalog, min(rng.randint(1, 3), lines - produced)):
+            quantity = rng.randint(1, 3)
+            order['total_amount'] += price * quantity
+            order_lines.append({'order_id': order_id, 'item_id': item_id, 'title': None,
+                                'category_id': category, 'unit_price': price, 'quantity': quantity})
+        produced += len(order_lines)
+        yield order, order_lines
+
+def seed(lines):
+    """Grava os pedidos sintéticos direto nas tabelas, sem passar pelos totais"""
+    orders, order_lines = [], []
+    for order, rows in synthetic_orders(lines):
+        orders.append(order)
+        order_lines.extend(rows)
+        if len(order_lines) >= CHUNK:
+            db.session.execute(MeliOrder.__table__.insert(), orders)
+            db.session.execute(MeliOrderItem.__table__.insert(), order_lines)
+            orders, order_lines = [], []
+    if orders:
+        db.session.execute(MeliOrder.__table__.insert(), orders)
+        db.session.execute(MeliOrderItem.__table__.insert(), order_lines)
+    db.session.commit()
+
+def raw_analytics(start, end, top_n=10):
+    """Mesma agregação do dashboard, feita sobre as linhas de pedido"""
+    revenue = func.sum(MeliOrderItem.quantity * MeliOrderItem.unit_price)
+    sold = (db.session.query(MeliOrderItem)
+            .join(MeliOrder, MeliOrder.id == MeliOrderItem.order_id)
+            .filter(MeliOrder.status.notin_(meli_analytics.EXCLUDED_STATUSES),
+                    MeliOrder.date_created >= datetime.combine(start, datetime.min.time()),
+                    MeliOrder.date_created < datetime.combine(end + timedelta(days=1), datetime.min.time())))
+    return {
+        'top_products': sold.with_entities(MeliOrderItem.item_id, revenue)
+        .group_by(MeliOrderItem.item_id).order_by(revenue.desc()).limit(top_n).all(),
+        'categories_performance': sold.with_entities(MeliOrderItem.category_id, revenue)
+        .group_by(MeliOrderItem.category_id).all()
+    }
+
+def run(size, iterations):
+    """Executa os cenários para `size` linhas de pedido"""
+    workdir = tempfile.mkdtemp(prefix='bench_analytics_')
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    db.init_app(app)
+
+    with app.app_context():
+        migrations.upgrade()
+        start = time.perf_counter()
+        seed(size)
+        seed_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        meli_analytics.rebuild_rollups()
+        rebuild_seconds = time.perf_counter() - start
+
+        # Página típica da sincronização: 50 pedidos já existentes, com status alterado
+        page = [order.to_dict(MeliOrderItem.query.filter_by(order_id=order.id).all())
+                for order in MeliOrder.query.order_by(MeliOrder.id.desc()).limit(50)]
+        for order in page:
+            order['status'] = 'delivered'
+
+        def sync_page():
+            meli_store.upsert_orders(page)
+            db.session.commit()
+
+        today = datetime.utcnow().date()
+        window = (today - timedelta(days=29), today)
+        scenarios = {
+            'metrics_totais': lambda: meli_analytics.sales_metrics(10000),
+            'analytics_totais': lambda: meli_analytics.analytics_data(10000),
+            'analytics_linhas': lambda: raw_analytics(*window),
+            'gravacao_50_pedidos': sync_page,
+        }
+
+        results = {}
+        for name, fn in scenarios.items():
+            samples = measure(lambda: json.dumps(fn(), default=str), iterations)
+            results[name] = {
+                'p50_ms': round(statistics.median(samples), 3),
+                'p95_ms': round(percentile(samples, 95), 3)
+            }
+
+    return {
+        'rows': size,
+        'seed_seconds': round(seed_seconds, 2),
+        'rebuild_seconds': round(rebuild_seconds, 2),
+        'scenarios': results
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000000, 10000000])
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        result = run(size, args.iterations)
+        print(f"\n{result['rows']} linhas de pedido (carga em {result['seed_seconds']}s, "
+              f"recálculo dos totais em {result['rebuild_seconds']}s)")
+        for name, stats in result['scenarios'].items():
+            print(f"  {name:<28} p50={stats['p50_ms']:>9.3f} ms  p95={stats['p95_ms']:>9.3f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Microbenchmark do custo de autenticação por requisição (@jwt_required)
+Compara a verificação completa do token a cada requisição, com busca do
+usuário no banco, contra o cache de tokens verificados e de usuários
+
+Uso: python benchmarks/bench_auth.py --iterations 20000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token, get_jwt_identity, verify_jwt_in_request
+from models import db, User
+from token_auth import CachingJWTManager, TokenAuth
+import migrations
+
+def create_app(workdir, manager):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    app.config['JWT_SECRET_KEY'] = 'bench-auth-secret-key-with-32-bytes!'
+    app.config['BCRYPT_LOG_ROUNDS'] = 4
+    db.init_app(app)
+    jwt = manager(app)
+    return app, jwt
+
+def measure_us(fn, iterations):
+    """Executa a função várias vezes e retorna as latências em µs"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        'p50_us': round(statistics.median(samples), 2),
+        'p95_us': round(samples[int(0.95 * (len(samples) - 1))], 2)
+    }
+
+def run(iterations):
+    workdir = tempfile.mkdtemp(prefix='bench_auth_')
+    results = {}
+
+    # Antes: decodifica e verifica o token e busca o usuário a cada requisição
+    app, _ = create_app(workdir, JWTManager)
+    with app.app_context():
+        migrations.upgrade()
+        user = User(nome='Operador', email='operador@meli.com', password='senha1234')
+        db.session.add(user)
+        db.session.commit()
+        token = create_access_token(identity=str(user.id))
+    headers = {'Authorization': f'Bearer {token}'}
+
+    def uncached():
+        verify_jwt_in_request()
+        db.session.get(User, int(get_jwt_identity())).to_dict()
+        db.session.expunge_all()
+
+    with app.test_request_context(headers=headers):
+        results['sem_cache'] = measure_us(uncached, iterations)
+
+    # Depois: claims do token e dados do usuário vêm do cache do worker
+    app, jwt = create_app(workdir, CachingJWTManager)
+    auth = TokenAuth()
+    auth.init_app(app, jwt)
+    with app.app_context():
+        auth.load_revocations()
+        # Algumas revogações, para o filtro de Bloom não estar vazio
+        for i in range(1000):
+            auth.denylist.revoke(f'revogado-{i}', time.time() + 900)
+
+    def cached():
+        verify_jwt_in_request()
+        auth.get_user(get_jwt_identity())
+
+    with app.test_request_context(headers=headers):
+        cached()
+        results['com_cache'] = measure_us(cached, iterations)
+        results['so_lista_de_revogacao'] = measure_us(
+            lambda: auth.denylist.is_revoked({'sub': '1', 'jti': 'valido', 'iat': 0}), iterations)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    for name, stats in run(args.iterations).items():
+        print(f"  {name:<24} p50={stats['p50_us']:>9.2f} µs  p95={stats['p95_us']:>9.2f} µs")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark da exportação em streaming x montar a lista inteira antes de responder
+Mede o tempo até o primeiro bloco, o tempo total e o pico de memória do processo
+
+Uso: python benchmarks/bench_exports.py --rows 2000000
+"""
+
+import argparse
+import gzip
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask
+from models import db
+import cd_store
+import exports
+import migrations
+from bench_products import synthetic_products
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def measure_stream(engine, query, fmt, compress):
+    start = time.perf_counter()
+    first = None
+    size = 0
+    for chunk in exports.stream_export(engine, query, fmt, compress):
+        if first is None:
+            first = time.perf_counter() - start
+        size += len(chunk)
+    return {'primeiro_bloco_ms': round(first * 1000, 1), 'total_s': round(time.perf_counter() - start, 2),
+            'mb': round(size / 1024 / 1024, 1), 'pico_rss_mb': round(peak_rss_mb(), 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=2000000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(tempfile.mkdtemp(), "bench.db")}'
+    db.init_app(app)
+    with app.app_context():
+        migrations.upgrade()
+        cd_store.load_products(synthetic_products(args.rows))
+        engine = db.engine
+        query = exports.build_query('cd-products', {})
+        print(f'{args.rows} produtos do CD (pico de RSS após a carga: {peak_rss_mb():.1f} MB)')
+        for fmt, compress in (('ndjson', False), ('csv', False), ('ndjson', True)):
+            result = measure_stream(engine, query, fmt, compress)
+            print(f"  streaming {fmt}{' + gzip' if compress else ''}: {result}")
+
+        # Antes: todas as linhas em memória e um único corpo serializado
+        start = time.perf_counter()
+        products = cd_store.all_products()
+        body = gzip.compress(json.dumps(products).encode('utf-8'))
+        print(f'  lista inteira + gzip: primeiro byte em {time.perf_counter() - start:.2f} s, '
+              f'pico de RSS {peak_rss_mb():.1f} MB ({len(body) / 1024 / 1024:.1f} MB)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark do login (/api/auth/login) com diferentes políticas de hash
+Mede verificações por segundo por núcleo e o comportamento de uma rajada de
+logins simultâneos passando pelo pool limitado
+
+Uso: python benchmarks/bench_login.py --rounds 10 12 --burst 200
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask
+from flask_jwt_extended import JWTManager
+from models import db, User
+from password_hashing import passwords, argon2
+from auth import auth_bp
+import migrations
+
+PASSWORD = 'operador123'
+
+def create_app(workdir, **config):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    app.config['JWT_SECRET_KEY'] = 'bench-login-secret-key-with-32-bytes'
+    app.config.update(config)
+    db.init_app(app)
+    JWTManager(app)
+    passwords.init_app(app)
+    app.register_blueprint(auth_bp)
+    return app
+
+def verify_rate(duration):
+    """Verificações por segundo em uma única thread"""
+    password_hash = passwords.hash(PASSWORD)
+    count, start = 0, time.perf_counter()
+    while time.perf_counter() - start < duration:
+        passwords.verify(password_hash, PASSWORD)
+        count += 1
+    return count / (time.perf_counter() - start)
+
+def burst(app, users, concurrency):
+    """Dispara um login por usuário com `concurrency` clientes simultâneos
+
+    Como o dashboard, o cliente repete a tentativa após o Retry-After quando
+    recebe 503; `busy` conta essas recusas.
+    """
+    client = app.test_client()
+
+    def login(email):
+        started, refused = time.perf_counter(), 0
+        while True:
+            response = client.post('/api/auth/login', json={'email': email, 'password': PASSWORD})
+            if response.status_code != 503:
+                return response.status_code, time.perf_counter() - started, refused
+            refused += 1
+            time.sleep(float(response.headers.get('Retry-After', 1)))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(login, users))
+    elapsed = time.perf_counter() - start
+    ok = sorted(latency for status, latency, _ in results if status == 200)
+    return {
+        'ok': len(ok),
+        'busy': sum(refused for _, _, refused in results),
+        'logins_per_sec': round(len(ok) / elapsed, 1),
+        'p95_ms': round(ok[int(0.95 * (len(ok) - 1))] * 1000, 1) if ok else None
+    }
+
+def run(scheme, cost, burst_size, concurrency, duration):
+    workdir = tempfile.mkdtemp(prefix='bench_login_')
+    config = {'PASSWORD_SCHEME': scheme}
+    if scheme == 'bcrypt':
+        config['BCRYPT_LOG_ROUNDS'] = cost
+    else:
+        config['ARGON2_TIME_COST'] = cost
+    app = create_app(workdir, **config)
+    cores = os.cpu_count() or 1
+
+    with app.app_context():
+        migrations.upgrade()
+        per_thread = verify_rate(duration)
+        password_hash = passwords.hash(PASSWORD)
+        db.session.execute(User.__table__.insert(), [
+            {'nome': f'Operador {i}', 'email': f'operador{i}@meli.com',
+             'password_hash': password_hash, 'is_active': True}
+            for i in range(burst_size)
+        ])
+        db.session.commit()
+
+    users = [f'operador{i}@meli.com' for i in range(burst_size)]
+    cold = burst(app, users, concurrency)
+    warm = burst(app, users, concurrency)
+    return {
+        'scheme': f'{scheme}({cost})',
+        'verify_per_sec_per_core': round(per_thread, 1),
+        'pool_workers': passwords.workers,
+        'cores': cores,
+        'cold': cold,
+        'warm': warm
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rounds', type=int, nargs='+', default=[10, 12],
+                        help='custos do bcrypt (log2 das rodadas)')
+    parser.add_argument('--argon2-time-cost', type=int, nargs='*', default=[2],
+                        help='time_cost do argon2 (ignorado sem argon2-cffi)')
+    parser.add_argument('--burst', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=2.0)
+    args = parser.parse_args()
+
+    runs = [('bcrypt', rounds) for rounds in args.rounds]
+    if argon2 is not None:
+        runs += [('argon2', cost) for cost in args.argon2_time_cost]
+
+    for scheme, cost in runs:
+        result = run(scheme, cost, args.burst, args.concurrency, args.duration)
+        print(f"\n{result['scheme']}: {result['verify_per_sec_per_core']} verificações/s por núcleo "
+              f"({result['cores']} núcleos, pool de {result['pool_workers']})")
+        for name in ('cold', 'warm'):
+            stats = result[name]
+            print(f"  rajada {name:<5} ok={stats['ok']:<5} 503={stats['busy']:<5} "
+                  f"{stats['logins_per_sec']:>8} logins/s  p95={stats['p95_ms']} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark do cliente da API do Mercado Livre contra o servidor substituto local
+Mede vazão e latência com o pool de conexões esgotado, com erros e com
+tempestades de 429, e o tempo de buscar envios em lote x um a um
+
+Uso: python benchmarks/bench_meli_client.py --threads 64 --pool-size 10 --seconds 5
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import requests
+from mercadolivre_api import MercadoLivreAPI, MercadoLivreAPIError
+from meli_standin import start_standin
+
+SCENARIOS = {
+    'base': {'latency_ms': 20, 'jitter_ms': 5},
+    'pool_esgotado': {'latency_ms': 20, 'jitter_ms': 5},
+    'erros_5pct': {'latency_ms': 20, 'jitter_ms': 5, 'error_rate': 0.05},
+    'tempestade_429': {'latency_ms': 20, 'jitter_ms': 5, 'throttle_rate': 0.3, 'retry_after': 0.2},
+    'rate_limit_200rps': {'latency_ms': 5, 'rate_limit': 200},
+}
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def run(base_url, config, threads, pool_size, seconds):
+    requests.post(f'{base_url}/_standin/config', json={
+        'latency_ms': 0, 'jitter_ms': 0, 'error_rate': 0.0, 'throttle_rate': 0.0,
+        'rate_limit': None, 'retry_after': 1, **config
+    })
+    api = MercadoLivreAPI(base_url=base_url, pool_size=pool_size, backoff=0.05)
+    api.authenticate('APP_USR-bench', '123456789')
+    latencies = []
+    errors = [0]
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                api.get_user_info()
+                latencies.append((time.perf_counter() - start) * 1000)
+            except MercadoLivreAPIError:
+                errors[0] += 1
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+    return {
+        'req_s': round(len(latencies) / seconds, 1),
+        'p50_ms': round(statistics.median(latencies), 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95), 1) if latencies else None,
+        'errors': errors[0],
+        'retries': api.retries,
+        'throttled': api.throttled
+    }
+
+def run_fan_out(base_url, count, pool_size, latency_ms):
+    """Compara buscar `count` envios um a um e em lote"""
+    requests.post(f'{base_url}/_standin/config', json={
+        'latency_ms': latency_ms, 'jitter_ms': latency_ms / 4, 'error_rate': 0.0,
+        'throttle_rate': 0.0, 'rate_limit': None
+    })
+    api = MercadoLivreAPI(base_url=base_url, pool_size=pool_size)
+    api.authenticate('APP_USR-bench', '123456789')
+    order_ids = []
+    while len(order_ids) < count:
+        page = api.get_orders(limit=50, offset=len(order_ids))['results']
+        if not page:
+            break
+        order_ids.extend(order['id'] for order in page)
+    order_ids = order_ids[:count]
+
+    start = time.perf_counter()
+    for order_id in order_ids:
+        api.get_shipping_info(order_id)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = api.get_shipments(order_ids)
+    fan_out = time.perf_counter() - start
+    return len(order_ids), sequential, fan_out, len(batch['errors'])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=64)
+    parser.add_argument('--pool-size', type=int, default=10)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--shipments', type=int, default=200)
+    args = parser.parse_args()
+
+    server, base_url = start_standin()
+    print(f'{args.threads} threads, pool de {args.pool_size} conexões, {args.seconds}s por cenário')
+    for name, config in SCENARIOS.items():
+        # No cenário base o número de threads cabe no pool
+        threads = min(args.threads, args.pool_size) if name == 'base' else args.threads
+        result = run(base_url, config, threads, args.pool_size, args.seconds)
+        print(f"  {name:<18} {result['req_s']:>8.1f} req/s  p50={result['p50_ms']} ms  "
+              f"p95={result['p95_ms']} ms  erros={result['errors']}  "
+              f"retentativas={result['retries']}  429={result['throttled']}")
+
+    count, sequential, fan_out, errors = run_fan_out(base_url, args.shipments, args.pool_size, 20)
+    print(f'\n{count} envios com 20 ms de latência: um a um {sequential:.2f}s, '
+          f'em lote {fan_out:.2f}s ({errors} erros)')
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark da consulta paginada de produtos do CD (/api/products)
+Mede p50/p95 por página em catálogos de tamanhos diferentes
+
+Uso: python benchmarks/bench_products.py --sizes 10000 100000 1000000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask, json
+from models import db
+import cd_store
+import migrations
+
+CATEGORIAS = ['Eletrônicos', 'Informática', 'Fotografia', 'Áudio', 'Ferramentas', 'Casa', 'Games']
+STATUS = ['em_estoque', 'enviado', 'pendente']
+
+def synthetic_products(count, seed=42):
+    """Gera produtos sintéticos no formato do arquivo de dados do CD"""
+    rng = random.Random(seed)
+    for i in range(1, count + 1):
+        yield {
+            'id': i,
+            'nome': f'Produto Sintético {i}',
+            'sku': f'SKU-{rng.randint(0, 10 ** 9):09d}',
+            'categoria': rng.choice(CATEGORIAS),
+            'status': rng.choice(STATUS),
+            'quantidade': rng.randint(0, 100),
+            'tempo_permanencia': rng.randint(1, 240)
+        }
+
+def percentile(samples, pct):
+    """Percentil simples por ordenação"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def measure(fn, iterations):
+    """Executa a função várias vezes e retorna as latências em ms"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def run(size, iterations, deep_pages):
+    """Executa os cenários para um catálogo de tamanho `size`"""
+    workdir = tempfile.mkdtemp(prefix='bench_products_')
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    db.init_app(app)
+
+    with app.app_context():
+        migrations.upgrade()
+        start = time.perf_counter()
+        cd_store.load_products(synthetic_products(size))
+        load_seconds = time.perf_counter() - start
+
+        # Cursor de uma página profunda, para mostrar que o custo não cresce
+        deep_cursor = None
+        for _ in range(deep_pages):
+            page = cd_store.query_products(sort='-tempo_permanencia', cursor=deep_cursor)
+            deep_cursor = page['paging']['next_cursor']
+
+        scenarios = {
+            'primeira_pagina': lambda: cd_store.query_products(),
+            'filtro_status_ordenado': lambda: cd_store.query_products(
+                status='pendente', sort='-tempo_permanencia'),
+            'filtro_categoria_status': lambda: cd_store.query_products(
+                categoria='Áudio', status='enviado', sort='tempo_permanencia'),
+            'busca_sku': lambda: cd_store.query_products(search='SKU-00'),
+            f'pagina_{deep_pages}': lambda: cd_store.query_products(
+                sort='-tempo_permanencia', cursor=deep_cursor),
+        }
+
+        results = {}
+        for name, fn in scenarios.items():
+            # Inclui a serialização, que é parte do custo da rota
+            samples = measure(lambda: json.dumps(fn()), iterations)
+            results[name] = {
+                'p50_ms': round(statistics.median(samples), 3),
+                'p95_ms': round(percentile(samples, 95), 3)
+            }
+
+    return {'rows': size, 'load_seconds': round(load_seconds, 2), 'scenarios': results}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--deep-pages', type=int, default=50)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        result = run(size, args.iterations, args.deep_pages)
+        print(f"\n{result['rows']} linhas (carga em {result['load_seconds']}s)")
+        for name, stats in result['scenarios'].items():
+            print(f"  {name:<28} p50={stats['p50_ms']:>8.3f} ms  p95={stats['p95_ms']:>8.3f} ms")
+
+if __name__ == '__main__':
+    main()
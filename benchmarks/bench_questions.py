@@ -0,0 +1,108 @@
+"""
+Benchmark da busca nas perguntas: varredura no cliente x índice FTS5
+Grava as perguntas sintéticas no armazenamento local (medindo a indexação) e
+compara as consultas da triagem com a abordagem antiga, que trazia tudo e
+filtrava em Python
+
+Uso: python benchmarks/bench_questions.py --questions 1000000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask
+from models import db
+from synthetic_data import SyntheticMarketplace
+import meli_questions
+import meli_store
+import migrations
+
+QUERIES = [
+    {'q': 'prazo de entrega', 'status': 'UNANSWERED'},
+    {'q': 'garantia', 'sort': 'relevance'},
+    {'q': 'cartões', 'max_age_hours': 12, 'sort': 'newest'},
+    {'status': 'UNANSWERED', 'min_age_hours': 48},
+    {'item': True, 'q': 'entrega'},
+]
+
+def scan(records, q=None, status=None, item_id=None, min_age_hours=None, max_age_hours=None, sort=None, now=None):
+    """A abordagem antiga: todas as perguntas na memória, filtradas uma a uma"""
+    words = meli_questions.terms(q).split() if q else []
+    found = []
+    for record in records:
+        created = meli_store.parse_datetime(record['date_created'])
+        if status and record['status'] != status:
+            continue
+        if item_id and record['item_id'] != item_id:
+            continue
+        if min_age_hours is not None and created > now - timedelta(hours=min_age_hours):
+            continue
+        if max_age_hours is not None and created < now - timedelta(hours=max_age_hours):
+            continue
+        if words and not set(words) <= set(meli_questions.terms(record['text']).split()):
+            continue
+        found.append(record)
+    return sorted(found, key=lambda record: record['date_created'])[:20]
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--questions', type=int, default=1000000)
+    parser.add_argument('--items', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--scan-sample', type=int, default=100000, help='Perguntas na varredura do cliente')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    data = SyntheticMarketplace(items=args.items, orders=0, questions=args.questions)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(tempfile.mkdtemp(), "bench.db")}'
+    db.init_app(app)
+    with app.app_context():
+        migrations.upgrade()
+        print(f'Índice FTS5: {"sim" if meli_questions.has_index() else "não (LIKE)"}')
+        start = time.perf_counter()
+        for batch in data.batches('questions', args.batch_size):
+            meli_store.upsert_questions(batch)
+            db.session.commit()
+        elapsed = time.perf_counter() - start
+        print(f'Gravação e indexação: {args.questions} perguntas em {elapsed:.1f} s '
+              f'({args.questions / elapsed:,.0f}/s)')
+
+        sample = data.question_records(0, args.scan_sample)
+        item_id = sample[0]['item_id']
+        now = data.now + timedelta(hours=1)
+        print(f"{'consulta':<60} {'varredura':>12} {'índice':>10}")
+        for query in QUERIES:
+            query = dict(query)
+            if query.pop('item', False):
+                query['item_id'] = item_id
+            scan_ms = timed(lambda: scan(sample, now=now, **query), 1) * args.questions / len(sample)
+            index_ms = timed(lambda: meli_questions.search(now=now, **query), args.repeat)
+            print(f'{str(query):<60} {scan_ms:>10.0f}ms {index_ms:>8.2f}ms')
+
+        # Uma pergunta nova: gravação + índice na mesma transação
+        question = dict(sample[0], id=10 ** 9, text='Vocês entregam em Curitiba?')
+        start = time.perf_counter()
+        meli_store.upsert_questions([question])
+        db.session.commit()
+        insert_ms = (time.perf_counter() - start) * 1000
+        found = meli_questions.search(q='curitiba', now=now)['questions']
+        print(f'Pergunta nova indexada em {insert_ms:.2f} ms; encontrada: {bool(found)}')
+
+if __name__ == '__main__':
+    main()
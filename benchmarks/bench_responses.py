@@ -0,0 +1,86 @@
+"""
+Teste de carga: jsonify a cada requisição x resposta pré-serializada com ETag
+Sobe um servidor local com as duas variantes da mesma rota e mede req/s
+
+Uso: python benchmarks/bench_responses.py --products 5000 --clients 8 --seconds 5
+"""
+
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import requests
+from flask import Flask, jsonify
+from werkzeug.serving import make_server
+from response_cache import ResponseCache
+from bench_products import synthetic_products
+
+def build_app(products):
+    app = Flask(__name__)
+    cache = ResponseCache()
+    payload = {'metrics': {'total_produtos': len(products)}, 'products': products}
+
+    @app.route('/jsonify')
+    def plain():
+        return jsonify(payload)
+
+    @app.route('/precompiled')
+    def precompiled():
+        return cache.respond(('cd-data', 1), lambda: payload)
+
+    return app
+
+def drive(url, clients, seconds, headers):
+    """Dispara requisições de `clients` threads durante `seconds` segundos"""
+    counts = [0] * clients
+    sizes = [0] * clients
+    deadline = time.perf_counter() + seconds
+
+    def worker(index):
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            response = session.get(url, headers=headers)
+            counts[index] += 1
+            sizes[index] += int(response.headers.get('Content-Length', len(response.content)))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = sum(counts)
+    return {'req_s': round(total / seconds, 1), 'bytes_per_req': sum(sizes) // max(total, 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    app = build_app(list(synthetic_products(args.products)))
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+
+    etag = requests.get(f'{base}/precompiled').headers['ETag']
+    scenarios = [
+        ('jsonify', '/jsonify', {'Accept-Encoding': 'identity'}),
+        ('pre-serializado', '/precompiled', {'Accept-Encoding': 'identity'}),
+        ('pre-serializado gzip', '/precompiled', {'Accept-Encoding': 'gzip'}),
+        ('pre-serializado 304', '/precompiled', {'If-None-Match': etag}),
+    ]
+    print(f'{args.products} produtos, {args.clients} clientes, {args.seconds}s por cenário')
+    for name, path, headers in scenarios:
+        result = drive(base + path, args.clients, args.seconds, headers)
+        print(f"  {name:<22} {result['req_s']:>9.1f} req/s  {result['bytes_per_req']:>9} bytes/req")
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
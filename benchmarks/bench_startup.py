@@ -0,0 +1,118 @@
+"""
+Benchmark de inicialização do servidor de produção (gunicorn + wsgi:app)
+Mede o tempo até o servidor responder e a memória de cada worker, com e sem
+preload da aplicação no processo mestre; o pss (memória rateada entre os
+processos) mostra o quanto os workers compartilham por copy-on-write
+
+Uso: python benchmarks/bench_startup.py --workers 4 --products 200000
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from server_runtime import process_memory
+from bench_products import synthetic_products
+
+def write_dataset(path, count):
+    """Arquivo de dados do CD com `count` produtos sintéticos"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"products": [')
+        for i, product in enumerate(synthetic_products(count)):
+            f.write((',' if i else '') + json.dumps(product))
+        f.write(']}')
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def worker_pids(master_pid):
+    with open(f'/proc/{master_pid}/task/{master_pid}/children') as f:
+        return [int(pid) for pid in f.read().split()]
+
+def ready_workers(log_path):
+    with open(log_path) as f:
+        return sum(1 for line in f if 'pronto' in line)
+
+def wait_ready(url, process, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn terminou durante a inicialização')
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError('gunicorn não respondeu a tempo')
+
+def run(workers, preload, data_path, workdir):
+    port = free_port()
+    env = dict(os.environ,
+               PORT=str(port), HOST='127.0.0.1',
+               WEB_CONCURRENCY=str(workers),
+               GUNICORN_PRELOAD='1' if preload else '0',
+               DATABASE_URL=f'sqlite:///{os.path.join(workdir, f"startup_{random.random()}.db")}',
+               CD_DATA_PATH=data_path,
+               CD_DATA_WATCH_INTERVAL='0',
+               MELI_SYNC_INTERVAL='0',
+               BACKGROUND_LOCK_PATH=os.path.join(workdir, f'background_{port}.lock'))
+    log_path = os.path.join(workdir, f'gunicorn_{port}.log')
+    start = time.perf_counter()
+    with open(log_path, 'w') as log:
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=log)
+    try:
+        wait_ready(f'http://127.0.0.1:{port}/api/health', process)
+        ready = time.perf_counter() - start
+        # Cada worker registra no log quando termina a inicialização
+        while ready_workers(log_path) < workers:
+            time.sleep(0.05)
+        all_ready = time.perf_counter() - start
+        time.sleep(1)
+        memory = [process_memory(pid) for pid in worker_pids(process.pid)]
+        master = process_memory(process.pid)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return {
+        'first_response_s': round(ready, 2),
+        'all_workers_s': round(all_ready, 2),
+        'master': master,
+        'workers': memory,
+        'total_pss_mb': round(master.get('pss_mb', 0) + sum(m.get('pss_mb', 0) for m in memory), 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--products', type=int, default=200000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_startup_')
+    data_path = os.path.join(workdir, 'cd_data.json')
+    write_dataset(data_path, args.products)
+
+    for preload in (False, True):
+        result = run(args.workers, preload, data_path, workdir)
+        print(f"preload={'sim' if preload else 'não'}: primeira resposta em {result['first_response_s']} s, "
+              f"{args.workers} workers em {result['all_workers_s']} s, pss total {result['total_pss_mb']} MB")
+        print(f"  mestre   {result['master']}")
+        for memory in result['workers']:
+            print(f"  worker   {memory}")
+
+if __name__ == '__main__':
+    main()
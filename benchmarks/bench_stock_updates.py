@@ -0,0 +1,74 @@
+"""
+Benchmark da atualização de estoque: uma requisição por produto x job em lote
+Usa o servidor substituto da API com latência simulada; o envio um a um é
+medido em uma amostra e extrapolado para o total de produtos
+
+Uso: python benchmarks/bench_stock_updates.py --items 50000 --latency-ms 40
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask
+from models import db, StockUpdateJob
+from mercadolivre_api import MercadoLivreAPI
+from meli_standin import StandinData, start_standin
+from stock_updates import StockUpdater, job_summary
+import meli_store
+import migrations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=50000)
+    parser.add_argument('--latency-ms', type=float, default=40)
+    parser.add_argument('--sample', type=int, default=200, help='Envios um a um medidos')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    data = StandinData(items=args.items, orders=0, questions=0)
+    _, base_url = start_standin(data=data, latency_ms=args.latency_ms, jitter_ms=args.latency_ms / 4)
+    api = MercadoLivreAPI(base_url=base_url, pool_size=args.concurrency)
+    api.authenticate('APP_USR-bench', data.user_id)
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(tempfile.mkdtemp(), "bench.db")}'
+    db.init_app(app)
+    rng = random.Random(7)
+    quantities = {item_id: rng.randint(0, 500) for item_id in data.items}
+
+    with app.app_context():
+        migrations.upgrade()
+        # Antes: uma chamada (e uma gravação local) por produto
+        sample = list(quantities)[:args.sample]
+        start = time.perf_counter()
+        for item_id in sample:
+            result = api.update_product_stock(item_id, quantities[item_id])
+            meli_store.update_item_stock(item_id, result['available_quantity'])
+        per_item = (time.perf_counter() - start) / len(sample)
+
+    # Depois: um job em lote, enviado em lotes com concorrência limitada
+    updater = StockUpdater(app, api, batch_size=args.batch_size, window=0)
+    start = time.perf_counter()
+    with app.app_context():
+        job_id = updater.submit(quantities).id
+    submitted = time.perf_counter() - start
+    while updater.run_once():
+        pass
+    elapsed = time.perf_counter() - start
+    with app.app_context():
+        summary = job_summary(db.session.get(StockUpdateJob, job_id))
+
+    print(f'{args.items} produtos, latência {args.latency_ms} ms')
+    print(f'  um a um (estimado): {per_item * args.items / 60:8.1f} min  ({1 / per_item:.0f} produtos/s)')
+    print(f'  em lote:            {elapsed / 60:8.1f} min  ({args.items / elapsed:.0f} produtos/s, '
+          f'job criado em {submitted:.2f} s, {summary["done"]} ok, {summary["failed"]} falhas)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,464 @@
+"""
+Teste de carga de todas as rotas da API (main.py e auth.py)
+Sobe o servidor substituto da API do Mercado Livre e o gunicorn com dados
+sintéticos na escala pedida (produtos do CD, anúncios, pedidos, perguntas e
+usuários) e exercita cada rota com clientes autenticados concorrentes,
+medindo req/s, p50/p95/p99 e a memória dos workers. O resultado é gravado em
+JSON; com --compare, é comparado com o de outro commit e as regressões
+acima de --threshold fazem o processo sair com código 1.
+
+Uso: python benchmarks/loadtest.py --products 100000 --orders 5000 --clients 16 --seconds 5
+     python benchmarks/loadtest.py --routes mercadolivre --compare benchmarks/results/loadtest-abc1234.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import requests
+from flask import Flask
+from server_runtime import process_memory
+from bench_products import CATEGORIAS, percentile
+from bench_startup import free_port, wait_ready, worker_pids, write_dataset
+
+# Ids dos produtos do CD criados pelo teste (acima dos sintéticos)
+BENCH_ID_BASE = 10 ** 8
+PASSWORD = 'senha-bench-1234'
+
+class Route:
+    """Uma requisição medida; `path` e `body` recebem os dados da carga e o número da iteração"""
+
+    def __init__(self, method, path, rule=None, auth=True, body=None, content_type=None,
+                 expect=(200,), stream=False, fresh_token=False):
+        self.method = method
+        self.path = path
+        self.rule = rule or path.split('?')[0]
+        self.auth = auth
+        self.body = body
+        self.content_type = content_type
+        self.expect = expect
+        # Mede até o primeiro evento (SSE) em vez da resposta inteira; uma conexão
+        # por cliente, pois o worker só libera a thread de um stream abandonado
+        # no próximo keep-alive
+        self.stream = stream
+        # A rota consome o token (logout): cada iteração faz login antes, fora da medida
+        self.fresh_token = fresh_token
+
+    @property
+    def name(self):
+        return f'{self.method} {self.path}'
+
+def _stock_ndjson(fixtures, n):
+    items = fixtures['item_list']
+    return ''.join(json.dumps({'product_id': items[(n + i) % len(items)], 'quantity': (n + i) % 100}) + '\n'
+                   for i in range(100))
+
+def _cd_product(fixtures, n):
+    return {'id': BENCH_ID_BASE + n, 'nome': f'Produto Carga {n}', 'sku': f'LOAD-{n:09d}',
+            'categoria': CATEGORIAS[n % len(CATEGORIAS)], 'status': 'em_estoque',
+            'quantidade': n % 100, 'tempo_permanencia': n % 240}
+
+# Leituras primeiro; as escritas e as rotas que disparam trabalho de fundo no fim
+ROUTES = [
+    Route('GET', '/api/health', auth=False),
+    Route('GET', '/metrics', auth=False),
+    Route('GET', '/', auth=False),
+    Route('GET', '/dashboard/pedidos', rule='/<path:path>', auth=False),
+    Route('GET', '/{script}', rule='/<path:path>', auth=False),
+    Route('GET', '/api/server/status'),
+    Route('GET', '/api/auth/me'),
+    Route('GET', '/api/cd-data'),
+    Route('GET', '/api/cd-data/status'),
+    Route('GET', '/api/products?limit=50'),
+    Route('GET', '/api/products?categoria={categoria}&sort=-tempo_permanencia&limit=50'),
+    Route('GET', '/api/metrics'),
+    Route('GET', '/api/mercadolivre/user'),
+    Route('GET', '/api/mercadolivre/products?limit=50'),
+    Route('GET', '/api/mercadolivre/orders?limit=50'),
+    Route('GET', '/api/mercadolivre/sync'),
+    Route('GET', '/api/mercadolivre/metrics'),
+    Route('GET', '/api/mercadolivre/questions'),
+    Route('GET', '/api/mercadolivre/questions?q=prazo%20de%20entrega&status=UNANSWERED'),
+    Route('GET', '/api/mercadolivre/notifications'),
+    Route('GET', '/api/alerts?limit=50'),
+    Route('GET', '/api/mercadolivre/analytics'),
+    Route('GET', '/api/mercadolivre/cache/stats'),
+    Route('GET', '/api/mercadolivre/shipping/{order}', rule='/api/mercadolivre/shipping/<order_id>'),
+    Route('GET', '/api/mercadolivre/items/batch?ids={item_ids}'),
+    Route('POST', '/api/mercadolivre/items/batch', body=lambda fx, n: {'ids': fx['item_list'][:50]}),
+    Route('GET', '/api/mercadolivre/orders/batch?ids={order_ids}'),
+    Route('POST', '/api/mercadolivre/orders/batch', body=lambda fx, n: {'ids': fx['order_list'][:20]}),
+    Route('GET', '/api/mercadolivre/shipping/batch?ids={order_ids}'),
+    Route('POST', '/api/mercadolivre/shipping/batch', body=lambda fx, n: {'ids': fx['order_list'][:20]}),
+    Route('GET', '/api/mercadolivre/stock/jobs/{job_id}', rule='/api/mercadolivre/stock/jobs/<job_id>'),
+    Route('GET', '/api/mercadolivre/stock/jobs/{job_id}/items',
+          rule='/api/mercadolivre/stock/jobs/<job_id>/items'),
+    Route('GET', '/api/jobs?limit=50'),
+    Route('GET', '/api/jobs/stats'),
+    Route('GET', '/api/jobs/{background_job}', rule='/api/jobs/<job_id>'),
+    Route('GET', '/api/stream/status'),
+    Route('GET', '/api/stream', stream=True),
+    Route('GET', '/api/export/cd-products', rule='/api/export/<dataset>'),
+    Route('GET', '/api/export/meli-orders?format=csv', rule='/api/export/<dataset>'),
+    Route('POST', '/api/products', body=_cd_product, expect=(200, 201)),
+    Route('PUT', '/api/products/{product_id}', rule='/api/products/<int:product_id>',
+          body=lambda fx, n: {'quantidade': n % 50}, expect=(200, 201)),
+    Route('DELETE', '/api/products/{product_id}', rule='/api/products/<int:product_id>', expect=(200, 404)),
+    Route('PUT', '/api/mercadolivre/products/{item}/stock', rule='/api/mercadolivre/products/<product_id>/stock',
+          body=lambda fx, n: {'quantity': n % 100}),
+    Route('POST', '/api/mercadolivre/products/stock', body=_stock_ndjson,
+          content_type='application/x-ndjson', expect=(202,)),
+    Route('POST', '/api/auth/login', auth=False,
+          body=lambda fx, n: {'email': fx['users'][n % len(fx['users'])], 'password': PASSWORD}),
+    Route('POST', '/api/auth/register', auth=False, expect=(201,),
+          body=lambda fx, n: {'nome': 'Carga', 'email': f"carga-{fx['run_id']}-{n}@meli.com",
+                              'password': PASSWORD}),
+    Route('POST', '/api/auth/logout', fresh_token=True),
+    Route('POST', '/api/cd-data/reload', expect=(202, 409)),
+    Route('POST', '/api/mercadolivre/sync', expect=(202, 409)),
+    Route('POST', '/api/jobs', body=lambda fx, n: {'task': 'meli.analytics', 'args': {'top': 1 + n % 20}},
+          expect=(202,)),
+    Route('DELETE', '/api/jobs/{background_job}', rule='/api/jobs/<job_id>', expect=(200, 409)),
+]
+
+# Rotas que não cabem no modelo requisição/resposta
+NOT_MEASURED = {
+    '/api/ws': 'WebSocket; o mesmo fluxo de eventos é medido em /api/stream'
+}
+
+def uncovered_routes():
+    """Regras de main.py e auth.py sem nenhuma rota medida (para o relatório)"""
+    import main
+    from auth import auth_bp
+    app = Flask('loadtest')
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(main.api_bp)
+    covered = {(route.method, route.rule) for route in ROUTES}
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint == 'static' or rule.rule in NOT_MEASURED:
+            continue
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            if (method, rule.rule) not in covered:
+                missing.append(f'{method} {rule.rule}')
+    return missing
+
+class Server:
+    """Servidor substituto da API e gunicorn com os dados sintéticos"""
+
+    def __init__(self, args, workdir):
+        self.args = args
+        self.workdir = workdir
+        self.processes = []
+        self.url = None
+        self.master = None
+
+    def _spawn(self, command, env, log_name):
+        log = open(os.path.join(self.workdir, log_name), 'w')
+        process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=log)
+        self.processes.append(process)
+        return process
+
+    def start(self):
+        args = self.args
+        standin_port, port = free_port(), free_port()
+        self._spawn([sys.executable, 'meli_standin.py', '--port', str(standin_port),
+                     '--latency-ms', str(args.latency_ms), '--seed', str(args.seed),
+                     '--items', str(args.items), '--orders', str(args.orders),
+                     '--questions', str(args.questions)], dict(os.environ), 'standin.log')
+        data_path = os.path.join(self.workdir, 'cd_data.json')
+        write_dataset(data_path, args.products)
+        env = dict(os.environ,
+                   PORT=str(port), HOST='127.0.0.1',
+                   WEB_CONCURRENCY=str(args.workers),
+                   DATABASE_URL=f'sqlite:///{os.path.join(self.workdir, "loadtest.db")}',
+                   CD_DATA_PATH=data_path,
+                   CD_DATA_WATCH_INTERVAL='0',
+                   MELI_SYNC_INTERVAL='0',
+                   MELI_API_URL=f'http://127.0.0.1:{standin_port}',
+                   BCRYPT_LOG_ROUNDS=str(args.bcrypt_rounds),
+                   BACKGROUND_LOCK_PATH=os.path.join(self.workdir, 'background.lock'),
+                   METRICS_DIR=os.path.join(self.workdir, 'metrics'))
+        wait_ready(f'http://127.0.0.1:{standin_port}/users/me', self.processes[0], timeout=600)
+        self.master = self._spawn([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+                                  env, 'gunicorn.log')
+        self.url = f'http://127.0.0.1:{port}'
+        wait_ready(f'{self.url}/api/health', self.master, timeout=600)
+
+    def memory(self):
+        """Memória do mestre e dos workers (MB)"""
+        workers = [process_memory(pid) for pid in worker_pids(self.master.pid)]
+        master = process_memory(self.master.pid)
+        return {
+            'master': master,
+            'workers': workers,
+            'total_rss_mb': round(master.get('rss_mb', 0) + sum(m.get('rss_mb', 0) for m in workers), 1),
+            'total_pss_mb': round(master.get('pss_mb', 0) + sum(m.get('pss_mb', 0) for m in workers), 1)
+        }
+
+    def stop(self):
+        for process in reversed(self.processes):
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+def seed(server, args):
+    """Usuários, sincronização inicial e os ids usados nos caminhos das rotas"""
+    session = requests.Session()
+    run_id = f'{os.getpid()}{int(time.time())}'
+    started = time.perf_counter()
+    users = []
+    for i in range(args.users):
+        email = f'usuario-{run_id}-{i}@meli.com'
+        response = session.post(f'{server.url}/api/auth/register',
+                                json={'nome': f'Usuário {i}', 'email': email, 'password': PASSWORD})
+        response.raise_for_status()
+        users.append(email)
+    users_s = time.perf_counter() - started
+
+    token = login(session, server.url, users[0])
+    headers = {'Authorization': f'Bearer {token}'}
+    started = time.perf_counter()
+    session.post(f'{server.url}/api/mercadolivre/sync', headers=headers)
+    while True:
+        status = session.get(f'{server.url}/api/mercadolivre/sync', headers=headers).json()
+        if not status['running'] and all(state['completed_at'] for state in status['states'].values()):
+            break
+        if status['last_error'] and not status['running']:
+            raise RuntimeError(f"Sincronização falhou: {status['last_error']}")
+        time.sleep(0.2)
+    sync_s = time.perf_counter() - started
+
+    items = session.get(f'{server.url}/api/mercadolivre/products?limit=100', headers=headers).json()['results']
+    orders = session.get(f'{server.url}/api/mercadolivre/orders?limit=50', headers=headers).json()['results']
+    item_list = [item['id'] for item in items]
+    order_list = [str(order['id']) for order in orders]
+    fixtures = {
+        'run_id': run_id,
+        'users': users,
+        'categoria': CATEGORIAS[0],
+        'item_list': item_list,
+        'order_list': order_list,
+        'item_ids': ','.join(item_list[:50]),
+        'order_ids': ','.join(order_list[:20]),
+        'order': order_list[0],
+        # Bundle JS citado no index.html (nome com hash do build)
+        'script': re.search(r'src="/([^"]+\.js)"', session.get(server.url).text).group(1)
+    }
+    job = session.post(f'{server.url}/api/mercadolivre/products/stock', headers=headers,
+                       data=_stock_ndjson(fixtures, 0), params={'format': 'ndjson'})
+    fixtures['job_id'] = job.json()['id']
+    job = session.post(f'{server.url}/api/jobs', headers=headers, json={'task': 'meli.analytics'})
+    fixtures['background_job'] = job.json()['id']
+    return fixtures, {'users_s': round(users_s, 2), 'sync_s': round(sync_s, 2)}
+
+def login(session, url, email):
+    response = session.post(f'{url}/api/auth/login', json={'email': email, 'password': PASSWORD})
+    response.raise_for_status()
+    return response.json()['access_token']
+
+def send(session, url, route, fixtures, n, token):
+    values = dict(fixtures, n=n, product_id=BENCH_ID_BASE + n,
+                  item=fixtures['item_list'][n % len(fixtures['item_list'])])
+    headers = {'Authorization': f'Bearer {token}'} if route.auth else {}
+    kwargs = {}
+    if route.body is not None:
+        body = route.body(fixtures, n)
+        if route.content_type:
+            headers['Content-Type'] = route.content_type
+            kwargs['data'] = body.encode('utf-8')
+        else:
+            kwargs['json'] = body
+    path = route.path.format(**values)
+    if route.stream:
+        with session.request(route.method, url + path, headers=headers, stream=True, timeout=30) as response:
+            # Primeiro evento (o estado atual dos tópicos) ou keep-alive
+            next(response.iter_content(chunk_size=None), None)
+            return response.status_code
+    response = session.request(route.method, url + path, headers=headers, timeout=120, **kwargs)
+    # Consome o corpo inteiro (exportações vêm em streaming)
+    response.content
+    return response.status_code
+
+def run_route(server, route, fixtures, tokens, args):
+    """Carga de `args.clients` clientes na rota por `args.seconds`"""
+    counter = itertools.count()
+    latencies, statuses = [], {}
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+    peak = {'rss_mb': 0.0}
+    done = threading.Event()
+
+    def sample_memory():
+        while not done.wait(0.25):
+            peak['rss_mb'] = max(peak['rss_mb'], server.memory()['total_rss_mb'])
+
+    def client(index):
+        session = requests.Session()
+        token = tokens[index % len(tokens)]
+        email = fixtures['users'][index % len(fixtures['users'])]
+        n_sent = 0
+        while time.perf_counter() < deadline and not (route.stream and n_sent):
+            n = next(counter)
+            if route.fresh_token:
+                token = login(session, server.url, email)
+            start = time.perf_counter()
+            try:
+                status = send(session, server.url, route, fixtures, n, token)
+            except requests.RequestException:
+                status = 'erro'
+            elapsed = (time.perf_counter() - start) * 1000
+            n_sent += 1
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if status not in route.expect:
+                    errors[0] += 1
+
+    sampler = threading.Thread(target=sample_memory, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    done.set()
+    sampler.join()
+    if not latencies:
+        return {'requests': 0}
+    return {
+        'requests': len(latencies),
+        'req_s': round(len(latencies) / wall, 1),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'max_ms': round(max(latencies), 2),
+        'errors': errors[0],
+        'statuses': statuses,
+        'peak_rss_mb': peak['rss_mb'] or server.memory()['total_rss_mb']
+    }
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+def compare(result, baseline, threshold):
+    """Imprime a variação por rota; retorna as rotas que pioraram além de `threshold` %"""
+    regressions = []
+    print(f"\nComparação com {baseline['meta'].get('commit')} (limite {threshold}%)")
+    for name, current in result['routes'].items():
+        before = baseline['routes'].get(name)
+        if not before or not before.get('requests') or not current.get('requests'):
+            continue
+        req_s = 100 * (current['req_s'] - before['req_s']) / before['req_s'] if before['req_s'] else 0
+        p95 = 100 * (current['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0
+        worse = req_s < -threshold or p95 > threshold
+        if worse:
+            regressions.append(name)
+        print(f"{'!!' if worse else '  '} {name:<70} req/s {req_s:+7.1f}%   p95 {p95:+7.1f}%")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=100000, help='produtos do CD')
+    parser.add_argument('--items', type=int, default=2000, help='anúncios no servidor substituto')
+    parser.add_argument('--orders', type=int, default=5000, help='pedidos no servidor substituto')
+    parser.add_argument('--questions', type=int, default=500)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=2, help='workers do gunicorn')
+    parser.add_argument('--clients', type=int, default=16, help='clientes concorrentes por rota')
+    parser.add_argument('--seconds', type=float, default=5, help='duração da carga em cada rota')
+    parser.add_argument('--latency-ms', type=float, default=20, help='latência do servidor substituto')
+    parser.add_argument('--bcrypt-rounds', type=int, default=12)
+    parser.add_argument('--routes', nargs='*', help='só as rotas cujo nome contém um destes trechos')
+    parser.add_argument('--output', help='JSON do resultado (padrão: benchmarks/results/loadtest-<commit>.json)')
+    parser.add_argument('--compare', help='JSON de uma execução anterior')
+    parser.add_argument('--threshold', type=float, default=10.0, help='regressão tolerada em %%')
+    args = parser.parse_args()
+
+    missing = uncovered_routes()
+    if missing:
+        print('Rotas sem medida:', ', '.join(missing))
+    routes = [route for route in ROUTES
+              if not args.routes or any(part in route.name for part in args.routes)]
+
+    commit, dirty = git_revision()
+    workdir = tempfile.mkdtemp(prefix='loadtest_')
+    server = Server(args, workdir)
+    started = time.perf_counter()
+    try:
+        server.start()
+        start_s = time.perf_counter() - started
+        fixtures, setup = seed(server, args)
+        setup['server_start_s'] = round(start_s, 2)
+        session = requests.Session()
+        tokens = [login(session, server.url, email) for email in fixtures['users']]
+        memory_start = server.memory()
+        results = {}
+        for route in routes:
+            results[route.name] = run_route(server, route, fixtures, tokens, args)
+            r = results[route.name]
+            if r['requests']:
+                print(f"{route.name:<72} {r['req_s']:>8} req/s  p50 {r['p50_ms']:>8} ms  "
+                      f"p95 {r['p95_ms']:>8} ms  p99 {r['p99_ms']:>8} ms  erros {r['errors']}")
+            else:
+                print(f'{route.name:<72} nenhuma requisição')
+        memory_end = server.memory()
+    finally:
+        server.stop()
+
+    result = {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'args': vars(args),
+            'uncovered_routes': missing
+        },
+        'setup': setup,
+        'memory': {'start': memory_start, 'end': memory_end},
+        'routes': results
+    }
+    output = args.output or os.path.normpath(
+        os.path.join(ROOT, 'benchmarks', 'results', f"loadtest-{commit or 'sem-git'}.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f'\nResultado gravado em {output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        if regressions:
+            print(f'{len(regressions)} rota(s) com regressão')
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""
+Recarga a quente do arquivo de dados do Cross Docking MELI
+Observa o mtime do arquivo (ou recebe um gatilho manual), lê a nova versão
+em uma thread de fundo e a ativa de forma atômica
+"""
+
+import json
+import os
+import threading
+import time
+import cd_store
+from server_runtime import FileLock
+
+READ_CHUNK_SIZE = 1 << 20
+
+class _JSONStream:
+    """Leitor incremental de JSON sobre um arquivo texto"""
+
+    def __init__(self, fileobj, chunk_size=READ_CHUNK_SIZE):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.fileobj.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Descarta o que já foi consumido para manter o buffer pequeno
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Retorna o próximo caractere que não seja espaço"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError('Fim inesperado do arquivo de dados')
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Esperado '{char}' no arquivo de dados")
+        self.pos += 1
+
+    def value(self):
+        """Decodifica o próximo valor JSON completo"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # Um número no fim do buffer pode estar cortado
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+def iter_products(path, chunk_size=READ_CHUNK_SIZE):
+    """Percorre os produtos do arquivo de dados sem carregá-lo inteiro
+
+    Só um produto (e um bloco de leitura) fica em memória por vez; as demais
+    chaves do objeto raiz, como o bloco estático de métricas, são ignoradas.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        stream = _JSONStream(f, chunk_size)
+        stream.expect('{')
+        while True:
+            char = stream.peek()
+            if char == '}':
+                return
+            if char == ',':
+                stream.pos += 1
+                continue
+            key = stream.value()
+            stream.expect(':')
+            if key != 'products':
+                stream.value()
+                continue
+            stream.expect('[')
+            while True:
+                char = stream.peek()
+                if char == ']':
+                    stream.pos += 1
+                    break
+                if char == ',':
+                    stream.pos += 1
+                    continue
+                yield stream.value()
+
+class CDDatasetLoader:
+    """Carrega e recarrega o arquivo de dados do CD sem reiniciar o processo"""
+
+    def __init__(self, app=None, path=None, interval=5.0):
+        # Funções chamadas (com o app context ativo) após cada carga
+        self.listeners = []
+        self.path = path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self.loading = False
+        self.last_error = None
+        self.last_duration = None
+        self._failed_mtime = None
+        self.app = None
+        self._process_lock = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Liga o carregador à aplicação (CD_DATA_PATH, CD_DATA_WATCH_INTERVAL)"""
+        self.app = app
+        self.path = app.config.get('CD_DATA_PATH', self.path)
+        self.interval = app.config.get('CD_DATA_WATCH_INTERVAL', self.interval)
+        # A versão vigente fica no banco; o lock faz as cargas dos processos
+        # gravarem uma de cada vez, e quem chega depois adota a que já foi gravada
+        self._process_lock = FileLock(os.path.join(app.instance_path, 'cd_load.lock'))
+
+    def _mtime(self):
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def load(self, force=False):
+        """Carrega o arquivo agora, na thread atual
+
+        Se a versão vigente no banco já veio do arquivo com este mtime (carregada
+        por outro worker ou antes de reiniciar), ela é adotada sem reler o
+        arquivo; `force` carrega de novo mesmo assim.
+        """
+        with self._lock, self._process_lock:
+            self.loading = True
+            start = time.perf_counter()
+            try:
+                mtime = self._mtime()
+                with self.app.app_context():
+                    state = cd_store.shared_state()
+                    if not force and state is not None and state.version and state.source_mtime == mtime:
+                        dataset = cd_store.sync_dataset()
+                    elif mtime is None:
+                        # Sem arquivo de dados o CD começa vazio
+                        dataset = cd_store.load_products([])
+                    else:
+                        dataset = cd_store.load_products(iter_products(self.path), source_mtime=mtime)
+                    for listener in self.listeners:
+                        listener(dataset)
+                self.last_error = None
+                return dataset
+            except Exception as e:
+                self.last_error = str(e)
+                self._failed_mtime = mtime
+                raise
+            finally:
+                self.last_duration = time.perf_counter() - start
+                self.loading = False
+
+    def on_load(self, listener):
+        """Registra uma função a ser chamada com cada versão carregada"""
+        self.listeners.append(listener)
+        return listener
+
+    def trigger(self):
+        """Dispara uma recarga em segundo plano; retorna False se já houver uma"""
+        if self.loading:
+            return False
+        threading.Thread(target=self._safe_load, args=(True,), name='cd-reload', daemon=True).start()
+        return True
+
+    def _safe_load(self, force=False):
+        try:
+            self.load(force)
+        except Exception:
+            # O erro fica em last_error e a versão anterior continua ativa
+            pass
+
+    def _watch(self):
+        while True:
+            time.sleep(self.interval)
+            mtime = self._mtime()
+            if mtime is None or mtime == self._failed_mtime:
+                continue
+            try:
+                with self.app.app_context():
+                    current = cd_store.sync_dataset()
+            except Exception:
+                self.app.logger.exception('Erro ao consultar a versão ativa do CD')
+                continue
+            if mtime != current.source_mtime:
+                self._safe_load()
+
+    def start(self):
+        """Inicia a observação do mtime do arquivo (em um processo só: a carga vale para todos)"""
+        if self.interval and self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name='cd-watch', daemon=True)
+            self._thread.start()
+
+    def status(self):
+        """Resumo da versão ativa e da última carga neste processo (com o app context ativo)"""
+        dataset = cd_store.sync_dataset()
+        return {
+            'version': dataset.version,
+            'loaded_at': dataset.loaded_at,
+            'source_mtime': dataset.source_mtime,
+            'loading': self.loading,
+            'last_error': self.last_error,
+            'last_duration': self.last_duration
+        }
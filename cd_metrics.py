@@ -0,0 +1,116 @@
+"""
+Métricas do Cross Docking MELI mantidas de forma incremental
+Cada inclusão, alteração ou remoção de produto atualiza os agregados em O(1)
+"""
+
+import threading
+
+# Status considerados aguardando envio e já enviados
+AWAITING_STATUSES = ('pendente',)
+SHIPPED_STATUSES = ('enviado',)
+
+class CDMetrics:
+    """Agregados correntes dos produtos do CD"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.total = 0
+        self.tempo_total = 0
+        self.por_status = {}
+        # Soma da permanência por status, para gravar os totais da versão
+        self.tempo_por_status = {}
+        self._snapshot = self._build_snapshot()
+
+    def _apply(self, product, sign):
+        status = product.get('status') or ''
+        tempo = sign * (product.get('tempo_permanencia') or 0)
+        self.total += sign
+        self.tempo_total += tempo
+        count = self.por_status.get(status, 0) + sign
+        if count:
+            self.por_status[status] = count
+            self.tempo_por_status[status] = self.tempo_por_status.get(status, 0) + tempo
+        else:
+            self.por_status.pop(status, None)
+            self.tempo_por_status.pop(status, None)
+
+    def _build_snapshot(self):
+        total = self.total
+        aguardando = sum(self.por_status.get(s, 0) for s in AWAITING_STATUSES)
+        enviados = sum(self.por_status.get(s, 0) for s in SHIPPED_STATUSES)
+        return {
+            'total_produtos': total,
+            'aguardando_envio': aguardando,
+            'tempo_medio_permanencia': round(self.tempo_total / total, 2) if total else 0,
+            'eficiencia_operacional': round(100 * enviados / total) if total else 0,
+            'por_status': dict(self.por_status)
+        }
+
+    def add(self, product):
+        """Contabiliza um produto incluído"""
+        with self._lock:
+            self._apply(product, 1)
+            self._snapshot = self._build_snapshot()
+
+    def add_many(self, products):
+        """Contabiliza um lote de produtos incluídos"""
+        with self._lock:
+            for product in products:
+                self._apply(product, 1)
+            self._snapshot = self._build_snapshot()
+
+    def remove(self, product):
+        """Desconta um produto removido"""
+        with self._lock:
+            self._apply(product, -1)
+            self._snapshot = self._build_snapshot()
+
+    def update(self, old_product, new_product):
+        """Troca a contribuição de um produto alterado"""
+        with self._lock:
+            self._apply(old_product, -1)
+            self._apply(new_product, 1)
+            self._snapshot = self._build_snapshot()
+
+    def recompute(self, products):
+        """Recalcula tudo a partir de uma varredura completa dos produtos"""
+        with self._lock:
+            self._reset()
+            for product in products:
+                self._apply(product, 1)
+            self._snapshot = self._build_snapshot()
+
+    def totals(self):
+        """Contagem e soma de permanência por status: [(status, count, tempo_total)]"""
+        with self._lock:
+            return [(status, count, self.tempo_por_status.get(status, 0))
+                    for status, count in self.por_status.items()]
+
+    def snapshot(self):
+        """Retorna as métricas atuais (não deve ser modificado pelo chamador)"""
+        return self._snapshot
+
+    @classmethod
+    def from_products(cls, products):
+        """Cria um agregado novo por varredura, útil para conferir o incremental"""
+        metrics = cls()
+        metrics.recompute(products)
+        return metrics
+
+    @classmethod
+    def from_totals(cls, totals):
+        """Cria um agregado a partir dos totais por status gravados no banco"""
+        metrics = cls()
+        with metrics._lock:
+            for status, count, tempo_total in totals:
+                if not count:
+                    continue
+                metrics.total += count
+                metrics.tempo_total += tempo_total
+                metrics.por_status[status] = count
+                metrics.tempo_por_status[status] = tempo_total
+            metrics._snapshot = metrics._build_snapshot()
+        return metrics
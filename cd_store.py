@@ -0,0 +1,388 @@
+"""
+Armazenamento indexado dos produtos do Cross Docking MELI
+Consultas com filtros, ordenação e paginação por cursor (keyset)
+"""
+
+import base64
+import json
+import math
+import threading
+import time
+from sqlalchemy import func, or_, select, text, tuple_
+import alerts
+import meli_questions
+import meli_store
+from models import db, CDProduct, CDState, CDStatusTotal
+from cd_metrics import CDMetrics
+
+# Campos aceitos na ordenação (todos indexados junto com o id)
+SORT_FIELDS = ('id', 'sku', 'tempo_permanencia')
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+INSERT_CHUNK_SIZE = 5000
+
+class CDDataset:
+    """Versão carregada dos produtos do CD e suas métricas"""
+
+    def __init__(self, version, metrics=None, source_mtime=None):
+        self.version = version
+        self.metrics = metrics or CDMetrics()
+        self.source_mtime = source_mtime
+        self.loaded_at = time.time()
+        # Incrementado a cada alteração pontual de produto nesta versão
+        self.revision = 0
+
+    @property
+    def key(self):
+        """Identifica o conteúdo atual, para caches derivados dos produtos"""
+        return (self.version, self.revision)
+
+# Versão ativa neste processo; trocar a referência é atômico, então cada
+# requisição lê uma versão consistente do início ao fim. A versão vigente é a
+# da linha de cd_state, que qualquer worker pode carregar ou alterar
+_current = CDDataset(0)
+_sync_lock = threading.Lock()
+
+STATE_ID = 1
+
+def current_dataset():
+    """Retorna a versão ativa dos produtos do CD neste processo (sem consultar o banco)"""
+    return _current
+
+def shared_state():
+    """Versão, revisão e mtime do arquivo da versão vigente no banco (None antes da primeira carga)"""
+    return db.session.execute(
+        select(CDState.version, CDState.revision, CDState.source_mtime, CDState.loaded_at)
+        .where(CDState.id == STATE_ID)
+    ).first()
+
+def _read_totals(version):
+    return CDMetrics.from_totals(db.session.execute(
+        select(CDStatusTotal.status, CDStatusTotal.count, CDStatusTotal.tempo_total)
+        .where(CDStatusTotal.snapshot == version)
+    ).all())
+
+def sync_dataset():
+    """Retorna a versão vigente, adotando a carga ou a alteração feita por outro worker
+
+    Custa uma leitura pela chave primária; as métricas só são relidas (dos
+    totais por status, sem varrer os produtos) quando a revisão muda.
+    """
+    global _current
+    state = shared_state()
+    if state is None or (state.version, state.revision) <= _current.key:
+        return _current
+    with _sync_lock:
+        while (state.version, state.revision) > _current.key:
+            metrics = _read_totals(state.version)
+            latest = shared_state()
+            if latest != state:
+                # Outra alteração entre as duas leituras: relê os totais dela
+                state = latest
+                continue
+            dataset = CDDataset(state.version, metrics, state.source_mtime)
+            dataset.revision = state.revision
+            dataset.loaded_at = state.loaded_at or dataset.loaded_at
+            _current = dataset
+    return _current
+
+# Tipos aceitos em cada campo de um produto recebido pela API (None = valor padrão);
+# tempo_permanencia aceita fração, arredondada em _product_row para a coluna inteira
+PRODUCT_FIELDS = {
+    'id': (int,),
+    'nome': (str,),
+    'sku': (str,),
+    'categoria': (str,),
+    'status': (str,),
+    'quantidade': (int,),
+    'tempo_permanencia': (int, float)
+}
+
+def validate_product(product):
+    """Confere o corpo de uma inclusão ou alteração; ValueError se inválido"""
+    if not isinstance(product, dict):
+        raise ValueError('O produto deve ser um objeto JSON')
+    if not isinstance(product.get('id'), int) or isinstance(product['id'], bool):
+        raise ValueError('Produto deve ter um id numérico')
+    for field, types in PRODUCT_FIELDS.items():
+        value = product.get(field)
+        if value is not None and (not isinstance(value, types) or isinstance(value, bool)):
+            kind = {(str,): 'texto', (int,): 'inteiro'}.get(types, 'numérico')
+            raise ValueError(f'Campo {field} deve ser {kind}')
+        if isinstance(value, float) and not math.isfinite(value):
+            raise ValueError(f'Campo {field} deve ser numérico')
+    return product
+
+def search_key(text):
+    """Forma normalizada de um nome para a busca: minúsculas, sem acentos nem pontuação"""
+    return ' '.join(meli_questions.tokens(text))
+
+def _product_row(product):
+    """Normaliza um produto do arquivo de dados para uma linha da tabela
+
+    A permanência é arredondada para inteiro aqui, antes de entrar na linha e
+    nos totais, para que as métricas incrementais batam com uma recontagem.
+    """
+    nome = product.get('nome') or ''
+    return {
+        'id': product['id'],
+        'nome': nome,
+        'nome_busca': search_key(nome),
+        'sku': product.get('sku') or '',
+        'categoria': product.get('categoria') or '',
+        'status': product.get('status') or '',
+        'quantidade': product.get('quantidade') or 0,
+        'tempo_permanencia': int(round(product.get('tempo_permanencia') or 0))
+    }
+
+def load_products(products, source_mtime=None):
+    """Carrega os produtos em uma versão nova e a torna ativa em todos os workers
+
+    Os produtos são consumidos em lotes, então um iterador (por exemplo, o
+    parser incremental do arquivo) nunca é materializado inteiro em memória.
+    """
+    global _current
+    state = shared_state()
+    previous = state.version if state else 0
+    latest = db.session.query(func.max(CDProduct.snapshot)).scalar() or 0
+    dataset = CDDataset(max(latest, previous, _current.version) + 1, source_mtime=source_mtime)
+
+    chunk = []
+    try:
+        for product in products:
+            row = _product_row(product)
+            row['snapshot'] = dataset.version
+            chunk.append(row)
+            if len(chunk) >= INSERT_CHUNK_SIZE:
+                db.session.execute(CDProduct.__table__.insert(), chunk)
+                dataset.metrics.add_many(chunk)
+                chunk = []
+        if chunk:
+            db.session.execute(CDProduct.__table__.insert(), chunk)
+            dataset.metrics.add_many(chunk)
+        totals = [{'snapshot': dataset.version, 'status': status, 'count': count, 'tempo_total': tempo_total}
+                  for status, count, tempo_total in dataset.metrics.totals()]
+        if totals:
+            db.session.execute(CDStatusTotal.__table__.insert(), totals)
+        db.session.merge(CDState(id=STATE_ID, version=dataset.version, revision=0,
+                                 source_mtime=source_mtime, loaded_at=dataset.loaded_at))
+        db.session.commit()
+    except Exception:
+        # Carga incompleta: descarta a versão nova e mantém a ativa
+        db.session.rollback()
+        raise
+
+    _current = dataset
+    alerts.alert_engine.cd_loaded(dataset)
+    # Os workers passam para a versão nova na próxima requisição; a anterior
+    # fica para as requisições que ainda a estão lendo
+    for table in (CDProduct.__table__, CDStatusTotal.__table__):
+        db.session.execute(table.delete().where(table.c.snapshot < previous))
+    if db.engine.dialect.name == 'sqlite':
+        # Sem estatísticas o SQLite não combina os índices do SKU e do nome na busca (OR)
+        db.session.execute(text('ANALYZE cd_product'))
+    db.session.commit()
+    return dataset
+
+def get_metrics(dataset=None):
+    """Retorna as métricas correntes do CD sem varrer os produtos"""
+    return (dataset or sync_dataset()).metrics.snapshot()
+
+def rescan_metrics(dataset=None):
+    """Recalcula as métricas varrendo a tabela inteira (modo de conferência)"""
+    dataset = dataset or sync_dataset()
+    rows = db.session.execute(
+        CDProduct.__table__.select().where(CDProduct.snapshot == dataset.version)
+    ).mappings()
+    return CDMetrics.from_products(rows).snapshot()
+
+def all_products(dataset=None):
+    """Retorna todos os produtos armazenados, ordenados pelo id"""
+    dataset = dataset or sync_dataset()
+    query = CDProduct.query.filter(CDProduct.snapshot == dataset.version)
+    return [product.to_dict() for product in query.order_by(CDProduct.id)]
+
+def _begin_write():
+    """Sobe a revisão da versão vigente e retorna o estado (versão, revisão nova, carga)
+
+    A atualização trava a linha de estado até o commit, então as alterações
+    de produtos vindas de workers diferentes são gravadas uma de cada vez.
+    """
+    table = CDState.__table__
+    updated = db.session.execute(
+        table.update().where(table.c.id == STATE_ID).values(revision=table.c.revision + 1))
+    if not updated.rowcount:
+        # Nenhuma carga ainda: as alterações vão para a versão 0
+        db.session.add(CDState(id=STATE_ID, version=0, revision=1, loaded_at=time.time()))
+        db.session.flush()
+    return shared_state()
+
+def _add_totals(version, product, sign):
+    """Soma (ou desconta) a contribuição de um produto nos totais da versão"""
+    table = CDStatusTotal.__table__
+    statement = meli_store.dialect_insert(table)
+    statement = statement.on_conflict_do_update(index_elements=['snapshot', 'status'], set_={
+        'count': table.c.count + statement.excluded.count,
+        'tempo_total': table.c.tempo_total + statement.excluded.tempo_total
+    })
+    db.session.execute(statement, {'snapshot': version, 'status': product['status'], 'count': sign,
+                                   'tempo_total': sign * product['tempo_permanencia']})
+
+def upsert_product(product):
+    """Inclui ou altera um produto, atualizando os totais incrementalmente"""
+    state = _begin_write()
+    now = time.time()
+    existing = db.session.get(CDProduct, (state.version, product['id']))
+    if existing:
+        # Campos não informados mantêm o valor atual
+        old = existing.to_dict()
+        row = _product_row({**old, **product})
+        for field, value in row.items():
+            setattr(existing, field, value)
+        # Com tempo_permanencia informado a permanência conta a partir de agora;
+        # senão, de quando já contava
+        if 'tempo_permanencia' in product:
+            existing.permanencia_desde = now
+        else:
+            existing.permanencia_desde = existing.permanencia_desde or state.loaded_at
+        existing.revision = state.revision
+        _add_totals(state.version, old, -1)
+        _add_totals(state.version, row, 1)
+        alerts.alert_engine.cd_product_changed(row, existing.permanencia_desde)
+        db.session.commit()
+        sync_dataset()
+        return existing.to_dict(), False
+    row = _product_row(product)
+    created = CDProduct(snapshot=state.version, permanencia_desde=now, revision=state.revision, **row)
+    db.session.add(created)
+    _add_totals(state.version, row, 1)
+    alerts.alert_engine.cd_product_changed(row, now)
+    db.session.commit()
+    sync_dataset()
+    return created.to_dict(), True
+
+def delete_product(product_id):
+    """Remove um produto, atualizando os totais incrementalmente"""
+    version = _begin_write().version
+    existing = db.session.get(CDProduct, (version, product_id))
+    if not existing:
+        db.session.rollback()
+        return None
+    old = existing.to_dict()
+    db.session.delete(existing)
+    _add_totals(version, old, -1)
+    alerts.alert_engine.cd_product_removed(product_id)
+    db.session.commit()
+    sync_dataset()
+    return old
+
+def categories(dataset=None):
+    """Categorias distintas da versão, em ordem alfabética (pelo índice de categoria)"""
+    dataset = dataset or sync_dataset()
+    return list(db.session.execute(
+        select(CDProduct.categoria).where(CDProduct.snapshot == dataset.version)
+        .group_by(CDProduct.categoria).order_by(CDProduct.categoria)
+    ).scalars())
+
+# Tipo do valor de ordenação guardado no cursor, por campo
+_CURSOR_TYPES = {'id': int, 'sku': str, 'tempo_permanencia': int}
+
+def encode_cursor(sort_value, product_id):
+    """Gera o cursor opaco a partir da última linha de uma página"""
+    raw = json.dumps([sort_value, product_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, field='id'):
+    """Decodifica o cursor recebido do cliente, conferindo os tipos com o campo de ordenação"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, product_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise ValueError('Cursor inválido')
+    for value, kind in ((product_id, int), (sort_value, _CURSOR_TYPES[field])):
+        if not isinstance(value, kind) or isinstance(value, bool):
+            raise ValueError('Cursor inválido')
+    return sort_value, product_id
+
+def _prefix(column, prefix):
+    """Valores que começam com `prefix`, como faixa [prefix, próximo prefixo)
+
+    A faixa usa o índice da coluna em qualquer banco (o LIKE do SQLite não
+    usa, por ignorar maiúsculas), e % e _ digitados valem literalmente.
+    """
+    last = ord(prefix[-1])
+    if last >= 0x10FFFF:
+        return column >= prefix
+    return (column >= prefix) & (column < prefix[:-1] + chr(last + 1))
+
+def parse_sort(sort):
+    """Converte o parâmetro de ordenação ('campo' ou '-campo')"""
+    sort = sort or 'id'
+    descending = sort.startswith('-')
+    field = sort.lstrip('-')
+    if field not in SORT_FIELDS:
+        raise ValueError(f'Ordenação inválida: {sort}')
+    return field, descending
+
+def query_products(categoria=None, status=None, search=None, sort=None,
+                   cursor=None, limit=DEFAULT_LIMIT, dataset=None):
+    """Retorna uma página de produtos filtrada e ordenada
+
+    A paginação usa o último (valor de ordenação, id) da página anterior,
+    então o custo de cada página não depende de quão fundo ela está. A
+    busca é por prefixo do SKU ou do nome (sem acentos), ambos indexados.
+    """
+    dataset = dataset or sync_dataset()
+    field, descending = parse_sort(sort)
+    limit = max(1, min(limit or DEFAULT_LIMIT, MAX_LIMIT))
+    sort_column = getattr(CDProduct, field)
+
+    query = CDProduct.query.filter(CDProduct.snapshot == dataset.version)
+    if categoria:
+        query = query.filter(CDProduct.categoria == categoria)
+    if status:
+        query = query.filter(CDProduct.status == status)
+    search = (search or '').strip()
+    if search:
+        # Prefixo do SKU (como digitado ou em maiúsculas) ou do nome normalizado
+        conditions = [_prefix(CDProduct.sku, value) for value in {search, search.upper()}]
+        key = search_key(search)
+        if key:
+            conditions.append(_prefix(CDProduct.nome_busca, key))
+        query = query.filter(or_(*conditions))
+
+    if cursor:
+        last_value, last_id = decode_cursor(cursor, field)
+        if field == 'id':
+            key, last_key = CDProduct.id, last_id
+        else:
+            key, last_key = tuple_(sort_column, CDProduct.id), (last_value, last_id)
+        query = query.filter(key < last_key if descending else key > last_key)
+
+    if field == 'id':
+        order = [CDProduct.id.desc() if descending else CDProduct.id.asc()]
+    elif descending:
+        order = [sort_column.desc(), CDProduct.id.desc()]
+    else:
+        order = [sort_column.asc(), CDProduct.id.asc()]
+
+    # Busca uma linha extra para saber se existe próxima página
+    rows = query.order_by(*order).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.id)
+
+    return {
+        'results': [row.to_dict() for row in rows],
+        'paging': {
+            'limit': limit,
+            'sort': sort or 'id',
+            'next_cursor': next_cursor
+        }
+    }
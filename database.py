@@ -0,0 +1,72 @@
+"""
+Configuração do banco a partir do ambiente
+SQLite roda em modo WAL (leitores não bloqueiam o escritor); PostgreSQL usa
+pool de conexões com tamanho, overflow e pre-ping configuráveis
+"""
+
+from sqlalchemy import event
+from models import db
+
+DEFAULT_DATABASE_URL = 'sqlite:///dashboard_meli.db'
+
+def database_uri(url=None):
+    """URI do SQLAlchemy a partir de DATABASE_URL (aceita o prefixo postgres://)"""
+    url = url or DEFAULT_DATABASE_URL
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+def is_sqlite(uri):
+    return uri.startswith('sqlite')
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS de acordo com o banco configurado"""
+    if is_sqlite(config['SQLALCHEMY_DATABASE_URI']):
+        # O timeout do driver é o quanto um escritor espera pelo lock do arquivo
+        return {'connect_args': {'timeout': config.get('SQLITE_BUSY_TIMEOUT', 5000) / 1000}}
+    return {
+        'pool_size': config.get('DB_POOL_SIZE', 10),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 20),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': config.get('DB_POOL_PRE_PING', True)
+    }
+
+def sqlite_pragmas(config):
+    """PRAGMAs aplicados a cada conexão SQLite nova"""
+    return [
+        ('journal_mode', 'WAL'),
+        ('synchronous', config.get('SQLITE_SYNCHRONOUS', 'NORMAL')),
+        ('busy_timeout', config.get('SQLITE_BUSY_TIMEOUT', 5000)),
+        ('foreign_keys', 'ON'),
+        ('temp_store', 'MEMORY'),
+        # Valores negativos são em KiB
+        ('cache_size', -config.get('SQLITE_CACHE_SIZE_KB', 65536)),
+        ('mmap_size', config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    ]
+
+def init_app(app):
+    """Aplica os PRAGMAs do SQLite às conexões do engine da aplicação"""
+    if not is_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+        return
+    pragmas = sqlite_pragmas(app.config)
+
+    with app.app_context():
+        @event.listens_for(db.engine, 'connect')
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+            cursor.close()
+
+def describe(app):
+    """Resumo do banco em uso (sem a senha da URI)"""
+    with app.app_context():
+        engine = db.engine
+        info = {'dialect': engine.dialect.name, 'url': engine.url.render_as_string(hide_password=True)}
+        if engine.dialect.name == 'sqlite':
+            with engine.connect() as connection:
+                info['journal_mode'] = connection.exec_driver_sql('PRAGMA journal_mode').scalar()
+        else:
+            info['pool'] = engine.pool.status()
+        return info
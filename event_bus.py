@@ -0,0 +1,282 @@
+"""
+Publicação de eventos para o dashboard (Server-Sent Events / WebSocket)
+Em um único processo os eventos passam por filas em memória; com um broker
+(EVENT_BROKER_URL, Redis) os processos do servidor trocam eventos entre si
+"""
+
+import json
+import queue
+import threading
+import uuid
+from collections import deque
+
+try:
+    import redis
+except ImportError:
+    # Redis é opcional; sem ele os eventos ficam restritos ao processo
+    redis = None
+
+_MISSING = object()
+
+def diff_state(old, new):
+    """Diferença rasa entre dois estados: chaves alteradas e chaves removidas"""
+    changed = {key: value for key, value in new.items() if old.get(key, _MISSING) != value}
+    removed = [key for key in old if key not in new]
+    return changed, removed
+
+def format_sse(event):
+    """Serializa um evento no formato text/event-stream"""
+    data = json.dumps(event['data'], separators=(',', ':'), default=str)
+    return f"id: {event['id']}\nevent: {event['topic']}\ndata: {data}\n\n"
+
+class StreamLimitReached(Exception):
+    """O processo já atende o número máximo de streams abertos"""
+
+class Subscription:
+    """Fila de eventos de um cliente conectado"""
+
+    def __init__(self, bus, topics, queue_size):
+        self.bus = bus
+        self.topics = topics
+        self.queue = queue.Queue(queue_size)
+        # Marcado quando a fila enche; o cliente recebe o estado completo de novo
+        self.overflowed = False
+
+    def wants(self, topic):
+        # Tópicos com "_" são internos do servidor e só chegam a quem os pede
+        if self.topics is None:
+            return not topic.startswith('_')
+        return topic in self.topics
+
+    def offer(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+            return False
+        return True
+
+    def get(self, timeout=None):
+        """Próximo evento, ou None se nada chegou dentro do tempo"""
+        if self.overflowed:
+            self.overflowed = False
+            self._drain()
+            for event in self.bus.snapshot(self.topics):
+                self.queue.put_nowait(event)
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _drain(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+class EventBus:
+    """Pub/sub em memória com o último estado de cada tópico e um histórico curto
+
+    Tópicos de estado (`publish_state`) só emitem as chaves que mudaram; quem
+    conecta recebe primeiro o estado completo. Os demais eventos (`publish`)
+    são avulsos e ficam no histórico para quem reconectar com Last-Event-ID.
+    """
+
+    # Os eventos chegam aos outros processos (workers)?
+    shared = False
+
+    def __init__(self, history=1000, queue_size=256, max_subscribers=None):
+        self.queue_size = queue_size
+        # Cada stream ocupa uma thread do servidor enquanto está aberto
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._states = {}
+        # Último estado publicado por este processo, base das diferenças
+        self._publish_lock = threading.Lock()
+        self._published = {}
+        self._history = deque(maxlen=history)
+        # Ids de evento são prefixados pelo processo; ids de outro processo
+        # (ou de antes de um reinício) fazem o cliente receber o estado completo
+        self._prefix = uuid.uuid4().hex[:8]
+        self._sequence = 0
+        # Callbacks internos por tópico (ex.: revogações de token entre workers)
+        self._listeners = {}
+        self.published = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def start(self):
+        """Nada a iniciar no modo em memória"""
+
+    def on(self, topic, listener):
+        """Registra `listener(data)` para os eventos do tópico, de qualquer worker"""
+        self._listeners.setdefault(topic, []).append(listener)
+
+    def publish(self, topic, data):
+        """Publica um evento avulso no tópico"""
+        self._send({'topic': topic, 'data': data})
+
+    def publish_state(self, topic, state):
+        """Publica só o que mudou no estado do tópico; retorna False se nada mudou
+
+        A diferença é calculada contra o último estado publicado por este
+        processo e enviada sob o mesmo lock, para que duas publicações
+        simultâneas não calculem a diferença contra o mesmo estado anterior.
+        A primeira publicação do tópico substitui o estado inteiro (reset).
+        """
+        with self._publish_lock:
+            old = self._published.get(topic)
+            changed, removed = diff_state(old or {}, state)
+            if old is not None and not changed and not removed:
+                return False
+            self._published[topic] = dict(state)
+            data = {'set': changed, 'unset': removed}
+            if old is None:
+                data['reset'] = True
+            self._send({'topic': topic, 'state': True, 'data': data})
+        return True
+
+    def state(self, topic):
+        """Último estado publicado no tópico"""
+        with self._lock:
+            return self._states.get(topic)
+
+    def _send(self, event):
+        self._dispatch(event)
+
+    def _next_id(self):
+        self._sequence += 1
+        return f'{self._prefix}-{self._sequence}'
+
+    def _dispatch(self, event):
+        with self._lock:
+            event['id'] = self._next_id()
+            if event.get('state'):
+                state = {} if event['data'].get('reset') else dict(self._states.get(event['topic']) or {})
+                state.update(event['data']['set'])
+                for key in event['data']['unset']:
+                    state.pop(key, None)
+                self._states[event['topic']] = state
+            self._history.append(event)
+            subscribers = [s for s in self._subscribers if s.wants(event['topic'])]
+            self.published += 1
+        for listener in self._listeners.get(event['topic'], ()):
+            listener(event['data'])
+        for subscription in subscribers:
+            if not subscription.offer(event):
+                self.dropped += 1
+
+    def snapshot(self, topics=None):
+        """Eventos com o estado completo dos tópicos de estado"""
+        with self._lock:
+            last_id = self._history[-1]['id'] if self._history else f'{self._prefix}-0'
+            return [
+                {'id': last_id, 'topic': topic, 'state': True,
+                 'data': {'set': state, 'unset': [], 'reset': True}}
+                for topic, state in self._states.items()
+                if topics is None or topic in topics
+            ]
+
+    def _replay(self, last_event_id, topics):
+        """Eventos após `last_event_id`, ou None se ele não está mais no histórico"""
+        if not last_event_id or not last_event_id.startswith(self._prefix + '-'):
+            return None
+        ids = [event['id'] for event in self._history]
+        if last_event_id not in ids:
+            return None
+        after = list(self._history)[ids.index(last_event_id) + 1:]
+        return [event for event in after
+                if (topics is None and not event['topic'].startswith('_')) or (topics and event['topic'] in topics)]
+
+    def subscribe(self, topics=None, last_event_id=None):
+        """Registra um cliente e enfileira o que ele precisa para ficar em dia
+
+        Levanta StreamLimitReached se o processo já tem `max_subscribers` clientes.
+        """
+        subscription = Subscription(self, set(topics) if topics else None, self.queue_size)
+        with self._lock:
+            if self.max_subscribers and len(self._subscribers) >= self.max_subscribers:
+                self.rejected += 1
+                raise StreamLimitReached()
+            pending = self._replay(last_event_id, subscription.topics)
+            self._subscribers.add(subscription)
+        if pending is None:
+            pending = self.snapshot(subscription.topics)
+        for event in pending:
+            subscription.offer(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def stream(self, subscription, keepalive=15.0):
+        """Gera o corpo text/event-stream de uma inscrição até o cliente sair"""
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                event = subscription.get(timeout=keepalive)
+                # Comentário periódico mantém a conexão viva em proxies
+                yield format_sse(event) if event else ': keepalive\n\n'
+        finally:
+            subscription.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'broker': None,
+                'subscribers': len(self._subscribers),
+                'max_subscribers': self.max_subscribers,
+                'rejected': self.rejected,
+                'topics': sorted(self._states),
+                'published': self.published,
+                'dropped': self.dropped
+            }
+
+class RedisEventBus(EventBus):
+    """Pub/sub entre processos através de um canal do Redis
+
+    Cada processo publica no canal e recebe de volta, pela sua thread de
+    escuta, os eventos de todos os processos, inclusive os próprios, então o
+    estado de cada tópico é o mesmo em todos os workers.
+    """
+
+    shared = True
+
+    def __init__(self, url, channel='dashboard-events', **options):
+        super().__init__(**options)
+        self.url = url
+        self.channel = channel
+        self._redis = redis.Redis.from_url(url)
+        self._listener = None
+
+    def start(self):
+        """Inicia a escuta do canal (deve rodar depois de um fork)"""
+        if self._listener is None:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{self.channel: self._on_message})
+            self._listener = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def _send(self, event):
+        self._redis.publish(self.channel, json.dumps(event, default=str))
+
+    def _on_message(self, message):
+        self._dispatch(json.loads(message['data']))
+
+    def stats(self):
+        stats = super().stats()
+        stats['broker'] = self.url
+        return stats
+
+def create_event_bus(broker_url=None, **options):
+    """Barramento em memória, ou via Redis quando `broker_url` é informado"""
+    if not broker_url:
+        return EventBus(**options)
+    if redis is None:
+        raise RuntimeError('EVENT_BROKER_URL requer o pacote redis')
+    return RedisEventBus(broker_url, **options)
@@ -0,0 +1,130 @@
+"""
+Exportação em streaming (NDJSON ou CSV) dos produtos do CD, anúncios e pedidos
+As linhas saem do cursor do banco direto para a resposta, em blocos, então a
+memória não cresce com o tamanho da exportação; a compressão gzip, quando o
+cliente aceita, é feita durante o envio
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from sqlalchemy import select
+import cd_store
+from models import CDProduct, MeliItem, MeliOrder, MeliOrderItem
+
+# Linhas buscadas do cursor por vez
+FETCH_SIZE = 2000
+# Bytes acumulados antes de enviar um bloco
+CHUNK_SIZE = 64 * 1024
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+def _cd_products(args):
+    table = CDProduct.__table__
+    # Só os campos do arquivo de dados (sem a versão e o controle das alterações)
+    columns = [table.c[field] for field in cd_store.PRODUCT_FIELDS]
+    query = select(*columns).where(table.c.snapshot == cd_store.sync_dataset().version)
+    for field in ('categoria', 'status'):
+        if args.get(field):
+            query = query.where(table.c[field] == args[field])
+    return query.order_by(table.c.id)
+
+def _meli_items(args):
+    table = MeliItem.__table__
+    query = select(table)
+    if args.get('status'):
+        query = query.where(table.c.status == args['status'])
+    return query.order_by(table.c.id)
+
+def _meli_orders(args):
+    table = MeliOrder.__table__
+    query = select(table)
+    if args.get('status'):
+        query = query.where(table.c.status == args['status'])
+    if args.get('date_from'):
+        query = query.where(table.c.date_created >= datetime.fromisoformat(args['date_from']))
+    if args.get('date_to'):
+        query = query.where(table.c.date_created < datetime.fromisoformat(args['date_to']))
+    return query.order_by(table.c.id)
+
+def _meli_order_items(args):
+    table = MeliOrderItem.__table__
+    return select(table).order_by(table.c.order_id, table.c.item_id)
+
+# Conjuntos exportáveis: função que monta a consulta a partir dos filtros
+DATASETS = {
+    'cd-products': _cd_products,
+    'meli-items': _meli_items,
+    'meli-orders': _meli_orders,
+    'meli-order-items': _meli_order_items
+}
+
+def build_query(dataset, args):
+    """Consulta do conjunto com os filtros; ValueError se um filtro for inválido"""
+    return DATASETS[dataset](args)
+
+def _value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def _ndjson_lines(columns, rows):
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    for row in rows:
+        yield dumps({name: _value(value) for name, value in zip(columns, row)}) + '\n'
+
+def _csv_lines(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_value(value) for value in row])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # O cabeçalho sai mesmo sem nenhuma linha
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def _chunks(lines):
+    """Junta as linhas em blocos de CHUNK_SIZE; o primeiro sai logo"""
+    parts, size, first = [], 0, True
+    for line in lines:
+        parts.append(line)
+        size += len(line)
+        if first or size >= CHUNK_SIZE:
+            yield ''.join(parts).encode('utf-8')
+            parts, size, first = [], 0, False
+    if parts:
+        yield ''.join(parts).encode('utf-8')
+
+def _gzip(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    first = True
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if first:
+            # Sem o flush o compressor segura os primeiros KB e o cliente espera
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            first = False
+        if data:
+            yield data
+    yield compressor.flush()
+
+def stream_export(engine, query, fmt, compress=False):
+    """Gera o corpo da exportação lendo o cursor aos poucos
+
+    Usa uma conexão própria (a requisição pode já ter terminado quando o
+    gerador é consumido), fechada no fim ou quando o cliente desconecta.
+    """
+    with engine.connect() as connection:
+        result = connection.execution_options(yield_per=FETCH_SIZE).execute(query)
+        columns = list(result.keys())
+        lines = (_csv_lines if fmt == 'csv' else _ndjson_lines)(columns, result)
+        chunks = _chunks(lines)
+        yield from (_gzip(chunks) if compress else chunks)
@@ -0,0 +1,62 @@
+"""
+Configuração do gunicorn para produção
+
+A aplicação é carregada uma vez no processo mestre (preload) e os workers
+saem de um fork dele, compartilhando por copy-on-write o que a carga deixou
+pronto; as threads de fundo são iniciadas em cada worker depois do fork.
+
+Uso: gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import gc
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', 5000)}"
+
+# Um processo por núcleo; as threads de cada worker atendem as conexões
+# simultâneas, inclusive os streams SSE/WebSocket, que ficam abertos e prendem
+# uma thread cada um. Para que os streams não esgotem as threads das demais
+# rotas, cada worker aceita no máximo STREAM_MAX_PER_WORKER (padrão: metade das
+# threads) e responde 503 aos que passarem; com muitos dashboards conectados,
+# aumente os workers ou GUNICORN_THREADS
+workers = int(os.environ.get('WEB_CONCURRENCY', 0)) or multiprocessing.cpu_count()
+# A aplicação divide os núcleos entre os workers ao dimensionar os seus pools
+os.environ['WEB_CONCURRENCY'] = str(workers)
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+os.environ.setdefault('STREAM_MAX_PER_WORKER', str(max(1, threads // 2)))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+# Cada worker grava as suas métricas aqui e /metrics soma as de todos; sem
+# METRICS_DIR, um diretório novo por execução do mestre, removido na saída
+_own_metrics_dir = not os.environ.get('METRICS_DIR')
+if _own_metrics_dir:
+    os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='dashboard-metrics-')
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+def when_ready(server):
+    if server.cfg.workers > 1 and not os.environ.get('EVENT_BROKER_URL'):
+        # Os eventos da sincronização, dos jobs e dos alertas saem só do worker
+        # líder; sem broker, os streams abertos nos outros workers não os recebem
+        server.log.warning('%d workers sem EVENT_BROKER_URL: os dashboards conectados a workers '
+                           'que não são o líder só veem as mudanças ao recarregar', server.cfg.workers)
+    # Os objetos criados na carga vão para a geração permanente do coletor,
+    # que deixa de percorrê-los e de sujar as páginas compartilhadas
+    gc.collect()
+    gc.freeze()
+
+def post_worker_init(worker):
+    from main import start_background
+    from server_runtime import process_memory
+    start_background(worker.wsgi)
+    worker.log.info('Worker %s pronto (%s)', worker.pid, process_memory())
+
+def on_exit(server):
+    if _own_metrics_dir:
+        shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
@@ -0,0 +1,536 @@
+"""
+Instrumentação das requisições e métricas no formato de texto do Prometheus
+Mede a latência e o tamanho das respostas por rota, as requisições em
+andamento, cada consulta SQL e cada método da API do Mercado Livre, além dos
+acertos dos caches. O tempo de cada requisição é dividido em fases (jwt, db,
+meli_api, serialize e app, o restante), que também vão no cabeçalho
+Server-Timing. Com vários workers, cada um grava um retrato das suas métricas
+em METRICS_DIR e /metrics soma os de todos.
+"""
+
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as StackCounter
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Limites dos histogramas: segundos e bytes
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Primeira palavra do SQL usada como rótulo; o resto vira OTHER
+SQL_OPERATIONS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'BEGIN', 'COMMIT', 'ROLLBACK', 'PRAGMA')
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def family(self):
+        with self._lock:
+            samples = [[list(key), list(value) if isinstance(value, list) else value]
+                       for key, value in self._values.items()]
+        return {'type': self.type, 'help': self.help, 'labelnames': list(self.labelnames), 'samples': samples}
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(float(bound) for bound in buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # Contagem de cada faixa (a última é +Inf) e a soma no fim
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def family(self):
+        family = super().family()
+        family['buckets'] = list(self.buckets)
+        return family
+
+def family(type, help, labelnames, samples):
+    """Família de métricas montada na hora da coleta ([(rótulos, valor)])"""
+    return {'type': type, 'help': help, 'labelnames': list(labelnames),
+            'samples': [[[str(label) for label in labels], value] for labels, value in samples]}
+
+def merge(snapshots, live_pids=None):
+    """Soma os retratos de vários processos; gauges só dos processos vivos"""
+    merged = {}
+    for pid, snapshot in snapshots:
+        for name, fam in snapshot.items():
+            if fam['type'] == 'gauge' and live_pids is not None and pid not in live_pids:
+                continue
+            target = merged.setdefault(name, dict(fam, samples={}))
+            for labels, value in fam['samples']:
+                key = tuple(labels)
+                current = target['samples'].get(key)
+                if current is None:
+                    target['samples'][key] = value
+                elif isinstance(value, list):
+                    target['samples'][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target['samples'][key] = current + value
+    return merged
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+def render(families):
+    """Texto de exposição do Prometheus a partir das famílias somadas"""
+    lines = []
+    for name in sorted(families):
+        fam = families[name]
+        lines.append(f"# HELP {name} {fam['help']}")
+        lines.append(f"# TYPE {name} {fam['type']}")
+        for labels, value in sorted(fam['samples'].items()):
+            pairs = list(zip(fam['labelnames'], labels))
+            if fam['type'] != 'histogram':
+                lines.append(f'{name}{_labels(pairs)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(fam['buckets'] + ['+Inf'], value[:-1]):
+                cumulative += count
+                le = bound if isinstance(bound, str) else repr(bound)
+                lines.append(f'{name}_bucket{_labels(pairs + [("le", le)])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(pairs)} {_number(value[-1])}')
+            lines.append(f'{name}_count{_labels(pairs)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+class _RequestState(threading.local):
+    # Tempo por fase da requisição atual; None fora de requisições
+    phases = None
+    # Fases abertas: [nome, início]; a de dentro pausa a de fora
+    stack = None
+    start = 0.0
+    recorded = False
+    profiled = False
+
+_state = _RequestState()
+
+def enter_phase(name):
+    """Passa a contar o tempo da requisição atual na fase `name`"""
+    if _state.phases is None:
+        return
+    now = time.perf_counter()
+    if _state.stack:
+        outer = _state.stack[-1]
+        _state.phases[outer[0]] = _state.phases.get(outer[0], 0.0) + now - outer[1]
+    _state.stack.append([name, now])
+
+def exit_phase():
+    """Fecha a fase mais interna e retoma a anterior"""
+    if _state.phases is None or not _state.stack:
+        return
+    now = time.perf_counter()
+    name, since = _state.stack.pop()
+    _state.phases[name] = _state.phases.get(name, 0.0) + now - since
+    if _state.stack:
+        _state.stack[-1][1] = now
+
+@contextmanager
+def phase(name):
+    enter_phase(name)
+    try:
+        yield
+    finally:
+        exit_phase()
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Serialização JSON do Flask contada na fase serialize"""
+
+    def dumps(self, obj, **kwargs):
+        with phase('serialize'):
+            return super().dumps(obj, **kwargs)
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)})"
+
+def _folded(frame):
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class SamplingProfiler:
+    """Amostra a pilha das threads registradas a cada `interval` segundos
+
+    Uma só thread amostra todas as requisições em perfil, e só enquanto houver
+    alguma; as pilhas saem no formato "folded" (flamegraph.pl, speedscope).
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def begin(self, ident):
+        with self._lock:
+            self._threads[ident] = StackCounter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='profiler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def end(self, ident):
+        """Para de amostrar a thread e retorna as pilhas contadas"""
+        with self._lock:
+            return self._threads.pop(ident, None)
+
+    def _loop(self):
+        while True:
+            if not self._threads:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, stacks in self._threads.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[_folded(frame)] += 1
+
+def write_profile(directory, route, elapsed, stacks, max_files=200):
+    """Grava as pilhas de uma requisição lenta; mantém os `max_files` mais novos"""
+    os.makedirs(directory, exist_ok=True)
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{slug}-{round(elapsed * 1000)}ms.folded"
+    path = os.path.join(directory, name)
+    with open(path, 'w') as f:
+        for stack, count in stacks.most_common():
+            f.write(f'{stack} {count}\n')
+    profiles = sorted(entry.path for entry in os.scandir(directory) if entry.name.endswith('.folded'))
+    for old in profiles[:-max_files]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+    return path
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class Metrics:
+    """Métricas do processo, ligadas à aplicação por `init_app`"""
+
+    def __init__(self):
+        self.requests = Counter('http_requests_total', 'Requisições atendidas',
+                                ('method', 'route', 'status'))
+        self.latency = Histogram('http_request_duration_seconds', 'Tempo até a resposta ficar pronta',
+                                 ('method', 'route'))
+        self.phases = Histogram('http_request_phase_seconds', 'Tempo da requisição por fase',
+                                ('route', 'phase'))
+        self.response_size = Histogram('http_response_size_bytes', 'Tamanho das respostas (sem streaming)',
+                                       ('route',), SIZE_BUCKETS)
+        self.in_flight = Gauge('http_requests_in_flight', 'Requisições em andamento')
+        self.db_queries = Histogram('db_query_duration_seconds', 'Tempo de cada consulta SQL', ('operation',))
+        self.api_calls = Histogram('meli_api_call_duration_seconds',
+                                   'Tempo de cada método da API do Mercado Livre', ('method',))
+        self.api_errors = Counter('meli_api_errors_total', 'Métodos da API do Mercado Livre que falharam',
+                                  ('method', 'status'))
+        self.profiles = Counter('http_slow_request_profiles_total', 'Perfis gravados de requisições lentas')
+        self._metrics = [self.requests, self.latency, self.phases, self.response_size, self.in_flight,
+                         self.db_queries, self.api_calls, self.api_errors, self.profiles]
+        self._collectors = []
+        self._pid = os.getpid()
+        self.app = None
+        self.directory = None
+        self.flush_interval = 5.0
+        self.token = None
+        self.server_timing = True
+        self.profile_rate = 0.0
+        self.profile_slow = 0.5
+        self.profile_dir = None
+        self.profiler = None
+        self._thread = None
+        self._flush_lock = threading.Lock()
+
+    def init_app(self, app):
+        """Liga os ganchos de requisição (METRICS_*, PROFILE_*)"""
+        self.app = app
+        self.directory = app.config.get('METRICS_DIR')
+        self.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', self.flush_interval)
+        self.token = app.config.get('METRICS_TOKEN')
+        self.server_timing = app.config.get('METRICS_SERVER_TIMING', self.server_timing)
+        self.profile_rate = app.config.get('PROFILE_SAMPLE_RATE', 0.0)
+        self.profile_slow = app.config.get('PROFILE_SLOW_MS', 500) / 1000
+        self.profile_dir = app.config.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+        if self.profile_rate > 0:
+            self.profiler = SamplingProfiler(app.config.get('PROFILE_INTERVAL_MS', 5) / 1000)
+        app.json = TimedJSONProvider(app)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def observe_engine(self, engine):
+        """Mede as consultas do engine do SQLAlchemy"""
+        event.listen(engine, 'before_cursor_execute', self._before_cursor)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor)
+        event.listen(engine, 'handle_error', self._query_error)
+
+    def collector(self, fn):
+        """Registra `fn()`, que retorna {nome: family(...)} na hora da coleta (decorador)
+
+        Os coletores rodam no contexto da aplicação, também na thread que grava
+        o retrato do processo.
+        """
+        self._collectors.append(fn)
+        return fn
+
+    def cache(self, name, stats):
+        """Exporta acertos, faltas e tamanho de um cache a partir de `stats()`"""
+        @self.collector
+        def collect():
+            values = stats()
+            families = {}
+            for key, metric, type, help in (
+                ('hits', 'cache_hits_total', 'counter', 'Acertos do cache'),
+                ('stale_hits', 'cache_stale_hits_total', 'counter', 'Acertos com valor vencido (revalidado em fundo)'),
+                ('misses', 'cache_misses_total', 'counter', 'Faltas do cache'),
+                ('coalesced', 'cache_coalesced_total', 'counter', 'Faltas que esperaram uma carga em andamento'),
+                ('evictions', 'cache_evictions_total', 'counter', 'Entradas despejadas por falta de espaço'),
+                ('entries', 'cache_entries', 'gauge', 'Entradas no cache'),
+                ('bytes', 'cache_bytes', 'gauge', 'Bytes ocupados pelo cache')
+            ):
+                if key in values:
+                    families[metric] = family(type, help, ('cache',), [((name,), values[key])])
+            return families
+        return collect
+
+    def _before_request(self):
+        self.in_flight.inc()
+        _state.start = time.perf_counter()
+        _state.phases = {}
+        _state.stack = []
+        _state.recorded = False
+        _state.profiled = self.profiler is not None and random.random() < self.profile_rate
+        if _state.profiled:
+            self.profiler.begin(threading.get_ident())
+
+    def _record(self, status, response=None):
+        elapsed = time.perf_counter() - _state.start
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        phases = _state.phases
+        phases['app'] = max(elapsed - sum(phases.values()), 0.0)
+        self.requests.inc(method=request.method, route=route, status=status)
+        self.latency.observe(elapsed, method=request.method, route=route)
+        for name, seconds in phases.items():
+            self.phases.observe(seconds, route=route, phase=name)
+        if response is not None:
+            if response.content_length is not None and not response.is_streamed:
+                self.response_size.observe(response.content_length, route=route)
+            if self.server_timing:
+                timings = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in phases.items()]
+                response.headers['Server-Timing'] = ', '.join(timings + [f'total;dur={elapsed * 1000:.2f}'])
+        if _state.profiled:
+            stacks = self.profiler.end(threading.get_ident())
+            _state.profiled = False
+            if stacks and elapsed >= self.profile_slow:
+                write_profile(self.profile_dir, f'{request.method} {route}', elapsed, stacks)
+                self.profiles.inc()
+        _state.recorded = True
+
+    def _after_request(self, response):
+        if _state.phases is not None and not _state.recorded:
+            self._record(str(response.status_code), response)
+        return response
+
+    def _teardown_request(self, exc):
+        if _state.phases is None:
+            return
+        if not _state.recorded:
+            # Exceção sem tratamento: after_request não rodou
+            self._record('500')
+        _state.phases = None
+        _state.stack = None
+        self.in_flight.dec()
+
+    def _before_cursor(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_start'] = time.perf_counter()
+        enter_phase('db')
+
+    def _after_cursor(self, conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop('query_start', None)
+        if start is None:
+            return
+        exit_phase()
+        words = statement.split(None, 1)
+        operation = words[0].upper() if words else ''
+        self.db_queries.observe(time.perf_counter() - start,
+                                operation=operation if operation in SQL_OPERATIONS else 'OTHER')
+
+    def _query_error(self, context):
+        connection = context.connection
+        if connection is not None and connection.info.pop('query_start', None) is not None:
+            exit_phase()
+
+    def snapshot(self):
+        """Métricas deste processo, com as dos coletores, em forma serializável"""
+        families = {metric.name: metric.family() for metric in self._metrics}
+        with self.app.app_context() if self.app is not None else nullcontext():
+            for collect in self._collectors:
+                try:
+                    for name, fam in collect().items():
+                        # Vários coletores podem contribuir para a mesma família (ex.: caches)
+                        if name in families:
+                            families[name]['samples'].extend(fam['samples'])
+                        else:
+                            families[name] = fam
+                except Exception:
+                    # Uma fonte com problema não derruba a coleta inteira
+                    pass
+        return families
+
+    def _snapshot_path(self, pid):
+        return os.path.join(self.directory, f'{pid}.json')
+
+    def flush(self):
+        """Grava o retrato deste processo em METRICS_DIR"""
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._snapshot_path(os.getpid())
+        snapshot = self.snapshot()
+        # Raspagens simultâneas no mesmo worker usariam o mesmo arquivo temporário
+        with self._flush_lock:
+            with open(path + '.tmp', 'w') as f:
+                json.dump(snapshot, f, separators=(',', ':'))
+            os.replace(path + '.tmp', path)
+
+    def collect(self):
+        """Métricas somadas de todos os workers (ou só deste processo)"""
+        if not self.directory:
+            return merge([(os.getpid(), self.snapshot())])
+        self.flush()
+        snapshots, live = [], set()
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                pid = int(entry.name[:-5])
+                with open(entry.path) as f:
+                    snapshots.append((pid, json.load(f)))
+            except (OSError, ValueError):
+                continue
+            if _pid_alive(pid):
+                live.add(pid)
+        return merge(snapshots, live)
+
+    def render(self):
+        return render(self.collect())
+
+    def authorized(self, header):
+        """Confere o `Authorization: Bearer` quando METRICS_TOKEN está definido"""
+        if not self.token:
+            return True
+        return hmac.compare_digest(header or '', f'Bearer {self.token}')
+
+    def _loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def start(self):
+        """Zera o que veio do mestre no fork e grava o retrato periodicamente"""
+        if os.getpid() != self._pid:
+            # Sem isso, a carga feita no mestre seria contada uma vez por worker
+            self._pid = os.getpid()
+            for metric in self._metrics:
+                metric.reset()
+        if self.directory and self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='metrics-flush', daemon=True)
+            self._thread.start()
+
+# Métricas do processo; os módulos instrumentados usam esta instância
+metrics = Metrics()
+
+def timed(method):
+    """Mede um método da API do Mercado Livre (histograma, erros e fase meli_api)"""
+    name = method.__name__
+
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        enter_phase('meli_api')
+        try:
+            return method(*args, **kwargs)
+        except Exception as e:
+            metrics.api_errors.inc(method=name, status=getattr(e, 'status', None) or 'error')
+            raise
+        finally:
+            exit_phase()
+            metrics.api_calls.observe(time.perf_counter() - start, method=name)
+    return wrapper
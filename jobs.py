@@ -0,0 +1,352 @@
+"""
+Fila de jobs em segundo plano, guardada no banco
+Trabalho demorado (agregações, chamadas à API) sai da requisição: o handler
+enfileira ou lê o último resultado e responde na hora, e um pool de threads
+executa os jobs por prioridade, com novas tentativas e tarefas recorrentes.
+Como a fila é uma tabela, ela é a mesma para todos os workers do gunicorn e
+para processos dedicados (`flask jobs worker`).
+
+A execução é "pelo menos uma vez": um job que passa do `timeout` da tarefa
+é dado como abandonado e volta para a fila, mas a thread original (que não
+pode ser interrompida) continua até o fim, então as tarefas precisam ser
+idempotentes. Só a gravação do resultado é exclusiva: a da execução que já
+perdeu o job é descartada.
+"""
+
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+import click
+from sqlalchemy import func, select
+from models import db, BackgroundJob
+
+STATUSES = ('queued', 'running', 'done', 'failed', 'cancelled')
+FINISHED = ('done', 'failed', 'cancelled')
+
+class UnknownTaskError(KeyError):
+    """Nome de tarefa não registrado na fila"""
+
+class Task:
+    """Função registrada na fila e as regras de execução dela"""
+
+    def __init__(self, name, fn, max_attempts=3, backoff=5.0, timeout=600.0, public=False):
+        self.name = name
+        self.fn = fn
+        self.max_attempts = max_attempts
+        # Espera antes da n-ésima nova tentativa: backoff * 2 ** (n - 1) segundos
+        self.backoff = backoff
+        # Jobs em execução há mais que isso são dados como abandonados (processo
+        # morreu) e voltam para a fila; a execução não é interrompida
+        self.timeout = timeout
+        # Pode ser enfileirada pela API (POST /api/jobs)
+        self.public = public
+        # Intervalo das execuções recorrentes (None = só sob demanda)
+        self.every = None
+
+class JobQueue:
+    """Enfileira, agenda e executa jobs em um pool de threads"""
+
+    def __init__(self, app=None, workers=2, poll_interval=1.0, retention=86400):
+        self.tasks = {}
+        self.workers = workers
+        self.poll_interval = poll_interval
+        # Jobs terminados são apagados depois disso (segundos)
+        self.retention = retention
+        # Chamados com o job (dict) ao fim de cada execução bem-sucedida
+        self.listeners = []
+        self._wake = threading.Event()
+        self._threads = []
+        self._last_cleanup = 0.0
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Liga a fila à aplicação (JOB_WORKERS, JOB_POLL_INTERVAL, JOB_RETENTION)"""
+        self.app = app
+        self.workers = app.config.get('JOB_WORKERS', self.workers)
+        self.poll_interval = app.config.get('JOB_POLL_INTERVAL', self.poll_interval)
+        self.retention = app.config.get('JOB_RETENTION', self.retention)
+
+        @app.cli.group('jobs')
+        def jobs_command():
+            """Fila de jobs em segundo plano"""
+
+        @jobs_command.command('worker')
+        @click.option('--threads', default=self.workers or 1, show_default=True)
+        @click.option('--scheduler', is_flag=True, help='Também agenda as tarefas recorrentes')
+        def worker_command(threads, scheduler):
+            """Executa jobs neste processo até ser interrompido"""
+            self.start(threads, scheduler)
+            click.echo(f'Executando jobs com {threads} threads (Ctrl+C para sair)')
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                pass
+
+        @jobs_command.command('stats')
+        def stats_command():
+            """Contagem de jobs por tarefa e situação"""
+            for name, counts in self.stats()['tasks'].items():
+                click.echo(f"{name:<24} " + '  '.join(f'{status}={count}' for status, count in counts.items()))
+
+    def task(self, name, max_attempts=3, backoff=5.0, timeout=600.0, public=False):
+        """Registra `fn(**args)` como a tarefa `name` (decorador); o retorno vira o resultado
+
+        A tarefa pode rodar mais de uma vez para o mesmo job (novas tentativas,
+        execução dada como abandonada), então deve ser idempotente.
+        """
+        def register(fn):
+            self.tasks[name] = Task(name, fn, max_attempts, backoff, timeout, public)
+            return fn
+        return register
+
+    def schedule(self, name, every):
+        """Executa a tarefa a cada `every` segundos (0 ou None desliga)"""
+        self._task(name).every = every or None
+
+    def on_done(self, listener):
+        """Registra `listener(job)` para o fim de cada job concluído (decorador)"""
+        self.listeners.append(listener)
+        return listener
+
+    def _task(self, name):
+        try:
+            return self.tasks[name]
+        except KeyError:
+            raise UnknownTaskError(name)
+
+    # Enfileiramento e consulta
+
+    def enqueue(self, name, args=None, priority=0, delay=0, unique=False):
+        """Grava um job e avisa as threads deste processo
+
+        Com `unique`, um job da mesma tarefa ainda na fila é reaproveitado
+        (a prioridade sobe se a nova for maior) em vez de criar outro.
+        """
+        task = self._task(name)
+        now = datetime.utcnow()
+        if unique:
+            job = (BackgroundJob.query.filter_by(name=name, status='queued')
+                   .order_by(BackgroundJob.run_at).first())
+            if job is not None:
+                job.priority = max(job.priority, priority)
+                job.run_at = min(job.run_at, now + timedelta(seconds=delay))
+                db.session.commit()
+                self._wake.set()
+                return job
+        job = BackgroundJob(
+            id=uuid.uuid4().hex, name=name, args=args or {}, priority=priority, status='queued',
+            max_attempts=task.max_attempts, run_at=now + timedelta(seconds=delay), created_at=now
+        )
+        db.session.add(job)
+        db.session.commit()
+        self._wake.set()
+        return job
+
+    def get(self, job_id):
+        return db.session.get(BackgroundJob, job_id)
+
+    def cancel(self, job_id):
+        """Cancela um job que ainda não começou; retorna o job, ou None se não existe"""
+        table = BackgroundJob.__table__
+        db.session.execute(table.update().where(table.c.id == job_id, table.c.status == 'queued')
+                           .values(status='cancelled', finished_at=datetime.utcnow()))
+        db.session.commit()
+        return self.get(job_id)
+
+    def recent(self, name=None, status=None, limit=50):
+        """Jobs mais recentes, com filtros opcionais"""
+        query = BackgroundJob.query
+        if name:
+            query = query.filter_by(name=name)
+        if status:
+            query = query.filter_by(status=status)
+        return query.order_by(BackgroundJob.created_at.desc()).limit(limit).all()
+
+    def latest_result(self, name, max_age):
+        """Resultado do último job concluído da tarefa, se tiver até `max_age` segundos"""
+        row = db.session.execute(
+            select(BackgroundJob.result, BackgroundJob.finished_at)
+            .where(BackgroundJob.name == name, BackgroundJob.status == 'done',
+                   BackgroundJob.finished_at >= datetime.utcnow() - timedelta(seconds=max_age))
+            .order_by(BackgroundJob.finished_at.desc())
+            .limit(1)
+        ).first()
+        return row.result if row is not None else None
+
+    def stats(self):
+        """Jobs por tarefa e situação, e a espera do job pronto mais antigo"""
+        tasks = {name: dict.fromkeys(STATUSES, 0) for name in self.tasks}
+        for name, status, count in db.session.execute(
+                select(BackgroundJob.name, BackgroundJob.status, func.count())
+                .group_by(BackgroundJob.name, BackgroundJob.status)):
+            tasks.setdefault(name, dict.fromkeys(STATUSES, 0))[status] = count
+        oldest = db.session.execute(
+            select(func.min(BackgroundJob.run_at))
+            .where(BackgroundJob.status == 'queued', BackgroundJob.run_at <= datetime.utcnow())
+        ).scalar()
+        return {
+            'tasks': tasks,
+            'schedule': {name: task.every for name, task in self.tasks.items() if task.every},
+            'oldest_ready_seconds': round((datetime.utcnow() - oldest).total_seconds(), 3) if oldest else None,
+            'workers': sum(thread.is_alive() for thread in self._threads)
+        }
+
+    # Execução
+
+    def _claim(self):
+        """Marca como em execução o próximo job pronto; None se não há nenhum
+
+        O UPDATE só vale se o job ainda estiver na fila, então dois processos
+        nunca pegam o mesmo job.
+        """
+        now = datetime.utcnow()
+        candidates = db.session.execute(
+            select(BackgroundJob.id)
+            .where(BackgroundJob.status == 'queued', BackgroundJob.run_at <= now)
+            .order_by(BackgroundJob.priority.desc(), BackgroundJob.run_at, BackgroundJob.created_at)
+            .limit(5)
+        ).scalars().all()
+        table = BackgroundJob.__table__
+        owner = f'{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}'
+        for job_id in candidates:
+            claimed = db.session.execute(
+                table.update().where(table.c.id == job_id, table.c.status == 'queued')
+                .values(status='running', locked_by=owner, started_at=now, attempts=table.c.attempts + 1)
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                return self.get(job_id)
+        db.session.commit()
+        return None
+
+    def _finish(self, job, owner, attempts, error=None, result=None):
+        """Grava o fim da execução de `owner`; False se o job já não é dela
+
+        A gravação só vale se o job continua em execução pela mesma thread:
+        um job dado como abandonado (e talvez já pego de novo) não é
+        sobrescrito quando a execução original termina.
+        """
+        now = datetime.utcnow()
+        if error is None:
+            values = {'status': 'done', 'result': result, 'error': None, 'finished_at': now}
+        elif attempts < job.max_attempts:
+            # Volta para a fila com espera exponencial
+            task = self.tasks.get(job.name)
+            backoff = task.backoff if task is not None else 5.0
+            values = {'status': 'queued', 'error': error,
+                      'run_at': now + timedelta(seconds=backoff * 2 ** (attempts - 1))}
+        else:
+            values = {'status': 'failed', 'error': error, 'finished_at': now}
+        table = BackgroundJob.__table__
+        updated = db.session.execute(table.update().where(
+            table.c.id == job.id, table.c.status == 'running', table.c.locked_by == owner
+        ).values(locked_by=None, **values)).rowcount
+        db.session.commit()
+        if not updated:
+            self.app.logger.warning('Job %s (%s) já não pertence a %s; resultado descartado',
+                                    job.id, job.name, owner)
+        return bool(updated)
+
+    def run_job(self, job):
+        """Executa um job já marcado como em execução e grava o resultado"""
+        # Lidos antes de executar: um rollback recarregaria a linha, que pode já ser de outra execução
+        owner, attempts = job.locked_by, job.attempts
+        task = self.tasks.get(job.name)
+        try:
+            if task is None:
+                raise UnknownTaskError(job.name)
+            result = task.fn(**(job.args or {}))
+        except Exception as e:
+            db.session.rollback()
+            self.app.logger.warning('Job %s (%s) falhou na tentativa %d: %s', job.id, job.name, attempts, e)
+            self._finish(job, owner, attempts, error=f'{type(e).__name__}: {e}'[:2000])
+            return
+        if not self._finish(job, owner, attempts, result=result):
+            return
+        summary = job.to_dict()
+        for listener in self.listeners:
+            listener(summary)
+
+    def run_once(self):
+        """Executa o próximo job pronto; retorna False se não havia nenhum"""
+        with self.app.app_context():
+            job = self._claim()
+            if job is None:
+                return False
+            self.run_job(job)
+            return True
+
+    def run_scheduled(self):
+        """Agenda as recorrentes, devolve à fila os abandonados e apaga os antigos"""
+        with self.app.app_context():
+            now = datetime.utcnow()
+            for name, task in self.tasks.items():
+                if not task.every:
+                    continue
+                pending = db.session.execute(
+                    select(BackgroundJob.id)
+                    .where(BackgroundJob.name == name, BackgroundJob.status.in_(('queued', 'running')))
+                    .limit(1)
+                ).first()
+                if pending is not None:
+                    continue
+                last = db.session.execute(
+                    select(func.max(BackgroundJob.finished_at)).where(BackgroundJob.name == name)
+                ).scalar()
+                delay = (last + timedelta(seconds=task.every) - now).total_seconds() if last else 0
+                # Recorrentes ficam abaixo dos jobs pedidos por alguém
+                self.enqueue(name, priority=-10, delay=max(delay, 0))
+
+            table = BackgroundJob.__table__
+            for name, task in self.tasks.items():
+                abandoned = db.session.execute(
+                    select(BackgroundJob).where(
+                        BackgroundJob.name == name, BackgroundJob.status == 'running',
+                        BackgroundJob.started_at < now - timedelta(seconds=task.timeout))
+                ).scalars().all()
+                for job in abandoned:
+                    self._finish(job, job.locked_by, job.attempts,
+                                 error=f'Sem resposta após {task.timeout:g} s')
+
+            if time.monotonic() - self._last_cleanup >= 60:
+                self._last_cleanup = time.monotonic()
+                db.session.execute(table.delete().where(
+                    table.c.status.in_(FINISHED),
+                    table.c.finished_at < now - timedelta(seconds=self.retention)))
+                db.session.commit()
+
+    def _work(self):
+        while True:
+            try:
+                busy = self.run_once()
+            except Exception:
+                self.app.logger.exception('Erro inesperado na fila de jobs')
+                busy = False
+            if not busy:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _schedule_loop(self):
+        while True:
+            try:
+                self.run_scheduled()
+            except Exception:
+                self.app.logger.exception('Erro inesperado no agendamento de jobs')
+            time.sleep(self.poll_interval)
+
+    def start(self, workers=None, scheduler=True):
+        """Inicia o pool de threads (e o agendador, em um só processo)"""
+        if self._threads:
+            return
+        for n in range(self.workers if workers is None else workers):
+            self._threads.append(threading.Thread(target=self._work, name=f'jobs-{n}', daemon=True))
+        if scheduler:
+            self._threads.append(threading.Thread(target=self._schedule_loop, name='jobs-scheduler', daemon=True))
+        for thread in self._threads:
+            thread.start()
@@ -1,158 +1,892 @@
-from flask import Flask, jsonify, send_from_directory, request
+from flask import Blueprint, Flask, Response, current_app, jsonify, request
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity
-import os
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.local import LocalProxy
+from sqlalchemy.exc import IntegrityError
+import inspect
 import json
-from mercadolivre_api import meli_api
-from models import db, bcrypt, User
+import os
+import time
+from datetime import datetime, timedelta
+from mercadolivre_api import meli_api, MercadoLivreAPIError
+from models import db, passwords, User, StockUpdateJob
 from auth import auth_bp
+import cd_store
+import meli_store
+import meli_analytics
+import meli_questions
+from cd_loader import CDDatasetLoader
+from response_cache import ResponseCache
+from meli_sync import MeliSyncWorker
+from event_bus import create_event_bus, StreamLimitReached
+from token_auth import CachingJWTManager, token_auth
+from server_runtime import FileLock, process_memory
+from instrumentation import metrics, family, CONTENT_TYPE
+import database
+import migrations
+import stock_updates
+import exports
+from stock_updates import StockFileError, StockUpdater
+from jobs import JobQueue
+from alerts import alert_engine
+from static_assets import StaticManifest
 
-# Configurar o Flask para servir os arquivos estáticos do React
-app = Flask(__name__, 
-            static_folder='static',
-            static_url_path='')
+try:
+    from flask_sock import Sock
+except ImportError:
+    # WebSocket é opcional; sem flask-sock o dashboard usa só SSE
+    Sock = None
 
-# Configurações
-app.config['SECRET_KEY'] = 'meli-dashboard-secret-key-2024'
-app.config['JWT_SECRET_KEY'] = 'jwt-secret-string-meli-dashboard'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///dashboard_meli.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+api_bp = Blueprint('api', __name__)
 
-# Inicializar extensões
-db.init_app(app)
-bcrypt.init_app(app)
-jwt = JWTManager(app)
+# Atualizações enviadas ao dashboard (SSE/WebSocket); o barramento é criado
+# por create_app, e com EVENT_BROKER_URL os workers compartilham os eventos
+events = LocalProxy(lambda: current_app.extensions['events'])
 
-# Habilitar CORS para permitir requisições do frontend
-CORS(app)
+# EventSource e WebSocket do navegador não enviam cabeçalhos, então só as rotas
+# de eventos aceitam o token na URL (?jwt=)
+STREAM_TOKEN_LOCATIONS = ['headers', 'query_string']
 
-# Registrar blueprints
-app.register_blueprint(auth_bp)
+# Pedidos com status alterado enviados por evento; acima disso o cliente recarrega a lista
+MAX_ORDER_CHANGES = 100
 
-# Carregar os dados do Cross Docking MELI
-try:
-    with open('src/meli_cd_mock_data.json', 'r', encoding='utf-8') as f:
-        cd_data = json.load(f)
-except FileNotFoundError:
-    # Dados de fallback caso o arquivo não seja encontrado
-    cd_data = {
-        "metrics": {
-            "total_produtos": 50,
-            "aguardando_envio": 17,
-            "tempo_medio_permanencia": 161.36,
-            "eficiencia_operacional": 78
-        },
-        "products": []
+# Carregar os dados do Cross Docking MELI (recarregados quando o arquivo muda)
+cd_loader = CDDatasetLoader()
+
+# Respostas das rotas somente leitura, serializadas uma vez por versão dos dados
+cd_responses = ResponseCache()
+
+# Pedidos e anúncios são lidos do armazenamento local, mantido pela sincronização
+meli_sync = MeliSyncWorker(api=meli_api)
+
+# Atualizações de estoque em lote, enviadas à API em segundo plano
+stock_updater = StockUpdater(api=meli_api)
+
+# Trabalho demorado (métricas, analytics) executado fora das requisições
+job_queue = JobQueue()
+
+# Build do frontend, indexado e comprimido uma vez na inicialização
+static_manifest = StaticManifest()
+
+# Caches exportados em /metrics
+metrics.cache('meli_api', meli_api.cache.stats)
+metrics.cache('cd_responses', cd_responses.stats)
+metrics.cache('auth_users', token_auth.users.stats)
+metrics.cache('auth_revocations', token_auth.revocations.stats)
+
+def _jwt_cache_stats():
+    stats = current_app.extensions['flask-jwt-extended'].stats()
+    return {'hits': stats['cache_hits'], 'misses': stats['cache_misses'], 'entries': stats['verified_tokens']}
+
+metrics.cache('jwt_tokens', _jwt_cache_stats)
+
+@metrics.collector
+def _runtime_metrics():
+    bus = events.stats()
+    return {
+        'meli_api_retries_total': family('counter', 'Novas tentativas de chamadas à API', (), [((), meli_api.retries)]),
+        'meli_api_throttled_total': family('counter', 'Respostas 429 da API', (), [((), meli_api.throttled)]),
+        'events_published_total': family('counter', 'Eventos publicados', (), [((), bus['published'])]),
+        'events_dropped_total': family('counter', 'Eventos descartados por assinantes lentos', (), [((), bus['dropped'])]),
+        'event_subscribers': family('gauge', 'Assinantes de eventos conectados', (), [((), bus['subscribers'])]),
+        'process_resident_memory_bytes': family('gauge', 'Memória residente dos processos', (),
+                                                [((), int(process_memory().get('rss_mb', 0) * 1024 * 1024))])
     }
 
-# Simular autenticação com Mercado Livre
-meli_api.authenticate("APP_USR-123456789-abcdef", "123456789")
+def configure(app, overrides=None):
+    """Lê a configuração do ambiente; `overrides` substitui valores antes dos derivados"""
+    app.config['SECRET_KEY'] = 'meli-dashboard-secret-key-2024'
+    app.config['JWT_SECRET_KEY'] = 'jwt-secret-string-meli-dashboard'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Token só no cabeçalho; as rotas de eventos aceitam também na URL (STREAM_TOKEN_LOCATIONS)
+    app.config['JWT_TOKEN_LOCATION'] = ['headers']
+
+    # Política de hash de senhas (bcrypt ou argon2) e pool limitado de verificação no login
+    app.config['PASSWORD_SCHEME'] = os.environ.get('PASSWORD_SCHEME', 'bcrypt')
+    app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    app.config['ARGON2_TIME_COST'] = int(os.environ.get('ARGON2_TIME_COST', 3))
+    app.config['ARGON2_MEMORY_COST'] = int(os.environ.get('ARGON2_MEMORY_COST', 65536))
+    app.config['ARGON2_PARALLELISM'] = int(os.environ.get('ARGON2_PARALLELISM', 1))
+    # Sem LOGIN_WORKERS o pool de cada processo fica com os núcleos / WEB_CONCURRENCY
+    app.config['LOGIN_WORKERS'] = int(os.environ.get('LOGIN_WORKERS', 0)) or None
+    app.config['WEB_CONCURRENCY'] = int(os.environ.get('WEB_CONCURRENCY', 0)) or None
+    app.config['LOGIN_MAX_PENDING'] = int(os.environ.get('LOGIN_MAX_PENDING', 0)) or None
+    app.config['LOGIN_USER_CACHE_TTL'] = float(os.environ.get('LOGIN_USER_CACHE_TTL', 30))
+
+    # Banco: DATABASE_URL (SQLite em WAL por padrão, ou PostgreSQL com pool)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database.database_uri(os.environ.get('DATABASE_URL'))
+    app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 10))
+    app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    app.config['DB_POOL_TIMEOUT'] = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+    app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    app.config['DB_POOL_PRE_PING'] = os.environ.get('DB_POOL_PRE_PING', '1') != '0'
+    app.config['SQLITE_BUSY_TIMEOUT'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+    app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    # Cache de páginas por conexão (KiB) e área mapeada em memória (bytes, 0 desliga)
+    app.config['SQLITE_CACHE_SIZE_KB'] = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 65536))
+    app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    # Com DB_AUTO_MIGRATE=0 as migrações rodam só pelo `flask migrate` (ex.: no deploy)
+    app.config['DB_AUTO_MIGRATE'] = os.environ.get('DB_AUTO_MIGRATE', '1') != '0'
+
+    # Usuário admin criado na inicialização se ADMIN_PASSWORD estiver definido
+    app.config['ADMIN_EMAIL'] = os.environ.get('ADMIN_EMAIL', 'admin@meli.com')
+    app.config['ADMIN_PASSWORD'] = os.environ.get('ADMIN_PASSWORD')
+
+    app.config['EVENT_BROKER_URL'] = os.environ.get('EVENT_BROKER_URL')
+    app.config['EVENT_KEEPALIVE'] = float(os.environ.get('EVENT_KEEPALIVE', 15))
+    # Streams SSE/WebSocket abertos por processo (0 = sem limite); acima disso 503
+    app.config['STREAM_MAX_PER_WORKER'] = int(os.environ.get('STREAM_MAX_PER_WORKER', 0)) or None
+    # Logout e contas desativadas derrubam os tokens na hora nos workers que recebem
+    # o evento; os demais conferem o banco a cada AUTH_REVOCATION_CHECK_TTL segundos
+    # (sem broker, o cache de usuários também não passa disso)
+    app.config['AUTH_USER_CACHE_TTL'] = float(os.environ.get('AUTH_USER_CACHE_TTL', 60))
+    app.config['AUTH_REVOCATION_CHECK_TTL'] = float(os.environ.get('AUTH_REVOCATION_CHECK_TTL', 5))
+
+    app.config['CD_DATA_PATH'] = os.environ.get('CD_DATA_PATH', 'src/meli_cd_mock_data.json')
+    app.config['CD_DATA_WATCH_INTERVAL'] = float(os.environ.get('CD_DATA_WATCH_INTERVAL', 5))
+    app.config['MELI_SYNC_INTERVAL'] = float(os.environ.get('MELI_SYNC_INTERVAL', 60))
+    app.config['MELI_SYNC_OVERLAP'] = float(os.environ.get('MELI_SYNC_OVERLAP', 300))
+    # Escritas de estoque do mesmo produto dentro da janela viram uma só (a última)
+    app.config['STOCK_COALESCE_WINDOW'] = float(os.environ.get('STOCK_COALESCE_WINDOW', 2))
+    app.config['STOCK_BATCH_SIZE'] = int(os.environ.get('STOCK_BATCH_SIZE', 500))
+    # Quanto uma escrita individual espera o lote em envio do mesmo produto terminar
+    app.config['STOCK_INFLIGHT_WAIT'] = float(os.environ.get('STOCK_INFLIGHT_WAIT', 15))
+    # Fila de jobs: threads no worker líder (0 = só processos `flask jobs worker`)
+    app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+    app.config['JOB_POLL_INTERVAL'] = float(os.environ.get('JOB_POLL_INTERVAL', 1))
+    app.config['JOB_RETENTION'] = float(os.environ.get('JOB_RETENTION', 86400))
+    # Recálculo periódico das métricas do Mercado Livre; as rotas usam o último
+    # resultado com até JOB_RESULT_MAX_AGE segundos e só calculam na hora sem ele
+    app.config['JOB_METRICS_INTERVAL'] = float(os.environ.get('JOB_METRICS_INTERVAL', 30))
+    app.config['JOB_NOTIFICATIONS_INTERVAL'] = float(os.environ.get('JOB_NOTIFICATIONS_INTERVAL', 30))
+    app.config['JOB_RESULT_MAX_AGE'] = float(os.environ.get('JOB_RESULT_MAX_AGE', 120))
+    # Métricas (/metrics): com METRICS_DIR os workers somam as suas; METRICS_TOKEN exige Bearer
+    app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR')
+    app.config['METRICS_FLUSH_INTERVAL'] = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    app.config['METRICS_SERVER_TIMING'] = os.environ.get('METRICS_SERVER_TIMING', '1') != '0'
+    # Perfil amostrado: fração das requisições amostradas; as mais lentas que
+    # PROFILE_SLOW_MS têm as pilhas gravadas em PROFILE_DIR
+    app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+    app.config['PROFILE_SLOW_MS'] = float(os.environ.get('PROFILE_SLOW_MS', 500))
+    app.config['PROFILE_INTERVAL_MS'] = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+    app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR')
+
+    # Alertas: limites de estoque e prazos de permanência no CD por categoria
+    # ('Eletrônicos=72,*=96'; '*' vale para as demais), prazo de resposta das
+    # perguntas, a janela de vencimentos mantida em memória e a cada quanto o worker
+    # líder procura produtos do CD alterados nos outros workers (segundos)
+    app.config['ALERT_STOCK_THRESHOLDS'] = os.environ.get('ALERT_STOCK_THRESHOLDS', '*=10')
+    app.config['ALERT_DWELL_SLA_HOURS'] = os.environ.get('ALERT_DWELL_SLA_HOURS', '*=96')
+    app.config['ALERT_QUESTION_SLA_HOURS'] = float(os.environ.get('ALERT_QUESTION_SLA_HOURS', 24))
+    app.config['ALERT_HORIZON'] = float(os.environ.get('ALERT_HORIZON', 3600))
+    app.config['ALERT_POLL_INTERVAL'] = float(os.environ.get('ALERT_POLL_INTERVAL', 5))
+
+    # Frontend: arquivos sob STATIC_IMMUTABLE_PREFIX têm hash no nome e cache de um ano
+    app.config['STATIC_ROOT'] = os.environ.get('STATIC_ROOT')
+    app.config['STATIC_IMMUTABLE_PREFIX'] = os.environ.get('STATIC_IMMUTABLE_PREFIX', 'assets/')
+    app.config['STATIC_COMPRESS_MIN_SIZE'] = int(os.environ.get('STATIC_COMPRESS_MIN_SIZE', 1024))
+    app.config['STATIC_BROTLI_QUALITY'] = int(os.environ.get('STATIC_BROTLI_QUALITY', 11))
+
+    # Arquivo de lock que elege o worker das tarefas únicas (sincronização)
+    app.config['BACKGROUND_LOCK_PATH'] = os.environ.get('BACKGROUND_LOCK_PATH')
+
+    app.config.update(overrides or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = database.engine_options(app.config)
+    app.config.setdefault('SOCK_SERVER_OPTIONS', {'ping_interval': app.config['EVENT_KEEPALIVE']})
+    if not app.config['BACKGROUND_LOCK_PATH']:
+        app.config['BACKGROUND_LOCK_PATH'] = os.path.join(app.instance_path, 'background.lock')
+
+def seed_admin(email, password):
+    """Cria o usuário admin se ele ainda não existir"""
+    if User.query.filter_by(email=email).first():
+        return False
+    db.session.add(User(nome='Administrador MELI', email=email, password=password))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Outro processo criou o mesmo usuário ao mesmo tempo
+        db.session.rollback()
+        return False
+    return True
+
+def create_app(config=None):
+    """Cria a aplicação e faz o trabalho de inicialização, que roda uma vez só
+
+    No gunicorn com preload (gunicorn.conf.py) isto roda no processo mestre
+    antes do fork: migrações, usuário admin e a carga dos dados do CD ficam
+    prontos e são compartilhados pelos workers (copy-on-write). Threads não
+    sobrevivem ao fork, então as de fundo são iniciadas por `start_background`
+    em cada worker.
+    """
+    started = time.perf_counter()
+    # Os arquivos estáticos do React saem do manifesto, não da rota static do Flask
+    app = Flask(__name__, static_folder=None)
+    configure(app, config)
+
+    # Inicializar extensões
+    db.init_app(app)
+    database.init_app(app)
+    metrics.init_app(app)
+    with app.app_context():
+        metrics.observe_engine(db.engine)
+    migrations.init_app(app)
+    if app.config['DB_AUTO_MIGRATE']:
+        with app.app_context():
+            migrations.upgrade(app.logger)
+    passwords.init_app(app)
+    jwt = CachingJWTManager(app)
+
+    # Habilitar CORS para permitir requisições do frontend
+    CORS(app)
+
+    bus = create_event_bus(app.config['EVENT_BROKER_URL'],
+                           max_subscribers=app.config['STREAM_MAX_PER_WORKER'])
+    app.extensions['events'] = bus
+    token_auth.init_app(app, jwt, bus)
 
-@app.route('/api/cd-data', methods=['GET'])
+    # Registrar blueprints
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(api_bp)
+
+    with app.app_context():
+        token_auth.load_revocations()
+        if app.config['ADMIN_PASSWORD'] and seed_admin(app.config['ADMIN_EMAIL'], app.config['ADMIN_PASSWORD']):
+            app.logger.info('Usuário admin criado: %s', app.config['ADMIN_EMAIL'])
+
+    alert_engine.init_app(app)
+    cd_loader.init_app(app)
+    cd_loader.load()
+    static_manifest.init_app(app)
+
+    # Sem MELI_API_URL, usa o servidor local que imita a API do Mercado Livre
+    if not os.environ.get('MELI_API_URL'):
+        from meli_standin import start_standin
+        _, standin_url = start_standin()
+        meli_api.configure(base_url=standin_url)
+    meli_api.authenticate(
+        os.environ.get('MELI_ACCESS_TOKEN', 'APP_USR-123456789-abcdef'),
+        os.environ.get('MELI_USER_ID', '123456789')
+    )
+    meli_sync.init_app(app)
+    stock_updater.init_app(app)
+    job_queue.init_app(app)
+    job_queue.schedule('meli.metrics', app.config['JOB_METRICS_INTERVAL'])
+    job_queue.schedule('meli.notifications', app.config['JOB_NOTIFICATIONS_INTERVAL'])
+
+    app.extensions['background_lock'] = FileLock(app.config['BACKGROUND_LOCK_PATH'])
+    app.config['STARTUP_SECONDS'] = round(time.perf_counter() - started, 3)
+    app.logger.info('Aplicação pronta em %.2f s (%s)', app.config['STARTUP_SECONDS'], process_memory())
+    return app
+
+def start_background(app):
+    """Inicia as threads de fundo deste processo (no worker, depois do fork)
+
+    O barramento de eventos roda em todo worker, pois o estado dele é do
+    processo; a observação do arquivo do CD, a sincronização com o Mercado
+    Livre, o envio dos estoques em lote e a fila de jobs gravam no banco
+    compartilhado e rodam só no worker que pegar o lock. Os demais adotam a
+    versão do CD gravada no banco na requisição seguinte.
+    """
+    with app.app_context():
+        # Conexões abertas antes do fork ficam com o processo mestre
+        db.engine.dispose(close=False)
+        metrics.start()
+        app.extensions['events'].start()
+        # Com broker, o estado publicado antes do fork não chegou a nenhum worker
+        push_cd_metrics()
+    if app.extensions['background_lock'].acquire(blocking=False):
+        # Os prazos saem das tabelas compartilhadas; os outros workers só
+        # conferem na hora as entidades que eles mesmos alteram
+        alert_engine.track_questions()
+        alert_engine.track_cd()
+        alert_engine.start()
+        cd_loader.start()
+        meli_sync.start()
+        stock_updater.start()
+        job_queue.start()
+
+def _cd_data_payload(dataset):
+    """Métricas, categorias e a primeira página de produtos; as seguintes vêm de /api/products"""
+    page = cd_store.query_products(dataset=dataset)
+    return {
+        'metrics': cd_store.get_metrics(dataset),
+        'categorias': cd_store.categories(dataset),
+        'products': page['results'],
+        'paging': page['paging']
+    }
+
+@cd_loader.on_load
+def warm_cd_responses(dataset):
+    """Serializa e comprime as respostas da nova versão antes do primeiro acesso"""
+    cd_responses.get_or_build(('cd-data', dataset.key), lambda: _cd_data_payload(dataset))
+    cd_responses.get_or_build(('metrics', dataset.key), lambda: cd_store.get_metrics(dataset))
+
+@cd_loader.on_load
+def push_cd_metrics(dataset=None):
+    """Envia aos dashboards conectados o que mudou nas métricas do CD"""
+    events.publish_state('cd_metrics', cd_store.get_metrics(dataset))
+
+def _last_30_days_visits():
+    """Visitas dos últimos 30 dias; as métricas seguem sem elas se a API falhar"""
+    today = datetime.utcnow().date()
+    try:
+        return meli_api.get_visits((today - timedelta(days=29)).isoformat(), today.isoformat())
+    except MercadoLivreAPIError as e:
+        current_app.logger.warning('Visitas indisponíveis: %s', e)
+        return None
+
+def push_notifications(notifications):
+    events.publish_state('notifications', {n['id']: n for n in notifications})
+
+@cd_loader.on_load
+@alert_engine.on_change
+def push_alerts(dataset=None):
+    """Envia os avisos depois que uma carga do CD ou um prazo vencido muda os alertas"""
+    push_notifications(meli_sync.build_notifications())
+
+@meli_sync.on_sync
+def push_meli_updates(changes):
+    """Envia aos dashboards conectados o que a rodada de sincronização trouxe"""
+    events.publish_state('meli_metrics', meli_analytics.sales_metrics(_last_30_days_visits()))
+    push_notifications(changes['notifications'])
+    orders = changes['orders']
+    if orders:
+        events.publish('orders', {
+            'count': len(orders),
+            'changes': orders[-MAX_ORDER_CHANGES:],
+            'truncated': len(orders) > MAX_ORDER_CHANGES
+        })
+    if changes['questions']:
+        events.publish('questions', {'new': changes['questions']})
+    # O resultado guardado das métricas acompanha os pedidos novos
+    job_queue.enqueue('meli.metrics', priority=10, unique=True)
+
+@stock_updater.on_job_done
+def push_stock_job(summary):
+    """Avisa os dashboards do fim de uma atualização em lote e do novo estoque baixo"""
+    summary = {key: value for key, value in summary.items() if key != 'parse_errors'}
+    events.publish('stock_jobs', summary)
+    push_notifications(meli_sync.build_notifications())
+
+@job_queue.task('meli.sync', max_attempts=1)
+def run_meli_sync():
+    """Rodada de sincronização pedida pelo dashboard, fora do laço periódico do líder"""
+    ran = meli_sync.run_once()
+    return {'ran': ran, 'last_error': meli_sync.last_error, 'progress': meli_sync.progress}
+
+@job_queue.task('meli.metrics', public=True)
+def refresh_meli_metrics():
+    """Métricas de vendas e analytics padrão, servidos depois pelas rotas"""
+    visits = _last_30_days_visits()
+    sales = meli_analytics.sales_metrics(visits)
+    events.publish_state('meli_metrics', sales)
+    return {'metrics': sales, 'analytics': meli_analytics.analytics_data(visits)}
+
+@job_queue.task('meli.analytics', public=True)
+def build_meli_analytics(top=10):
+    """Analytics com um ranking de tamanho diferente do padrão"""
+    return meli_analytics.analytics_data(_last_30_days_visits(), min(max(int(top), 1), 100))
+
+@job_queue.task('meli.notifications', public=True)
+def refresh_notifications():
+    """Recalcula os avisos (alertas ativos, perguntas, pagamentos) e envia os que mudaram"""
+    notifications = meli_sync.build_notifications()
+    push_notifications(notifications)
+    return {'notifications': notifications}
+
+@job_queue.on_done
+def push_job_done(job):
+    """Avisa os dashboards dos jobs concluídos (os recorrentes não)"""
+    if job['priority'] >= 0:
+        events.publish('jobs', {key: job[key] for key in ('id', 'name', 'status', 'finished_at')})
+
+def _job_result(name):
+    return job_queue.latest_result(name, current_app.config['JOB_RESULT_MAX_AGE'])
+
+@api_bp.route('/api/health', methods=['GET'])
+def health():
+    """Verificação de vida para o balanceador (sem autenticação)"""
+    return jsonify({'status': 'ok'})
+
+@api_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Métricas no formato de texto do Prometheus, somadas entre os workers"""
+    if not metrics.authorized(request.headers.get('Authorization')):
+        return jsonify({'error': 'Token de métricas inválido'}), 401
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
+
+@api_bp.route('/api/server/status', methods=['GET'])
+@jwt_required()
+def get_server_status():
+    """Processo que atendeu: tempo de inicialização, memória e papel do worker"""
+    return jsonify({
+        'pid': os.getpid(),
+        'startup_seconds': current_app.config['STARTUP_SECONDS'],
+        'memory': process_memory(),
+        'background_leader': current_app.extensions['background_lock'].held
+    })
+
+@api_bp.app_errorhandler(MercadoLivreAPIError)
+def handle_meli_error(e):
+    """Falhas da API do Mercado Livre viram 502 (ou o status original, se 4xx)"""
+    status = e.status if e.status and 400 <= e.status < 500 and e.status != 429 else 502
+    return jsonify({'error': str(e)}), status
+
+@api_bp.route('/api/cd-data', methods=['GET'])
 @jwt_required()
 def get_cd_data():
-    return jsonify(cd_data)
+    dataset = cd_store.sync_dataset()
+    return cd_responses.respond(('cd-data', dataset.key), lambda: _cd_data_payload(dataset))
+
+@api_bp.route('/api/cd-data/reload', methods=['POST'])
+@jwt_required()
+def reload_cd_data():
+    """Dispara a recarga do arquivo de dados do CD em segundo plano"""
+    started = cd_loader.trigger()
+    return jsonify({'started': started, **cd_loader.status()}), 202 if started else 409
 
-@app.route('/api/products', methods=['GET'])
+@api_bp.route('/api/cd-data/status', methods=['GET'])
+@jwt_required()
+def get_cd_data_status():
+    """Retorna a versão ativa do arquivo de dados do CD"""
+    return jsonify(cd_loader.status())
+
+@api_bp.route('/api/products', methods=['GET'])
 @jwt_required()
 def get_products():
-    return jsonify(cd_data.get('products', []))
+    """Retorna produtos do CD com filtros, ordenação e paginação por cursor"""
+    dataset = cd_store.sync_dataset()
+    args = tuple(sorted(request.args.items(multi=True)))
+    try:
+        return cd_responses.respond(('products', dataset.key, args), lambda: cd_store.query_products(
+            categoria=request.args.get('categoria'),
+            status=request.args.get('status'),
+            search=request.args.get('q'),
+            sort=request.args.get('sort'),
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', cd_store.DEFAULT_LIMIT, type=int),
+            dataset=dataset
+        ))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-@app.route('/api/metrics', methods=['GET'])
+@api_bp.route('/api/metrics', methods=['GET'])
 @jwt_required()
 def get_metrics():
-    return jsonify(cd_data.get('metrics', {}))
+    """Retorna as métricas do CD mantidas incrementalmente"""
+    dataset = cd_store.sync_dataset()
+    return cd_responses.respond(('metrics', dataset.key), lambda: cd_store.get_metrics(dataset))
+
+@api_bp.route('/api/products', methods=['POST'])
+@jwt_required()
+def create_product():
+    """Inclui ou substitui um produto do CD"""
+    try:
+        data = cd_store.validate_product(request.get_json())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    product, created = cd_store.upsert_product(data)
+    push_cd_metrics()
+    push_alerts()
+    return jsonify(product), 201 if created else 200
+
+@api_bp.route('/api/products/<int:product_id>', methods=['PUT'])
+@jwt_required()
+def update_product(product_id):
+    """Atualiza um produto do CD"""
+    data = request.get_json()
+    try:
+        data = cd_store.validate_product({**data, 'id': product_id} if isinstance(data, dict) else data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    product, created = cd_store.upsert_product(data)
+    push_cd_metrics()
+    push_alerts()
+    return jsonify(product), 201 if created else 200
+
+@api_bp.route('/api/products/<int:product_id>', methods=['DELETE'])
+@jwt_required()
+def delete_product(product_id):
+    """Remove um produto do CD"""
+    product = cd_store.delete_product(product_id)
+    if not product:
+        return jsonify({'error': 'Produto não encontrado'}), 404
+    push_cd_metrics()
+    push_alerts()
+    return jsonify(product)
 
 # Rotas da API do Mercado Livre
-@app.route('/api/mercadolivre/user', methods=['GET'])
+@api_bp.route('/api/mercadolivre/user', methods=['GET'])
 @jwt_required()
 def get_meli_user():
     """Retorna informações do usuário do Mercado Livre"""
     return jsonify(meli_api.get_user_info())
 
-@app.route('/api/mercadolivre/products', methods=['GET'])
+@api_bp.route('/api/mercadolivre/products', methods=['GET'])
 @jwt_required()
 def get_meli_products():
     """Retorna produtos do Mercado Livre"""
     limit = request.args.get('limit', 50, type=int)
     offset = request.args.get('offset', 0, type=int)
-    return jsonify(meli_api.get_products(limit, offset))
+    # Até a primeira sincronização terminar, consulta a API diretamente
+    if not meli_store.is_synced('items'):
+        return jsonify(meli_api.get_products(limit, offset))
+    return jsonify(meli_store.query_items(limit, offset, request.args.get('status')))
 
-@app.route('/api/mercadolivre/orders', methods=['GET'])
+@api_bp.route('/api/mercadolivre/orders', methods=['GET'])
 @jwt_required()
 def get_meli_orders():
     """Retorna pedidos do Mercado Livre"""
     limit = request.args.get('limit', 50, type=int)
     offset = request.args.get('offset', 0, type=int)
-    return jsonify(meli_api.get_orders(limit, offset))
+    if not meli_store.is_synced('orders'):
+        return jsonify(meli_api.get_orders(limit, offset))
+    return jsonify(meli_store.query_orders(limit, offset, request.args.get('status')))
+
+@api_bp.route('/api/mercadolivre/sync', methods=['GET'])
+@jwt_required()
+def get_meli_sync_status():
+    """Retorna o andamento da sincronização com o Mercado Livre"""
+    return jsonify(meli_sync.status())
 
-@app.route('/api/mercadolivre/metrics', methods=['GET'])
+@api_bp.route('/api/mercadolivre/sync', methods=['POST'])
+@jwt_required()
+def trigger_meli_sync():
+    """Enfileira uma sincronização com o Mercado Livre; o job sai em /api/jobs/<id>"""
+    job = job_queue.enqueue('meli.sync', priority=10, unique=True)
+    response = jsonify(job.to_dict())
+    response.status_code = 202
+    response.headers['Location'] = f'/api/jobs/{job.id}'
+    return response
+
+@api_bp.route('/api/mercadolivre/metrics', methods=['GET'])
 @jwt_required()
 def get_meli_metrics():
     """Retorna métricas de vendas do Mercado Livre"""
-    return jsonify(meli_api.get_sales_metrics())
+    cached = _job_result('meli.metrics')
+    if cached is not None:
+        return jsonify(cached['metrics'])
+    return jsonify(meli_analytics.sales_metrics(_last_30_days_visits()))
 
-@app.route('/api/mercadolivre/questions', methods=['GET'])
+@api_bp.route('/api/mercadolivre/questions', methods=['GET'])
 @jwt_required()
 def get_meli_questions():
-    """Retorna perguntas dos compradores"""
-    limit = request.args.get('limit', 20, type=int)
-    return jsonify(meli_api.get_questions(limit))
+    """Busca nas perguntas dos compradores (?q=, status, item_id, min/max_age_hours, sort)"""
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+    if not meli_store.is_synced('questions'):
+        return jsonify(meli_api.get_questions(limit, request.args.get('status')))
+    try:
+        return jsonify(meli_questions.search(
+            q=request.args.get('q'),
+            status=request.args.get('status'),
+            item_id=request.args.get('item_id'),
+            min_age_hours=request.args.get('min_age_hours', type=float),
+            max_age_hours=request.args.get('max_age_hours', type=float),
+            sort=request.args.get('sort', 'priority'),
+            limit=limit,
+            offset=max(request.args.get('offset', 0, type=int), 0)
+        ))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-@app.route('/api/mercadolivre/notifications', methods=['GET'])
+@api_bp.route('/api/mercadolivre/notifications', methods=['GET'])
 @jwt_required()
 def get_meli_notifications():
-    """Retorna notificações importantes"""
-    return jsonify(meli_api.get_notifications())
+    """Retorna notificações importantes (os alertas ativos são contados, não recalculados)"""
+    return jsonify({'notifications': meli_sync.build_notifications()})
+
+@api_bp.route('/api/alerts', methods=['GET'])
+@jwt_required()
+def get_alerts():
+    """Alertas por regra e situação (?rule=low_stock|question_sla|cd_dwell, status=active|resolved)"""
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    try:
+        return jsonify(alert_engine.search(
+            rule=request.args.get('rule'),
+            status=request.args.get('status', 'active'),
+            limit=limit,
+            offset=max(request.args.get('offset', 0, type=int), 0)
+        ))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-@app.route('/api/mercadolivre/analytics', methods=['GET'])
+@api_bp.route('/api/mercadolivre/analytics', methods=['GET'])
 @jwt_required()
 def get_meli_analytics():
     """Retorna dados analíticos detalhados"""
-    return jsonify(meli_api.get_analytics_data())
+    top = min(max(request.args.get('top', 10, type=int), 1), 100)
+    cached = _job_result('meli.metrics') if top == 10 else None
+    if cached is not None:
+        return jsonify(cached['analytics'])
+    return jsonify(meli_analytics.analytics_data(_last_30_days_visits(), top))
 
-@app.route('/api/mercadolivre/shipping/<order_id>', methods=['GET'])
+@api_bp.route('/api/mercadolivre/cache/stats', methods=['GET'])
+@jwt_required()
+def get_meli_cache_stats():
+    """Retorna os contadores do cache da API do Mercado Livre"""
+    return jsonify(meli_api.cache.stats())
+
+@api_bp.route('/api/mercadolivre/shipping/<order_id>', methods=['GET'])
 @jwt_required()
 def get_meli_shipping(order_id):
     """Retorna informações de envio de um pedido"""
     return jsonify(meli_api.get_shipping_info(order_id))
 
-@app.route('/api/mercadolivre/products/<product_id>/stock', methods=['PUT'])
+# Máximo de ids aceitos em uma consulta em lote
+MAX_BATCH_IDS = 500
+
+def _batch_ids():
+    """Lê os ids de uma consulta em lote (?ids=a,b,c ou JSON {"ids": [...]})"""
+    if request.method == 'POST':
+        ids = (request.get_json(silent=True) or {}).get('ids') or []
+    else:
+        ids = [i for i in request.args.get('ids', '').split(',') if i.strip()]
+    return [str(i).strip() for i in ids]
+
+def _batch_response(fetch):
+    ids = _batch_ids()
+    if not ids:
+        return jsonify({'error': 'Informe ao menos um id'}), 400
+    if len(ids) > MAX_BATCH_IDS:
+        return jsonify({'error': f'Máximo de {MAX_BATCH_IDS} ids por consulta'}), 400
+    return jsonify(fetch(ids))
+
+@api_bp.route('/api/mercadolivre/items/batch', methods=['GET', 'POST'])
+@jwt_required()
+def get_meli_items_batch():
+    """Retorna vários itens do Mercado Livre de uma vez"""
+    return _batch_response(meli_api.get_items)
+
+@api_bp.route('/api/mercadolivre/orders/batch', methods=['GET', 'POST'])
+@jwt_required()
+def get_meli_orders_batch():
+    """Retorna vários pedidos do Mercado Livre de uma vez"""
+    return _batch_response(meli_api.get_orders_by_ids)
+
+@api_bp.route('/api/mercadolivre/shipping/batch', methods=['GET', 'POST'])
+@jwt_required()
+def get_meli_shipping_batch():
+    """Retorna o envio de vários pedidos de uma vez"""
+    return _batch_response(meli_api.get_shipments)
+
+@api_bp.route('/api/mercadolivre/products/<product_id>/stock', methods=['PUT'])
 @jwt_required()
 def update_meli_stock(product_id):
     """Atualiza estoque de um produto"""
     data = request.get_json()
     quantity = data.get('quantity', 0)
-    return jsonify(meli_api.update_product_stock(product_id, quantity))
+    # Um envio em lote deste produto, pendente ou em andamento, traria a quantidade
+    # antiga de volta: os pendentes são descartados e o que já está em envio termina antes
+    if not stock_updates.wait_for_batch(product_id, 'Substituído por uma atualização individual',
+                                        current_app.config['STOCK_INFLIGHT_WAIT']):
+        return jsonify({'error': 'Atualização em lote deste produto em andamento. Tente novamente.'}), 409
+    result = meli_api.update_product_stock(product_id, quantity)
+    meli_store.update_item_stock(product_id, result['available_quantity'])
+    db.session.commit()
+    push_notifications(meli_sync.build_notifications())
+    return jsonify(result)
+
+@api_bp.route('/api/export/<dataset>', methods=['GET'])
+@jwt_required()
+def export_dataset(dataset):
+    """Exporta um conjunto inteiro em streaming (?format=ndjson|csv, gzip se aceito)"""
+    if dataset not in exports.DATASETS:
+        return jsonify({'error': f"Conjunto inválido; use um de: {', '.join(exports.DATASETS)}"}), 404
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in exports.FORMATS:
+        return jsonify({'error': 'Formato deve ser ndjson ou csv'}), 400
+    try:
+        query = exports.build_query(dataset, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    compress = request.accept_encodings['gzip'] > 0
+    response = Response(exports.stream_export(db.engine, query, fmt, compress),
+                        mimetype=exports.FORMATS[fmt])
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename="{dataset}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}"')
+    response.headers['Cache-Control'] = 'no-store'
+    # Sem buffer no proxy, para os blocos chegarem ao cliente enquanto são gerados
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Formatos aceitos na atualização em lote, pelo Content-Type
+STOCK_FORMATS = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'application/json': 'ndjson'
+}
+
+@api_bp.route('/api/mercadolivre/products/stock', methods=['POST'])
+@jwt_required()
+def bulk_update_meli_stock():
+    """Atualiza o estoque de vários produtos (CSV ou JSON lines) em segundo plano"""
+    fmt = request.args.get('format') or STOCK_FORMATS.get(request.mimetype)
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Envie text/csv ou application/x-ndjson (ou ?format=csv|ndjson)'}), 415
+    try:
+        quantities, errors, invalid, duplicates = stock_updates.parse_updates(request.stream, fmt)
+    except StockFileError as e:
+        return jsonify({'error': str(e)}), 400
+    if not quantities:
+        return jsonify({'error': 'Nenhuma linha válida', 'invalid': invalid, 'parse_errors': errors}), 400
+    job = stock_updater.submit(quantities, errors, invalid, duplicates)
+    response = jsonify(stock_updates.job_summary(job))
+    response.status_code = 202
+    response.headers['Location'] = f'/api/mercadolivre/stock/jobs/{job.id}'
+    return response
+
+@api_bp.route('/api/mercadolivre/stock/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_stock_job(job_id):
+    """Andamento de uma atualização de estoque em lote"""
+    job = db.session.get(StockUpdateJob, job_id)
+    if job is None:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    return jsonify(stock_updates.job_summary(job))
+
+@api_bp.route('/api/mercadolivre/stock/jobs/<job_id>/items', methods=['GET'])
+@jwt_required()
+def get_stock_job_items(job_id):
+    """Resultado por produto de uma atualização em lote (?status=failed para os erros)"""
+    if db.session.get(StockUpdateJob, job_id) is None:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 500, type=int), 1), 5000)
+    items = stock_updates.job_items(job_id, request.args.get('status'), offset, limit)
+    return jsonify({
+        'items': items,
+        'paging': {'offset': offset, 'limit': limit,
+                   'next_offset': offset + limit if len(items) == limit else None}
+    })
+
+@api_bp.route('/api/jobs', methods=['POST'])
+@jwt_required()
+def enqueue_job():
+    """Enfileira uma tarefa ({"task", "args", "priority", "delay"}); o resultado sai em /api/jobs/<id>"""
+    data = request.get_json(silent=True) or {}
+    task = job_queue.tasks.get(data.get('task'))
+    if task is None or not task.public:
+        public = [name for name, t in job_queue.tasks.items() if t.public]
+        return jsonify({'error': f"Tarefa inválida; use uma de: {', '.join(public)}"}), 400
+    args = data.get('args') or {}
+    priority, delay = data.get('priority', 0), data.get('delay', 0)
+    if not isinstance(args, dict):
+        return jsonify({'error': 'args deve ser um objeto'}), 400
+    try:
+        inspect.signature(task.fn).bind(**args)
+    except TypeError as e:
+        return jsonify({'error': f'Argumentos inválidos: {e}'}), 400
+    if not isinstance(priority, int) or not -100 <= priority <= 100:
+        return jsonify({'error': 'priority deve ser um inteiro entre -100 e 100'}), 400
+    if not isinstance(delay, (int, float)) or delay < 0:
+        return jsonify({'error': 'delay deve ser um número de segundos não negativo'}), 400
+    job = job_queue.enqueue(task.name, args, priority, delay)
+    response = jsonify(job.to_dict())
+    response.status_code = 202
+    response.headers['Location'] = f'/api/jobs/{job.id}'
+    return response
+
+@api_bp.route('/api/jobs', methods=['GET'])
+@jwt_required()
+def list_jobs():
+    """Jobs mais recentes (?task=, ?status=, ?limit=)"""
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    jobs = job_queue.recent(request.args.get('task'), request.args.get('status'), limit)
+    return jsonify({'jobs': [job.to_dict() for job in jobs]})
 
-@app.route('/')
+@api_bp.route('/api/jobs/stats', methods=['GET'])
+@jwt_required()
+def get_job_stats():
+    """Jobs por tarefa e situação, agenda das recorrentes e atraso da fila"""
+    return jsonify(job_queue.stats())
+
+@api_bp.route('/api/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """Situação de um job e, quando concluído, o resultado"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    return jsonify({**job.to_dict(), 'result': job.result})
+
+@api_bp.route('/api/jobs/<job_id>', methods=['DELETE'])
+@jwt_required()
+def cancel_job(job_id):
+    """Cancela um job que ainda não começou"""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    if job.status != 'cancelled':
+        return jsonify({'error': f'Job já está {job.status}', **job.to_dict()}), 409
+    return jsonify(job.to_dict())
+
+def _stream_topics():
+    topics = [t for t in request.args.get('topics', '').split(',') if t]
+    return topics or None
+
+@api_bp.route('/api/stream', methods=['GET'])
+@jwt_required(locations=STREAM_TOKEN_LOCATIONS)
+def stream_events():
+    """Stream SSE com as mudanças de métricas, pedidos, perguntas e notificações"""
+    try:
+        subscription = events.subscribe(_stream_topics(), request.headers.get('Last-Event-ID'))
+    except StreamLimitReached:
+        # O EventSource do navegador tenta de novo sozinho
+        response = jsonify({'error': 'Limite de conexões de eventos atingido'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    return Response(
+        events.stream(subscription, current_app.config['EVENT_KEEPALIVE']),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@api_bp.route('/api/stream/status', methods=['GET'])
+@jwt_required()
+def get_stream_status():
+    """Retorna os contadores do barramento de eventos"""
+    return jsonify(events.stats())
+
+if Sock is not None:
+    sock = Sock()
+
+    @sock.route('/api/ws', bp=api_bp)
+    @jwt_required(locations=STREAM_TOKEN_LOCATIONS)
+    def events_websocket(ws):
+        """Os mesmos eventos do SSE, um JSON por mensagem"""
+        try:
+            subscription = events.subscribe(_stream_topics(), request.args.get('last_event_id'))
+        except StreamLimitReached:
+            # 1013: tente novamente mais tarde
+            ws.close(reason=1013, message='Limite de conexões de eventos atingido')
+            return
+        try:
+            while ws.connected:
+                event = subscription.get(timeout=current_app.config['EVENT_KEEPALIVE'])
+                if event is not None:
+                    ws.send(json.dumps({'id': event['id'], 'topic': event['topic'], 'data': event['data']},
+                                       default=str))
+        finally:
+            subscription.close()
+
+@api_bp.route('/')
 def serve_index():
-    return send_from_directory(app.static_folder, 'index.html')
+    return static_manifest.respond('index.html')
 
-@app.route('/<path:path>')
+@api_bp.route('/<path:path>')
 def serve_static(path):
-    # Servir arquivos estáticos diretamente
-    if os.path.exists(os.path.join(app.static_folder, path)):
-        return send_from_directory(app.static_folder, path)
-    # Para SPA routing, servir o index.html para rotas não encontradas
-    return send_from_directory(app.static_folder, 'index.html')
+    """Arquivo do build, ou o index.html para as rotas do SPA"""
+    return static_manifest.respond(path)
 
 if __name__ == '__main__':
-    with app.app_context():
-        # Criar tabelas do banco de dados
-        db.create_all()
-        
-        # Criar usuário admin padrão se não existir
-        admin_user = User.query.filter_by(email='admin@meli.com').first()
-        if not admin_user:
-            admin_user = User(
-                nome='Administrador MELI',
-                email='admin@meli.com',
-                password='admin123'
-            )
-            db.session.add(admin_user)
-            db.session.commit()
-            print("Usuário admin criado: admin@meli.com / admin123")
-    
+    # Servidor de desenvolvimento (um processo); em produção: gunicorn -c gunicorn.conf.py wsgi:app
+    app = create_app({'ADMIN_PASSWORD': os.environ.get('ADMIN_PASSWORD', 'admin123')})
+    # Com o reloader, só o processo filho atende e roda as threads de fundo
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background(app)
     app.run(debug=True, host='0.0.0.0', port=5000)
-
@@ -0,0 +1,208 @@
+"""
+Análises de vendas calculadas a partir dos pedidos sincronizados
+Os totais diários (por dia e por anúncio) são atualizados a cada gravação de
+pedidos, então as consultas do dashboard somam no máximo algumas dezenas de
+linhas por anúncio em vez de varrer todas as linhas de pedido
+"""
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from sqlalchemy import func, select
+import meli_store
+from models import db, MeliItem, MeliOrder, MeliOrderItem, DailySalesTotal, DailyItemSales
+
+# Pedidos que não contam como venda
+EXCLUDED_STATUSES = ('cancelled',)
+
+# Pedidos pagos que ainda não foram enviados
+PENDING_STATUSES = ('paid', 'confirmed', 'ready_to_ship')
+
+def _add_rows(table, rows, keys):
+    """Soma os valores das linhas aos totais existentes (upsert aditivo)"""
+    if not rows:
+        return
+    statement = meli_store.dialect_insert(table)
+    columns = {
+        name: table.c[name] + statement.excluded[name]
+        for name in ('orders', 'units', 'revenue')
+    }
+    if 'category_id' in rows[0]:
+        columns['category_id'] = statement.excluded.category_id
+    db.session.execute(statement.on_conflict_do_update(index_elements=keys, set_=columns), rows)
+
+def record_order_changes(order_rows, line_rows):
+    """Atualiza os totais diários com a diferença entre o pedido salvo e o novo
+
+    Deve ser chamada antes de gravar os pedidos: a contribuição da versão
+    salva é descontada e a da nova é somada, então regravar um pedido
+    igual não altera nada e uma mudança de status (por exemplo, cancelamento)
+    corrige os totais sem recalcular o dia. Retorna o status salvo de cada
+    pedido que já existia.
+    """
+    order_ids = [row['id'] for row in order_rows]
+    if not order_ids:
+        return {}
+    saved = {
+        order_id: (status, created)
+        for order_id, status, created in db.session.query(
+            MeliOrder.id, MeliOrder.status, MeliOrder.date_created
+        ).filter(MeliOrder.id.in_(order_ids))
+    }
+    saved_lines = defaultdict(list)
+    for line in db.session.query(
+        MeliOrderItem.order_id, MeliOrderItem.item_id, MeliOrderItem.category_id,
+        MeliOrderItem.unit_price, MeliOrderItem.quantity
+    ).filter(MeliOrderItem.order_id.in_(order_ids)):
+        saved_lines[line.order_id].append(line._asdict())
+    new_lines = defaultdict(list)
+    for line in line_rows:
+        new_lines[line['order_id']].append(line)
+
+    totals = defaultdict(lambda: [0, 0, 0.0])
+    items = {}
+
+    def contribute(status, created, lines, sign):
+        if status in EXCLUDED_STATUSES or not lines:
+            return
+        day = created.date()
+        total = totals[day]
+        total[0] += sign
+        for line in lines:
+            quantity = line['quantity']
+            revenue = quantity * line['unit_price']
+            total[1] += sign * quantity
+            total[2] += sign * revenue
+            item = items.setdefault((day, line['item_id']), [line['category_id'], 0, 0, 0.0])
+            item[0] = line['category_id'] or item[0]
+            item[1] += sign
+            item[2] += sign * quantity
+            item[3] += sign * revenue
+
+    for order_id, (status, created) in saved.items():
+        contribute(status, created, saved_lines.get(order_id, []), -1)
+    for row in order_rows:
+        contribute(row['status'], row['date_created'], new_lines.get(row['id'], []), 1)
+
+    _add_rows(DailySalesTotal.__table__, [
+        {'day': day, 'orders': o, 'units': u, 'revenue': r}
+        for day, (o, u, r) in totals.items() if o or u or abs(r) > 1e-9
+    ], ['day'])
+    _add_rows(DailyItemSales.__table__, [
+        {'day': day, 'item_id': item_id, 'category_id': c, 'orders': o, 'units': u, 'revenue': r}
+        for (day, item_id), (c, o, u, r) in items.items() if o or u or abs(r) > 1e-9
+    ], ['day', 'item_id'])
+    return {order_id: status for order_id, (status, _) in saved.items()}
+
+def rebuild_rollups(connection=None):
+    """Recalcula os totais diários a partir de todas as linhas de pedido
+
+    A agregação roda inteira no banco (INSERT ... SELECT ... GROUP BY), o que
+    serve para a carga inicial e para conferir os totais incrementais. Com
+    `connection` (migrações) roda nela, sem commit.
+    """
+    executor = connection if connection is not None else db.session
+    day = func.date(MeliOrder.date_created)
+    def sold(*columns):
+        return (select(*columns).select_from(MeliOrderItem)
+                .join(MeliOrder, MeliOrder.id == MeliOrderItem.order_id)
+                .where(MeliOrder.status.notin_(EXCLUDED_STATUSES)))
+    revenue = func.sum(MeliOrderItem.quantity * MeliOrderItem.unit_price)
+
+    executor.execute(DailySalesTotal.__table__.delete())
+    executor.execute(DailyItemSales.__table__.delete())
+    executor.execute(DailySalesTotal.__table__.insert().from_select(
+        ['day', 'orders', 'units', 'revenue'],
+        sold(day, func.count(func.distinct(MeliOrder.id)),
+             func.sum(MeliOrderItem.quantity), revenue).group_by(day)
+    ))
+    executor.execute(DailyItemSales.__table__.insert().from_select(
+        ['day', 'item_id', 'category_id', 'orders', 'units', 'revenue'],
+        sold(day, MeliOrderItem.item_id, func.max(MeliOrderItem.category_id),
+             func.count(MeliOrder.id), func.sum(MeliOrderItem.quantity), revenue)
+        .group_by(day, MeliOrderItem.item_id)
+    ))
+    if connection is None:
+        db.session.commit()
+
+def _windows(today=None):
+    today = today or datetime.utcnow().date()
+    return {
+        'today': (today, today),
+        'this_month': (today.replace(day=1), today),
+        'last_30_days': (today - timedelta(days=29), today)
+    }
+
+def _totals(start, end):
+    orders, units, revenue = db.session.query(
+        func.coalesce(func.sum(DailySalesTotal.orders), 0),
+        func.coalesce(func.sum(DailySalesTotal.units), 0),
+        func.coalesce(func.sum(DailySalesTotal.revenue), 0.0)
+    ).filter(DailySalesTotal.day.between(start, end)).one()
+    return int(orders), int(units), round(float(revenue), 2)
+
+def _pending_since(start):
+    return db.session.query(func.count(MeliOrder.id)).filter(
+        MeliOrder.status.in_(PENDING_STATUSES),
+        MeliOrder.date_created >= datetime.combine(start, time.min)
+    ).scalar()
+
+def _conversion_rate(orders, visits):
+    return round(100 * orders / visits, 2) if visits else 0
+
+def sales_metrics(visits=None, today=None):
+    """Vendas de hoje, do mês e dos últimos 30 dias"""
+    windows = _windows(today)
+    result = {}
+    for name, (start, end) in windows.items():
+        orders, _, revenue = _totals(start, end)
+        result[name] = {'sales_count': orders, 'revenue': revenue}
+        if name == 'last_30_days':
+            result[name]['conversion_rate'] = _conversion_rate(orders, visits)
+        else:
+            result[name]['orders_pending'] = _pending_since(start)
+    return result
+
+def top_products(start, end, limit=10):
+    """Anúncios com maior faturamento no período"""
+    revenue = func.sum(DailyItemSales.revenue)
+    rows = (db.session.query(DailyItemSales.item_id, func.sum(DailyItemSales.units), revenue)
+            .filter(DailyItemSales.day.between(start, end))
+            .group_by(DailyItemSales.item_id)
+            .order_by(revenue.desc())
+            .limit(limit).all())
+    ids = [row[0] for row in rows]
+    titles = dict(db.session.query(MeliItem.id, MeliItem.title).filter(MeliItem.id.in_(ids)))
+    missing = [item_id for item_id in ids if item_id not in titles]
+    if missing:
+        titles.update(db.session.query(MeliOrderItem.item_id, func.max(MeliOrderItem.title))
+                      .filter(MeliOrderItem.item_id.in_(missing))
+                      .group_by(MeliOrderItem.item_id))
+    return [
+        {'id': item_id, 'title': titles.get(item_id), 'sales': int(units), 'revenue': round(float(total), 2)}
+        for item_id, units, total in rows
+    ]
+
+def categories_performance(start, end):
+    """Vendas e faturamento por categoria no período"""
+    revenue = func.sum(DailyItemSales.revenue)
+    rows = (db.session.query(DailyItemSales.category_id, func.sum(DailyItemSales.units), revenue)
+            .filter(DailyItemSales.day.between(start, end))
+            .group_by(DailyItemSales.category_id)
+            .order_by(revenue.desc()).all())
+    return [
+        {'category': category, 'sales': int(units), 'revenue': round(float(total), 2)}
+        for category, units, total in rows
+    ]
+
+def analytics_data(visits=None, top_n=10, today=None):
+    """Visitas, ranking de anúncios e desempenho por categoria dos últimos 30 dias"""
+    start, end = _windows(today)['last_30_days']
+    orders, _, _ = _totals(start, end)
+    return {
+        'visits': {
+            'total': visits,
+            'conversion_rate': _conversion_rate(orders, visits)
+        },
+        'top_products': top_products(start, end, top_n),
+        'categories_performance': categories_performance(start, end)
+    }
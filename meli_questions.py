@@ -0,0 +1,158 @@
+"""
+Busca e triagem das perguntas dos compradores
+As perguntas ficam na tabela meli_question com os radicais das palavras em
+`terms` (sem acentos, sem palavras vazias, com um stemmer leve de português),
+indexados no SQLite por uma tabela FTS5 mantida por triggers: cada pergunta
+gravada entra no índice na mesma transação. Sem FTS5 (ou em outro banco) a
+busca cai para LIKE sobre `terms`, mais lenta mas com os mesmos resultados.
+"""
+
+import re
+import unicodedata
+from datetime import datetime, timedelta
+from sqlalchemy import case, column, inspect, literal_column, table
+from sqlalchemy.exc import OperationalError
+from models import db, MeliQuestion
+
+FTS_TABLE = 'meli_question_fts'
+
+SORTS = ('priority', 'newest', 'oldest', 'relevance')
+
+STOPWORDS = frozenset('''
+a o as os um uma uns umas de da do das dos em no na nos nas ao aos para pra pro por pelo pela
+com sem e ou que qual quais quando como onde se me te lhe eu voce voces ele ela isso esse essa
+este esta tem ter ha ja mais muito pode posso vou sim ok oi ola bom boa dia tarde noite obrigado
+'''.split())
+
+# Plurais, na ordem em que são testados (RSLP simplificado)
+_PLURALS = (('oes', 'ao'), ('aes', 'ao'), ('ais', 'al'), ('eis', 'el'), ('ns', 'm'),
+            ('res', 'r'), ('zes', 'z'), ('s', ''))
+# Sufixos derivacionais e verbais, do mais longo para o mais curto
+_SUFFIXES = ('amente', 'mente', 'idade', 'amento', 'imento', 'aremo', 'eremo', 'adora', 'ador', 'edor',
+             'acao', 'avel', 'ivel', 'ismo', 'ista', 'aram', 'eram', 'iram', 'ando', 'endo', 'indo',
+             'osa', 'oso', 'ava', 'ado', 'ada', 'ido', 'ida', 'amo', 'emo', 'imo', 'ar', 'er', 'ir',
+             'ou', 'ia', 'am', 'em')
+_MIN_STEM = 3
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+def tokens(text):
+    """Palavras do texto em minúsculas e sem acentos"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    return _WORD.findall(text)
+
+def stem(word):
+    """Radical de uma palavra (já sem acentos): entregas, entregar, entrega -> entreg"""
+    if len(word) <= _MIN_STEM or word.isdigit():
+        return word
+    for suffix, replacement in _PLURALS:
+        if word.endswith(suffix) and not word.endswith('ss') and len(word) - len(suffix) >= _MIN_STEM:
+            word = word[:-len(suffix)] + replacement
+            break
+    if word.endswith('gue'):
+        word = word[:-2]
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= _MIN_STEM:
+            word = word[:-len(suffix)]
+            break
+    if word[-1] in 'aeo' and len(word) > _MIN_STEM:
+        word = word[:-1]
+    return word
+
+def terms(text):
+    """Radicais indexados de um texto, separados por espaço"""
+    return ' '.join(stem(word) for word in tokens(text) if word not in STOPWORDS)
+
+def create_index(connection):
+    """Cria a tabela FTS5 e os triggers que a mantêm; False se o SQLite não tem FTS5"""
+    if connection.dialect.name != 'sqlite':
+        return False
+    try:
+        connection.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"terms, content='meli_question', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2')")
+    except OperationalError:
+        return False
+    connection.exec_driver_sql(
+        f"CREATE TRIGGER IF NOT EXISTS meli_question_ai AFTER INSERT ON meli_question BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, terms) VALUES (new.id, new.terms); END")
+    connection.exec_driver_sql(
+        f"CREATE TRIGGER IF NOT EXISTS meli_question_ad AFTER DELETE ON meli_question BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, terms) VALUES ('delete', old.id, old.terms); END")
+    connection.exec_driver_sql(
+        f"CREATE TRIGGER IF NOT EXISTS meli_question_au AFTER UPDATE OF terms ON meli_question BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, terms) VALUES ('delete', old.id, old.terms); "
+        f"INSERT INTO {FTS_TABLE}(rowid, terms) VALUES (new.id, new.terms); END")
+    # Indexa o que já estava na tabela
+    connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+_has_index = {}
+
+def has_index():
+    """Se o banco em uso tem o índice FTS5 (consultado uma vez por engine)"""
+    engine = db.engine
+    if engine not in _has_index:
+        _has_index[engine] = inspect(engine).has_table(FTS_TABLE)
+    return _has_index[engine]
+
+def _match(words):
+    """Expressão MATCH: todos os radicais, o último também como prefixo (busca enquanto digita)"""
+    quoted = [f'"{word}"' for word in words]
+    quoted[-1] += '*'
+    return ' AND '.join(quoted)
+
+def search(q=None, status=None, item_id=None, min_age_hours=None, max_age_hours=None,
+           sort='priority', limit=20, offset=0, now=None):
+    """Página de perguntas com filtros e ordenação
+
+    `priority` (padrão) põe as sem resposta primeiro e, entre elas, as que
+    esperam há mais tempo; `relevance` usa o bm25 do FTS5 (só com `q`).
+    """
+    if sort not in SORTS:
+        raise ValueError(f"sort deve ser um de: {', '.join(SORTS)}")
+    now = now or datetime.utcnow()
+    words = [stem(word) for word in tokens(q) if word not in STOPWORDS] if q else []
+    query = MeliQuestion.query
+    fts = None
+    # Com item_id o índice do anúncio já reduz a busca a poucas linhas, e os
+    # termos são conferidos nelas (LIKE) sem juntar todos os resultados do FTS5
+    if words and has_index() and not item_id:
+        fts = table(FTS_TABLE, column('rowid'), column('rank'))
+        query = query.join(fts, fts.c.rowid == MeliQuestion.id).filter(
+            literal_column(FTS_TABLE).op('MATCH')(_match(words)))
+    elif words:
+        for position, word in enumerate(words):
+            pattern = f'% {word}%' if position == len(words) - 1 else f'% {word} %'
+            query = query.filter((' ' + MeliQuestion.terms + ' ').like(pattern))
+    if status:
+        query = query.filter(MeliQuestion.status == status)
+    if item_id:
+        query = query.filter(MeliQuestion.item_id == item_id)
+    if min_age_hours is not None:
+        query = query.filter(MeliQuestion.date_created <= now - timedelta(hours=min_age_hours))
+    if max_age_hours is not None:
+        query = query.filter(MeliQuestion.date_created >= now - timedelta(hours=max_age_hours))
+
+    if sort == 'relevance' and fts is not None:
+        order = (fts.c.rank, MeliQuestion.date_created.desc())
+    elif sort in ('newest', 'relevance'):
+        order = (MeliQuestion.date_created.desc(), MeliQuestion.id.desc())
+    elif sort == 'oldest':
+        order = (MeliQuestion.date_created, MeliQuestion.id)
+    elif status and fts is None:
+        # Com o status fixo a prioridade é só a idade, e o índice (status, data) já dá a ordem;
+        # com busca, ordenar pelo índice faria o SQLite consultar o FTS5 linha a linha
+        order = (MeliQuestion.date_created, MeliQuestion.id)
+    else:
+        unanswered_first = case((MeliQuestion.status == 'UNANSWERED', 0), else_=1)
+        order = (unanswered_first, MeliQuestion.date_created, MeliQuestion.id)
+    # Uma a mais para saber se há próxima página sem contar o total
+    rows = query.order_by(*order).offset(offset).limit(limit + 1).all()
+    return {
+        'questions': [row.to_dict() for row in rows[:limit]],
+        'paging': {'offset': offset, 'limit': limit,
+                   'next_offset': offset + limit if len(rows) > limit else None}
+    }
@@ -0,0 +1,325 @@
+"""
+Servidor local que imita a API do Mercado Livre
+Substitui o antigo simulador: gera um catálogo fixo (semente) e responde nos
+mesmos caminhos da API oficial, com latência, erros e 429 configuráveis
+
+Uso: python meli_standin.py --port 5001 --latency-ms 40 --error-rate 0.02
+"""
+
+import argparse
+import random
+import threading
+import time
+from datetime import datetime
+from flask import Flask, jsonify, request
+from werkzeug.serving import WSGIRequestHandler, make_server
+from synthetic_data import SyntheticMarketplace
+
+# Limite de ids por chamada multiget, como na API oficial
+MULTIGET_LIMIT = 20
+
+class StandinConfig:
+    """Parâmetros de comportamento do servidor, ajustáveis em tempo de execução"""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, throttle_rate=0.0,
+                 rate_limit=None, retry_after=1):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        # Fração das requisições que recebem 500/503
+        self.error_rate = error_rate
+        # Fração das requisições que recebem 429 (tempestade de rate limit)
+        self.throttle_rate = throttle_rate
+        # Requisições por segundo permitidas (None = sem limite)
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+
+    def update(self, values):
+        for key, value in values.items():
+            if hasattr(self, key):
+                setattr(self, key, value)
+
+    def to_dict(self):
+        return dict(vars(self))
+
+class StandinData:
+    """Catálogo, pedidos e perguntas gerados uma vez a partir de uma semente"""
+
+    def __init__(self, seed=42, items=1247, orders=892, questions=200, user_id="123456789", now=None):
+        data = SyntheticMarketplace(seed, items, orders, questions, user_id, now)
+        self.user_id = user_id
+        self.lock = threading.Lock()
+
+        self.items = {item["id"]: item for item in data.item_records()}
+        self.item_ids = list(self.items)
+
+        self.orders = {order["id"]: order for order in data.order_records()}
+        self.shipments = {shipment["id"]: shipment for shipment in data.shipment_records()}
+        # Pedidos mais recentes primeiro, como o padrão da busca oficial
+        self.order_ids = sorted(self.orders, key=lambda oid: self.orders[oid]["date_created"], reverse=True)
+
+        # Visitas diárias aos anúncios do vendedor
+        self.visits = data.visits(90)
+
+        self.questions = sorted(data.question_records(), key=lambda q: q["date_created"], reverse=True)
+
+        self.user = {
+            "id": int(user_id),
+            "nickname": "loja_exemplo",
+            "first_name": "João",
+            "last_name": "Silva",
+            "email": "joao.silva@exemplo.com",
+            "country_id": "BR",
+            "seller_reputation": {
+                "level_id": "5_green",
+                "power_seller_status": "platinum",
+                "transactions": {
+                    "total": 15420,
+                    "completed": 15380,
+                    "canceled": 40
+                }
+            }
+        }
+
+    def update_order(self, order_id, status=None, at=None):
+        """Altera um pedido como a API faria (pagamento, envio): só muda last_updated e o status"""
+        with self.lock:
+            order = self.orders[order_id]
+            if status:
+                order["status"] = status
+            order["last_updated"] = (at or datetime.now()).isoformat()
+            return order
+
+def _error(status, message, error):
+    return jsonify({"message": message, "error": error, "status": status, "cause": []}), status
+
+def create_standin_app(config=None, data=None):
+    """Cria o app Flask do servidor substituto"""
+    app = Flask(__name__)
+    config = config or StandinConfig()
+    data = data or StandinData()
+    app.config['STANDIN'] = config
+    app.config['STANDIN_DATA'] = data
+    window = {'start': time.monotonic(), 'count': 0}
+    window_lock = threading.Lock()
+
+    @app.before_request
+    def inject_faults():
+        if request.path.startswith('/_standin'):
+            return None
+
+        delay = config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+        if config.rate_limit:
+            with window_lock:
+                now = time.monotonic()
+                if now - window['start'] >= 1:
+                    window['start'], window['count'] = now, 0
+                window['count'] += 1
+                remaining = config.rate_limit - window['count']
+                reset = max(0.0, 1 - (now - window['start']))
+            request.environ['standin.ratelimit'] = (max(remaining, 0), reset)
+            if remaining < 0:
+                response, status = _error(429, "Too many requests", "too_many_requests")
+                response.headers['Retry-After'] = str(config.retry_after)
+                return response, status
+
+        roll = random.random()
+        if roll < config.throttle_rate:
+            response, status = _error(429, "Too many requests", "too_many_requests")
+            response.headers['Retry-After'] = str(config.retry_after)
+            return response, status
+        if roll < config.throttle_rate + config.error_rate:
+            return _error(random.choice([500, 503]), "Service unavailable", "internal_error")
+        return None
+
+    @app.after_request
+    def rate_limit_headers(response):
+        limit = request.environ.get('standin.ratelimit')
+        if limit:
+            remaining, reset = limit
+            response.headers['X-RateLimit-Limit'] = str(config.rate_limit)
+            response.headers['X-RateLimit-Remaining'] = str(remaining)
+            response.headers['X-RateLimit-Reset'] = f'{reset:.3f}'
+        return response
+
+    @app.route('/_standin/config', methods=['GET', 'POST'])
+    def standin_config():
+        if request.method == 'POST':
+            config.update(request.get_json() or {})
+        return jsonify(config.to_dict())
+
+    @app.route('/_standin/orders/<int:order_id>', methods=['POST'])
+    def standin_order_update(order_id):
+        if order_id not in data.orders:
+            return _error(404, f"Order {order_id} not found", "not_found")
+        return jsonify(data.update_order(order_id, (request.get_json(silent=True) or {}).get('status')))
+
+    @app.route('/users/me')
+    def users_me():
+        return jsonify(data.user)
+
+    @app.route('/users/<int:user_id>')
+    def users_get(user_id):
+        if str(user_id) != data.user_id:
+            return _error(404, "User not found", "not_found")
+        return jsonify(data.user)
+
+    @app.route('/users/<user_id>/items/search')
+    def items_search(user_id):
+        limit = min(request.args.get('limit', 50, type=int), 100)
+        offset = request.args.get('offset', 0, type=int)
+        return jsonify({
+            "seller_id": user_id,
+            "results": data.item_ids[offset:offset + limit],
+            "paging": {"total": len(data.item_ids), "offset": offset, "limit": limit}
+        })
+
+    @app.route('/users/<user_id>/items_visits')
+    def items_visits(user_id):
+        try:
+            date_from = datetime.fromisoformat(request.args['date_from']).date()
+            date_to = datetime.fromisoformat(request.args['date_to']).date()
+        except (KeyError, ValueError):
+            return _error(400, "date_from and date_to are required", "bad_request")
+        details = [
+            {"date": day.isoformat(), "total": total}
+            for day, total in sorted(data.visits.items()) if date_from <= day <= date_to
+        ]
+        return jsonify({
+            "user_id": int(user_id),
+            "date_from": date_from.isoformat(),
+            "date_to": date_to.isoformat(),
+            "total_visits": sum(d["total"] for d in details),
+            "visits_detail": details
+        })
+
+    @app.route('/items')
+    def items_multiget():
+        ids = [i for i in request.args.get('ids', '').split(',') if i]
+        if len(ids) > MULTIGET_LIMIT:
+            return _error(400, f"Maximum of {MULTIGET_LIMIT} ids allowed", "bad_request")
+        results = []
+        for item_id in ids:
+            item = data.items.get(item_id)
+            if item:
+                results.append({"code": 200, "body": item})
+            else:
+                results.append({"code": 404, "body": {"message": f"Item {item_id} not found", "error": "not_found"}})
+        return jsonify(results)
+
+    @app.route('/items/<item_id>', methods=['GET', 'PUT'])
+    def items_get(item_id):
+        item = data.items.get(item_id)
+        if not item:
+            return _error(404, f"Item {item_id} not found", "not_found")
+        if request.method == 'PUT':
+            changes = request.get_json() or {}
+            with data.lock:
+                if 'available_quantity' in changes:
+                    item['available_quantity'] = int(changes['available_quantity'])
+                item['last_updated'] = datetime.now().isoformat()
+        return jsonify(item)
+
+    @app.route('/orders/search')
+    def orders_search():
+        limit = min(request.args.get('limit', 50, type=int), 51)
+        offset = request.args.get('offset', 0, type=int)
+        ids = data.order_ids
+        updated_from = request.args.get('order.date_last_updated.from')
+        if updated_from:
+            since = datetime.fromisoformat(updated_from)
+            ids = [oid for oid in ids if datetime.fromisoformat(data.orders[oid]["last_updated"]) >= since]
+        if request.args.get('sort') == 'date_asc':
+            # Como na API oficial, a ordenação é sempre pela data de criação (e id),
+            # com ou sem o filtro de atualização
+            ids = sorted(ids, key=lambda oid: (data.orders[oid]["date_created"], oid))
+        return jsonify({
+            "results": [data.orders[oid] for oid in ids[offset:offset + limit]],
+            "paging": {"total": len(ids), "offset": offset, "limit": limit}
+        })
+
+    @app.route('/orders/<int:order_id>')
+    def orders_get(order_id):
+        order = data.orders.get(order_id)
+        if not order:
+            return _error(404, f"Order {order_id} not found", "not_found")
+        return jsonify(order)
+
+    @app.route('/orders/<int:order_id>/shipments')
+    def orders_shipments(order_id):
+        order = data.orders.get(order_id)
+        if not order:
+            return _error(404, f"Order {order_id} not found", "not_found")
+        return jsonify(data.shipments[order["shipping"]["id"]])
+
+    @app.route('/shipments/<int:shipment_id>')
+    def shipments_get(shipment_id):
+        shipment = data.shipments.get(shipment_id)
+        if not shipment:
+            return _error(404, f"Shipment {shipment_id} not found", "not_found")
+        return jsonify(shipment)
+
+    @app.route('/questions/search')
+    def questions_search():
+        limit = request.args.get('limit', 50, type=int)
+        offset = request.args.get('offset', 0, type=int)
+        status = request.args.get('status')
+        questions = [q for q in data.questions if not status or q["status"] == status]
+        return jsonify({
+            "questions": questions[offset:offset + limit],
+            "total": len(questions)
+        })
+
+    @app.route('/questions', methods=['POST'])
+    def questions_create():
+        body = request.get_json(silent=True) or {}
+        if body.get('item_id') not in data.items or not body.get('text'):
+            return _error(400, "item_id and text are required", "bad_request")
+        question = {
+            "id": random.randint(1000000, 9999999),
+            "text": body['text'],
+            "status": "UNANSWERED",
+            "date_created": datetime.now().isoformat(),
+            "from": {"id": random.randint(100000000, 999999999), "answered_questions": 0},
+            "item_id": body['item_id']
+        }
+        with data.lock:
+            data.questions.insert(0, question)
+        return jsonify(question), 201
+
+    return app
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    """Não registra cada requisição no log (o servidor roda junto com o dashboard)"""
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+def start_standin(host='127.0.0.1', port=0, data=None, **options):
+    """Sobe o servidor em uma thread de fundo e retorna (servidor, url base)"""
+    app = create_standin_app(StandinConfig(**options), data)
+    server = make_server(host, port, app, threaded=True, request_handler=_QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, name='meli-standin', daemon=True).start()
+    return server, f'http://{host}:{server.server_port}'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--items', type=int, default=1247)
+    parser.add_argument('--orders', type=int, default=892)
+    parser.add_argument('--questions', type=int, default=200)
+    args = parser.parse_args()
+
+    config = StandinConfig(args.latency_ms, args.jitter_ms, args.error_rate,
+                           args.throttle_rate, args.rate_limit)
+    data = StandinData(args.seed, args.items, args.orders, args.questions)
+    create_standin_app(config, data).run(host=args.host, port=args.port, threaded=True)
@@ -0,0 +1,216 @@
+"""
+Armazenamento local dos pedidos, anúncios e perguntas do Mercado Livre
+As rotas leem daqui; a sincronização (meli_sync) mantém as tabelas em dia
+"""
+
+from datetime import datetime, timezone
+from sqlalchemy import bindparam, func
+from sqlalchemy.exc import IntegrityError
+import alerts
+import meli_analytics
+import meli_questions
+from models import db, MeliItem, MeliOrder, MeliOrderItem, MeliQuestion, SyncState
+
+def parse_datetime(value):
+    """Converte as datas ISO da API para datetime em UTC sem fuso"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def dialect_insert(table):
+    """INSERT com suporte a ON CONFLICT do banco em uso"""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+def _upsert(table, rows, keys):
+    """Insere ou atualiza as linhas em uma única instrução"""
+    if not rows:
+        return
+    statement = dialect_insert(table)
+    columns = {name: statement.excluded[name] for name in rows[0] if name not in keys}
+    db.session.execute(statement.on_conflict_do_update(index_elements=keys, set_=columns), rows)
+
+def item_row(item):
+    """Converte um item da API para uma linha da tabela"""
+    return {
+        'id': item['id'],
+        'title': item.get('title') or '',
+        'category_id': item.get('category_id'),
+        'price': item.get('price') or 0,
+        'available_quantity': item.get('available_quantity') or 0,
+        'sold_quantity': item.get('sold_quantity') or 0,
+        'condition': item.get('condition'),
+        'listing_type_id': item.get('listing_type_id'),
+        'status': item.get('status'),
+        'permalink': item.get('permalink'),
+        'thumbnail': item.get('thumbnail'),
+        'last_updated': parse_datetime(item.get('last_updated'))
+    }
+
+def order_rows(order):
+    """Divide um pedido da API na linha do pedido e nas linhas dos itens"""
+    buyer = order.get('buyer') or {}
+    created = parse_datetime(order['date_created'])
+    row = {
+        'id': order['id'],
+        'status': order.get('status') or '',
+        'date_created': created,
+        'last_updated': parse_datetime(order.get('last_updated')) or created,
+        'total_amount': order.get('total_amount') or 0,
+        'currency_id': order.get('currency_id'),
+        'buyer_id': buyer.get('id'),
+        'buyer_nickname': buyer.get('nickname'),
+        'shipment_id': (order.get('shipping') or {}).get('id')
+    }
+    items = []
+    for order_item in order.get('order_items') or []:
+        item = order_item.get('item') or {}
+        items.append({
+            'order_id': order['id'],
+            'item_id': item.get('id'),
+            'title': item.get('title'),
+            'category_id': item.get('category_id'),
+            'unit_price': order_item.get('unit_price') or 0,
+            'quantity': order_item.get('quantity') or 1
+        })
+    return row, items
+
+def upsert_items(items):
+    """Grava um lote de anúncios (sem commit) e confere o estoque deles"""
+    rows = [item_row(item) for item in items]
+    _upsert(MeliItem.__table__, rows, ['id'])
+    alerts.alert_engine.items_changed(rows)
+
+def upsert_orders(orders):
+    """Grava um lote de pedidos e seus itens (sem commit)
+
+    Retorna os pedidos novos ou com status alterado, como
+    `{'id', 'status', 'previous'}`.
+    """
+    rows, lines = [], []
+    for order in orders:
+        row, items = order_rows(order)
+        rows.append(row)
+        lines.extend(items)
+    # Os totais diários são ajustados pela diferença em relação ao que está salvo
+    saved = meli_analytics.record_order_changes(rows, lines)
+    _upsert(MeliOrder.__table__, rows, ['id'])
+    _upsert(MeliOrderItem.__table__, lines, ['order_id', 'item_id'])
+    return [
+        {'id': row['id'], 'status': row['status'], 'previous': saved.get(row['id'])}
+        for row in rows if saved.get(row['id']) != row['status']
+    ]
+
+def question_row(question):
+    """Converte uma pergunta da API para uma linha da tabela"""
+    asker = question.get('from') or {}
+    return {
+        'id': question['id'],
+        'item_id': question.get('item_id'),
+        'text': question.get('text') or '',
+        'status': question.get('status') or 'UNANSWERED',
+        'date_created': parse_datetime(question['date_created']),
+        'from_id': asker.get('id'),
+        'answered_questions': asker.get('answered_questions'),
+        'terms': meli_questions.terms(question.get('text'))
+    }
+
+def upsert_questions(questions):
+    """Grava as perguntas novas ou com status alterado (sem commit); retorna quantas"""
+    if not questions:
+        return 0
+    known = dict(db.session.query(MeliQuestion.id, MeliQuestion.status)
+                 .filter(MeliQuestion.id.in_([question['id'] for question in questions])))
+    changed = [question for question in questions
+               if known.get(question['id']) != (question.get('status') or 'UNANSWERED')]
+    rows = [question_row(question) for question in changed]
+    _upsert(MeliQuestion.__table__, rows, ['id'])
+    alerts.alert_engine.questions_changed(rows)
+    return len(changed)
+
+def count_questions(status):
+    return db.session.query(func.count(MeliQuestion.id)).filter(MeliQuestion.status == status).scalar()
+
+def latest_question(status):
+    """Pergunta mais recente com o status informado"""
+    return (MeliQuestion.query.filter(MeliQuestion.status == status)
+            .order_by(MeliQuestion.date_created.desc(), MeliQuestion.id.desc()).first())
+
+def latest_order(status):
+    """Pedido mais recente com o status informado"""
+    return (MeliOrder.query.filter(MeliOrder.status == status)
+            .order_by(MeliOrder.date_created.desc(), MeliOrder.id.desc()).first())
+
+def update_item_stock(item_id, quantity):
+    """Reflete localmente uma alteração de estoque já feita na API"""
+    MeliItem.query.filter_by(id=item_id).update({'available_quantity': quantity})
+    alerts.alert_engine.stock_changed({item_id: quantity})
+    db.session.commit()
+
+def update_items_stock(quantities):
+    """Reflete localmente várias alterações de estoque já feitas na API ({id: quantidade})"""
+    if not quantities:
+        return
+    statement = MeliItem.__table__.update().where(MeliItem.id == bindparam('item_id')).values(
+        available_quantity=bindparam('quantity'))
+    db.session.execute(statement, [{'item_id': item_id, 'quantity': quantity}
+                                   for item_id, quantity in quantities.items()])
+    alerts.alert_engine.stock_changed(quantities)
+    db.session.commit()
+
+def get_state(name):
+    """Retorna (criando se preciso) o ponto de retomada de uma sincronização"""
+    state = db.session.get(SyncState, name)
+    if state is None:
+        db.session.add(SyncState(name=name, offset=0, rows_synced=0))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Outro worker (ou a thread de sincronização) criou ao mesmo tempo
+            db.session.rollback()
+        state = db.session.get(SyncState, name)
+    return state
+
+def is_synced(name):
+    """Indica se a sincronização já completou ao menos uma vez"""
+    state = db.session.get(SyncState, name)
+    return state is not None and state.completed_at is not None
+
+def query_orders(limit=50, offset=0, status=None):
+    """Página de pedidos, do mais recente para o mais antigo"""
+    query = MeliOrder.query
+    if status:
+        query = query.filter(MeliOrder.status == status)
+    total = query.with_entities(func.count(MeliOrder.id)).scalar()
+    orders = (query.order_by(MeliOrder.date_created.desc(), MeliOrder.id.desc())
+              .limit(limit).offset(offset).all())
+
+    lines = {}
+    if orders:
+        order_ids = [order.id for order in orders]
+        for line in MeliOrderItem.query.filter(MeliOrderItem.order_id.in_(order_ids)):
+            lines.setdefault(line.order_id, []).append(line)
+
+    return {
+        'results': [order.to_dict(lines.get(order.id, ())) for order in orders],
+        'paging': {'total': total, 'offset': offset, 'limit': limit}
+    }
+
+def query_items(limit=50, offset=0, status=None):
+    """Página de anúncios, dos atualizados mais recentemente"""
+    query = MeliItem.query
+    if status:
+        query = query.filter(MeliItem.status == status)
+    total = query.with_entities(func.count(MeliItem.id)).scalar()
+    items = (query.order_by(MeliItem.last_updated.desc(), MeliItem.id.desc())
+             .limit(limit).offset(offset).all())
+    return {
+        'results': [item.to_dict() for item in items],
+        'paging': {'total': total, 'offset': offset, 'limit': limit}
+    }
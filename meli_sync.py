@@ -0,0 +1,280 @@
+"""
+Sincronização incremental dos pedidos, anúncios e perguntas do Mercado Livre
+Uma thread de fundo traz da API só o que mudou desde a última marca d'água e
+grava em lote no armazenamento local; a carga pode ser interrompida e retomada
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+import alerts
+import meli_store
+from models import db, MeliItem
+from mercadolivre_api import MercadoLivreAPIError
+from server_runtime import FileLock
+
+class MeliSyncWorker:
+    """Mantém as tabelas locais de pedidos e anúncios em dia com a API"""
+
+    def __init__(self, app=None, api=None, interval=60.0, page_size=50, overlap=300.0):
+        self.app = app
+        self.api = api
+        self.interval = interval
+        self.page_size = page_size
+        # Folga (segundos) com que a marca d'água dos pedidos recua em relação
+        # ao início da rodada: relógio da API e pedidos alterados depois de lidos
+        self.overlap = overlap
+        self._thread = None
+        self._lock = threading.Lock()
+        self._process_lock = None
+        self.running = False
+        self.last_error = None
+        # Progresso da execução atual/última, por sincronização
+        self.progress = {}
+        # Chamados ao fim de cada rodada com as mudanças encontradas
+        self.listeners = []
+        # Perguntas sem resposta na API: total (para conferir o local) e ids já vistos
+        # (para detectar as novas)
+        self.unanswered = 0
+        self._seen_questions = None
+
+    def init_app(self, app):
+        """Liga a sincronização à aplicação (MELI_SYNC_INTERVAL e MELI_SYNC_OVERLAP)"""
+        self.app = app
+        self.interval = app.config.get('MELI_SYNC_INTERVAL', self.interval)
+        self.overlap = app.config.get('MELI_SYNC_OVERLAP', self.overlap)
+        # Os totais diários somam os pedidos gravados, então duas rodadas ao
+        # mesmo tempo (em processos diferentes) contariam os mesmos pedidos duas vezes
+        self._process_lock = FileLock(os.path.join(app.instance_path, 'meli_sync.lock'))
+
+    def on_sync(self, listener):
+        """Registra `listener(changes)` para o fim de cada rodada (decorador)"""
+        self.listeners.append(listener)
+        return listener
+
+    def _report(self, name, rows, started):
+        elapsed = time.perf_counter() - started
+        self.progress[name] = {
+            'rows': rows,
+            'seconds': round(elapsed, 3),
+            'rows_per_sec': round(rows / elapsed, 1) if elapsed > 0 else None
+        }
+
+    def sync_orders(self):
+        """Traz os pedidos alterados desde a marca d'água salva
+
+        Toda a rodada busca a partir da mesma marca, fixada no início, em
+        ordem de criação (e id): uma alteração no meio da rodada não muda a
+        posição de um pedido, só pode fazer entrar no filtro um que já foi
+        ultrapassado, e então um pedido é lido duas vezes, nunca pulado. O
+        deslocamento é salvo a cada página, então uma interrupção recomeça de
+        onde parou. A marca só avança no fim da rodada, para o início dela
+        menos `overlap`; os pedidos relidos nessa folga são inofensivos porque
+        a gravação é um upsert pelo id. Retorna os pedidos novos ou com status
+        alterado.
+        """
+        state = meli_store.get_state('orders')
+        if state.started_at is None:
+            state.started_at = datetime.utcnow()
+            state.offset = 0
+        since = state.watermark.isoformat() if state.watermark else None
+        started = time.perf_counter()
+        rows = 0
+        changes = []
+        while True:
+            page = self.api.search_orders_updated_since(since, self.page_size, state.offset)
+            orders = page.get('results', [])
+            if orders:
+                changes.extend(meli_store.upsert_orders(orders))
+                state.offset += len(orders)
+                state.rows_synced += len(orders)
+                rows += len(orders)
+            last = len(orders) < self.page_size
+            if last:
+                state.watermark = state.started_at - timedelta(seconds=self.overlap)
+                state.started_at = None
+                state.offset = 0
+                state.completed_at = datetime.utcnow()
+            # Cada página é confirmada junto com o ponto de retomada
+            db.session.commit()
+            self._report('orders', rows, started)
+            if last:
+                return changes
+
+    def sync_items(self):
+        """Percorre os anúncios e grava os que mudaram
+
+        A busca de anúncios não filtra por data, então os ids são percorridos
+        por inteiro (é barato) e só os itens com `last_updated` mais novo que o
+        local são gravados. O deslocamento salvo permite retomar a varredura.
+        """
+        state = meli_store.get_state('items')
+        started = time.perf_counter()
+        rows = 0
+        while True:
+            page = self.api.search_item_ids(self.page_size, state.offset)
+            ids = page.get('results', [])
+            if ids:
+                items = list(self.api.get_items(ids)['results'].values())
+                known = dict(db.session.query(MeliItem.id, MeliItem.last_updated)
+                             .filter(MeliItem.id.in_(ids)))
+                changed = [item for item in items
+                           if item['id'] not in known
+                           or known[item['id']] != meli_store.parse_datetime(item.get('last_updated'))]
+                meli_store.upsert_items(changed)
+                state.offset += len(ids)
+                state.rows_synced += len(changed)
+                rows += len(changed)
+            if len(ids) < self.page_size:
+                # Varredura completa: a próxima começa do início
+                state.offset = 0
+                state.completed_at = datetime.utcnow()
+            db.session.commit()
+            self._report('items', rows, started)
+            if len(ids) < self.page_size:
+                return rows
+
+    def poll_questions(self, limit=50):
+        """Busca as perguntas sem resposta e retorna as que ainda não tinham sido vistas"""
+        page = self.api.get_questions(limit, status='UNANSWERED')
+        questions = page.get('questions', [])
+        self.unanswered = page.get('total', len(questions))
+        ids = {question['id'] for question in questions}
+        # Na primeira consulta nada é "novo": só marca o que já existe
+        seen, self._seen_questions = self._seen_questions, ids
+        if seen is None:
+            return []
+        return [question for question in questions if question['id'] not in seen]
+
+    def sync_questions(self):
+        """Grava as perguntas novas ou com status alterado no armazenamento local
+
+        A busca vem da mais recente para a mais antiga. Na carga inicial todas
+        as páginas são lidas (retomável pelo deslocamento salvo); depois, a
+        leitura para na primeira página sem mudanças. Se o total de perguntas
+        sem resposta da API diverge do local (uma antiga foi respondida), a
+        próxima rodada relê tudo.
+        """
+        state = meli_store.get_state('questions')
+        started = time.perf_counter()
+        initial = state.completed_at is None
+        offset = state.offset if initial else 0
+        rows = 0
+        while True:
+            questions = self.api.get_questions(self.page_size, offset=offset).get('questions', [])
+            changed = meli_store.upsert_questions(questions)
+            offset += len(questions)
+            state.rows_synced += changed
+            rows += changed
+            last = len(questions) < self.page_size or (not initial and not changed)
+            if initial:
+                state.offset = offset
+            if last:
+                state.offset = 0
+                state.completed_at = datetime.utcnow()
+            db.session.commit()
+            self._report('questions', rows, started)
+            if last:
+                break
+        if meli_store.count_questions('UNANSWERED') != self.unanswered:
+            state.completed_at = None
+            db.session.commit()
+        return rows
+
+    def build_notifications(self):
+        """Avisos do dashboard: alertas ativos por regra, perguntas e o último pagamento
+
+        Tudo sai das tabelas sincronizadas, então qualquer worker monta os mesmos avisos.
+        """
+        notifications = alerts.alert_engine.notifications()
+        unanswered = meli_store.count_questions('UNANSWERED')
+        if unanswered:
+            latest = meli_store.latest_question('UNANSWERED')
+            notifications.append({
+                "id": "new_question",
+                "type": "new_question",
+                "title": "Nova pergunta",
+                "message": f"Você tem {unanswered} perguntas não respondidas",
+                "priority": "high",
+                "created_at": latest.date_created.isoformat()
+            })
+        paid = meli_store.latest_order('paid')
+        if paid is not None:
+            amount = f"{paid.total_amount:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.')
+            notifications.append({
+                "id": "payment_received",
+                "type": "payment_received",
+                "title": "Pagamento aprovado",
+                "message": f"Pedido #{paid.id} - R$ {amount}",
+                "priority": "low",
+                "created_at": paid.date_created.isoformat()
+            })
+        return notifications
+
+    def run_once(self):
+        """Executa uma rodada completa de sincronização
+
+        Retorna False sem fazer nada se outro processo está no meio de uma rodada.
+        """
+        with self._lock, self.app.app_context():
+            if not self._process_lock.acquire(blocking=False):
+                self.app.logger.info('Sincronização com o Mercado Livre já em andamento em outro processo')
+                return False
+            self.running = True
+            try:
+                self.sync_items()
+                orders = self.sync_orders()
+                questions = self.poll_questions()
+                self.sync_questions()
+                changes = {
+                    'orders': orders,
+                    'questions': questions,
+                    'notifications': self.build_notifications()
+                }
+                self.last_error = None
+                self.app.logger.info('Sincronização com o Mercado Livre: %s', self.progress)
+                for listener in self.listeners:
+                    listener(changes)
+            except MercadoLivreAPIError as e:
+                db.session.rollback()
+                self.last_error = str(e)
+                self.app.logger.warning('Sincronização com o Mercado Livre falhou: %s', e)
+            except Exception as e:
+                db.session.rollback()
+                self.last_error = str(e)
+                self.app.logger.exception('Erro inesperado na sincronização com o Mercado Livre')
+            finally:
+                self.running = False
+                self._process_lock.release()
+            return True
+
+    def _loop(self):
+        while True:
+            self.run_once()
+            time.sleep(self.interval)
+
+    def start(self):
+        """Inicia a sincronização periódica em segundo plano"""
+        if self.interval and self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='meli-sync', daemon=True)
+            self._thread.start()
+
+    def status(self):
+        with self.app.app_context():
+            states = {name: meli_store.get_state(name) for name in ('items', 'orders')}
+            return {
+                'running': self.running,
+                'last_error': self.last_error,
+                'progress': self.progress,
+                'states': {
+                    name: {
+                        'watermark': state.watermark.isoformat() if state.watermark else None,
+                        'offset': state.offset,
+                        'started_at': state.started_at.isoformat() if state.started_at else None,
+                        'rows_synced': state.rows_synced,
+                        'completed_at': state.completed_at.isoformat() if state.completed_at else None
+                    }
+                    for name, state in states.items()
+                }
+            }
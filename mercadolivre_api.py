@@ -1,248 +1,345 @@
 """
 Módulo para integração com a API do Mercado Livre
-Simula funcionalidades reais que poderiam ser implementadas com a API oficial
+Cliente HTTP com pool de conexões, retentativas e controle de rate limit
 """
 
-import json
+import functools
+import os
 import random
-from datetime import datetime, timedelta
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from ttl_cache import TTLCache
+from instrumentation import timed
+
+DEFAULT_BASE_URL = 'https://api.mercadolibre.com'
+
+# Status que valem uma nova tentativa (além de falhas de conexão)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Limite de ids por chamada multiget da API oficial
+MULTIGET_LIMIT = 20
+
+class MercadoLivreAPIError(Exception):
+    """Erro retornado (ou não recuperado) ao chamar a API do Mercado Livre"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+def cached(namespace, ttl, stale=0):
+    """Guarda o retorno do método no cache da API por `ttl` segundos
+
+    O valor devolvido é compartilhado entre as chamadas e não deve ser alterado.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args):
+            return self.cache.get_or_load((namespace,) + args,
+                                          lambda: method(self, *args), ttl, stale)
+        return wrapper
+    return decorator
 
 class MercadoLivreAPI:
-    def __init__(self):
+    def __init__(self, base_url=None, timeout=(3.05, 10), pool_size=20,
+                 max_retries=3, backoff=0.2, backoff_cap=5.0, max_concurrency=None,
+                 cache_max_bytes=32 * 1024 * 1024):
         self.access_token = None
         self.user_id = None
-        
+        self.base_url = (base_url or os.environ.get('MELI_API_URL') or DEFAULT_BASE_URL).rstrip('/')
+        # (conexão, leitura) em segundos
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_cap = backoff_cap
+
+        # Sessão única com keep-alive; pool_block faz as threads esperarem
+        # por uma conexão livre em vez de abrir conexões extras
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                              pool_block=True, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # Instante (monotonic) até o qual ninguém deve chamar a API
+        self._throttled_until = 0.0
+        self._throttle_lock = threading.Lock()
+        self.retries = 0
+        self.throttled = 0
+
+        # Chamadas simultâneas nas consultas em lote; acima do pool elas só
+        # ficariam esperando conexão
+        self.max_concurrency = max_concurrency or pool_size
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+        self.cache = TTLCache(max_bytes=cache_max_bytes)
+
+    def configure(self, base_url=None, timeout=None):
+        """Altera o endereço da API ou os timeouts"""
+        if base_url:
+            self.base_url = base_url.rstrip('/')
+        if timeout:
+            self.timeout = timeout
+
     def authenticate(self, access_token, user_id):
-        """Simula autenticação com a API do Mercado Livre"""
+        """Configura o token de acesso usado nas chamadas à API"""
         self.access_token = access_token
         self.user_id = user_id
+        self.session.headers['Authorization'] = f'Bearer {access_token}'
+        # Outro vendedor: nada do que está no cache vale mais
+        self.cache.clear()
         return {"status": "success", "message": "Autenticado com sucesso"}
-    
+
+    def _backoff_delay(self, attempt):
+        """Backoff exponencial com jitter completo"""
+        return random.uniform(0, min(self.backoff_cap, self.backoff * (2 ** attempt)))
+
+    def _throttle(self, seconds):
+        """Pausa todas as chamadas por `seconds` segundos"""
+        with self._throttle_lock:
+            self._throttled_until = max(self._throttled_until, time.monotonic() + seconds)
+
+    def _wait_throttle(self):
+        delay = self._throttled_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _track_rate_limit(self, response):
+        """Usa os cabeçalhos de rate limit para não estourar a cota"""
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        reset = response.headers.get('X-RateLimit-Reset')
+        if remaining is not None and reset is not None:
+            try:
+                if int(remaining) <= 0:
+                    self._throttle(float(reset))
+            except ValueError:
+                pass
+
+    def _request(self, method, path, params=None, json=None):
+        """Executa uma chamada com retentativas e retorna o JSON da resposta"""
+        url = f'{self.base_url}{path}'
+        attempt = 0
+        while True:
+            self._wait_throttle()
+            try:
+                response = self.session.request(method, url, params=params, json=json,
+                                                timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise MercadoLivreAPIError(f'Falha de conexão com a API: {e}')
+                time.sleep(self._backoff_delay(attempt))
+                attempt += 1
+                self.retries += 1
+                continue
+
+            self._track_rate_limit(response)
+            if response.status_code < 400:
+                return response.json()
+
+            if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                raise MercadoLivreAPIError(self._error_message(response), response.status_code)
+
+            delay = self._backoff_delay(attempt)
+            if response.status_code == 429:
+                self.throttled += 1
+                retry_after = response.headers.get('Retry-After')
+                if retry_after:
+                    try:
+                        # Espera o que a API pediu, com jitter para não sincronizar as threads
+                        delay = float(retry_after) + random.uniform(0, self.backoff)
+                    except ValueError:
+                        pass
+                self._throttle(delay)
+            else:
+                time.sleep(delay)
+            attempt += 1
+            self.retries += 1
+
+    @staticmethod
+    def _error_message(response):
+        try:
+            return response.json().get('message') or response.reason
+        except ValueError:
+            return response.reason or f'HTTP {response.status_code}'
+
+    @timed
+    @cached('user_info', ttl=6 * 3600, stale=24 * 3600)
     def get_user_info(self):
         """Retorna informações do usuário"""
+        return self._request('GET', '/users/me')
+
+    def _fan_out(self, keys, fn):
+        """Executa `fn(key)` para cada chave em paralelo, com concorrência limitada
+
+        Retorna os resultados que deram certo e os erros por chave, em vez de
+        falhar o lote inteiro por causa de uma chamada.
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                                    thread_name_prefix='meli-api')
+        futures = {key: self._executor.submit(fn, key) for key in keys}
+        results, errors = {}, {}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except MercadoLivreAPIError as e:
+                errors[key] = {"status": e.status, "message": str(e)}
+        return results, errors
+
+    @staticmethod
+    def _unique(ids):
+        """Remove ids repetidos mantendo a ordem"""
+        return list(dict.fromkeys(str(i) for i in ids))
+
+    @timed
+    def get_items(self, item_ids):
+        """Busca vários itens pelo multiget, com os lotes de 20 ids em paralelo"""
+        item_ids = self._unique(item_ids)
+        chunks = [tuple(item_ids[start:start + MULTIGET_LIMIT])
+                  for start in range(0, len(item_ids), MULTIGET_LIMIT)]
+        pages, chunk_errors = self._fan_out(
+            chunks, lambda chunk: self._request('GET', '/items', params={'ids': ','.join(chunk)}))
+
+        results, errors = {}, {}
+        for chunk, error in chunk_errors.items():
+            for item_id in chunk:
+                errors[item_id] = error
+        for chunk, entries in pages.items():
+            for item_id, entry in zip(chunk, entries):
+                if entry.get('code') == 200:
+                    results[item_id] = entry['body']
+                else:
+                    body = entry.get('body') or {}
+                    errors[item_id] = {"status": entry.get('code'), "message": body.get('message')}
+        # Mantém a ordem dos ids pedidos
         return {
-            "id": self.user_id or "123456789",
-            "nickname": "loja_exemplo",
-            "first_name": "João",
-            "last_name": "Silva",
-            "email": "joao.silva@exemplo.com",
-            "country_id": "BR",
-            "seller_reputation": {
-                "level_id": "5_green",
-                "power_seller_status": "platinum",
-                "transactions": {
-                    "total": 15420,
-                    "completed": 15380,
-                    "canceled": 40
-                }
-            }
+            "results": {item_id: results[item_id] for item_id in item_ids if item_id in results},
+            "errors": errors
         }
-    
+
+    @timed
+    def get_orders_by_ids(self, order_ids):
+        """Busca vários pedidos em paralelo (a API não tem multiget de pedidos)"""
+        results, errors = self._fan_out(
+            self._unique(order_ids), lambda order_id: self._request('GET', f'/orders/{order_id}'))
+        return {"results": results, "errors": errors}
+
+    @timed
+    def get_shipments(self, order_ids):
+        """Busca o envio de vários pedidos em paralelo"""
+        results, errors = self._fan_out(self._unique(order_ids), self.get_shipping_info)
+        return {"results": results, "errors": errors}
+
+    @timed
     def get_products(self, limit=50, offset=0):
         """Retorna lista de produtos do vendedor"""
-        products = []
-        categories = ["Eletrônicos", "Casa e Jardim", "Esportes", "Moda", "Automotivo"]
-        conditions = ["new", "used"]
-        
-        for i in range(limit):
-            product_id = f"MLB{random.randint(1000000000, 9999999999)}"
-            products.append({
-                "id": product_id,
-                "title": f"Produto Exemplo {i + offset + 1}",
-                "category_id": random.choice(categories),
-                "price": round(random.uniform(50, 2000), 2),
-                "available_quantity": random.randint(0, 100),
-                "sold_quantity": random.randint(0, 500),
-                "condition": random.choice(conditions),
-                "listing_type_id": "gold_special",
-                "status": random.choice(["active", "paused", "closed"]),
-                "permalink": f"https://produto.mercadolivre.com.br/{product_id}",
-                "thumbnail": f"https://http2.mlstatic.com/D_NQ_NP_{random.randint(600000, 999999)}-O.jpg"
-            })
-        
+        search = self.search_item_ids(limit, offset)
+        items = self.get_items(search.get('results', []))
         return {
-            "results": products,
-            "paging": {
-                "total": 1247,
-                "offset": offset,
-                "limit": limit
-            }
+            "results": list(items['results'].values()),
+            "paging": search.get('paging', {"total": 0, "offset": offset, "limit": limit})
         }
-    
+
+    @timed
+    def search_item_ids(self, limit=50, offset=0):
+        """Retorna uma página de ids de anúncios do vendedor"""
+        return self._request('GET', f'/users/{self.user_id}/items/search',
+                             params={'limit': limit, 'offset': offset})
+
+    @timed
+    def search_orders_updated_since(self, updated_from=None, limit=50, offset=0):
+        """Pedidos alterados a partir de `updated_from`, em ordem de criação (a API não ordena pela atualização)"""
+        params = {'seller': self.user_id, 'sort': 'date_asc', 'limit': limit, 'offset': offset}
+        if updated_from:
+            params['order.date_last_updated.from'] = updated_from
+        return self._request('GET', '/orders/search', params=params)
+
+    @timed
     def get_orders(self, limit=50, offset=0):
         """Retorna lista de pedidos"""
-        orders = []
-        statuses = ["paid", "confirmed", "ready_to_ship", "shipped", "delivered"]
-        
-        for i in range(limit):
-            order_id = random.randint(2000000000, 9999999999)
-            orders.append({
-                "id": order_id,
-                "status": random.choice(statuses),
-                "date_created": (datetime.now() - timedelta(days=random.randint(0, 30))).isoformat(),
-                "total_amount": round(random.uniform(50, 1000), 2),
-                "currency_id": "BRL",
-                "buyer": {
-                    "id": random.randint(100000000, 999999999),
-                    "nickname": f"comprador{random.randint(1, 1000)}"
-                },
-                "order_items": [{
-                    "item": {
-                        "id": f"MLB{random.randint(1000000000, 9999999999)}",
-                        "title": f"Produto Vendido {i + 1}",
-                        "category_id": random.choice(["Eletrônicos", "Casa", "Moda"]),
-                        "unit_price": round(random.uniform(50, 500), 2),
-                        "quantity": random.randint(1, 3)
-                    }
-                }]
-            })
-        
-        return {
-            "results": orders,
-            "paging": {
-                "total": 892,
-                "offset": offset,
-                "limit": limit
-            }
-        }
-    
-    def get_sales_metrics(self):
-        """Retorna métricas de vendas"""
-        today = datetime.now()
-        return {
-            "today": {
-                "sales_count": random.randint(80, 120),
-                "revenue": round(random.uniform(40000, 60000), 2),
-                "orders_pending": random.randint(15, 35)
-            },
-            "this_month": {
-                "sales_count": random.randint(2000, 3000),
-                "revenue": round(random.uniform(800000, 1200000), 2),
-                "orders_pending": random.randint(100, 200)
-            },
-            "last_30_days": {
-                "sales_count": random.randint(2500, 3500),
-                "revenue": round(random.uniform(1000000, 1500000), 2),
-                "conversion_rate": round(random.uniform(3.5, 6.8), 2)
-            }
-        }
-    
-    def get_questions(self, limit=20):
-        """Retorna perguntas dos compradores"""
-        questions = []
-        sample_questions = [
-            "Qual o prazo de entrega para São Paulo?",
-            "Tem garantia? Por quanto tempo?",
-            "Aceita cartão de crédito?",
-            "Tem desconto para pagamento à vista?",
-            "Qual a cor disponível?",
-            "Tem nota fiscal?",
-            "Faz entrega no mesmo dia?",
-            "Qual o peso do produto?"
-        ]
-        
-        for i in range(limit):
-            questions.append({
-                "id": random.randint(1000000, 9999999),
-                "text": random.choice(sample_questions),
-                "status": random.choice(["UNANSWERED", "ANSWERED"]),
-                "date_created": (datetime.now() - timedelta(hours=random.randint(1, 72))).isoformat(),
-                "from": {
-                    "id": random.randint(100000000, 999999999),
-                    "answered_questions": random.randint(0, 50)
-                },
-                "item_id": f"MLB{random.randint(1000000000, 9999999999)}"
-            })
-        
-        return {
-            "questions": questions,
-            "total": len(questions)
+        return self._request('GET', '/orders/search', params={
+            'seller': self.user_id,
+            'sort': 'date_desc',
+            'limit': limit,
+            'offset': offset
+        })
+
+    @timed
+    @cached('visits', ttl=300, stale=3600)
+    def get_visits(self, date_from, date_to):
+        """Total de visitas aos anúncios do vendedor no período (datas ISO)"""
+        visits = self._request('GET', f'/users/{self.user_id}/items_visits',
+                               params={'date_from': date_from, 'date_to': date_to})
+        return visits.get('total_visits', 0)
+
+    @timed
+    def get_questions(self, limit=20, status=None, offset=0):
+        """Retorna perguntas dos compradores, das mais recentes para as mais antigas"""
+        params = {
+            'seller_id': self.user_id,
+            'sort_fields': 'date_created',
+            'sort_types': 'DESC',
+            'limit': limit
         }
-    
-    def get_notifications(self):
-        """Retorna notificações importantes"""
-        notifications = [
-            {
-                "id": 1,
-                "type": "low_stock",
-                "title": "Estoque baixo",
-                "message": "5 produtos com estoque abaixo de 10 unidades",
-                "priority": "medium",
-                "created_at": datetime.now().isoformat()
-            },
-            {
-                "id": 2,
-                "type": "new_question",
-                "title": "Nova pergunta",
-                "message": "Você tem 3 perguntas não respondidas",
-                "priority": "high",
-                "created_at": (datetime.now() - timedelta(hours=2)).isoformat()
-            },
-            {
-                "id": 3,
-                "type": "payment_received",
-                "title": "Pagamento aprovado",
-                "message": "Pedido #2087654321 - R$ 299,90",
-                "priority": "low",
-                "created_at": (datetime.now() - timedelta(hours=1)).isoformat()
-            }
-        ]
-        
-        return {"notifications": notifications}
-    
+        if offset:
+            params['offset'] = offset
+        if status:
+            params['status'] = status
+        return self._request('GET', '/questions/search', params=params)
+
+    @timed
     def get_shipping_info(self, order_id):
         """Retorna informações de envio de um pedido"""
+        shipment = self._request('GET', f'/orders/{order_id}/shipments')
+        option = shipment.get('shipping_option') or {}
         return {
             "order_id": order_id,
-            "shipment_id": random.randint(20000000000, 29999999999),
-            "status": random.choice(["ready_to_ship", "shipped", "delivered"]),
-            "tracking_number": f"BR{random.randint(100000000, 999999999)}BR",
-            "estimated_delivery": (datetime.now() + timedelta(days=random.randint(3, 10))).isoformat(),
+            "shipment_id": shipment.get('id'),
+            "status": shipment.get('status'),
+            "tracking_number": shipment.get('tracking_number'),
+            "estimated_delivery": (option.get('estimated_delivery_time') or {}).get('date'),
             "shipping_option": {
-                "name": "Mercado Envios",
-                "shipping_method_id": random.randint(100, 999),
-                "cost": round(random.uniform(15, 45), 2)
+                "name": option.get('name'),
+                "shipping_method_id": option.get('shipping_method_id'),
+                "cost": option.get('cost')
             }
         }
-    
+
+    @timed
     def update_product_stock(self, product_id, quantity):
-        """Atualiza estoque de um produto"""
+        """Atualiza estoque de um produto
+
+        Nada em `self.cache` depende do estoque: anúncios e pedidos são lidos do
+        armazenamento local (meli_store), que quem chama atualiza junto com a
+        escrita, então a alteração vale na hora para todos os workers. Um cache
+        de itens aqui seria por processo e ficaria velho nos outros workers.
+        """
+        item = self._request('PUT', f'/items/{product_id}', json={'available_quantity': quantity})
         return {
             "product_id": product_id,
-            "available_quantity": quantity,
+            "available_quantity": item.get('available_quantity', quantity),
             "status": "success",
             "message": f"Estoque atualizado para {quantity} unidades"
         }
-    
-    def get_analytics_data(self):
-        """Retorna dados analíticos detalhados"""
-        return {
-            "visits": {
-                "total": random.randint(15000, 25000),
-                "unique": random.randint(8000, 15000),
-                "conversion_rate": round(random.uniform(2.5, 5.8), 2)
-            },
-            "top_products": [
-                {
-                    "id": f"MLB{random.randint(1000000000, 9999999999)}",
-                    "title": "Smartphone Samsung Galaxy",
-                    "sales": random.randint(50, 150),
-                    "revenue": round(random.uniform(15000, 45000), 2)
-                },
-                {
-                    "id": f"MLB{random.randint(1000000000, 9999999999)}",
-                    "title": "Notebook Lenovo IdeaPad",
-                    "sales": random.randint(30, 80),
-                    "revenue": round(random.uniform(25000, 60000), 2)
-                }
-            ],
-            "categories_performance": [
-                {"category": "Eletrônicos", "sales": 45, "revenue": 89500},
-                {"category": "Casa e Jardim", "sales": 32, "revenue": 15600},
-                {"category": "Moda", "sales": 28, "revenue": 8900}
-            ]
-        }
+
+    @timed
+    def update_stocks(self, quantities):
+        """Atualiza o estoque de vários produtos em paralelo ({id: quantidade})
+
+        A API não tem escrita em lote de itens; as chamadas individuais passam
+        pelo mesmo pool limitado das leituras em lote. Como em
+        `update_product_stock`, não há entradas do cache a invalidar.
+        """
+        def update(product_id):
+            item = self._request('PUT', f'/items/{product_id}',
+                                 json={'available_quantity': quantities[product_id]})
+            return item.get('available_quantity', quantities[product_id])
+        results, errors = self._fan_out(list(quantities), update)
+        return {"results": results, "errors": errors}
 
 # Instância global da API
 meli_api = MercadoLivreAPI()
-
@@ -0,0 +1,387 @@
+"""
+Migrações do banco, aplicadas em ordem e registradas em schema_migrations
+Um lock (advisory no PostgreSQL, BEGIN IMMEDIATE no SQLite) garante que só um
+processo aplica as migrações quando vários workers sobem ao mesmo tempo
+
+Migrações novas entram no fim da lista e não mudam depois de publicadas;
+tabelas novas são criadas com `checkfirst` para valer em bancos novos e antigos.
+As tabelas são criadas a partir de definições congeladas aqui, com o esquema
+do momento em que a migração foi publicada, e não dos modelos atuais: uma
+coluna nova no modelo precisa de uma migração nova que a acrescente.
+"""
+
+from datetime import datetime
+import click
+from sqlalchemy import (JSON, BigInteger, Boolean, Column, Date, DateTime, Float, ForeignKey, Index, Integer,
+                        MetaData, String, Table, Text, UniqueConstraint, inspect, select, text)
+from models import db
+
+# Chave do lock advisory no PostgreSQL (qualquer inteiro fixo de 64 bits)
+ADVISORY_LOCK_ID = 4202510001
+
+_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _metadata,
+    Column('version', String(32), primary_key=True),
+    Column('description', String(200)),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+# Esquema de cada tabela como estava na migração que a criou
+_frozen = MetaData()
+
+_user = Table(
+    'user', _frozen,
+    Column('id', Integer, primary_key=True),
+    Column('nome', String(100), nullable=False),
+    Column('email', String(120), unique=True, nullable=False),
+    Column('password_hash', String(128), nullable=False),
+    Column('created_at', DateTime),
+    Column('is_active', Boolean)
+)
+
+_revoked_token = Table(
+    'revoked_token', _frozen,
+    Column('jti', String(36), primary_key=True),
+    Column('user_id', Integer, nullable=False),
+    Column('expires_at', DateTime, nullable=False, index=True)
+)
+
+_cd_product = Table(
+    'cd_product', _frozen,
+    Column('snapshot', Integer, primary_key=True, autoincrement=False),
+    Column('id', Integer, primary_key=True, autoincrement=False),
+    Column('nome', String(200), nullable=False),
+    Column('sku', String(64), nullable=False),
+    Column('categoria', String(100), nullable=False),
+    Column('status', String(32), nullable=False),
+    Column('quantidade', Integer, nullable=False),
+    Column('tempo_permanencia', Integer, nullable=False),
+    Index('ix_cd_product_status_tempo', 'snapshot', 'status', 'tempo_permanencia', 'id'),
+    Index('ix_cd_product_categoria_tempo', 'snapshot', 'categoria', 'tempo_permanencia', 'id'),
+    Index('ix_cd_product_tempo', 'snapshot', 'tempo_permanencia', 'id'),
+    Index('ix_cd_product_sku', 'snapshot', 'sku', 'id')
+)
+
+_meli_item = Table(
+    'meli_item', _frozen,
+    Column('id', String(32), primary_key=True),
+    Column('title', String(255), nullable=False),
+    Column('category_id', String(64), index=True),
+    Column('price', Float, nullable=False),
+    Column('available_quantity', Integer, nullable=False),
+    Column('sold_quantity', Integer, nullable=False),
+    Column('condition', String(16)),
+    Column('listing_type_id', String(32)),
+    Column('status', String(16), index=True),
+    Column('permalink', String(255)),
+    Column('thumbnail', String(255)),
+    Column('last_updated', DateTime),
+    Index('ix_meli_item_last_updated', 'last_updated', 'id')
+)
+
+_meli_order = Table(
+    'meli_order', _frozen,
+    Column('id', BigInteger, primary_key=True, autoincrement=False),
+    Column('status', String(32), nullable=False),
+    Column('date_created', DateTime, nullable=False),
+    Column('last_updated', DateTime, nullable=False),
+    Column('total_amount', Float, nullable=False),
+    Column('currency_id', String(8)),
+    Column('buyer_id', BigInteger),
+    Column('buyer_nickname', String(100)),
+    Column('shipment_id', BigInteger),
+    Index('ix_meli_order_date_created', 'date_created', 'id'),
+    Index('ix_meli_order_status_date', 'status', 'date_created', 'id'),
+    Index('ix_meli_order_last_updated', 'last_updated')
+)
+
+_meli_order_item = Table(
+    'meli_order_item', _frozen,
+    Column('order_id', BigInteger, primary_key=True, autoincrement=False),
+    Column('item_id', String(32), primary_key=True, index=True),
+    Column('title', String(255)),
+    Column('category_id', String(64)),
+    Column('unit_price', Float, nullable=False),
+    Column('quantity', Integer, nullable=False)
+)
+
+_sync_state = Table(
+    'sync_state', _frozen,
+    Column('name', String(32), primary_key=True),
+    Column('watermark', DateTime),
+    Column('offset', Integer, nullable=False),
+    Column('completed_at', DateTime),
+    Column('rows_synced', Integer, nullable=False)
+)
+
+_daily_sales_total = Table(
+    'daily_sales_total', _frozen,
+    Column('day', Date, primary_key=True),
+    Column('orders', Integer, nullable=False),
+    Column('units', Integer, nullable=False),
+    Column('revenue', Float, nullable=False)
+)
+
+_daily_item_sales = Table(
+    'daily_item_sales', _frozen,
+    Column('day', Date, primary_key=True),
+    Column('item_id', String(32), primary_key=True),
+    Column('category_id', String(64)),
+    Column('orders', Integer, nullable=False),
+    Column('units', Integer, nullable=False),
+    Column('revenue', Float, nullable=False)
+)
+
+_stock_update_job = Table(
+    'stock_update_job', _frozen,
+    Column('id', String(32), primary_key=True),
+    Column('status', String(16), nullable=False, index=True),
+    Column('total', Integer, nullable=False),
+    Column('invalid', Integer, nullable=False),
+    Column('duplicates', Integer, nullable=False),
+    Column('parse_errors', JSON),
+    Column('created_at', DateTime, nullable=False),
+    Column('not_before', DateTime, nullable=False),
+    Column('started_at', DateTime),
+    Column('finished_at', DateTime)
+)
+
+_stock_update_item = Table(
+    'stock_update_item', _frozen,
+    Column('job_id', String(32), ForeignKey('stock_update_job.id'), primary_key=True),
+    Column('product_id', String(32), primary_key=True),
+    Column('position', Integer, nullable=False),
+    Column('quantity', Integer, nullable=False),
+    Column('status', String(16), nullable=False),
+    Column('message', String(255)),
+    Column('updated_at', DateTime),
+    Index('ix_stock_update_item_job_status', 'job_id', 'status'),
+    Index('ix_stock_update_item_product_status', 'product_id', 'status')
+)
+
+_background_job = Table(
+    'background_job', _frozen,
+    Column('id', String(32), primary_key=True),
+    Column('name', String(64), nullable=False),
+    Column('args', JSON),
+    Column('priority', Integer, nullable=False),
+    Column('status', String(16), nullable=False),
+    Column('attempts', Integer, nullable=False),
+    Column('max_attempts', Integer, nullable=False),
+    Column('run_at', DateTime, nullable=False),
+    Column('created_at', DateTime, nullable=False),
+    Column('started_at', DateTime),
+    Column('finished_at', DateTime),
+    Column('locked_by', String(128)),
+    Column('result', JSON),
+    Column('error', Text),
+    Index('ix_background_job_claim', 'status', 'run_at'),
+    Index('ix_background_job_name_status', 'name', 'status', 'finished_at')
+)
+
+_meli_question = Table(
+    'meli_question', _frozen,
+    Column('id', BigInteger().with_variant(Integer, 'sqlite'), primary_key=True, autoincrement=False),
+    Column('item_id', String(32)),
+    Column('text', Text, nullable=False),
+    Column('status', String(16), nullable=False),
+    Column('date_created', DateTime, nullable=False),
+    Column('from_id', BigInteger),
+    Column('answered_questions', Integer),
+    Column('terms', Text, nullable=False),
+    Index('ix_meli_question_status_date', 'status', 'date_created'),
+    Index('ix_meli_question_item_date', 'item_id', 'date_created')
+)
+
+_alert = Table(
+    'alert', _frozen,
+    Column('id', Integer, primary_key=True),
+    Column('rule', String(32), nullable=False),
+    Column('entity_id', String(64), nullable=False),
+    Column('category', String(100)),
+    Column('status', String(16), nullable=False),
+    Column('severity', String(16), nullable=False),
+    Column('message', String(255), nullable=False),
+    Column('value', Float),
+    Column('threshold', Float),
+    Column('raised_at', DateTime, nullable=False),
+    Column('updated_at', DateTime, nullable=False),
+    Column('resolved_at', DateTime),
+    UniqueConstraint('rule', 'entity_id', name='uq_alert_rule_entity'),
+    Index('ix_alert_status_rule_raised', 'status', 'rule', 'raised_at'),
+    Index('ix_alert_status_raised', 'status', 'raised_at')
+)
+
+_cd_state = Table(
+    'cd_state', _frozen,
+    Column('id', Integer, primary_key=True, autoincrement=False),
+    Column('version', Integer, nullable=False),
+    Column('revision', Integer, nullable=False),
+    Column('source_mtime', Float),
+    Column('loaded_at', Float)
+)
+
+_cd_status_total = Table(
+    'cd_status_total', _frozen,
+    Column('snapshot', Integer, primary_key=True, autoincrement=False),
+    Column('status', String(32), primary_key=True),
+    Column('count', Integer, nullable=False),
+    Column('tempo_total', Integer, nullable=False)
+)
+
+def _columns(connection, table_name):
+    return {column['name'] for column in inspect(connection).get_columns(table_name)}
+
+MIGRATIONS = []
+
+def migration(version, description):
+    """Registra uma migração `fn(connection)` (decorador)"""
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+@migration('0001', 'Tabelas iniciais')
+def _initial_tables(connection):
+    # Linha de base: bancos criados antes das migrações já têm parte das tabelas
+    _frozen.create_all(connection, checkfirst=True, tables=[
+        _user, _revoked_token, _cd_product, _meli_item, _meli_order, _meli_order_item,
+        _sync_state, _daily_sales_total, _daily_item_sales
+    ])
+
+@migration('0002', 'Produtos do CD versionados por snapshot')
+def _cd_product_snapshot(connection):
+    # A tabela é derivada do arquivo de dados; o esquema antigo é recriado
+    if 'snapshot' not in _columns(connection, 'cd_product'):
+        connection.execute(text('DROP TABLE cd_product'))
+        _cd_product.create(connection)
+
+@migration('0003', 'Totais diários de vendas calculados a partir dos pedidos')
+def _sales_rollups(connection):
+    import meli_analytics
+    has_orders = connection.execute(select(_meli_order.c.id).limit(1)).first() is not None
+    has_totals = connection.execute(select(_daily_sales_total.c.day).limit(1)).first() is not None
+    if has_orders and not has_totals:
+        meli_analytics.rebuild_rollups(connection)
+
+@migration('0004', 'Atualizações de estoque em lote')
+def _stock_update_jobs(connection):
+    _stock_update_job.create(connection, checkfirst=True)
+    _stock_update_item.create(connection, checkfirst=True)
+
+@migration('0005', 'Fila de jobs em segundo plano')
+def _background_jobs(connection):
+    _background_job.create(connection, checkfirst=True)
+
+@migration('0006', 'Perguntas dos compradores com índice de busca')
+def _questions_search(connection):
+    import meli_questions
+    _meli_question.create(connection, checkfirst=True)
+    # Sem FTS5 no SQLite (ou em outro banco) a busca usa LIKE
+    meli_questions.create_index(connection)
+
+@migration('0007', 'Alertas de estoque baixo e de prazos')
+def _alerts(connection):
+    _alert.create(connection, checkfirst=True)
+
+@migration('0008', 'Versão ativa do CD e totais por status compartilhados entre os workers')
+def _cd_shared_state(connection):
+    # Sem a linha de estado, a próxima carga grava uma versão nova do arquivo
+    _cd_state.create(connection, checkfirst=True)
+    _cd_status_total.create(connection, checkfirst=True)
+
+@migration('0009', 'Início da permanência e revisão dos produtos do CD alterados pela API')
+def _cd_product_changes(connection):
+    columns = _columns(connection, 'cd_product')
+    if 'permanencia_desde' not in columns:
+        connection.execute(text('ALTER TABLE cd_product ADD COLUMN permanencia_desde FLOAT'))
+    if 'revision' not in columns:
+        connection.execute(text('ALTER TABLE cd_product ADD COLUMN revision INTEGER'))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS ix_cd_product_revision ON cd_product (snapshot, revision)'))
+
+@migration('0010', 'Início da rodada na sincronização incremental')
+def _sync_round_start(connection):
+    if 'started_at' not in _columns(connection, 'sync_state'):
+        connection.execute(text('ALTER TABLE sync_state ADD COLUMN started_at TIMESTAMP'))
+    # O deslocamento salvo contava os pedidos empatados na marca; a próxima rodada recomeça do zero
+    connection.execute(_sync_state.update().where(_sync_state.c.name == 'orders').values(offset=0))
+
+@migration('0011', 'Nome normalizado dos produtos do CD para a busca por prefixo')
+def _cd_product_search(connection):
+    import cd_store
+    if 'nome_busca' not in _columns(connection, 'cd_product'):
+        connection.execute(text("ALTER TABLE cd_product ADD COLUMN nome_busca VARCHAR(200) NOT NULL DEFAULT ''"))
+        rows = connection.execute(select(_cd_product.c.snapshot, _cd_product.c.id, _cd_product.c.nome)).all()
+        if rows:
+            connection.execute(
+                text('UPDATE cd_product SET nome_busca = :key WHERE snapshot = :row_snapshot AND id = :row_id'),
+                [{'row_snapshot': row.snapshot, 'row_id': row.id, 'key': cd_store.search_key(row.nome)}
+                 for row in rows])
+    connection.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_cd_product_nome_busca ON cd_product (snapshot, nome_busca, id)'))
+
+def _applied(connection):
+    schema_migrations.create(connection, checkfirst=True)
+    return {row.version for row in connection.execute(select(schema_migrations.c.version))}
+
+def _apply_pending(connection, logger=None):
+    applied = _applied(connection)
+    done = []
+    for version, description, fn in MIGRATIONS:
+        if version in applied:
+            continue
+        fn(connection)
+        connection.execute(schema_migrations.insert().values(
+            version=version, description=description, applied_at=datetime.utcnow()))
+        done.append(version)
+        if logger is not None:
+            logger.info('Migração %s aplicada: %s', version, description)
+    return done
+
+def upgrade(logger=None):
+    """Aplica as migrações pendentes; retorna as versões aplicadas"""
+    engine = db.engine
+    if engine.dialect.name == 'sqlite':
+        # Sem transação implícita do driver: o BEGIN IMMEDIATE pega o lock de
+        # escrita do arquivo e os outros processos esperam (busy_timeout)
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+            try:
+                done = _apply_pending(connection, logger)
+            except BaseException:
+                connection.exec_driver_sql('ROLLBACK')
+                raise
+            connection.exec_driver_sql('COMMIT')
+            return done
+
+    with engine.begin() as connection:
+        if engine.dialect.name == 'postgresql':
+            # Liberado no fim da transação; o DDL do PostgreSQL é transacional
+            connection.execute(text('SELECT pg_advisory_xact_lock(:id)'), {'id': ADVISORY_LOCK_ID})
+        return _apply_pending(connection, logger)
+
+def status():
+    """Versões aplicadas e pendentes"""
+    with db.engine.connect() as connection:
+        applied = {}
+        if inspect(connection).has_table(schema_migrations.name):
+            applied = {row.version: row.applied_at for row in connection.execute(select(schema_migrations))}
+    return [
+        {'version': version, 'description': description,
+         'applied_at': applied[version].isoformat() if version in applied else None}
+        for version, description, _ in MIGRATIONS
+    ]
+
+def init_app(app):
+    """Registra `flask migrate` (aplica) e `flask migrate --status`"""
+    @app.cli.command('migrate')
+    @click.option('--status', 'show_status', is_flag=True, help='Só lista as migrações')
+    def migrate_command(show_status):
+        """Aplica as migrações pendentes do banco"""
+        if show_status:
+            for entry in status():
+                click.echo(f"{entry['version']}  {entry['applied_at'] or 'pendente':<26}  {entry['description']}")
+            return
+        done = upgrade()
+        click.echo(f"Migrações aplicadas: {', '.join(done)}" if done else 'Banco já está atualizado')
@@ -1,9 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
 from datetime import datetime
+from password_hashing import passwords
 
 db = SQLAlchemy()
-bcrypt = Bcrypt()
 
 class User(db.Model):
     """Modelo de usuário para autenticação"""
@@ -17,11 +16,11 @@ class User(db.Model):
     def __init__(self, nome, email, password):
         self.nome = nome
         self.email = email
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = passwords.hash(password)
     
     def check_password(self, password):
         """Verifica se a senha fornecida está correta"""
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return passwords.verify(self.password_hash, password)
     
     def to_dict(self):
         """Converte o usuário para dicionário (sem a senha)"""
@@ -36,3 +35,359 @@ class User(db.Model):
     def __repr__(self):
         return f'<User {self.email}>'
 
+class RevokedToken(db.Model):
+    """Token revogado antes de expirar (logout); guardado até a expiração"""
+    __tablename__ = 'revoked_token'
+    jti = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class CDProduct(db.Model):
+    """Produto armazenado no Cross Docking MELI
+
+    Cada carga do arquivo de dados gera uma versão (snapshot) nova; as
+    requisições em andamento continuam lendo a versão em que começaram.
+    """
+    __tablename__ = 'cd_product'
+    __table_args__ = (
+        # Índices compostos para paginação por cursor (keyset) com filtros
+        db.Index('ix_cd_product_status_tempo', 'snapshot', 'status', 'tempo_permanencia', 'id'),
+        db.Index('ix_cd_product_categoria_tempo', 'snapshot', 'categoria', 'tempo_permanencia', 'id'),
+        db.Index('ix_cd_product_tempo', 'snapshot', 'tempo_permanencia', 'id'),
+        db.Index('ix_cd_product_sku', 'snapshot', 'sku', 'id'),
+        db.Index('ix_cd_product_revision', 'snapshot', 'revision'),
+        db.Index('ix_cd_product_nome_busca', 'snapshot', 'nome_busca', 'id'),
+    )
+
+    snapshot = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    nome = db.Column(db.String(200), nullable=False)
+    sku = db.Column(db.String(64), nullable=False)
+    categoria = db.Column(db.String(100), nullable=False, default='')
+    status = db.Column(db.String(32), nullable=False, default='')
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    tempo_permanencia = db.Column(db.Integer, nullable=False, default=0)
+    # Nome em minúsculas e sem acentos, para a busca por prefixo no índice
+    nome_busca = db.Column(db.String(200), nullable=False, default='')
+    # Produtos alterados pela API: instante (epoch) de onde a permanência conta e
+    # a revisão de cd_state da alteração; nulos nos que vieram do arquivo
+    permanencia_desde = db.Column(db.Float)
+    revision = db.Column(db.Integer)
+
+    def to_dict(self):
+        """Converte o produto para o formato do arquivo de dados do CD"""
+        return {
+            'id': self.id,
+            'nome': self.nome,
+            'sku': self.sku,
+            'categoria': self.categoria,
+            'status': self.status,
+            'quantidade': self.quantidade,
+            'tempo_permanencia': self.tempo_permanencia
+        }
+
+    def __repr__(self):
+        return f'<CDProduct {self.sku}>'
+
+class CDState(db.Model):
+    """Versão ativa do CD, compartilhada pelos workers (uma linha só)
+
+    `revision` sobe a cada alteração pontual de produto; os workers comparam
+    a versão e a revisão com as suas a cada requisição.
+    """
+    __tablename__ = 'cd_state'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    revision = db.Column(db.Integer, nullable=False, default=0)
+    source_mtime = db.Column(db.Float)
+    loaded_at = db.Column(db.Float)
+
+class CDStatusTotal(db.Model):
+    """Quantidade e soma da permanência por status de cada versão do CD"""
+    __tablename__ = 'cd_status_total'
+
+    snapshot = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    status = db.Column(db.String(32), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    tempo_total = db.Column(db.Integer, nullable=False, default=0)
+
+
+class MeliItem(db.Model):
+    """Anúncio do vendedor sincronizado da API do Mercado Livre"""
+    __tablename__ = 'meli_item'
+    __table_args__ = (
+        db.Index('ix_meli_item_last_updated', 'last_updated', 'id'),
+    )
+
+    id = db.Column(db.String(32), primary_key=True)
+    title = db.Column(db.String(255), nullable=False, default='')
+    category_id = db.Column(db.String(64), index=True)
+    price = db.Column(db.Float, nullable=False, default=0)
+    available_quantity = db.Column(db.Integer, nullable=False, default=0)
+    sold_quantity = db.Column(db.Integer, nullable=False, default=0)
+    condition = db.Column(db.String(16))
+    listing_type_id = db.Column(db.String(32))
+    status = db.Column(db.String(16), index=True)
+    permalink = db.Column(db.String(255))
+    thumbnail = db.Column(db.String(255))
+    last_updated = db.Column(db.DateTime)
+
+    def to_dict(self):
+        """Converte para o formato de item da API do Mercado Livre"""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'category_id': self.category_id,
+            'price': self.price,
+            'available_quantity': self.available_quantity,
+            'sold_quantity': self.sold_quantity,
+            'condition': self.condition,
+            'listing_type_id': self.listing_type_id,
+            'status': self.status,
+            'permalink': self.permalink,
+            'thumbnail': self.thumbnail,
+            'last_updated': self.last_updated.isoformat() if self.last_updated else None
+        }
+
+class MeliOrder(db.Model):
+    """Pedido sincronizado da API do Mercado Livre"""
+    __tablename__ = 'meli_order'
+    __table_args__ = (
+        db.Index('ix_meli_order_date_created', 'date_created', 'id'),
+        db.Index('ix_meli_order_status_date', 'status', 'date_created', 'id'),
+        db.Index('ix_meli_order_last_updated', 'last_updated'),
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    status = db.Column(db.String(32), nullable=False)
+    date_created = db.Column(db.DateTime, nullable=False)
+    last_updated = db.Column(db.DateTime, nullable=False)
+    total_amount = db.Column(db.Float, nullable=False, default=0)
+    currency_id = db.Column(db.String(8))
+    buyer_id = db.Column(db.BigInteger)
+    buyer_nickname = db.Column(db.String(100))
+    shipment_id = db.Column(db.BigInteger)
+
+    def to_dict(self, order_items=()):
+        """Converte para o formato de pedido da API do Mercado Livre"""
+        return {
+            'id': self.id,
+            'status': self.status,
+            'date_created': self.date_created.isoformat(),
+            'last_updated': self.last_updated.isoformat(),
+            'total_amount': self.total_amount,
+            'currency_id': self.currency_id,
+            'buyer': {'id': self.buyer_id, 'nickname': self.buyer_nickname},
+            'order_items': [order_item.to_dict() for order_item in order_items],
+            'shipping': {'id': self.shipment_id}
+        }
+
+class MeliOrderItem(db.Model):
+    """Linha (item vendido) de um pedido sincronizado"""
+    __tablename__ = 'meli_order_item'
+
+    order_id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    item_id = db.Column(db.String(32), primary_key=True, index=True)
+    title = db.Column(db.String(255))
+    category_id = db.Column(db.String(64))
+    unit_price = db.Column(db.Float, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+
+    def to_dict(self):
+        return {
+            'item': {'id': self.item_id, 'title': self.title, 'category_id': self.category_id},
+            'unit_price': self.unit_price,
+            'quantity': self.quantity
+        }
+
+class MeliQuestion(db.Model):
+    """Pergunta de comprador sincronizada da API do Mercado Livre"""
+    __tablename__ = 'meli_question'
+    __table_args__ = (
+        db.Index('ix_meli_question_status_date', 'status', 'date_created'),
+        db.Index('ix_meli_question_item_date', 'item_id', 'date_created'),
+    )
+
+    # INTEGER PRIMARY KEY no SQLite: é o rowid, a chave do índice FTS5
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=False)
+    item_id = db.Column(db.String(32))
+    text = db.Column(db.Text, nullable=False, default='')
+    status = db.Column(db.String(16), nullable=False)
+    date_created = db.Column(db.DateTime, nullable=False)
+    from_id = db.Column(db.BigInteger)
+    answered_questions = db.Column(db.Integer)
+    # Radicais das palavras do texto, sem acentos: o que o índice de busca indexa
+    terms = db.Column(db.Text, nullable=False, default='')
+
+    def to_dict(self):
+        """Converte para o formato de pergunta da API do Mercado Livre"""
+        return {
+            'id': self.id,
+            'text': self.text,
+            'status': self.status,
+            'date_created': self.date_created.isoformat(),
+            'from': {'id': self.from_id, 'answered_questions': self.answered_questions},
+            'item_id': self.item_id
+        }
+
+class SyncState(db.Model):
+    """Ponto de retomada de uma sincronização com a API do Mercado Livre"""
+    __tablename__ = 'sync_state'
+
+    name = db.Column(db.String(32), primary_key=True)
+    watermark = db.Column(db.DateTime)
+    offset = db.Column(db.Integer, nullable=False, default=0)
+    # Início da rodada em andamento (None entre rodadas); a marca d'água avança para ele no fim
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    rows_synced = db.Column(db.Integer, nullable=False, default=0)
+
+class DailySalesTotal(db.Model):
+    """Totais de vendas por dia, mantidos junto com a gravação dos pedidos"""
+    __tablename__ = 'daily_sales_total'
+
+    day = db.Column(db.Date, primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+class DailyItemSales(db.Model):
+    """Vendas por dia e anúncio, base do ranking e das categorias"""
+    __tablename__ = 'daily_item_sales'
+
+    day = db.Column(db.Date, primary_key=True)
+    item_id = db.Column(db.String(32), primary_key=True)
+    category_id = db.Column(db.String(64))
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+class StockUpdateJob(db.Model):
+    """Atualização de estoque em lote enviada para a API do Mercado Livre"""
+    __tablename__ = 'stock_update_job'
+
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(16), nullable=False, default='queued', index=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    # Linhas recusadas na leitura e repetições do mesmo produto no arquivo
+    invalid = db.Column(db.Integer, nullable=False, default=0)
+    duplicates = db.Column(db.Integer, nullable=False, default=0)
+    parse_errors = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Os itens só são enviados depois disso, para juntar envios próximos do mesmo produto
+    not_before = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+class StockUpdateItem(db.Model):
+    """Quantidade de um produto em uma atualização em lote e o resultado do envio"""
+    __tablename__ = 'stock_update_item'
+    __table_args__ = (
+        db.Index('ix_stock_update_item_job_status', 'job_id', 'status'),
+        db.Index('ix_stock_update_item_product_status', 'product_id', 'status'),
+    )
+
+    job_id = db.Column(db.String(32), db.ForeignKey('stock_update_job.id'), primary_key=True)
+    product_id = db.Column(db.String(32), primary_key=True)
+    # Posição no arquivo enviado, para listar os resultados na mesma ordem
+    position = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='pending')
+    message = db.Column(db.String(255))
+    updated_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'product_id': self.product_id,
+            'quantity': self.quantity,
+            'status': self.status,
+            'message': self.message
+        }
+
+class BackgroundJob(db.Model):
+    """Job da fila de trabalho em segundo plano"""
+    __tablename__ = 'background_job'
+    __table_args__ = (
+        db.Index('ix_background_job_claim', 'status', 'run_at'),
+        db.Index('ix_background_job_name_status', 'name', 'status', 'finished_at'),
+    )
+
+    id = db.Column(db.String(32), primary_key=True)
+    name = db.Column(db.String(64), nullable=False)
+    args = db.Column(db.JSON)
+    # Maior primeiro; entre iguais, o que está pronto há mais tempo
+    priority = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(16), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # Processo e thread que executa o job agora
+    locked_by = db.Column(db.String(128))
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'args': self.args or {},
+            'priority': self.priority,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at.isoformat(),
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'error': self.error
+        }
+
+class Alert(db.Model):
+    """Alerta de uma regra (estoque baixo, prazo vencido) para uma entidade
+
+    Há no máximo um por regra e entidade: repetir um alerta ativo só o
+    atualiza, e um resolvido volta a ficar ativo se a condição reaparecer.
+    """
+    __tablename__ = 'alert'
+    __table_args__ = (
+        db.UniqueConstraint('rule', 'entity_id', name='uq_alert_rule_entity'),
+        # Avisos do dashboard: contagem e mais recente dos ativos de cada regra
+        db.Index('ix_alert_status_rule_raised', 'status', 'rule', 'raised_at'),
+        # Listagem de todas as regras, dos mais recentes para os mais antigos
+        db.Index('ix_alert_status_raised', 'status', 'raised_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    rule = db.Column(db.String(32), nullable=False)
+    # Anúncio, produto do CD ou pergunta, conforme a regra
+    entity_id = db.Column(db.String(64), nullable=False)
+    category = db.Column(db.String(100))
+    status = db.Column(db.String(16), nullable=False, default='active')
+    severity = db.Column(db.String(16), nullable=False, default='medium')
+    message = db.Column(db.String(255), nullable=False, default='')
+    # Valor observado (estoque, horas) e o limite da regra
+    value = db.Column(db.Float)
+    threshold = db.Column(db.Float)
+    raised_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+    resolved_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'rule': self.rule,
+            'entity_id': self.entity_id,
+            'category': self.category,
+            'status': self.status,
+            'severity': self.severity,
+            'message': self.message,
+            'value': self.value,
+            'threshold': self.threshold,
+            'raised_at': self.raised_at.isoformat(),
+            'updated_at': self.updated_at.isoformat(),
+            'resolved_at': self.resolved_at.isoformat() if self.resolved_at else None
+        }
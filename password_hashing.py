@@ -0,0 +1,150 @@
+"""
+Política de hash de senhas: bcrypt (padrão) ou argon2, com custo configurável
+Hashes gerados com outra política são refeitos no login, e as verificações
+rodam em um pool limitado para que uma rajada de logins não ocupe os
+núcleos que atendem as demais rotas
+"""
+
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+
+try:
+    import argon2
+except ImportError:
+    # argon2-cffi é opcional; sem ele só o bcrypt está disponível
+    argon2 = None
+
+# O bcrypt só considera os primeiros 72 bytes da senha
+BCRYPT_MAX_BYTES = 72
+
+_BCRYPT_COST = re.compile(r'^\$2[aby]?\$(\d{2})\$')
+
+def default_workers(processes=None):
+    """Threads de hash por processo: os núcleos divididos por `processes`, no mínimo 1"""
+    return max(1, (os.cpu_count() or 1) // max(1, int(processes or 1)))
+
+class HashingBusy(Exception):
+    """Fila de verificação de senhas cheia"""
+
+class PasswordHasher:
+    """Gera e confere hashes de senha segundo a política configurada"""
+
+    def __init__(self, app=None):
+        self._argon2 = None
+        self._pool = None
+        self.rejected = 0
+        self.configure()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Lê PASSWORD_SCHEME, BCRYPT_LOG_ROUNDS, ARGON2_* e LOGIN_* da configuração"""
+        self.configure(
+            scheme=app.config.get('PASSWORD_SCHEME', 'bcrypt'),
+            bcrypt_rounds=app.config.get('BCRYPT_LOG_ROUNDS', 12),
+            argon2_time_cost=app.config.get('ARGON2_TIME_COST', 3),
+            argon2_memory_cost=app.config.get('ARGON2_MEMORY_COST', 65536),
+            argon2_parallelism=app.config.get('ARGON2_PARALLELISM', 1),
+            workers=app.config.get('LOGIN_WORKERS'),
+            max_pending=app.config.get('LOGIN_MAX_PENDING'),
+            processes=app.config.get('WEB_CONCURRENCY')
+        )
+
+    def configure(self, scheme='bcrypt', bcrypt_rounds=12, argon2_time_cost=3,
+                  argon2_memory_cost=65536, argon2_parallelism=1, workers=None, max_pending=None,
+                  processes=None):
+        if scheme not in ('bcrypt', 'argon2'):
+            raise ValueError(f'Esquema de senha desconhecido: {scheme}')
+        if scheme == 'argon2' and argon2 is None:
+            raise RuntimeError('PASSWORD_SCHEME=argon2 requer o pacote argon2-cffi')
+        self.scheme = scheme
+        self.bcrypt_rounds = int(bcrypt_rounds)
+        self.argon2_options = {
+            'time_cost': int(argon2_time_cost),
+            'memory_cost': int(argon2_memory_cost),
+            'parallelism': int(argon2_parallelism)
+        }
+        if argon2 is not None:
+            self._argon2 = argon2.PasswordHasher(**self.argon2_options)
+
+        # Os núcleos divididos entre os processos do servidor, para que os pools
+        # de todos os workers somados não passem de uma verificação por núcleo;
+        # as que passarem da fila recebem HashingBusy
+        workers = int(workers or default_workers(processes))
+        max_pending = int(max_pending if max_pending is not None else workers * 8)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self.workers = workers
+        self.max_pending = max_pending
+        self._dummy_hash = None
+
+    def hash(self, password):
+        """Hash da senha com a política atual"""
+        if self.scheme == 'argon2':
+            return self._argon2.hash(password)
+        salt = bcrypt.gensalt(rounds=self.bcrypt_rounds)
+        return bcrypt.hashpw(password.encode('utf-8')[:BCRYPT_MAX_BYTES], salt).decode('utf-8')
+
+    def verify(self, password_hash, password):
+        """Confere a senha contra um hash de qualquer esquema suportado"""
+        if not password_hash:
+            return False
+        if password_hash.startswith('$argon2'):
+            if argon2 is None:
+                return False
+            try:
+                return self._argon2.verify(password_hash, password)
+            except (argon2.exceptions.VerificationError, argon2.exceptions.InvalidHashError):
+                return False
+        try:
+            return bcrypt.checkpw(password.encode('utf-8')[:BCRYPT_MAX_BYTES],
+                                  password_hash.encode('utf-8'))
+        except ValueError:
+            return False
+
+    def needs_rehash(self, password_hash):
+        """Indica se o hash foi gerado com outro esquema ou outro custo"""
+        if password_hash.startswith('$argon2'):
+            return self.scheme != 'argon2' or self._argon2.check_needs_rehash(password_hash)
+        if self.scheme != 'bcrypt':
+            return True
+        match = _BCRYPT_COST.match(password_hash)
+        return match is None or int(match.group(1)) != self.bcrypt_rounds
+
+    @property
+    def dummy_hash(self):
+        """Hash de referência para conferir logins de emails inexistentes no mesmo tempo"""
+        if self._dummy_hash is None:
+            self._dummy_hash = self.hash(os.urandom(16).hex())
+        return self._dummy_hash
+
+    def run(self, fn, *args):
+        """Executa `fn` no pool de hash; levanta HashingBusy se a fila estiver cheia"""
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashingBusy()
+        try:
+            future = self._pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def stats(self):
+        return {
+            'scheme': self.scheme,
+            'bcrypt_rounds': self.bcrypt_rounds if self.scheme == 'bcrypt' else None,
+            'argon2': self.argon2_options if self.scheme == 'argon2' else None,
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'rejected': self.rejected
+        }
+
+# Instância usada pelo modelo de usuário e pelas rotas de autenticação
+passwords = PasswordHasher()
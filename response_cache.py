@@ -0,0 +1,117 @@
+"""
+Respostas JSON pré-serializadas para as rotas somente leitura
+Cada versão dos dados é serializada e comprimida uma única vez; as requisições
+seguintes só escolhem a variante e respondem 304 quando o ETag bate
+"""
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from flask import Response, current_app, request
+
+try:
+    import brotli
+except ImportError:
+    # Brotli é opcional; sem ele só as variantes gzip são geradas
+    brotli = None
+
+# Respostas menores que isso não compensam a compressão
+MIN_COMPRESS_SIZE = 1024
+
+class PrecompiledResponse:
+    """Corpo JSON já serializado, com as variantes comprimidas e o ETag"""
+
+    def __init__(self, body):
+        self.body = body
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etag = digest
+        self.variants = {}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            if brotli is not None:
+                self._add_variant('br', brotli.compress(body, quality=9))
+            self._add_variant('gzip', gzip.compress(body, compresslevel=6, mtime=0))
+
+    def _add_variant(self, encoding, data):
+        if len(data) < len(self.body):
+            self.variants[encoding] = data
+
+    @property
+    def size(self):
+        return len(self.body) + sum(len(data) for data in self.variants.values())
+
+    def etags(self):
+        """ETags fortes de todas as representações desta versão"""
+        return [self.etag] + [f'{self.etag}-{encoding}' for encoding in self.variants]
+
+    def to_response(self):
+        """Monta a resposta para a requisição atual (304, comprimida ou não)"""
+        if any(request.if_none_match.contains(tag) for tag in self.etags()):
+            response = Response(status=304)
+            response.set_etag(self.etag)
+        else:
+            encoding = self._negotiate()
+            if encoding:
+                response = Response(self.variants[encoding], mimetype='application/json')
+                response.headers['Content-Encoding'] = encoding
+                response.set_etag(f'{self.etag}-{encoding}')
+            else:
+                response = Response(self.body, mimetype='application/json')
+                response.set_etag(self.etag)
+        response.headers['Vary'] = 'Accept-Encoding'
+        # O cliente sempre revalida, mas só baixa o corpo quando mudou
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    def _negotiate(self):
+        accepted = request.accept_encodings
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and accepted[encoding] > 0:
+                return encoding
+        return None
+
+class ResponseCache:
+    """Cache LRU de respostas pré-serializadas, limitado em bytes"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key, builder):
+        """Retorna a resposta da chave, serializando `builder()` só na primeira vez"""
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+
+        body = current_app.json.dumps(builder(), separators=(',', ':'))
+        compiled = PrecompiledResponse(body.encode('utf-8'))
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = compiled
+                self._bytes += compiled.size
+                while self._bytes > self.max_bytes and len(self._entries) > 1:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= evicted.size
+        return compiled
+
+    def respond(self, key, builder):
+        """Atalho para montar a resposta da requisição atual"""
+        return self.get_or_build(key, builder).to_response()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
@@ -0,0 +1,80 @@
+"""
+Informações do processo servidor e coordenação entre os workers
+Os workers saem de um fork do processo mestre; tarefas que devem rodar uma
+vez só (como a sincronização com o Mercado Livre) ficam com o worker que
+segura o lock de arquivo
+"""
+
+import os
+
+try:
+    import fcntl
+except ImportError:
+    # Sem fcntl (Windows) não há lock entre processos; cada processo é líder
+    fcntl = None
+
+def process_memory(pid='self'):
+    """Memória do processo em MB: rss, pss (rss rateado entre processos) e privada
+
+    O pss e a memória privada mostram o quanto do worker é compartilhado com o
+    mestre por copy-on-write. Fora do Linux retorna um dicionário vazio.
+    """
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if value.strip().endswith('kB'):
+                    fields[name] = int(value.split()[0])
+    except OSError:
+        return {}
+    return {
+        'rss_mb': round(fields.get('Rss', 0) / 1024, 1),
+        'pss_mb': round(fields.get('Pss', 0) / 1024, 1),
+        'private_mb': round((fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)) / 1024, 1)
+    }
+
+class FileLock:
+    """Lock exclusivo em um arquivo, entre processos
+
+    Liberado pelo sistema se o processo terminar; serve tanto para serializar
+    um trecho (`with`) quanto para eleger um líder (`acquire(blocking=False)`).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self):
+        return self._file is not None
+
+    def acquire(self, blocking=True):
+        """Pega o lock; sem `blocking`, retorna False se outro processo o tem"""
+        if self._file is not None:
+            return True
+        if fcntl is None:
+            self._file = True
+            return True
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        f = open(self.path, 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is not None and self._file is not True:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef, useCallback } from 'react';
 import { Search, Filter, Package, Clock, TrendingUp, BarChart3, Users, FileText, GraduationCap, User, AlertCircle, LogOut } from 'lucide-react';
 import { AuthProvider } from './contexts/AuthContext';
 import { useAuth } from './contexts/AuthContext';
@@ -8,8 +8,11 @@ import logoImage from './assets/logo.png';
 import './App.css';
 
 function Dashboard() {
-  const { user, logout, authenticatedFetch } = useAuth();
-  const [data, setData] = useState({ products: [], metrics: {} });
+  const { user, token, logout, authenticatedFetch } = useAuth();
+  const [data, setData] = useState({ products: [], metrics: {}, categorias: [] });
+  // Cursor da próxima página de produtos (null quando não há mais)
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [meliData, setMeliData] = useState({ 
     metrics: {}, 
     products: [], 
@@ -27,10 +30,11 @@ function Dashboard() {
   useEffect(() => {
     const loadData = async () => {
       try {
-        // Carregar dados do Cross Docking
+        // Carregar métricas, categorias e a primeira página do Cross Docking
         const cdResponse = await authenticatedFetch('/api/cd-data');
         const cdData = await cdResponse.json();
-        setData(cdData);
+        setData({ products: cdData.products, metrics: cdData.metrics, categorias: cdData.categorias });
+        setNextCursor(cdData.paging.next_cursor);
 
         // Carregar dados do Mercado Livre
         const [metricsRes, productsRes, ordersRes, notificationsRes, analyticsRes] = await Promise.all([
@@ -66,6 +70,106 @@ function Dashboard() {
     loadData();
   }, [authenticatedFetch]);
 
+  // Busca, filtros e paginação dos produtos ficam no servidor (/api/products)
+  const fetchProducts = useCallback(async (cursor) => {
+    const params = new URLSearchParams();
+    if (searchTerm.trim()) params.set('q', searchTerm.trim());
+    if (selectedCategory) params.set('categoria', selectedCategory);
+    if (selectedStatus) params.set('status', selectedStatus);
+    if (cursor) params.set('cursor', cursor);
+    const response = await authenticatedFetch(`/api/products?${params}`);
+    return response.json();
+  }, [authenticatedFetch, searchTerm, selectedCategory, selectedStatus]);
+
+  const filtersChanged = useRef(false);
+  useEffect(() => {
+    // A primeira página sem filtros já veio com /api/cd-data
+    if (!filtersChanged.current) {
+      filtersChanged.current = true;
+      return undefined;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const page = await fetchProducts();
+        if (cancelled) return;
+        setData((prev) => ({ ...prev, products: page.results }));
+        setNextCursor(page.paging.next_cursor);
+      } catch (error) {
+        console.error('Erro ao buscar produtos:', error);
+      }
+    }, 300);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [fetchProducts]);
+
+  const loadMoreProducts = async () => {
+    setLoadingMore(true);
+    try {
+      const page = await fetchProducts(nextCursor);
+      setData((prev) => ({ ...prev, products: [...prev.products, ...page.results] }));
+      setNextCursor(page.paging.next_cursor);
+    } catch (error) {
+      console.error('Erro ao carregar mais produtos:', error);
+    }
+    setLoadingMore(false);
+  };
+
+  // Atualizações enviadas pelo servidor (SSE): só o que mudou, sem recarregar as rotas
+  useEffect(() => {
+    if (!token) return undefined;
+    let source;
+    let retryTimer;
+    const applyState = (current, { set, unset, reset }) => {
+      const next = reset ? { ...set } : { ...current, ...set };
+      (unset || []).forEach((key) => delete next[key]);
+      return next;
+    };
+
+    let notifications = {};
+    const listen = () => {
+      source = new EventSource(`/api/stream?jwt=${encodeURIComponent(token)}`);
+      // Com o servidor no limite de streams (503) o navegador desiste; tenta de novo
+      source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED) {
+          retryTimer = setTimeout(listen, 5000 + Math.random() * 5000);
+        }
+      };
+
+      source.addEventListener('cd_metrics', (event) => {
+        const diff = JSON.parse(event.data);
+        setData((prev) => ({ ...prev, metrics: applyState(prev.metrics, diff) }));
+      });
+      source.addEventListener('meli_metrics', (event) => {
+        const diff = JSON.parse(event.data);
+        setMeliData((prev) => ({ ...prev, metrics: applyState(prev.metrics, diff) }));
+      });
+
+      source.addEventListener('notifications', (event) => {
+        notifications = applyState(notifications, JSON.parse(event.data));
+        setMeliData((prev) => ({ ...prev, notifications: Object.values(notifications) }));
+      });
+      source.addEventListener('orders', (event) => {
+        const { changes } = JSON.parse(event.data);
+        const statuses = Object.fromEntries(changes.map((change) => [change.id, change.status]));
+        setMeliData((prev) => ({
+          ...prev,
+          orders: prev.orders.map((order) => (
+            order.id in statuses ? { ...order, status: statuses[order.id] } : order
+          ))
+        }));
+      });
+    };
+
+    listen();
+    return () => {
+      clearTimeout(retryTimer);
+      source.close();
+    };
+  }, [token]);
+
   // Dados mockados para gestores
   const gestores = [
     { id: 1, nome: 'Ana Silva', departamento: 'Logística', email: 'ana.silva@meli.com', telefone: '(11) 99999-1111' },
@@ -122,16 +226,10 @@ function Dashboard() {
     return imageMap[productKey] || 'https://via.placeholder.com/100/FFE600/000000?text=PROD';
   };
 
-  const filteredProducts = data.products.filter(product => {
-    const matchesSearch = product.nome.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                         product.sku.toLowerCase().includes(searchTerm.toLowerCase());
-    const matchesCategory = selectedCategory === '' || product.categoria.toLowerCase() === selectedCategory.toLowerCase();
-    const matchesStatus = selectedStatus === '' || product.status.toLowerCase() === selectedStatus.toLowerCase();
-    
-    return matchesSearch && matchesCategory && matchesStatus;
-  });
+  // Já filtrados pelo servidor; são as páginas carregadas até agora
+  const filteredProducts = data.products;
 
-  const categories = [...new Set(data.products.map(product => product.categoria))];
+  const categories = data.categorias;
 
   const getStatusBadge = (status) => {
     const statusConfig = {
@@ -324,7 +422,7 @@ function Dashboard() {
 
                     <div className="text-sm text-corporate-light flex items-center font-medium">
                       <Package className="h-4 w-4 mr-2 text-meli-blue" />
-                      {filteredProducts.length} produtos encontrados
+                      {filteredProducts.length}{nextCursor ? '+' : ''} produtos encontrados
                     </div>
                   </div>
                 </div>
@@ -377,6 +475,14 @@ function Dashboard() {
                 ))}
               </div>
 
+              {nextCursor && (
+                <div className="text-center mt-8">
+                  <button className="btn-corporate-primary" onClick={loadMoreProducts} disabled={loadingMore}>
+                    {loadingMore ? 'Carregando...' : 'Carregar mais'}
+                  </button>
+                </div>
+              )}
+
               {filteredProducts.length === 0 && (
                 <div className="text-center py-12">
                   <Package className="mx-auto h-12 w-12 text-gray-400" />
@@ -102,6 +102,13 @@ export const AuthProvider = ({ children }) => {
   };
 
   const logout = () => {
+    // Revoga o token no servidor; a sessão local é encerrada de qualquer forma
+    if (token) {
+      fetch('/api/auth/logout', {
+        method: 'POST',
+        headers: { 'Authorization': `Bearer ${token}` },
+      }).catch(() => {});
+    }
     localStorage.removeItem('meli_dashboard_token');
     localStorage.removeItem('meli_dashboard_user');
     setToken(null);
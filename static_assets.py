@@ -0,0 +1,170 @@
+"""
+Arquivos do frontend (build do Vite em static/) servidos a partir de um manifesto
+A árvore é lida uma vez na inicialização: cada arquivo vira uma entrada com
+tamanho, hash (ETag) e as variantes comprimidas (gzip e, com o pacote brotli,
+br), então uma requisição é só uma consulta ao dicionário. Os arquivos com
+hash no nome (assets/) são imutáveis e vão com cache de um ano; o original sai
+por sendfile quando o servidor oferece wsgi.file_wrapper.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+from datetime import datetime, timezone
+from flask import Response, jsonify, request
+from werkzeug.wsgi import wrap_file
+
+try:
+    import brotli
+except ImportError:
+    # Brotli é opcional; sem ele só há a variante gzip (ou .br gerado no build)
+    brotli = None
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+# Demais arquivos (index.html, favicon): sempre revalidados pelo ETag
+REVALIDATE_CACHE = 'no-cache'
+
+COMPRESSIBLE_TYPES = {
+    'application/javascript', 'text/javascript', 'application/json', 'application/manifest+json',
+    'application/xml', 'image/svg+xml', 'application/wasm'
+}
+# Ordem de preferência quando o cliente aceita as duas
+ENCODINGS = ('br', 'gzip')
+EXTENSIONS = {'br': '.br', 'gzip': '.gz'}
+
+class Asset:
+    """Um arquivo do build: metadados e variantes comprimidas
+
+    Cada variante é bytes (comprimida na inicialização) ou o caminho de um
+    arquivo .gz/.br gerado no build.
+    """
+
+    __slots__ = ('path', 'filename', 'size', 'etag', 'mimetype', 'last_modified', 'cache_control', 'variants')
+
+    def __init__(self, path, filename, size, etag, mimetype, last_modified, cache_control):
+        self.path = path
+        self.filename = filename
+        self.size = size
+        self.etag = etag
+        self.mimetype = mimetype
+        self.last_modified = last_modified
+        self.cache_control = cache_control
+        self.variants = {}
+
+def _compressible(mimetype):
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES
+
+def _compress(data, encoding, brotli_quality):
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality) if brotli is not None else None
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+class StaticManifest:
+    """Índice em memória dos arquivos estáticos e a resposta de cada um"""
+
+    def __init__(self, app=None):
+        self.root = None
+        self.assets = {}
+        self.immutable_prefix = 'assets/'
+        self.min_size = 1024
+        self.brotli_quality = 11
+        self.index = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Lê STATIC_ROOT, STATIC_IMMUTABLE_PREFIX, STATIC_COMPRESS_MIN_SIZE, STATIC_BROTLI_QUALITY e indexa"""
+        self.root = app.config.get('STATIC_ROOT') or os.path.join(app.root_path, 'static')
+        self.immutable_prefix = app.config.get('STATIC_IMMUTABLE_PREFIX', self.immutable_prefix)
+        self.min_size = app.config.get('STATIC_COMPRESS_MIN_SIZE', self.min_size)
+        self.brotli_quality = app.config.get('STATIC_BROTLI_QUALITY', self.brotli_quality)
+        self.scan()
+        app.logger.info('Arquivos estáticos: %s', self.stats())
+
+    def scan(self):
+        """Percorre a árvore e monta o manifesto (troca o anterior de uma vez)"""
+        assets = {}
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                filename = os.path.join(directory, name)
+                path = os.path.relpath(filename, self.root).replace(os.sep, '/')
+                # Variantes geradas no build entram junto do original
+                if os.path.splitext(path)[1] in ('.gz', '.br') and os.path.exists(os.path.splitext(filename)[0]):
+                    continue
+                assets[path] = self._load(path, filename)
+        self.assets = assets
+        self.index = assets.get('index.html')
+        return len(assets)
+
+    def _load(self, path, filename):
+        with open(filename, 'rb') as f:
+            data = f.read()
+        stat = os.stat(filename)
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        immutable = path.startswith(self.immutable_prefix)
+        asset = Asset(
+            path, filename, len(data), hashlib.sha256(data).hexdigest()[:32], mimetype,
+            datetime.fromtimestamp(int(stat.st_mtime), timezone.utc),
+            IMMUTABLE_CACHE if immutable else REVALIDATE_CACHE
+        )
+        if _compressible(mimetype) and len(data) >= self.min_size:
+            for encoding in ENCODINGS:
+                prebuilt = filename + EXTENSIONS[encoding]
+                if os.path.exists(prebuilt):
+                    asset.variants[encoding] = prebuilt
+                    continue
+                body = _compress(data, encoding, self.brotli_quality)
+                # Só vale a pena se reduzir de verdade
+                if body is not None and len(body) < len(data) * 0.9:
+                    asset.variants[encoding] = body
+        return asset
+
+    def stats(self):
+        variants = {encoding: sum(encoding in asset.variants for asset in self.assets.values())
+                    for encoding in ENCODINGS}
+        return {
+            'files': len(self.assets),
+            'bytes': sum(asset.size for asset in self.assets.values()),
+            'compressed_bytes': sum(len(body) for asset in self.assets.values()
+                                    for body in asset.variants.values() if isinstance(body, bytes)),
+            'variants': variants
+        }
+
+    def lookup(self, path):
+        """Arquivo do caminho; rotas do SPA caem no index.html, assets inexistentes não"""
+        asset = self.assets.get(path)
+        if asset is None and not path.startswith(self.immutable_prefix):
+            asset = self.index
+        return asset
+
+    def _negotiate(self, asset):
+        for encoding in ENCODINGS:
+            if encoding in asset.variants and request.accept_encodings[encoding] > 0:
+                return encoding
+        return None
+
+    def respond(self, path):
+        """Resposta do arquivo com negociação de codificação, ETag e cache"""
+        asset = self.lookup(path)
+        if asset is None:
+            return jsonify({'error': 'Arquivo não encontrado'}), 404
+        encoding = self._negotiate(asset)
+        body = asset.variants[encoding] if encoding else asset.filename
+        if isinstance(body, bytes):
+            response = Response(body, mimetype=asset.mimetype)
+        else:
+            # Arquivo em disco: o file_wrapper do servidor usa sendfile
+            size = asset.size if encoding is None else os.path.getsize(body)
+            response = Response(wrap_file(request.environ, open(body, 'rb')), mimetype=asset.mimetype,
+                                direct_passthrough=True)
+            response.content_length = size
+        if encoding:
+            response.content_encoding = encoding
+        if asset.variants:
+            response.vary.add('Accept-Encoding')
+        # A mesma representação tem sempre o mesmo ETag, em qualquer worker
+        response.set_etag(f'{asset.etag}-{encoding}' if encoding else asset.etag)
+        response.last_modified = asset.last_modified
+        response.headers['Cache-Control'] = asset.cache_control
+        return response.make_conditional(request)
@@ -0,0 +1,340 @@
+"""
+Atualização de estoque em lote (reconciliação do inventário)
+Cada arquivo enviado (CSV ou JSON lines) vira um job com um item por produto;
+uma thread de fundo envia os itens à API em lotes, com concorrência limitada,
+e grava o resultado de cada um. Escritas ainda não enviadas de um produto são
+descartadas quando chega uma mais nova para ele; uma escrita individual espera
+o lote já em envio do produto terminar (wait_for_batch).
+"""
+
+import csv
+import io
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, func, select
+import meli_store
+from models import db, StockUpdateJob, StockUpdateItem
+
+# Produtos por arquivo enviado
+MAX_ITEMS = 100000
+# Erros de leitura guardados no job; os demais só entram na contagem
+MAX_PARSE_ERRORS = 100
+# Linhas por INSERT e ids por IN (...)
+CHUNK_SIZE = 500
+
+class StockFileError(ValueError):
+    """Arquivo de estoque recusado por inteiro"""
+
+def _chunks(values, size=CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+class _ReadableStream(io.RawIOBase):
+    """Adapta um stream que só tem read() (ex.: wsgi.input do gunicorn) para o TextIOWrapper"""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+def _parse_csv(lines):
+    for line_no, row in enumerate(csv.reader(lines), 1):
+        if not any(cell.strip() for cell in row):
+            continue
+        # Cabeçalho opcional na primeira linha
+        if line_no == 1 and row[0].strip().lower() in ('product_id', 'id', 'item_id'):
+            continue
+        if len(row) < 2:
+            yield line_no, None, None, 'Linha deve ter product_id e quantity'
+            continue
+        yield line_no, row[0].strip(), row[1].strip(), None
+
+def _parse_ndjson(lines):
+    for line_no, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            yield line_no, None, None, 'JSON inválido'
+            continue
+        if not isinstance(entry, dict):
+            yield line_no, None, None, 'Cada linha deve ser um objeto JSON'
+            continue
+        yield line_no, entry.get('product_id'), entry.get('quantity'), None
+
+def _quantity(value):
+    if isinstance(value, (bool, float)):
+        raise ValueError
+    quantity = int(value)
+    if quantity < 0:
+        raise ValueError
+    return quantity
+
+def parse_updates(stream, fmt):
+    """Lê as linhas (product_id, quantity) de um arquivo CSV ou JSON lines
+
+    Retorna as quantidades por produto (a última linha de cada produto vale),
+    os erros de leitura, o total de linhas recusadas e o de repetições.
+    """
+    lines = io.TextIOWrapper(io.BufferedReader(_ReadableStream(stream)), encoding='utf-8-sig', newline='')
+    parser = _parse_csv if fmt == 'csv' else _parse_ndjson
+    quantities, errors = {}, []
+    invalid = duplicates = 0
+    try:
+        for line_no, product_id, quantity, error in parser(lines):
+            if error is None and not product_id:
+                error = 'product_id ausente'
+            if error is None:
+                try:
+                    quantity = _quantity(quantity)
+                except (TypeError, ValueError):
+                    error = 'quantity deve ser um inteiro não negativo'
+            if error is not None:
+                invalid += 1
+                if len(errors) < MAX_PARSE_ERRORS:
+                    errors.append({'line': line_no, 'error': error})
+                continue
+            product_id = str(product_id)
+            if product_id in quantities:
+                duplicates += 1
+                # Vai para o fim: os resultados seguem a ordem da última linha
+                del quantities[product_id]
+            quantities[product_id] = quantity
+            if len(quantities) > MAX_ITEMS:
+                raise StockFileError(f'Máximo de {MAX_ITEMS} produtos por arquivo')
+    except UnicodeDecodeError:
+        raise StockFileError('O arquivo deve estar em UTF-8')
+    return quantities, errors, invalid, duplicates
+
+def supersede_pending(product_ids, message, exclude_job=None):
+    """Descarta as escritas ainda não enviadas dos produtos; retorna quantas eram"""
+    table = StockUpdateItem.__table__
+    superseded = 0
+    for chunk in _chunks(list(product_ids)):
+        statement = table.update().where(
+            table.c.product_id.in_(chunk), table.c.status == 'pending'
+        ).values(status='superseded', message=message, updated_at=datetime.utcnow())
+        if exclude_job is not None:
+            statement = statement.where(table.c.job_id != exclude_job)
+        superseded += db.session.execute(statement).rowcount
+    return superseded
+
+def wait_for_batch(product_id, message, timeout, interval=0.1):
+    """Prepara uma escrita individual do produto, serializada com o envio em lote
+
+    Descarta os itens pendentes do produto e espera o que já está em envio
+    terminar, para que a escrita individual chegue à API depois dele. Retorna
+    False se o envio não terminou em `timeout` segundos.
+    """
+    table = StockUpdateItem.__table__
+    deadline = time.monotonic() + timeout
+    while True:
+        supersede_pending([product_id], message)
+        db.session.commit()
+        sending = db.session.execute(select(func.count()).where(
+            table.c.product_id == product_id, table.c.status == 'sending'
+        )).scalar()
+        db.session.commit()
+        if not sending:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+
+def create_job(quantities, parse_errors=(), invalid=0, duplicates=0, window=0):
+    """Grava um job com os itens pendentes; envios só depois de `window` segundos"""
+    now = datetime.utcnow()
+    job = StockUpdateJob(
+        id=uuid.uuid4().hex, status='queued', total=len(quantities), invalid=invalid,
+        duplicates=duplicates, parse_errors=list(parse_errors), created_at=now,
+        not_before=now + timedelta(seconds=window)
+    )
+    db.session.add(job)
+    db.session.flush()
+    rows = [
+        {'job_id': job.id, 'product_id': product_id, 'position': position,
+         'quantity': quantity, 'status': 'pending'}
+        for position, (product_id, quantity) in enumerate(quantities.items())
+    ]
+    for chunk in _chunks(rows):
+        db.session.execute(StockUpdateItem.__table__.insert(), chunk)
+    # Este job é a escrita mais recente dos seus produtos
+    supersede_pending(quantities, f'Substituído pelo job {job.id}', exclude_job=job.id)
+    db.session.commit()
+    return job
+
+def job_summary(job):
+    """Andamento do job: contagem de itens por situação"""
+    counts = dict(db.session.execute(
+        select(StockUpdateItem.status, func.count())
+        .where(StockUpdateItem.job_id == job.id)
+        .group_by(StockUpdateItem.status)
+    ).all())
+    pending = counts.get('pending', 0) + counts.get('sending', 0)
+    return {
+        'id': job.id,
+        'status': job.status,
+        'total': job.total,
+        'pending': pending,
+        'done': counts.get('done', 0),
+        'failed': counts.get('failed', 0),
+        'superseded': counts.get('superseded', 0),
+        'progress': round(100 * (job.total - pending) / job.total, 1) if job.total else 100.0,
+        'invalid': job.invalid,
+        'duplicates': job.duplicates,
+        'parse_errors': job.parse_errors or [],
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+
+def job_items(job_id, status=None, offset=0, limit=500):
+    """Resultado por item, na ordem do arquivo"""
+    query = StockUpdateItem.query.filter_by(job_id=job_id)
+    if status:
+        query = query.filter_by(status=status)
+    items = query.order_by(StockUpdateItem.position).offset(offset).limit(limit).all()
+    return [item.to_dict() for item in items]
+
+class StockUpdater:
+    """Envia à API os itens pendentes dos jobs, um job por vez e em lotes
+
+    Roda em um único processo (o worker líder): com um só remetente, a escrita
+    mais nova de um produto é sempre enviada depois das anteriores.
+    """
+
+    def __init__(self, app=None, api=None, batch_size=500, window=2.0, poll_interval=1.0):
+        self.api = api
+        self.batch_size = batch_size
+        self.window = window
+        self.poll_interval = poll_interval
+        # Chamados com o resumo de cada job concluído
+        self.listeners = []
+        self._wake = threading.Event()
+        self._thread = None
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Liga o envio à aplicação (STOCK_BATCH_SIZE, STOCK_COALESCE_WINDOW)"""
+        self.app = app
+        self.batch_size = app.config.get('STOCK_BATCH_SIZE', self.batch_size)
+        self.window = app.config.get('STOCK_COALESCE_WINDOW', self.window)
+
+    def on_job_done(self, listener):
+        """Registra `listener(summary)` para o fim de cada job (decorador)"""
+        self.listeners.append(listener)
+        return listener
+
+    def submit(self, quantities, parse_errors=(), invalid=0, duplicates=0):
+        """Cria o job e avisa o remetente (se ele estiver neste processo)"""
+        job = create_job(quantities, parse_errors, invalid, duplicates, self.window)
+        self._wake.set()
+        return job
+
+    def _next_job(self):
+        return (StockUpdateJob.query
+                .filter(StockUpdateJob.status.in_(('queued', 'running')),
+                        StockUpdateJob.not_before <= datetime.utcnow())
+                .order_by(StockUpdateJob.created_at)
+                .first())
+
+    def _claim(self, job_id):
+        """Marca o próximo lote de itens pendentes do job como em envio"""
+        items = db.session.execute(
+            select(StockUpdateItem.product_id, StockUpdateItem.quantity)
+            .where(StockUpdateItem.job_id == job_id, StockUpdateItem.status == 'pending')
+            .order_by(StockUpdateItem.position)
+            .limit(self.batch_size)
+        ).all()
+        batch = dict(items)
+        table = StockUpdateItem.__table__
+        for chunk in _chunks(list(batch)):
+            db.session.execute(table.update().where(
+                table.c.job_id == job_id, table.c.product_id.in_(chunk), table.c.status == 'pending'
+            ).values(status='sending'))
+        db.session.commit()
+        return batch
+
+    def _send(self, job_id, batch):
+        """Envia um lote e grava o resultado de cada item"""
+        try:
+            response = self.api.update_stocks(batch)
+            results, errors = response['results'], response['errors']
+        except Exception as e:
+            # Falha fora das chamadas individuais: o lote inteiro falha
+            results, errors = {}, {product_id: {'message': str(e)} for product_id in batch}
+        table = StockUpdateItem.__table__
+        statement = table.update().where(
+            table.c.job_id == job_id, table.c.product_id == bindparam('b_product')
+        ).values(status=bindparam('b_status'), message=bindparam('b_message'), updated_at=datetime.utcnow())
+        rows = [{'b_product': product_id, 'b_status': 'done', 'b_message': None} for product_id in results]
+        rows += [{'b_product': product_id, 'b_status': 'failed',
+                  'b_message': (error.get('message') or f"HTTP {error.get('status')}")[:255]}
+                 for product_id, error in errors.items()]
+        if rows:
+            db.session.execute(statement, rows)
+        # O commit de update_items_stock grava também os resultados
+        meli_store.update_items_stock(results)
+        db.session.commit()
+
+    def run_once(self):
+        """Processa o próximo job pronto; retorna False se não havia nenhum"""
+        with self.app.app_context():
+            job = self._next_job()
+            if job is None:
+                return False
+            if job.started_at is None:
+                job.status = 'running'
+                job.started_at = datetime.utcnow()
+                db.session.commit()
+            while True:
+                batch = self._claim(job.id)
+                if not batch:
+                    break
+                self._send(job.id, batch)
+            job.status = 'done'
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            summary = job_summary(job)
+            self.app.logger.info('Atualização de estoque %s concluída: %s', job.id, summary)
+            for listener in self.listeners:
+                listener(summary)
+            return True
+
+    def _requeue_interrupted(self):
+        """Itens que estavam em envio quando o processo anterior parou voltam à fila"""
+        with self.app.app_context():
+            table = StockUpdateItem.__table__
+            db.session.execute(table.update().where(table.c.status == 'sending').values(status='pending'))
+            db.session.commit()
+
+    def _loop(self):
+        self._requeue_interrupted()
+        while True:
+            try:
+                busy = self.run_once()
+            except Exception:
+                self.app.logger.exception('Erro inesperado na atualização de estoque em lote')
+                self._requeue_interrupted()
+                busy = False
+            if not busy:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def start(self):
+        """Inicia o envio em segundo plano"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='stock-updates', daemon=True)
+            self._thread.start()
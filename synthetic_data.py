@@ -0,0 +1,444 @@
+"""
+Gerador determinístico de dados sintéticos do Mercado Livre
+Anúncios, pedidos (com envios) e perguntas gerados em colunas, em lotes, a
+partir de uma semente: cada campo de cada linha é um hash (splitmix64) da
+semente, do campo e do número da linha, então qualquer faixa de linhas pode
+ser gerada sozinha e sempre sai igual, com ou sem NumPy. Os dicionários só
+são montados na saída (API, NDJSON ou banco).
+
+Uso: python synthetic_data.py --items 1000000 --orders 5000000 --ndjson dados/
+     DATABASE_URL=sqlite:///instance/carga.db python synthetic_data.py --items 20000 --orders 100000 --database
+"""
+
+import argparse
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    # Sem NumPy as colunas são listas calculadas em Python (mais lento, mesmos valores)
+    np = None
+
+CATEGORIES = ["Eletrônicos", "Casa e Jardim", "Esportes", "Moda", "Automotivo"]
+CONDITIONS = ["new", "used"]
+ITEM_STATUSES = ["active", "paused", "closed"]
+ORDER_STATUSES = ["paid", "confirmed", "ready_to_ship", "shipped", "delivered"]
+SHIPMENT_STATUSES = ["ready_to_ship", "shipped", "delivered"]
+QUESTION_STATUSES = ["UNANSWERED", "ANSWERED"]
+SAMPLE_QUESTIONS = [
+    "Qual o prazo de entrega para São Paulo?",
+    "Tem garantia? Por quanto tempo?",
+    "Aceita cartão de crédito?",
+    "Tem desconto para pagamento à vista?",
+    "Qual a cor disponível?",
+    "Tem nota fiscal?",
+    "Faz entrega no mesmo dia?",
+    "Qual o peso do produto?"
+]
+
+# Linhas geradas por lote ao iterar
+BATCH_SIZE = 50000
+
+_MASK = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+_MIX1 = 0xBF58476D1CE4E5B9
+_MIX2 = 0x94D049BB133111EB
+# Multiplicador das permutações de ids: primo, sem fatores 2, 3 ou 5
+_PERMUTE = 2654435761
+
+# Um número fixo por campo; hash() do Python muda a cada processo
+_FIELDS = {name: salt for salt, name in enumerate((
+    'item_id', 'category', 'price', 'available', 'sold', 'condition', 'status', 'thumbnail',
+    'order_id', 'order_status', 'order_days', 'order_minutes', 'buyer', 'nickname', 'lines', 'product',
+    'quantity', 'shipment_id', 'shipment_status', 'tracking', 'method', 'cost', 'delivery',
+    'question_id', 'question_text', 'question_status', 'question_hours', 'asker', 'answered',
+    'question_item', 'visits'
+), 1)}
+
+def _splitmix(x):
+    x = (x + _GOLDEN) & _MASK
+    x = ((x ^ (x >> 30)) * _MIX1) & _MASK
+    x = ((x ^ (x >> 27)) * _MIX2) & _MASK
+    return x ^ (x >> 31)
+
+def _to_list(column):
+    return column.tolist() if np is not None else list(column)
+
+class SyntheticMarketplace:
+    """Catálogo, pedidos e perguntas de um vendedor, definidos pela semente
+
+    Os pedidos referenciam anúncios que existem (índices em [0, items)) e o
+    total de cada pedido é a soma das suas linhas. As datas são relativas a
+    `now`, fixado na criação, e não ao relógio de cada linha.
+    """
+
+    def __init__(self, seed=42, items=1247, orders=892, questions=200, user_id="123456789",
+                 now=None, max_lines=3):
+        self.seed = seed
+        self.item_count = items
+        self.order_count = orders
+        self.question_count = questions
+        self.user_id = str(user_id)
+        self.now = (now or datetime.now()).replace(microsecond=0)
+        self.max_lines = max_lines
+        self._keys = {name: _splitmix(seed * 1000003 + salt) for name, salt in _FIELDS.items()}
+
+    # Colunas básicas
+
+    def _index(self, start, stop):
+        return np.arange(start, stop, dtype=np.uint64) if np is not None else range(start, stop)
+
+    def _hash(self, field, index):
+        key = self._keys[field]
+        if np is not None:
+            with np.errstate(over='ignore'):
+                x = np.asarray(index, dtype=np.uint64) * np.uint64(_GOLDEN) + np.uint64(key)
+                x ^= x >> np.uint64(30)
+                x *= np.uint64(_MIX1)
+                x ^= x >> np.uint64(27)
+                x *= np.uint64(_MIX2)
+                x ^= x >> np.uint64(31)
+            return x
+        hashes = []
+        for i in index:
+            x = (i * _GOLDEN + key) & _MASK
+            x ^= x >> 30
+            x = (x * _MIX1) & _MASK
+            x ^= x >> 27
+            x = (x * _MIX2) & _MASK
+            hashes.append(x ^ (x >> 31))
+        return hashes
+
+    def _ints(self, field, index, low, high):
+        """Inteiro em [low, high] por linha"""
+        hashes = self._hash(field, index)
+        span = high - low + 1
+        if np is not None:
+            return (hashes % np.uint64(span)).astype(np.int64) + low
+        return [low + h % span for h in hashes]
+
+    def _ids(self, field, index, offset, modulus):
+        """Ids únicos e embaralhados: permutação de [0, modulus) somada a `offset`"""
+        shift = self._keys[field] % modulus
+        if np is not None:
+            return (np.asarray(index, dtype=np.int64) * _PERMUTE + shift) % modulus + offset
+        return [(i * _PERMUTE + shift) % modulus + offset for i in index]
+
+    @staticmethod
+    def _labels(codes, options):
+        return [options[code] for code in _to_list(codes)]
+
+    def _range(self, start, stop, count):
+        stop = count if stop is None else min(stop, count)
+        return start, max(stop, start)
+
+    # Anúncios
+
+    def item_ids(self, index):
+        """Ids dos anúncios nos índices dados"""
+        return [f"MLB{value}" for value in _to_list(self._ids('item_id', index, 1000000000, 9000000000))]
+
+    def item_columns(self, start=0, stop=None):
+        """Colunas dos anúncios [start, stop)"""
+        start, stop = self._range(start, stop, self.item_count)
+        index = self._index(start, stop)
+        return {
+            'index': index,
+            'id': self.item_ids(index),
+            'category': self._ints('category', index, 0, len(CATEGORIES) - 1),
+            'price_cents': self._ints('price', index, 5000, 200000),
+            'available_quantity': self._ints('available', index, 0, 100),
+            'sold_quantity': self._ints('sold', index, 0, 500),
+            'condition': self._ints('condition', index, 0, len(CONDITIONS) - 1),
+            'status': self._ints('status', index, 0, len(ITEM_STATUSES) - 1),
+            'thumbnail': self._ints('thumbnail', index, 600000, 999999)
+        }
+
+    def item_records(self, start=0, stop=None):
+        """Anúncios [start, stop) no formato da API"""
+        columns = self.item_columns(start, stop)
+        last_updated = self.now.isoformat()
+        seller_id = int(self.user_id)
+        return [
+            {
+                "id": item_id,
+                "seller_id": seller_id,
+                "title": f"Produto Exemplo {index + 1}",
+                "category_id": category,
+                "price": cents / 100,
+                "available_quantity": available,
+                "sold_quantity": sold,
+                "condition": condition,
+                "listing_type_id": "gold_special",
+                "status": status,
+                "permalink": f"https://produto.mercadolivre.com.br/{item_id}",
+                "thumbnail": f"https://http2.mlstatic.com/D_NQ_NP_{thumbnail}-O.jpg",
+                "last_updated": last_updated
+            }
+            for index, item_id, category, cents, available, sold, condition, status, thumbnail in zip(
+                _to_list(columns['index']), columns['id'],
+                self._labels(columns['category'], CATEGORIES), _to_list(columns['price_cents']),
+                _to_list(columns['available_quantity']), _to_list(columns['sold_quantity']),
+                self._labels(columns['condition'], CONDITIONS), self._labels(columns['status'], ITEM_STATUSES),
+                _to_list(columns['thumbnail']))
+        ]
+
+    # Pedidos
+
+    def order_columns(self, start=0, stop=None):
+        """Colunas dos pedidos [start, stop), com até `max_lines` linhas cada"""
+        start, stop = self._range(start, stop, self.order_count)
+        index = self._index(start, stop)
+        lines = self._ints('lines', index, 1, min(self.max_lines, max(self.item_count, 1)))
+        first = self._ints('product', index, 0, max(self.item_count - 1, 0))
+        products, quantities, prices = [], [], []
+        for line in range(self.max_lines):
+            # Índices consecutivos: linhas do mesmo pedido nunca repetem o anúncio
+            product = self._shift(first, line, max(self.item_count, 1))
+            products.append(product)
+            quantities.append(self._ints('quantity', self._line_index(index, line), 1, 3))
+            prices.append(self._ints('price', product, 5000, 200000))
+        if np is not None:
+            active = [lines > line for line in range(self.max_lines)]
+            total = sum(np.where(active[line], prices[line] * quantities[line], 0)
+                        for line in range(self.max_lines))
+        else:
+            total = [sum(prices[line][row] * quantities[line][row] for line in range(count))
+                     for row, count in enumerate(lines)]
+        return {
+            'index': index,
+            'id': self._ids('order_id', index, 2000000000, 8000000000),
+            'status': self._ints('order_status', index, 0, len(ORDER_STATUSES) - 1),
+            'age_seconds': self._seconds(self._ints('order_days', index, 0, 30), 86400,
+                                         self._ints('order_minutes', index, 0, 1439), 60),
+            'buyer_id': self._ints('buyer', index, 100000000, 999999999),
+            'nickname': self._ints('nickname', index, 1, 1000),
+            'lines': lines,
+            'products': products,
+            'quantities': quantities,
+            'prices_cents': prices,
+            'total_cents': total,
+            'shipment_id': self._ids('shipment_id', index, 20000000000, 10000000000)
+        }
+
+    @staticmethod
+    def _shift(values, step, modulus):
+        if np is not None:
+            return (values + step) % modulus
+        return [(value + step) % modulus for value in values]
+
+    def _line_index(self, index, line):
+        if np is not None:
+            return index * np.uint64(self.max_lines) + np.uint64(line)
+        return [i * self.max_lines + line for i in index]
+
+    @staticmethod
+    def _seconds(major, major_unit, minor, minor_unit):
+        if np is not None:
+            return major * major_unit + minor * minor_unit
+        return [a * major_unit + b * minor_unit for a, b in zip(major, minor)]
+
+    def order_records(self, start=0, stop=None):
+        """Pedidos [start, stop) no formato da API"""
+        columns = self.order_columns(start, stop)
+        lines = _to_list(columns['lines'])
+        products = [_to_list(column) for column in columns['products']]
+        quantities = [_to_list(column) for column in columns['quantities']]
+        prices = [_to_list(column) for column in columns['prices_cents']]
+        # Dados dos anúncios citados, buscados de uma vez
+        referenced = sorted({product for row, count in enumerate(lines)
+                             for product in (products[line][row] for line in range(count))})
+        item_ids = dict(zip(referenced, self.item_ids(referenced)))
+        categories = dict(zip(referenced, self._labels(self._ints('category', referenced, 0, len(CATEGORIES) - 1),
+                                                       CATEGORIES)))
+        records = []
+        for row, (order_id, status, age, buyer, nickname, total, shipment_id) in enumerate(zip(
+                _to_list(columns['id']), self._labels(columns['status'], ORDER_STATUSES),
+                _to_list(columns['age_seconds']), _to_list(columns['buyer_id']), _to_list(columns['nickname']),
+                _to_list(columns['total_cents']), _to_list(columns['shipment_id']))):
+            created = (self.now - timedelta(seconds=age)).isoformat()
+            records.append({
+                "id": order_id,
+                "status": status,
+                "date_created": created,
+                "last_updated": created,
+                "total_amount": total / 100,
+                "currency_id": "BRL",
+                "buyer": {"id": buyer, "nickname": f"comprador{nickname}"},
+                "order_items": [
+                    {
+                        "item": {
+                            "id": item_ids[products[line][row]],
+                            "title": f"Produto Exemplo {products[line][row] + 1}",
+                            "category_id": categories[products[line][row]]
+                        },
+                        "unit_price": prices[line][row] / 100,
+                        "quantity": quantities[line][row]
+                    }
+                    for line in range(lines[row])
+                ],
+                "shipping": {"id": shipment_id}
+            })
+        return records
+
+    def shipment_records(self, start=0, stop=None):
+        """Envios dos pedidos [start, stop) no formato da API"""
+        start, stop = self._range(start, stop, self.order_count)
+        index = self._index(start, stop)
+        delivery = self._ints('delivery', index, 3, 10)
+        return [
+            {
+                "id": shipment_id,
+                "order_id": order_id,
+                "status": status,
+                "tracking_number": f"BR{tracking}BR",
+                "shipping_option": {
+                    "name": "Mercado Envios",
+                    "shipping_method_id": method,
+                    "cost": cost / 100,
+                    "estimated_delivery_time": {
+                        "date": (self.now - timedelta(seconds=age) + timedelta(days=days)).isoformat()
+                    }
+                }
+            }
+            for shipment_id, order_id, status, tracking, method, cost, age, days in zip(
+                _to_list(self._ids('shipment_id', index, 20000000000, 10000000000)),
+                _to_list(self._ids('order_id', index, 2000000000, 8000000000)),
+                self._labels(self._ints('shipment_status', index, 0, len(SHIPMENT_STATUSES) - 1),
+                             SHIPMENT_STATUSES),
+                _to_list(self._ints('tracking', index, 100000000, 999999999)),
+                _to_list(self._ints('method', index, 100, 999)),
+                _to_list(self._ints('cost', index, 1500, 4500)),
+                _to_list(self._seconds(self._ints('order_days', index, 0, 30), 86400,
+                                       self._ints('order_minutes', index, 0, 1439), 60)),
+                _to_list(delivery))
+        ]
+
+    # Perguntas e visitas
+
+    def question_records(self, start=0, stop=None):
+        """Perguntas [start, stop) no formato da API"""
+        start, stop = self._range(start, stop, self.question_count)
+        index = self._index(start, stop)
+        items = _to_list(self._ints('question_item', index, 0, max(self.item_count - 1, 0)))
+        item_ids = self.item_ids(items) if self.item_count else [None] * len(items)
+        return [
+            {
+                "id": question_id,
+                "text": text,
+                "status": status,
+                "date_created": (self.now - timedelta(hours=hours)).isoformat(),
+                "from": {"id": asker, "answered_questions": answered},
+                "item_id": item_id
+            }
+            for question_id, text, status, hours, asker, answered, item_id in zip(
+                _to_list(self._ids('question_id', index, 1000000, 9000000)),
+                self._labels(self._ints('question_text', index, 0, len(SAMPLE_QUESTIONS) - 1), SAMPLE_QUESTIONS),
+                self._labels(self._ints('question_status', index, 0, len(QUESTION_STATUSES) - 1),
+                             QUESTION_STATUSES),
+                _to_list(self._ints('question_hours', index, 1, 72)),
+                _to_list(self._ints('asker', index, 100000000, 999999999)),
+                _to_list(self._ints('answered', index, 0, 50)),
+                item_ids)
+        ]
+
+    def visits(self, days=90):
+        """Visitas diárias aos anúncios nos últimos `days` dias ({data: total})"""
+        totals = _to_list(self._ints('visits', self._index(0, days), 400, 900))
+        today = self.now.date()
+        return {today - timedelta(days=offset): total for offset, total in enumerate(totals)}
+
+    # Lotes
+
+    def batches(self, kind, batch_size=BATCH_SIZE):
+        """Registros de `kind` (items, orders, shipments, questions) em lotes"""
+        records, count = {
+            'items': (self.item_records, self.item_count),
+            'orders': (self.order_records, self.order_count),
+            'shipments': (self.shipment_records, self.order_count),
+            'questions': (self.question_records, self.question_count)
+        }[kind]
+        for start in range(0, count, batch_size):
+            yield records(start, start + batch_size)
+
+def write_ndjson(path, batches):
+    """Grava os lotes em JSON lines (gzip se `path` termina em .gz); retorna as linhas"""
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    written = 0
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'wt', encoding='utf-8') as f:
+        for batch in batches:
+            f.write(''.join(dumps(record) + '\n' for record in batch))
+            written += len(batch)
+    return written
+
+def write_database(data, batch_size=BATCH_SIZE):
+    """Grava anúncios, pedidos e perguntas no armazenamento local, como a sincronização faria
+
+    Precisa do contexto da aplicação. Os pontos de retomada ficam marcados
+    como sincronizados em `data.now`: a sincronização seguinte contra um
+    servidor com a mesma semente não tem nada novo a buscar.
+    """
+    import meli_store
+    from models import db
+    counts = {'items': 0, 'orders': 0, 'questions': 0}
+    for batch in data.batches('items', batch_size):
+        meli_store.upsert_items(batch)
+        db.session.commit()
+        counts['items'] += len(batch)
+    for batch in data.batches('orders', batch_size):
+        meli_store.upsert_orders(batch)
+        db.session.commit()
+        counts['orders'] += len(batch)
+    for batch in data.batches('questions', batch_size):
+        meli_store.upsert_questions(batch)
+        db.session.commit()
+        counts['questions'] += len(batch)
+    for name in ('items', 'orders', 'questions'):
+        state = meli_store.get_state(name)
+        state.watermark = data.now
+        state.offset = 0
+        state.rows_synced = counts[name]
+        state.completed_at = datetime.utcnow()
+    db.session.commit()
+    return counts
+
+def _database_app():
+    from flask import Flask
+    from models import db
+    import database
+    import migrations
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database.database_uri(os.environ.get('DATABASE_URL'))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = database.engine_options(app.config)
+    db.init_app(app)
+    database.init_app(app)
+    with app.app_context():
+        migrations.upgrade()
+    return app
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--items', type=int, default=1247)
+    parser.add_argument('--orders', type=int, default=892)
+    parser.add_argument('--questions', type=int, default=200)
+    parser.add_argument('--now', help='data de referência (ISO); padrão: agora')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--ndjson', metavar='DIR', help='grava items/orders/shipments/questions.ndjson.gz')
+    parser.add_argument('--database', action='store_true', help='grava anúncios, pedidos e perguntas no DATABASE_URL')
+    args = parser.parse_args()
+
+    data = SyntheticMarketplace(args.seed, args.items, args.orders, args.questions,
+                                now=datetime.fromisoformat(args.now) if args.now else None)
+    if args.ndjson:
+        os.makedirs(args.ndjson, exist_ok=True)
+        for kind in ('items', 'orders', 'shipments', 'questions'):
+            path = os.path.join(args.ndjson, f'{kind}.ndjson.gz')
+            print(f'{kind}: {write_ndjson(path, data.batches(kind, args.batch_size))} linhas em {path}')
+    if args.database:
+        with _database_app().app_context():
+            print(write_database(data, args.batch_size))
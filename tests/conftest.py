@@ -0,0 +1,83 @@
+"""
+Fixtures dos testes: cada teste usa um SQLite novo em um diretório temporário
+
+`db_app` liga só o banco, as migrações e os alertas, para testar os módulos
+direto; `client` sobe a aplicação inteira (create_app) com um arquivo de dados
+do CD pequeno e devolve o cliente de teste com o cabeçalho de um token válido.
+"""
+
+import json
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import alerts
+import cd_store
+import migrations
+from models import db
+
+CD_PRODUCTS = [
+    {'id': 1, 'nome': 'Smartphone', 'sku': 'SKU-1', 'categoria': 'Eletrônicos', 'status': 'pendente',
+     'quantidade': 5, 'tempo_permanencia': 10},
+    {'id': 2, 'nome': 'Notebook', 'sku': 'SKU-2', 'categoria': 'Informática', 'status': 'enviado',
+     'quantidade': 2, 'tempo_permanencia': 30},
+    {'id': 3, 'nome': 'Cadeira', 'sku': 'SKU-3', 'categoria': 'Móveis', 'status': 'em_estoque',
+     'quantidade': 9, 'tempo_permanencia': 50},
+]
+
+def write_cd_file(path, products):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'metrics': {}, 'products': products}, f)
+
+@pytest.fixture(autouse=True)
+def _fresh_singletons(monkeypatch):
+    """Versão do CD e motor de alertas novos: o estado deles é do processo"""
+    monkeypatch.setattr(cd_store, '_current', cd_store.CDDataset(0))
+    monkeypatch.setattr(alerts, 'alert_engine', alerts.AlertEngine())
+
+@pytest.fixture
+def db_app(tmp_path):
+    app = Flask(__name__, instance_path=str(tmp_path))
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'test.db'}"
+    app.config['ALERT_STOCK_THRESHOLDS'] = 'MLB1055=3,*=10'
+    app.config['ALERT_DWELL_SLA_HOURS'] = 'Eletrônicos=24,*=100'
+    db.init_app(app)
+    alerts.alert_engine.init_app(app)
+    with app.app_context():
+        migrations.upgrade()
+        yield app
+        db.session.remove()
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    import main
+    # O main guarda a referência do motor de alertas importado na carga do módulo
+    monkeypatch.setattr(main, 'alert_engine', alerts.alert_engine)
+    monkeypatch.setenv('MELI_SYNC_INTERVAL', '0')
+    monkeypatch.setenv('CD_DATA_WATCH_INTERVAL', '0')
+    data_path = tmp_path / 'cd.json'
+    write_cd_file(data_path, CD_PRODUCTS)
+    app = main.create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+        'CD_DATA_PATH': str(data_path),
+        'BCRYPT_LOG_ROUNDS': 4,
+        'BACKGROUND_LOCK_PATH': str(tmp_path / 'background.lock'),
+    })
+    return app
+
+@pytest.fixture
+def client(app):
+    import main
+    from flask_jwt_extended import create_access_token
+    from models import User
+    with app.app_context():
+        main.seed_admin('admin@meli.com', 'senha1234')
+        token = create_access_token(identity=str(User.query.filter_by(email='admin@meli.com').first().id))
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    client.token = token
+    return client
@@ -0,0 +1,100 @@
+import time
+from datetime import datetime, timedelta
+
+import alerts
+import cd_store
+import meli_store
+import meli_questions
+from conftest import CD_PRODUCTS
+from models import db, Alert, CDProduct
+
+HOUR = 3600
+
+def _active(rule):
+    return {alert.entity_id: alert for alert in Alert.query.filter_by(rule=rule, status='active')}
+
+def test_parse_limits():
+    assert alerts.parse_limits('Eletrônicos=72, MLB1055=5', 96) == {'Eletrônicos': 72.0, 'MLB1055': 5.0, '*': 96.0}
+    assert alerts.parse_limits('=3', 10) == {'*': 3.0}
+    assert alerts.parse_limits({'MLB1': 2}, 10) == {'MLB1': 2.0, '*': 10.0}
+    assert alerts.parse_limits(None, 24) == {'*': 24.0}
+
+def test_low_stock_is_raised_once_and_resolved(db_app):
+    item = {'id': 'MLB9', 'title': 'Fone', 'category_id': 'MLB1055', 'status': 'active', 'available_quantity': 2}
+    meli_store.upsert_items([item, dict(item, id='MLB8', category_id='MLB1', available_quantity=8)])
+    db.session.commit()
+    # MLB1055 tem limite 3; as demais categorias, 10
+    assert set(_active('low_stock')) == {'MLB9', 'MLB8'}
+    raised_at = _active('low_stock')['MLB9'].raised_at
+
+    meli_store.update_item_stock('MLB9', 0)
+    alert = _active('low_stock')['MLB9']
+    assert alert.raised_at == raised_at
+    assert alert.severity == 'high'
+    assert Alert.query.filter_by(rule='low_stock', entity_id='MLB9').count() == 1
+
+    meli_store.update_item_stock('MLB9', 3)
+    assert set(_active('low_stock')) == {'MLB8'}
+    assert [n['count'] for n in alerts.alert_engine.notifications()] == [1]
+
+def test_question_sla_is_resolved_when_answered(db_app):
+    old = (datetime.utcnow() - timedelta(hours=30)).isoformat()
+    question = {'id': 7, 'item_id': 'MLB1', 'text': 'Tem garantia?', 'status': 'UNANSWERED', 'date_created': old}
+    meli_store.upsert_questions([question])
+    db.session.commit()
+    assert set(_active('question_sla')) == {'7'}
+    meli_store.upsert_questions([dict(question, status='ANSWERED')])
+    db.session.commit()
+    assert _active('question_sla') == {}
+    assert meli_questions.search(status='UNANSWERED')['questions'] == []
+
+def _tracking_engine(dataset):
+    engine = alerts.alert_engine
+    engine.horizon = 100 * HOUR
+    engine.track_cd()
+    engine.run_due(now=dataset.loaded_at)
+    return engine
+
+def test_dwell_alert_raised_by_the_clock(db_app):
+    dataset = cd_store.load_products(CD_PRODUCTS)
+    engine = _tracking_engine(dataset)
+    assert engine.stats()['cd_version'] == dataset.version
+    # Smartphone: prazo de 24 h com 10 h de permanência na carga
+    assert engine.run_due(now=dataset.loaded_at + 14 * HOUR - 1) == 0
+    assert engine.run_due(now=dataset.loaded_at + 14 * HOUR + 1) == 1
+    assert set(_active('cd_dwell')) == {'1'}
+
+def test_dwell_deadline_is_rechecked_against_the_row(db_app):
+    dataset = cd_store.load_products(CD_PRODUCTS)
+    engine = _tracking_engine(dataset)
+    # Outro processo zerou a permanência e o relógio ainda não viu a revisão
+    db.session.query(CDProduct).filter_by(snapshot=dataset.version, id=1).update(
+        {'tempo_permanencia': 0, 'permanencia_desde': dataset.loaded_at})
+    db.session.commit()
+    assert engine.run_due(now=dataset.loaded_at + 14 * HOUR + 1) == 0
+    assert _active('cd_dwell') == {}
+    # O vencimento recalculado voltou para o heap
+    assert engine.run_due(now=dataset.loaded_at + 24 * HOUR + 1) == 1
+    assert set(_active('cd_dwell')) == {'1'}
+
+def test_dwell_change_from_another_worker_is_rescheduled(db_app):
+    dataset = cd_store.load_products(CD_PRODUCTS)
+    engine = _tracking_engine(dataset)
+    before = time.time()
+    cd_store.upsert_product({'id': 1, 'tempo_permanencia': 0})
+    # A permanência passa a contar de agora: vence em 24 h, não mais em 14 h
+    assert engine.run_due(now=dataset.loaded_at + 14 * HOUR + 1) == 0
+    assert engine.stats()['scheduled'] == 2
+    assert engine.run_due(now=before + 24 * HOUR + 1) == 1
+
+def test_dwell_is_raised_and_resolved_on_write(db_app):
+    cd_store.load_products(CD_PRODUCTS)
+    cd_store.upsert_product({'id': 1, 'tempo_permanencia': 30})
+    assert set(_active('cd_dwell')) == {'1'}
+    cd_store.upsert_product({'id': 1, 'status': 'enviado'})
+    assert _active('cd_dwell') == {}
+    cd_store.upsert_product({'id': 4, 'nome': 'Mesa', 'sku': 'SKU-4', 'categoria': 'Móveis',
+                             'status': 'pendente', 'tempo_permanencia': 120})
+    assert set(_active('cd_dwell')) == {'4'}
+    cd_store.delete_product(4)
+    assert _active('cd_dwell') == {}
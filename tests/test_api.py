@@ -0,0 +1,63 @@
+def test_metrics_etag_and_304(client):
+    first = client.get('/api/metrics')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'no-cache'
+
+    again = client.get('/api/metrics', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+
+    assert client.put('/api/products/1', json={'status': 'enviado'}).status_code == 200
+    changed = client.get('/api/metrics', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert changed.json['por_status']['enviado'] == 2
+
+def test_cd_data_is_bounded_to_the_first_page(client):
+    data = client.get('/api/cd-data').json
+    assert data['metrics']['total_produtos'] == 3
+    assert data['categorias'] == ['Eletrônicos', 'Informática', 'Móveis']
+    assert [product['id'] for product in data['products']] == [1, 2, 3]
+    assert data['paging']['next_cursor'] is None
+
+def test_products_pages_and_rejects_forged_cursor(client):
+    page = client.get('/api/products?limit=2&sort=-tempo_permanencia').json
+    assert [product['id'] for product in page['results']] == [3, 2]
+    rest = client.get(f"/api/products?limit=2&sort=-tempo_permanencia&cursor={page['paging']['next_cursor']}")
+    assert [product['id'] for product in rest.json['results']] == [1]
+    assert client.get('/api/products?sort=sku&cursor=WzEsMV0').status_code == 400
+    assert client.get('/api/products?cursor=bm9wZQ').status_code == 400
+
+def test_product_payload_validation(client):
+    assert client.put('/api/products/1', json={'status': 5}).status_code == 400
+    assert client.put('/api/products/1', json={'tempo_permanencia': 'abc'}).status_code == 400
+    assert client.post('/api/products', json=[1, 2]).status_code == 400
+    assert client.post('/api/products', json={'nome': 'sem id'}).status_code == 400
+    # Nada foi gravado: as métricas continuam consistentes
+    metrics = client.get('/api/metrics')
+    assert metrics.status_code == 200
+    assert metrics.json['total_produtos'] == 3
+
+def test_product_create_update_delete(client):
+    created = client.post('/api/products', json={'id': 10, 'nome': 'Mesa', 'status': 'pendente'})
+    assert created.status_code == 201
+    assert client.put('/api/products/10', json={'quantidade': 4}).json['nome'] == 'Mesa'
+    assert client.delete('/api/products/10').status_code == 200
+    assert client.delete('/api/products/10').status_code == 404
+
+def test_query_string_token_only_on_stream(client):
+    token = client.token
+    anonymous = client.application.test_client()
+    assert anonymous.get(f'/api/metrics?jwt={token}').status_code == 401
+    stream = anonymous.get(f'/api/stream?jwt={token}', buffered=False)
+    assert stream.status_code == 200
+    assert stream.mimetype == 'text/event-stream'
+    stream.close()
+
+def test_manual_sync_is_a_unique_job(client):
+    first = client.post('/api/mercadolivre/sync')
+    second = client.post('/api/mercadolivre/sync')
+    assert first.status_code == 202
+    assert first.json['id'] == second.json['id']
+    assert first.headers['Location'] == f"/api/jobs/{first.json['id']}"
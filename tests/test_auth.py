@@ -0,0 +1,32 @@
+import pytest
+
+import password_hashing
+from models import db, User
+from password_hashing import PasswordHasher
+from ttl_cache import TTLCache
+
+@pytest.mark.parametrize('cpus, processes, expected', [(8, None, 8), (8, 4, 2), (8, 8, 1), (4, 16, 1)])
+def test_hash_pool_split_between_processes(monkeypatch, cpus, processes, expected):
+    monkeypatch.setattr(password_hashing.os, 'cpu_count', lambda: cpus)
+    hasher = PasswordHasher()
+    hasher.configure(bcrypt_rounds=4, processes=processes)
+    assert hasher.workers == expected
+    hasher.configure(bcrypt_rounds=4, workers=3, processes=processes)
+    assert hasher.workers == 3
+
+def test_cache_none_false_does_not_store_missing_values():
+    cache = TTLCache()
+    values = iter([None, 'depois'])
+    load = lambda: next(values)
+    assert cache.get_or_load(('k',), load, ttl=60, cache_none=False) is None
+    assert cache.get_or_load(('k',), load, ttl=60, cache_none=False) == 'depois'
+    assert cache.stats()['entries'] == 1
+
+def test_login_after_account_created_by_another_worker(client, app):
+    credentials = {'email': 'novo@meli.com', 'password': 'senha1234'}
+    assert client.post('/api/auth/login', json=credentials).status_code == 401
+    # Cadastro feito por outro processo: o cache deste worker não é invalidado
+    with app.app_context():
+        db.session.add(User(nome='Novo', email='novo@meli.com', password='senha1234'))
+        db.session.commit()
+    assert client.post('/api/auth/login', json=credentials).status_code == 200
@@ -0,0 +1,67 @@
+import io
+import json
+import os
+
+import cd_store
+from cd_loader import CDDatasetLoader, _JSONStream, iter_products
+from conftest import CD_PRODUCTS, write_cd_file
+
+def _loader(app, path):
+    app.config['CD_DATA_PATH'] = str(path)
+    app.config['CD_DATA_WATCH_INTERVAL'] = 0
+    loader = CDDatasetLoader()
+    loader.init_app(app)
+    return loader
+
+def test_iter_products_streams_with_small_chunks(tmp_path):
+    path = tmp_path / 'cd.json'
+    products = [{'id': i, 'nome': f'Produto "{i}" ç', 'tempo_permanencia': i * 1.5} for i in range(200)]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'metrics': {'total': [1, {'a': 2}]}, 'products': products, 'extra': None}, f)
+    assert list(iter_products(path, chunk_size=7)) == products
+
+def test_stream_reads_number_split_across_chunks():
+    stream = _JSONStream(io.StringIO('[12345]'), chunk_size=3)
+    stream.expect('[')
+    assert stream.value() == 12345
+
+def test_reload_swaps_version_and_notifies(db_app, tmp_path):
+    path = tmp_path / 'cd.json'
+    write_cd_file(path, CD_PRODUCTS)
+    loader = _loader(db_app, path)
+    loaded = []
+    loader.on_load(loaded.append)
+    first = loader.load()
+    assert first.metrics.snapshot()['total_produtos'] == 3
+
+    write_cd_file(path, CD_PRODUCTS[:1])
+    os.utime(path, (first.source_mtime + 10, first.source_mtime + 10))
+    second = loader.load()
+    assert second.version > first.version
+    assert cd_store.sync_dataset() is second
+    assert second.metrics.snapshot()['total_produtos'] == 1
+    assert loaded == [first, second]
+    # A versão anterior continua legível até a próxima carga
+    assert len(cd_store.all_products(first)) == 3
+
+def test_unchanged_file_is_adopted_not_reloaded(db_app, tmp_path):
+    path = tmp_path / 'cd.json'
+    write_cd_file(path, CD_PRODUCTS)
+    first = _loader(db_app, path).load()
+    # Outro worker (ou um reinício) com o mesmo arquivo adota a versão gravada
+    cd_store._current = cd_store.CDDataset(0)
+    adopted = _loader(db_app, path).load()
+    assert adopted.version == first.version
+    forced = _loader(db_app, path).load(force=True)
+    assert forced.version > first.version
+
+def test_failed_load_keeps_active_version(db_app, tmp_path):
+    path = tmp_path / 'cd.json'
+    write_cd_file(path, CD_PRODUCTS)
+    loader = _loader(db_app, path)
+    first = loader.load()
+    path.write_text('{"products": [{"id": 1}, {"id": ', encoding='utf-8')
+    os.utime(path, (first.source_mtime + 10, first.source_mtime + 10))
+    loader._safe_load()
+    assert loader.last_error
+    assert cd_store.sync_dataset().version == first.version
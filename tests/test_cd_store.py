@@ -0,0 +1,117 @@
+import random
+
+import pytest
+
+import cd_store
+from cd_metrics import CDMetrics
+from conftest import CD_PRODUCTS
+from models import db, CDProduct
+
+STATUSES = ('pendente', 'enviado', 'em_estoque', '')
+
+def test_incremental_metrics_match_rescan(db_app):
+    cd_store.load_products(CD_PRODUCTS)
+    rng = random.Random(7)
+    for _ in range(200):
+        product_id = rng.randint(1, 30)
+        if rng.random() < 0.2:
+            cd_store.delete_product(product_id)
+            continue
+        change = {'id': product_id, 'status': rng.choice(STATUSES)}
+        if rng.random() < 0.5:
+            change['tempo_permanencia'] = rng.choice([rng.randint(0, 300), rng.uniform(0, 300)])
+        cd_store.upsert_product(change)
+    assert cd_store.get_metrics() == cd_store.rescan_metrics()
+
+def test_fractional_dwell_is_rounded_in_row_and_totals(db_app):
+    cd_store.load_products([dict(CD_PRODUCTS[0], tempo_permanencia=10.6)])
+    product, _ = cd_store.upsert_product({'id': 2, 'status': 'pendente', 'tempo_permanencia': 4.4})
+    assert product['tempo_permanencia'] == 4
+    assert db.session.get(CDProduct, (cd_store.sync_dataset().version, 1)).tempo_permanencia == 11
+    assert cd_store.get_metrics() == cd_store.rescan_metrics()
+    assert cd_store.get_metrics()['tempo_medio_permanencia'] == 7.5
+
+def test_metrics_totals_round_trip():
+    metrics = CDMetrics.from_products(CD_PRODUCTS)
+    assert CDMetrics.from_totals(metrics.totals()).snapshot() == metrics.snapshot()
+
+def test_load_keeps_previous_version_and_collects_older(db_app):
+    first = cd_store.load_products(CD_PRODUCTS)
+    second = cd_store.load_products(CD_PRODUCTS[:1])
+    # Uma requisição que começou na versão anterior continua lendo-a inteira
+    assert len(cd_store.all_products(first)) == 3
+    assert cd_store.sync_dataset() is second
+    third = cd_store.load_products(CD_PRODUCTS[:2])
+    snapshots = {row[0] for row in db.session.query(CDProduct.snapshot).distinct()}
+    assert snapshots == {second.version, third.version}
+
+def test_write_from_another_worker_is_adopted(db_app):
+    cd_store.load_products(CD_PRODUCTS)
+    # Outro worker: a versão em memória dele ficou para trás da do banco
+    stale = cd_store.current_dataset()
+    cd_store.upsert_product({'id': 1, 'status': 'enviado'})
+    cd_store._current = stale
+    dataset = cd_store.sync_dataset()
+    assert dataset.key > stale.key
+    assert dataset.metrics.snapshot()['por_status']['enviado'] == 2
+
+def test_load_from_another_worker_is_adopted(db_app):
+    loaded = cd_store.load_products(CD_PRODUCTS)
+    cd_store._current = cd_store.CDDataset(0)
+    dataset = cd_store.sync_dataset()
+    assert dataset.key == loaded.key
+    assert dataset.metrics.snapshot() == loaded.metrics.snapshot()
+
+def test_query_products_paginates_by_cursor(db_app):
+    cd_store.load_products([{'id': i, 'sku': f'SKU-{i:03}', 'tempo_permanencia': i % 7} for i in range(1, 26)])
+    seen, cursor = [], None
+    while True:
+        page = cd_store.query_products(sort='-tempo_permanencia', cursor=cursor, limit=10)
+        seen.extend(product['id'] for product in page['results'])
+        cursor = page['paging']['next_cursor']
+        if cursor is None:
+            break
+    assert sorted(seen) == list(range(1, 26))
+    assert len(seen) == 25
+
+def test_search_is_a_literal_prefix_of_sku_or_normalized_name(db_app):
+    cd_store.load_products(CD_PRODUCTS + [
+        {'id': 4, 'nome': 'Câmera 100% digital', 'sku': 'CAM_01', 'categoria': 'Fotografia'},
+        {'id': 5, 'nome': 'Camiseta', 'sku': 'CAMX01', 'categoria': 'Moda'},
+    ])
+
+    def ids(search):
+        return [product['id'] for product in cd_store.query_products(search=search)['results']]
+
+    assert ids('camera') == [4]
+    assert ids('CÂMERA 100') == [4]
+    assert ids('sku-') == [1, 2, 3]
+    assert ids('cam') == [4, 5]
+    # % e _ não são curingas
+    assert ids('CAM_0') == [4]
+    assert ids('%') == []
+    assert ids('phone') == []
+    assert cd_store.categories() == ['Eletrônicos', 'Fotografia', 'Informática', 'Moda', 'Móveis']
+
+@pytest.mark.parametrize('sort, value', [('tempo_permanencia', 'abc'), ('sku', 5), ('id', [1]), ('id', True)])
+def test_cursor_with_wrong_typed_sort_value_is_rejected(db_app, sort, value):
+    cd_store.load_products(CD_PRODUCTS)
+    with pytest.raises(ValueError):
+        cd_store.query_products(sort=sort, cursor=cd_store.encode_cursor(value, 1))
+
+@pytest.mark.parametrize('payload', [
+    [1, 2],
+    {'id': 'x'},
+    {'id': True},
+    {'id': 1, 'status': 5},
+    {'id': 1, 'tempo_permanencia': 'abc'},
+    {'id': 1, 'tempo_permanencia': float('nan')},
+    {'id': 1, 'quantidade': 1.5},
+    {'id': 1, 'nome': ['a']},
+])
+def test_validate_product_rejects_bad_payloads(payload):
+    with pytest.raises(ValueError):
+        cd_store.validate_product(payload)
+
+def test_validate_product_accepts_partial_update():
+    assert cd_store.validate_product({'id': 1, 'tempo_permanencia': 12.5, 'nome': None})
@@ -0,0 +1,62 @@
+import threading
+import time
+
+import pytest
+
+import event_bus
+from event_bus import EventBus, StreamLimitReached
+
+def test_subscribers_are_capped_per_process():
+    bus = EventBus(max_subscribers=2)
+    first = bus.subscribe()
+    bus.subscribe()
+    with pytest.raises(StreamLimitReached):
+        bus.subscribe()
+    first.close()
+    bus.subscribe()
+    assert bus.stats()['rejected'] == 1
+
+def test_stream_over_the_limit_gets_503(client, app):
+    bus = app.extensions['events']
+    bus.max_subscribers = 1
+    subscription = bus.subscribe()
+    response = client.get('/api/stream')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+    subscription.close()
+    response = client.get('/api/stream')
+    assert response.status_code == 200
+    response.close()
+
+def test_concurrent_state_publishes_stay_consistent(monkeypatch):
+    diff_state = event_bus.diff_state
+
+    def slow_diff(old, new):
+        # Alarga a janela entre ler o estado anterior e publicar a diferença
+        time.sleep(0.0005)
+        return diff_state(old, new)
+
+    monkeypatch.setattr(event_bus, 'diff_state', slow_diff)
+    bus = EventBus(queue_size=100000)
+    subscription = bus.subscribe(['metrics'])
+    # Cada estado tem uma única chave diferente de zero: misturar dois não dá nenhum deles
+    published = [{key: i + 1 if key == 'abc'[i % 3] else 0 for key in 'abc'} for i in range(200)]
+    barrier = threading.Barrier(8)
+
+    def publisher(states):
+        barrier.wait()
+        for state in states:
+            bus.publish_state('metrics', state)
+
+    threads = [threading.Thread(target=publisher, args=(published[i::8],)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # O estado montado pelo cliente a partir das diferenças é um dos publicados
+    state = {}
+    while (event := subscription.get(timeout=0)) is not None:
+        state.update(event['data']['set'])
+    assert state == bus.state('metrics')
+    assert state in published
@@ -0,0 +1,57 @@
+import csv
+import gzip
+import io
+import json
+
+import exports
+import meli_store
+from conftest import CD_PRODUCTS
+from meli_standin import StandinData
+from models import db
+
+def _ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+def test_cd_products_ndjson_has_the_data_file_fields(client):
+    response = client.get('/api/export/cd-products')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.headers['Content-Disposition'].startswith('attachment; filename="cd-products-')
+    rows = _ndjson(response)
+    assert [row['id'] for row in rows] == [1, 2, 3]
+    assert {key: rows[0][key] for key in CD_PRODUCTS[0]} == CD_PRODUCTS[0]
+
+def test_csv_filters_and_header_without_rows(client):
+    response = client.get('/api/export/cd-products?format=csv&status=enviado')
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0][:2] == ['id', 'nome']
+    assert [row[1] for row in rows[1:]] == ['Notebook']
+    empty = client.get('/api/export/cd-products?format=csv&categoria=Nenhuma')
+    assert empty.get_data(as_text=True).count('\n') == 1
+
+def test_orders_export_gzip_and_filters(client, app):
+    data = StandinData(seed=5, items=10, orders=50, questions=0)
+    with app.app_context():
+        meli_store.upsert_items(list(data.items.values()))
+        meli_store.upsert_orders(list(data.orders.values()))
+        db.session.commit()
+    response = client.get('/api/export/meli-orders', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    orders = [json.loads(line) for line in gzip.decompress(response.data).decode('utf-8').splitlines()]
+    assert sorted(order['id'] for order in orders) == sorted(data.orders)
+
+    status = orders[0]['status']
+    filtered = _ndjson(client.get(f'/api/export/meli-orders?status={status}'))
+    assert filtered and all(order['status'] == status for order in filtered)
+    assert len(_ndjson(client.get('/api/export/meli-items'))) == len(data.items)
+    assert client.get('/api/export/meli-order-items').status_code == 200
+
+def test_invalid_requests(client):
+    assert client.get('/api/export/usuarios').status_code == 404
+    assert client.get('/api/export/cd-products?format=xml').status_code == 400
+    assert client.get('/api/export/meli-orders?date_from=ontem').status_code == 400
+
+def test_chunks_send_the_first_line_at_once(monkeypatch):
+    monkeypatch.setattr(exports, 'CHUNK_SIZE', 10)
+    chunks = list(exports._chunks(['a\n', 'bbbb\n', 'cccc\n', 'd\n']))
+    assert chunks == [b'a\n', b'bbbb\ncccc\n', b'd\n']
@@ -0,0 +1,133 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from jobs import JobQueue
+from models import db, BackgroundJob
+
+@pytest.fixture
+def queue(db_app):
+    queue = JobQueue()
+    queue.init_app(db_app)
+    return queue
+
+def test_failed_job_retries_with_exponential_backoff(queue):
+    calls = []
+
+    @queue.task('flaky', max_attempts=3, backoff=10)
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RuntimeError('falhou')
+        return {'ok': True}
+
+    job_id = queue.enqueue('flaky').id
+    waits = []
+    for _ in range(3):
+        before = datetime.utcnow()
+        assert queue.run_once()
+        job = queue.get(job_id)
+        if job.status == 'queued':
+            waits.append((job.run_at - before).total_seconds())
+            # Antecipa a nova tentativa em vez de esperar o backoff
+            job.run_at = datetime.utcnow()
+            db.session.commit()
+    assert job.status == 'done'
+    assert job.result == {'ok': True}
+    assert job.attempts == 3
+    assert waits[0] == pytest.approx(10, abs=1)
+    assert waits[1] == pytest.approx(20, abs=1)
+
+def test_job_fails_after_max_attempts(queue):
+    @queue.task('broken', max_attempts=2, backoff=0)
+    def broken():
+        raise ValueError('sempre')
+
+    job_id = queue.enqueue('broken').id
+    assert queue.run_once()
+    assert queue.run_once()
+    job = queue.get(job_id)
+    assert job.status == 'failed'
+    assert 'ValueError' in job.error
+    assert not queue.run_once()
+
+def test_job_is_claimed_once_under_concurrency(db_app, queue):
+    queue.task('noop')(lambda: None)
+    job_id = queue.enqueue('noop').id
+    claims = []
+    barrier = threading.Barrier(8)
+
+    def claim():
+        with db_app.app_context():
+            barrier.wait()
+            job = queue._claim()
+            if job is not None:
+                claims.append(job.id)
+            db.session.remove()
+
+    threads = [threading.Thread(target=claim) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert claims == [job_id]
+
+def test_unique_enqueue_reuses_queued_job_and_raises_priority(queue):
+    queue.task('refresh')(lambda: None)
+    first = queue.enqueue('refresh', priority=-10, delay=60)
+    second = queue.enqueue('refresh', priority=10, unique=True)
+    assert second.id == first.id
+    assert second.priority == 10
+    assert second.run_at <= datetime.utcnow()
+    assert BackgroundJob.query.count() == 1
+
+def test_abandoned_running_job_is_requeued(queue):
+    queue.task('slow', timeout=1)(lambda: None)
+    job_id = queue.enqueue('slow').id
+    job = queue._claim()
+    job.started_at = datetime.utcnow() - timedelta(seconds=5)
+    db.session.commit()
+    queue.run_scheduled()
+    job = queue.get(job_id)
+    assert job.status == 'queued'
+    assert 'Sem resposta' in job.error
+
+def test_stale_run_cannot_overwrite_a_requeued_job(db_app, queue):
+    runs = []
+    release = threading.Event()
+
+    @queue.task('push', timeout=1, backoff=0)
+    def push():
+        runs.append(1)
+        run = len(runs)
+        if run == 1:
+            # A primeira execução trava além do timeout
+            release.wait(5)
+        return {'run': run}
+
+    job_id = queue.enqueue('push').id
+
+    def stale():
+        with db_app.app_context():
+            queue.run_once()
+            db.session.remove()
+
+    thread = threading.Thread(target=stale)
+    thread.start()
+    while not runs:
+        time.sleep(0.01)
+    db.session.execute(BackgroundJob.__table__.update().values(
+        started_at=datetime.utcnow() - timedelta(seconds=5)))
+    db.session.commit()
+    queue.run_scheduled()
+    # Pega de novo o job devolvido à fila e termina antes da execução travada
+    assert queue.run_once()
+    release.set()
+    thread.join()
+    db.session.expire_all()
+    job = queue.get(job_id)
+    assert job.status == 'done'
+    assert job.result == {'run': 2}
+    assert job.attempts == 2
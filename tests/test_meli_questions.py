@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import meli_questions
+import meli_store
+from models import db
+
+NOW = datetime(2026, 1, 10, 12, 0)
+
+QUESTIONS = [
+    {'id': 1, 'item_id': 'MLB1', 'text': 'Qual o prazo de entrega para São Paulo?', 'status': 'UNANSWERED',
+     'date_created': (NOW - timedelta(hours=30)).isoformat()},
+    {'id': 2, 'item_id': 'MLB1', 'text': 'Vocês entregam no sábado?', 'status': 'ANSWERED',
+     'date_created': (NOW - timedelta(hours=5)).isoformat()},
+    {'id': 3, 'item_id': 'MLB2', 'text': 'Tem garantia? A entrega é rápida?', 'status': 'UNANSWERED',
+     'date_created': (NOW - timedelta(hours=2)).isoformat()},
+    {'id': 4, 'item_id': 'MLB2', 'text': 'Quais cores estão disponíveis?', 'status': 'UNANSWERED',
+     'date_created': (NOW - timedelta(hours=1)).isoformat()},
+]
+
+@pytest.mark.parametrize('words', [
+    ('entregas', 'entregar', 'entrega', 'entregaram'),
+    ('garantia', 'garantias'),
+    ('cor', 'cores'),
+    ('pagamento', 'pagar'),
+])
+def test_word_variants_share_a_stem(words):
+    assert len({meli_questions.stem(word) for word in words}) == 1
+
+def test_terms_strip_accents_and_stopwords():
+    assert meli_questions.tokens('Ação É Rápida') == ['acao', 'e', 'rapida']
+    assert meli_questions.terms('Qual é o prazo de entrega para São Paulo?') == 'praz entreg sao paul'
+    assert meli_questions.terms('') == ''
+
+@pytest.fixture
+def questions(db_app):
+    meli_store.upsert_questions(QUESTIONS)
+    db.session.commit()
+    assert meli_questions.has_index()
+
+def _ids(**kwargs):
+    return [question['id'] for question in meli_questions.search(now=NOW, **kwargs)['questions']]
+
+def test_search_matches_variants_without_accents(questions):
+    assert _ids(q='entregar', sort='oldest') == [1, 2, 3]
+    assert _ids(q='GARANTIAS') == [3]
+    assert _ids(q='sao paulo') == [1]
+    # O último termo também vale como prefixo
+    assert _ids(q='dispon') == [4]
+
+def test_search_fallback_gives_same_results(questions, monkeypatch):
+    expected = {q: _ids(q=q, sort='oldest') for q in ('entregas', 'garantia rapida', 'cor')}
+    monkeypatch.setattr(meli_questions, 'has_index', lambda: False)
+    assert {q: _ids(q=q, sort='oldest') for q in expected} == expected
+
+def test_search_filters_and_priority(questions):
+    assert _ids() == [1, 3, 4, 2]
+    assert _ids(status='UNANSWERED', min_age_hours=2) == [1, 3]
+    assert _ids(q='entrega', item_id='MLB1') == [1, 2]
+    with pytest.raises(ValueError):
+        meli_questions.search(sort='random')
+
+def test_answered_question_updates_the_index(questions):
+    meli_store.upsert_questions([dict(QUESTIONS[0], status='ANSWERED', text='Qual a voltagem?')])
+    db.session.commit()
+    assert _ids(q='paulo') == []
+    assert _ids(q='voltagem') == [1]
@@ -0,0 +1,91 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import meli_store
+from meli_standin import StandinData, start_standin
+from meli_sync import MeliSyncWorker
+from mercadolivre_api import MercadoLivreAPI, MercadoLivreAPIError
+from models import db, MeliOrder
+
+PAGE_SIZE = 20
+
+@pytest.fixture
+def standin():
+    data = StandinData(seed=3, items=30, orders=300, questions=0)
+    rng = random.Random(3)
+    # Pedidos pagos ou enviados depois de criados: last_updated fora da ordem de criação
+    for order_id, order in data.orders.items():
+        if rng.random() < 0.5:
+            created = datetime.fromisoformat(order['date_created'])
+            data.update_order(order_id, at=created + timedelta(hours=rng.uniform(1, 24 * 30)))
+    server, url = start_standin(data=data)
+    yield data, url
+    server.shutdown()
+
+@pytest.fixture
+def worker(db_app, standin):
+    data, url = standin
+    api = MercadoLivreAPI(base_url=url, max_retries=0)
+    api.authenticate('token', data.user_id)
+    return MeliSyncWorker(db_app, api, page_size=PAGE_SIZE)
+
+def _local_statuses():
+    return dict(db.session.query(MeliOrder.id, MeliOrder.status))
+
+def test_backfill_syncs_every_order_when_updates_are_out_of_order(worker, standin):
+    data, _ = standin
+    search = worker.api.search_orders_updated_since
+    by_creation = sorted(data.orders, key=lambda oid: (data.orders[oid]['date_created'], oid))
+    touched = []
+
+    def search_and_update(updated_from, limit, offset):
+        page = search(updated_from, limit, offset)
+        if offset == PAGE_SIZE:
+            # Durante a rodada: um pedido já lido e um ainda não lido mudam de status
+            for order_id in (by_creation[0], by_creation[-1]):
+                data.update_order(order_id, status='cancelled')
+                touched.append(order_id)
+        return page
+
+    worker.api.search_orders_updated_since = search_and_update
+    worker.sync_orders()
+    statuses = _local_statuses()
+    assert len(statuses) == len(data.orders)
+
+    # A rodada seguinte recomeça antes do início da anterior e traz o pedido alterado depois de lido
+    worker.api.search_orders_updated_since = search
+    state = meli_store.get_state('orders')
+    assert state.started_at is None and state.offset == 0
+    assert state.watermark <= datetime.utcnow() - timedelta(seconds=worker.overlap)
+    worker.sync_orders()
+    statuses = _local_statuses()
+    assert all(statuses[order_id] == 'cancelled' for order_id in touched)
+    assert statuses == {order_id: order['status'] for order_id, order in data.orders.items()}
+
+def test_interrupted_round_resumes_without_advancing_watermark(worker, standin):
+    data, _ = standin
+    search = worker.api.search_orders_updated_since
+    calls = []
+
+    def failing_search(updated_from, limit, offset):
+        calls.append(offset)
+        if len(calls) == 3:
+            raise MercadoLivreAPIError('indisponível', 503)
+        return search(updated_from, limit, offset)
+
+    worker.api.search_orders_updated_since = failing_search
+    with pytest.raises(MercadoLivreAPIError):
+        worker.sync_orders()
+    db.session.rollback()
+    state = meli_store.get_state('orders')
+    assert state.watermark is None
+    assert state.offset == 2 * PAGE_SIZE
+    started_at = state.started_at
+
+    worker.api.search_orders_updated_since = search
+    worker.sync_orders()
+    assert len(_local_statuses()) == len(data.orders)
+    state = meli_store.get_state('orders')
+    assert state.watermark == started_at - timedelta(seconds=worker.overlap)
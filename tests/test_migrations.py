@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, inspect, text
+
+import database
+import main
+import migrations
+from models import db
+
+def _schema(engine):
+    inspector = inspect(engine)
+    return {
+        name: ({column['name']: column['nullable'] for column in inspector.get_columns(name)},
+               {index['name'] for index in inspector.get_indexes(name)})
+        for name in inspector.get_table_names() if name in db.metadata.tables
+    }
+
+def _model_schema():
+    return {
+        name: ({column.name: column.nullable for column in table.columns},
+               {index.name for index in table.indexes})
+        for name, table in db.metadata.tables.items()
+    }
+
+def _migrated_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    return app
+
+def test_fresh_database_matches_the_models(db_app):
+    assert _schema(db.engine) == _model_schema()
+    assert [entry['applied_at'] is not None for entry in migrations.status()] == [True] * len(migrations.MIGRATIONS)
+    assert migrations.upgrade() == []
+
+def test_database_from_before_the_migrations_is_upgraded(tmp_path):
+    path = tmp_path / 'old.db'
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.begin() as connection:
+        # Esquema anterior às migrações: usuários e produtos do CD sem versão
+        connection.execute(text('CREATE TABLE user (id INTEGER NOT NULL PRIMARY KEY, nome VARCHAR(100) NOT NULL, '
+                                'email VARCHAR(120) NOT NULL UNIQUE, password_hash VARCHAR(128) NOT NULL, '
+                                'created_at DATETIME, is_active BOOLEAN)'))
+        connection.execute(text("INSERT INTO user (nome, email, password_hash) VALUES ('Ana', 'ana@meli.com', 'x')"))
+        connection.execute(text('CREATE TABLE cd_product (id INTEGER NOT NULL PRIMARY KEY, nome VARCHAR(200) NOT NULL, '
+                                'sku VARCHAR(64) NOT NULL)'))
+        connection.execute(text("INSERT INTO cd_product VALUES (1, 'Cadeira', 'SKU-1')"))
+    engine.dispose()
+
+    app = _migrated_app(path)
+    with app.app_context():
+        assert len(migrations.upgrade()) == len(migrations.MIGRATIONS)
+        assert _schema(db.engine) == _model_schema()
+        assert db.session.execute(text('SELECT email FROM user')).scalars().all() == ['ana@meli.com']
+
+def test_concurrent_upgrades_apply_each_migration_once(tmp_path):
+    apps = [_migrated_app(tmp_path / 'shared.db') for _ in range(4)]
+    barrier = threading.Barrier(len(apps))
+    applied, errors = [], []
+
+    def upgrade(app):
+        with app.app_context():
+            barrier.wait()
+            try:
+                applied.extend(migrations.upgrade())
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=upgrade, args=(app,)) for app in apps]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert sorted(applied) == [version for version, _, _ in migrations.MIGRATIONS]
+
+@pytest.mark.parametrize('cache_kb, mmap_size', [(1024, 0), (65536, 268435456)])
+def test_sqlite_cache_and_mmap_come_from_the_environment(tmp_path, monkeypatch, cache_kb, mmap_size):
+    monkeypatch.setenv('SQLITE_CACHE_SIZE_KB', str(cache_kb))
+    monkeypatch.setenv('SQLITE_MMAP_SIZE', str(mmap_size))
+    app = Flask(__name__)
+    main.configure(app, {'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'pragmas.db'}"})
+    db.init_app(app)
+    database.init_app(app)
+    with app.app_context(), db.engine.connect() as connection:
+        assert connection.exec_driver_sql('PRAGMA cache_size').scalar() == -cache_kb
+        assert connection.exec_driver_sql('PRAGMA mmap_size').scalar() == mmap_size
@@ -0,0 +1,78 @@
+import io
+import threading
+import time
+
+import main
+import stock_updates
+from models import db, MeliItem, StockUpdateItem
+from stock_updates import StockUpdater
+
+class FakeStockAPI:
+    def __init__(self):
+        self.batches = []
+
+    def update_stocks(self, quantities):
+        self.batches.append(dict(quantities))
+        return {'results': dict(quantities), 'errors': {}}
+
+def _statuses(job_id):
+    return {item.product_id: item.status for item in StockUpdateItem.query.filter_by(job_id=job_id)}
+
+def test_parse_keeps_last_line_per_product():
+    data = b'product_id,quantity\nMLB1,5\nMLB2,x\nMLB1,7\n,3\nMLB3,2\n'
+    quantities, errors, invalid, duplicates = stock_updates.parse_updates(io.BytesIO(data), 'csv')
+    assert quantities == {'MLB1': 7, 'MLB3': 2}
+    assert list(quantities) == ['MLB1', 'MLB3']
+    assert [error['line'] for error in errors] == [3, 5]
+    assert (invalid, duplicates) == (2, 1)
+
+def test_newer_job_supersedes_pending_items_and_batches_are_sent(db_app):
+    db.session.add_all([MeliItem(id=f'MLB{i}', title='Item', status='active', available_quantity=0)
+                        for i in range(1, 4)])
+    db.session.commit()
+    old = stock_updates.create_job({'MLB1': 1, 'MLB2': 2})
+    new = stock_updates.create_job({'MLB2': 20, 'MLB3': 30})
+    assert _statuses(old.id) == {'MLB1': 'pending', 'MLB2': 'superseded'}
+
+    api = FakeStockAPI()
+    updater = StockUpdater(db_app, api=api, batch_size=1)
+    assert updater.run_once() and updater.run_once()
+    assert not updater.run_once()
+    assert api.batches == [{'MLB1': 1}, {'MLB2': 20}, {'MLB3': 30}]
+    assert stock_updates.job_summary(new)['done'] == 2
+    assert {item.id: item.available_quantity for item in MeliItem.query} == {'MLB1': 1, 'MLB2': 20, 'MLB3': 30}
+
+def _sending_job(app, product_id):
+    with app.app_context():
+        job = stock_updates.create_job({product_id: 1})
+        StockUpdater(app, batch_size=10)._claim(job.id)
+        return job.id
+
+def test_individual_write_waits_for_the_batch_in_flight(client, app, monkeypatch):
+    calls = []
+    monkeypatch.setattr(main.meli_api, 'update_product_stock', lambda product_id, quantity: calls.append(
+        ('individual', quantity)) or {'product_id': product_id, 'available_quantity': quantity})
+    job_id = _sending_job(app, 'MLB1')
+
+    def finish_batch():
+        time.sleep(0.3)
+        with app.app_context():
+            calls.append(('batch', 1))
+            StockUpdateItem.query.filter_by(job_id=job_id).update({'status': 'done'})
+            db.session.commit()
+
+    thread = threading.Thread(target=finish_batch)
+    thread.start()
+    response = client.put('/api/mercadolivre/products/MLB1/stock', json={'quantity': 9})
+    thread.join()
+    assert response.status_code == 200
+    assert calls == [('batch', 1), ('individual', 9)]
+
+def test_individual_write_gives_up_if_the_batch_does_not_finish(client, app, monkeypatch):
+    calls = []
+    monkeypatch.setattr(main.meli_api, 'update_product_stock', lambda *args: calls.append(args))
+    app.config['STOCK_INFLIGHT_WAIT'] = 0.2
+    _sending_job(app, 'MLB1')
+    response = client.put('/api/mercadolivre/products/MLB1/stock', json={'quantity': 9})
+    assert response.status_code == 409
+    assert calls == []
@@ -0,0 +1,116 @@
+import inspect
+import time
+import uuid
+from datetime import timedelta
+
+import jwt as pyjwt
+import pytest
+from flask_jwt_extended import JWTManager, create_access_token, decode_token
+
+from models import db, User
+from token_auth import BloomFilter, CachingJWTManager, TokenAuth, TokenDenylist, max_token_age
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(size_bits=1 << 16, hashes=5)
+    keys = [str(uuid.uuid4()) for _ in range(500)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    misses = sum(str(uuid.uuid4()) in bloom for _ in range(1000))
+    assert misses < 20
+
+def test_denylist_revokes_and_prunes():
+    denylist = TokenDenylist(size_bits=1 << 12)
+    now = time.time()
+    denylist.revoke('old', now - 1)
+    denylist.revoke('new', now + 60)
+    assert denylist.is_revoked({'jti': 'old', 'sub': '1'})
+    assert not denylist.is_revoked({'jti': 'other', 'sub': '1'})
+    denylist.prune(now)
+    assert not denylist.is_revoked({'jti': 'old', 'sub': '1'})
+    assert denylist.is_revoked({'jti': 'new', 'sub': '1'})
+
+def test_denylist_revokes_tokens_issued_before_user_revocation():
+    denylist = TokenDenylist(size_bits=1 << 12)
+    denylist.revoke_user(7, at=1000)
+    assert denylist.is_revoked({'jti': 'a', 'sub': '7', 'iat': 999})
+    assert not denylist.is_revoked({'jti': 'b', 'sub': '7', 'iat': 1001})
+    assert not denylist.is_revoked({'jti': 'c', 'sub': '8', 'iat': 999})
+
+def test_user_revocations_expire_with_the_longest_token():
+    denylist = TokenDenylist(size_bits=1 << 12, max_token_age=900)
+    denylist.revoke_user(7, at=1000)
+    denylist.prune(now=1000 + 899)
+    assert denylist.is_revoked({'jti': 'a', 'sub': '7', 'iat': 999})
+    # Todo token emitido antes da revogação já expirou
+    denylist.prune(now=1000 + 901)
+    assert denylist.stats()['revoked_users'] == 0
+
+def test_max_token_age_from_config():
+    assert max_token_age({}) == 900
+    assert max_token_age({'JWT_ACCESS_TOKEN_EXPIRES': timedelta(hours=1), 'JWT_DECODE_LEEWAY': 30}) == 3630
+    assert max_token_age({'JWT_ACCESS_TOKEN_EXPIRES': 120}) == 120
+    assert max_token_age({'JWT_ACCESS_TOKEN_EXPIRES': False}) is None
+
+def test_caching_manager_matches_the_extension_internals(db_app):
+    # O método sobrescrito é interno; a versão fixada no requirements.txt tem esta assinatura
+    parameters = list(inspect.signature(JWTManager._decode_jwt_from_config).parameters)
+    assert parameters == ['self', 'encoded_token', 'csrf_value', 'allow_expired']
+    db_app.config['JWT_SECRET_KEY'] = 'segredo-de-teste-com-32-caracteres!'
+    jwt = CachingJWTManager(db_app)
+    token = create_access_token(identity='1')
+    assert decode_token(token)['sub'] == decode_token(token)['sub'] == '1'
+    assert (jwt.cache_misses, jwt.cache_hits) == (1, 1)
+    forged = pyjwt.encode(decode_token(token), 'outra-chave-com-pelo-menos-32-caracteres', algorithm='HS256')
+    with pytest.raises(pyjwt.InvalidSignatureError):
+        decode_token(forged)
+
+class SharedBus:
+    shared = True
+
+    def on(self, topic, listener):
+        pass
+
+@pytest.fixture
+def workers(db_app):
+    """Dois processos sem broker: cada um com a sua instância de TokenAuth"""
+    db_app.config['AUTH_REVOCATION_CHECK_TTL'] = 0.05
+    jwt = JWTManager(db_app)
+    workers = []
+    for _ in range(2):
+        auth = TokenAuth()
+        auth.init_app(db_app, jwt)
+        workers.append(auth)
+    user = User('Operador', 'operador@meli.com', 'senha1234')
+    db.session.add(user)
+    db.session.commit()
+    payload = {'jti': str(uuid.uuid4()), 'sub': str(user.id), 'iat': time.time() - 1, 'exp': time.time() + 600}
+    return workers, user, payload
+
+def test_user_cache_is_capped_without_broker(db_app):
+    db_app.config['AUTH_REVOCATION_CHECK_TTL'] = 5
+    db_app.config['AUTH_USER_CACHE_TTL'] = 60
+    jwt = JWTManager(db_app)
+    local, shared = TokenAuth(), TokenAuth()
+    local.init_app(db_app, jwt)
+    shared.init_app(db_app, jwt, SharedBus())
+    assert local.user_ttl == 5
+    assert shared.user_ttl == 60
+
+def test_logout_in_another_worker_is_seen_after_ttl(workers):
+    (first, second), user, payload = workers
+    assert not second._check_revoked(payload)
+    first.revoke_token(payload)
+    assert first._check_revoked(payload)
+    time.sleep(0.06)
+    assert second._check_revoked(payload)
+    # A partir daqui vale pela lista em memória, sem consultar o banco
+    assert second.denylist.is_revoked(payload)
+
+def test_deactivation_in_another_worker_is_seen_after_ttl(workers):
+    (first, second), user, payload = workers
+    assert not second._check_revoked(payload)
+    first.deactivate_user(user)
+    assert first._check_revoked(payload)
+    time.sleep(0.06)
+    assert second._check_revoked(payload)
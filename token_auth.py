@@ -0,0 +1,282 @@
+"""
+Verificação de JWT com cache e lista de revogação em memória
+Um token já verificado não é decodificado de novo até expirar; logout e
+desativação de conta valem na hora no worker que os recebeu e nos demais pelo
+barramento de eventos. Sem broker (ou pela CLI), os outros workers encontram a
+revogação no banco em até AUTH_REVOCATION_CHECK_TTL segundos.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from flask_jwt_extended import JWTManager
+from sqlalchemy import select
+from models import db, User, RevokedToken
+from ttl_cache import TTLCache
+from instrumentation import phase
+
+# Tópico interno do barramento com as revogações feitas em outros workers
+REVOCATION_TOPIC = '_auth_revocations'
+
+def token_key(encoded_token):
+    """Chave de cache do token (o hash, para não guardar o token em si)"""
+    return hashlib.sha256(encoded_token.encode('utf-8')).digest()
+
+class BloomFilter:
+    """Filtro de Bloom de tamanho fixo: 'não contém' é garantido, 'contém' é provável"""
+
+    def __init__(self, size_bits=1 << 20, hashes=7):
+        self.size_bits = size_bits
+        self.hashes = hashes
+        self._bits = bytearray(size_bits // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=self.hashes * 4).digest()
+        for i in range(self.hashes):
+            yield int.from_bytes(digest[i * 4:i * 4 + 4], 'little') % self.size_bits
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class TokenDenylist:
+    """Tokens revogados: filtro de Bloom na frente de um conjunto exato
+
+    A grande maioria das consultas é de tokens válidos, que o filtro descarta
+    sem tocar no conjunto. O conjunto guarda a expiração de cada jti, e os
+    vencidos saem dele (e o filtro é refeito) em `prune`. As revogações por
+    usuário saem depois de `max_token_age` segundos, quando todos os tokens
+    emitidos antes delas já expiraram.
+    """
+
+    def __init__(self, size_bits=1 << 20, hashes=7, prune_interval=60.0, max_token_age=None):
+        self._size_bits = size_bits
+        self._hashes = hashes
+        self.prune_interval = prune_interval
+        self.max_token_age = max_token_age
+        self._last_prune = time.monotonic()
+        self._lock = threading.Lock()
+        self._bloom = BloomFilter(size_bits, hashes)
+        self._revoked = {}
+        # Usuários cujos tokens emitidos antes do instante registrado são inválidos
+        self._users = {}
+        self.bloom_hits = 0
+
+    def revoke(self, jti, expires_at):
+        with self._lock:
+            self._revoked[jti] = expires_at
+            self._bloom.add(jti)
+
+    def revoke_user(self, user_id, at=None):
+        with self._lock:
+            self._users[str(user_id)] = at or time.time()
+
+    def is_revoked(self, payload):
+        revoked_at = self._users.get(str(payload.get('sub')))
+        if revoked_at is not None and payload.get('iat', 0) <= revoked_at:
+            return True
+        jti = payload.get('jti')
+        if jti is None or jti not in self._bloom:
+            return False
+        self.bloom_hits += 1
+        return jti in self._revoked
+
+    def prune(self, now=None):
+        """Descarta os tokens já expirados e as revogações de usuário vencidas; refaz o filtro"""
+        now = now or time.time()
+        self._last_prune = time.monotonic()
+        with self._lock:
+            self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+            if self.max_token_age is not None:
+                self._users = {user: at for user, at in self._users.items() if at + self.max_token_age > now}
+            bloom = BloomFilter(self._size_bits, self._hashes)
+            for jti in self._revoked:
+                bloom.add(jti)
+            self._bloom = bloom
+
+    def maybe_prune(self):
+        """Roda `prune` se o intervalo desde a última limpeza já passou"""
+        if time.monotonic() - self._last_prune >= self.prune_interval:
+            self.prune()
+
+    def stats(self):
+        return {'revoked_tokens': len(self._revoked), 'revoked_users': len(self._users),
+                'bloom_hits': self.bloom_hits}
+
+# A extensão não tem um ponto público para trocar a decodificação; o método
+# interno sobrescrito abaixo é conferido aqui e a versão fica fixa no requirements.txt
+if not hasattr(JWTManager, '_decode_jwt_from_config'):
+    raise ImportError('Versão do flask-jwt-extended sem _decode_jwt_from_config; use a do requirements.txt')
+
+class CachingJWTManager(JWTManager):
+    """JWTManager que guarda as claims dos tokens já verificados até expirarem
+
+    A assinatura e as claims de um token não mudam, então basta verificá-lo
+    uma vez; revogação e usuário continuam sendo conferidos a cada requisição
+    pelos callbacks da extensão, que rodam depois desta decodificação.
+    """
+
+    def __init__(self, app=None, max_entries=50000, **kwargs):
+        self.max_entries = max_entries
+        self._verified = OrderedDict()
+        self._verified_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        super().__init__(app, **kwargs)
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        with phase('jwt'):
+            return self._decode_cached(encoded_token, csrf_value, allow_expired)
+
+    def _decode_cached(self, encoded_token, csrf_value, allow_expired):
+        # Só o caso comum (sem CSRF, sem aceitar expirado) passa pelo cache
+        if csrf_value is not None or allow_expired:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+        key = token_key(encoded_token)
+        entry = self._verified.get(key)
+        if entry is not None and entry[1] > time.time():
+            self.cache_hits += 1
+            return dict(entry[0])
+
+        claims = super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+        self.cache_misses += 1
+        expires = claims.get('exp')
+        if expires is not None:
+            with self._verified_lock:
+                self._verified[key] = (claims, expires)
+                if len(self._verified) > self.max_entries:
+                    self._evict()
+        return dict(claims)
+
+    def _evict(self):
+        now = time.time()
+        for key in [k for k, (_, exp) in self._verified.items() if exp <= now]:
+            del self._verified[key]
+        while len(self._verified) > self.max_entries:
+            self._verified.popitem(last=False)
+
+    def stats(self):
+        return {'verified_tokens': len(self._verified),
+                'cache_hits': self.cache_hits, 'cache_misses': self.cache_misses}
+
+def max_token_age(config):
+    """Vida máxima de um token de acesso em segundos (com a tolerância), ou None se não expiram"""
+    expires = config.get('JWT_ACCESS_TOKEN_EXPIRES', timedelta(minutes=15))
+    if expires is False:
+        return None
+    if isinstance(expires, timedelta):
+        expires = expires.total_seconds()
+    leeway = config.get('JWT_DECODE_LEEWAY', 0)
+    if isinstance(leeway, timedelta):
+        leeway = leeway.total_seconds()
+    return expires + leeway
+
+class TokenAuth:
+    """Revogação de tokens e cache de usuários ligados ao JWTManager da aplicação"""
+
+    def __init__(self):
+        self.denylist = TokenDenylist()
+        self.users = TTLCache(max_bytes=8 * 1024 * 1024)
+        # Tokens conferidos na tabela revoked_token: jti -> expiração ou None
+        self.revocations = TTLCache(max_bytes=4 * 1024 * 1024)
+        self.user_ttl = 60
+        self.revocation_ttl = 5
+        self.events = None
+
+    def init_app(self, app, jwt, events=None):
+        self.revocation_ttl = app.config.get('AUTH_REVOCATION_CHECK_TTL', 5)
+        self.user_ttl = app.config.get('AUTH_USER_CACHE_TTL', 60)
+        if not getattr(events, 'shared', False):
+            # Sem broker, uma conta desativada em outro processo só é vista no banco
+            self.user_ttl = min(self.user_ttl, self.revocation_ttl)
+        self.events = events
+        self.denylist.max_token_age = max_token_age(app.config)
+        jwt.token_in_blocklist_loader(self._is_revoked)
+        if events is not None:
+            events.on(REVOCATION_TOPIC, self._apply)
+
+    def load_revocations(self):
+        """Carrega os tokens revogados que ainda não expiraram"""
+        now = datetime.utcnow()
+        for row in RevokedToken.query.filter(RevokedToken.expires_at > now):
+            self.denylist.revoke(row.jti, row.expires_at.replace(tzinfo=timezone.utc).timestamp())
+        RevokedToken.query.filter(RevokedToken.expires_at <= now).delete()
+        db.session.commit()
+
+    def _user_record(self, user_id):
+        user = db.session.get(User, user_id)
+        return None if user is None else user.to_dict()
+
+    def get_user(self, user_id):
+        """Dados do usuário (to_dict) pelo id, do cache do worker quando possível"""
+        return self.users.get_or_load(('user', int(user_id)), lambda: self._user_record(int(user_id)),
+                                      ttl=self.user_ttl)
+
+    def _is_revoked(self, jwt_header, jwt_payload):
+        # A busca do usuário no banco, quando não está em cache, conta como db
+        with phase('jwt'):
+            return self._check_revoked(jwt_payload)
+
+    def _revoked_in_db(self, jti):
+        expires_at = db.session.execute(
+            select(RevokedToken.expires_at).where(RevokedToken.jti == jti)).scalar()
+        return None if expires_at is None else expires_at.replace(tzinfo=timezone.utc).timestamp()
+
+    def _check_revoked(self, jwt_payload):
+        if self.denylist.is_revoked(jwt_payload):
+            return True
+        # Logout feito em outro worker sem broker: consulta o banco, e a
+        # resposta (inclusive "não revogado") vale por revocation_ttl segundos
+        jti = jwt_payload.get('jti')
+        if jti:
+            expires = self.revocations.get_or_load(('jti', jti), lambda: self._revoked_in_db(jti),
+                                                   ttl=self.revocation_ttl)
+            if expires is not None:
+                self.denylist.revoke(jti, expires)
+                return True
+        # Conta removida ou desativada invalida os tokens já emitidos
+        try:
+            user = self.get_user(jwt_payload['sub'])
+        except (TypeError, ValueError):
+            return True
+        return user is None or not user['is_active']
+
+    def _apply(self, data):
+        if data.get('jti'):
+            self.denylist.revoke(data['jti'], data['exp'])
+        if data.get('user_id') is not None:
+            self.denylist.revoke_user(data['user_id'], data['at'])
+            self.users.invalidate('user', int(data['user_id']))
+        self.denylist.maybe_prune()
+
+    def _broadcast(self, data):
+        self._apply(data)
+        if self.events is not None:
+            self.events.publish(REVOCATION_TOPIC, data)
+
+    def revoke_token(self, payload):
+        """Revoga um token (logout) até a sua expiração"""
+        expires_at = datetime.fromtimestamp(payload['exp'], timezone.utc).replace(tzinfo=None)
+        db.session.merge(RevokedToken(jti=payload['jti'], user_id=int(payload['sub']), expires_at=expires_at))
+        db.session.commit()
+        self._broadcast({'jti': payload['jti'], 'exp': payload['exp']})
+
+    def revoke_user(self, user_id):
+        """Invalida os tokens já emitidos para o usuário (ex.: conta desativada)"""
+        self._broadcast({'user_id': user_id, 'at': time.time()})
+
+    def deactivate_user(self, user):
+        """Desativa a conta e derruba as sessões abertas"""
+        user.is_active = False
+        db.session.commit()
+        self.revoke_user(user.id)
+
+    def stats(self):
+        return self.denylist.stats()
+
+token_auth = TokenAuth()
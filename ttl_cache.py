@@ -0,0 +1,149 @@
+"""
+Cache em memória com TTL, despejo LRU por tamanho e stale-while-revalidate
+Chamadas simultâneas para a mesma chave ausente viram uma única carga
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+class _Entry:
+    __slots__ = ('value', 'size', 'expires', 'stale_until')
+
+    def __init__(self, value, size, ttl, stale):
+        now = time.monotonic()
+        self.value = value
+        self.size = size
+        self.expires = now + ttl
+        self.stale_until = self.expires + stale
+
+def _estimate_size(value):
+    """Tamanho aproximado do valor, medido pela serialização JSON"""
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 1024
+
+class TTLCache:
+    """Cache LRU com validade por entrada, limitado em bytes"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Muda a cada invalidação; cargas iniciadas antes dela não são guardadas
+        self._epoch = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.refreshes = 0
+
+    def get_or_load(self, key, loader, ttl, stale=0, cache_none=True):
+        """Retorna o valor da chave, chamando `loader()` só quando necessário
+
+        Dentro do TTL o valor vem direto do cache. Depois dele, e até `stale`
+        segundos a mais, o valor antigo é devolvido enquanto uma thread de
+        fundo busca o novo. Fora disso a chamada espera a carga, que é
+        compartilhada com quem pedir a mesma chave ao mesmo tempo.
+        Com `cache_none=False` um resultado None é devolvido sem ser guardado.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            now = time.monotonic()
+            if entry is not None and now < entry.expires:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            if entry is not None and now < entry.stale_until:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                if key not in self._inflight:
+                    self._inflight[key] = Future()
+                    self.refreshes += 1
+                    threading.Thread(target=self._load, args=(key, loader, ttl, stale, self._epoch, cache_none),
+                                     name='cache-refresh', daemon=True).start()
+                return entry.value
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+                leader = True
+            epoch = self._epoch
+
+        if leader:
+            self._load(key, loader, ttl, stale, epoch, cache_none)
+        return future.result()
+
+    def _load(self, key, loader, ttl, stale, epoch, cache_none=True):
+        future = self._inflight[key]
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            return
+        if value is None and not cache_none:
+            with self._lock:
+                self._inflight.pop(key, None)
+                # Descarta também o valor vencido que estava sendo revalidado
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self._bytes -= old.size
+        else:
+            self._store(key, value, ttl, stale, epoch)
+        future.set_result(value)
+
+    def _store(self, key, value, ttl, stale, epoch):
+        entry = _Entry(value, _estimate_size(value), ttl, stale)
+        with self._lock:
+            self._inflight.pop(key, None)
+            if epoch != self._epoch:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
+
+    def invalidate(self, namespace, *args):
+        """Remove as entradas cuja chave começa com (namespace, *args)"""
+        prefix = (namespace,) + args
+        with self._lock:
+            self._epoch += 1
+            for key in [k for k in self._entries if k[:len(prefix)] == prefix]:
+                self._bytes -= self._entries.pop(key).size
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'refreshes': self.refreshes,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,9 @@
+"""
+Ponto de entrada WSGI de produção
+
+Uso: gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+from main import create_app
+
+app = create_app()